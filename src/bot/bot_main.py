@@ -1,27 +1,85 @@
+import datetime
 import logging
 import discord
 
-CURRENT_LOGGING_LEVEL = logging.INFO
-
-import datetime
-
 from pathlib import Path
 from discord import Guild, Intents
 from discord.ext import commands
 
-from logging import getLogger
 from utilities.custom_logger import CustomLogger
 from utilities.role_handler import RoleHandler
-from utilities.role_configuration import RoleConfigurationManager
+from utilities.role_configuration import (
+    RoleConfigurationStore,
+    get_role_configuration_store,
+)
 from utilities.data_handling import DataHandler, get_data_handler
+from utilities.loop_watchdog import LoopWatchdog
+from utilities.validation_scheduler import ValidationScheduler
+from utilities.role_reconciler import (
+    DEFAULT_RECONCILIATION_PERIOD,
+    DEFAULT_SLICE_INTERVAL,
+    RoleReconciler,
+)
+from utilities.sweep_planner import SweepPlanner
+from utilities.event_recorder import EventRecorder
+from utilities.rate_limit_budget import (
+    RateLimitBudgetManager,
+    get_rate_limit_budget_manager,
+)
+from utilities.startup_profiler import get_startup_profiler, startup_phase
+from utilities.log_sampling import flush_suppressed_log_summaries
+from utilities.cog_reloader import CogReloader
+
+CURRENT_LOGGING_LEVEL = logging.INFO
+# how many role validations run at the same time
+VALIDATION_WORKER_COUNT = 2
+# how many processes plan a full guild sweep at the same time,
+# None uses all but one core
+SWEEP_PLANNER_WORKER_COUNT = None
+
+
+def get_shard_id_for_guild(guild_id: int, shard_count: int) -> int:
+    """
+    Gets the shard that a guild is handled by.
+
+    Parameters
+    ----------
+    guild_id : int
+        The ID of the guild.
+    shard_count : int
+        The total amount of shards, None or 0 if the bot is not sharded.
+
+    Returns
+    -------
+    int
+        The ID of the shard that handles the guild.
+    """
+    # this is the formula discord uses to assign guilds to shards
+    return (guild_id >> 22) % (shard_count or 1)
+
 
 class DoseBot(commands.Bot):
-    def __init__(self):
+    def __init__(
+        self,
+        record_events: bool = False,
+        watch_cogs: bool = False,
+        live_validation: bool = False,
+        reconciliation_period: float = DEFAULT_RECONCILIATION_PERIOD,
+        reconciliation_interval: float = DEFAULT_SLICE_INTERVAL,
+        **options,
+    ):
+        # learn the rate limits from every response,
+        # so role edits and dms can stay under them
+        rate_limit_budget: RateLimitBudgetManager = get_rate_limit_budget_manager()
+        options.setdefault("http_trace", rate_limit_budget.create_trace_config())
+
         # initialize the bot
         super().__init__(
-            command_prefix="!", intents=Intents.all(), case_insensitive=True
+            command_prefix="!", intents=Intents.all(), case_insensitive=True, **options
         )
 
+        self.rate_limit_budget: RateLimitBudgetManager = rate_limit_budget
+
         self.bot_start_time = datetime.datetime.now(datetime.timezone.utc)
 
         self.production_server_id = 715062960984162344
@@ -30,38 +88,90 @@ class DoseBot(commands.Bot):
 
         # setup the logger
         self.setup_loggers()
-        
-        # create the role handler
-        self.role_handler = RoleHandler(self)
-        
+
         # load the data handler
         self.data_handler: DataHandler = get_data_handler()
-        
-        self.role_configuration_manager = RoleConfigurationManager(self, self.data_handler)
-        
-    
+
+        # get the store that loads the role configuration of each guild
+        # when it is first needed
+        self.role_configuration_store: RoleConfigurationStore = (
+            get_role_configuration_store(self, self.data_handler)
+        )
+
+        # create the role handler, it only changes roles when live validation is on
+        self.role_handler = RoleHandler(self, live_validation=live_validation)
+
+        # every role validation goes through the scheduler,
+        # so urgent ones are handled first
+        self.validation_scheduler = ValidationScheduler(
+            self.role_handler.validate_roles, worker_count=VALIDATION_WORKER_COUNT
+        )
+
+        # walks every member in the background to fix drift that no event told us about
+        self.role_reconciler = RoleReconciler(
+            self,
+            self.validation_scheduler,
+            self.role_handler,
+            self.data_handler,
+            period=reconciliation_period,
+            slice_interval=reconciliation_interval,
+        )
+
+        # plans full guild sweeps in worker processes,
+        # so the event loop keeps up with the gateway
+        self.sweep_planner = SweepPlanner(max_workers=SWEEP_PLANNER_WORKER_COUNT)
+
+        # create the watchdog that reports when the event loop gets blocked
+        self.loop_watchdog = LoopWatchdog()
+
+        # record the gateway events for offline replays, only when asked for
+        self.event_recorder: EventRecorder = (
+            EventRecorder(self, self.data_handler) if record_events else None
+        )
+
+        # reloads changed cogs without a restart,
+        # watching the cogs folder only when asked for
+        self.cog_reloader: CogReloader = CogReloader(self)
+        self.watch_cogs: bool = watch_cogs
+
     def setup_loggers(self) -> None:
         """
         Sets up the logger for the bot.
         """
         self.logger = CustomLogger("bot", logging_level=CURRENT_LOGGING_LEVEL).logger
         # create a new cog logger
-        self.cog_logger = CustomLogger("cogs", logging_level=CURRENT_LOGGING_LEVEL).logger
+        self.cog_logger = CustomLogger(
+            "cogs", logging_level=CURRENT_LOGGING_LEVEL, structured=True
+        ).logger
         # create a logger for role validation and handling
-        self.role_logger = CustomLogger("role", logging_level=CURRENT_LOGGING_LEVEL).logger
+        self.role_logger = CustomLogger(
+            "role", logging_level=CURRENT_LOGGING_LEVEL, structured=True
+        ).logger
         # log the success
         self.logger.info("Logger setup complete!")
-    
+
     async def setup_hook(self) -> None:
         """Hook for the setup of the bot."""
+        # start watching the event loop for blocking work
+        await self.loop_watchdog.start()
+
+        # start the role validation workers
+        await self.validation_scheduler.start()
+
         # load the initial cogs
-        await self.load_cogs()
+        with startup_phase("load_cogs"):
+            await self.load_cogs()
+
+        # remember the loaded cogs, so only the ones changed after this are reloaded
+        self.cog_reloader.remember_modification_times()
+        if self.watch_cogs:
+            self.cog_reloader.start()
 
         # log the success
         self.logger.info("Setup complete!")
 
         return None
-    
+
     async def load_cogs(self) -> None:
         """
         Loads all the cogs found in the cogs folder.
@@ -71,7 +181,7 @@ class DoseBot(commands.Bot):
 
         # find the cogs folder
         cogs_folder = Path("src/bot/cogs")
-        
+
         # load all files in the cogs folder
         for file in cogs_folder.iterdir():
             try:
@@ -84,7 +194,8 @@ class DoseBot(commands.Bot):
                     self.logger.info(f"Loading cog '{extension_name}'...")
 
                     # load the extension
-                    await self.load_extension(f"bot.cogs.{extension_name}")
+                    with startup_phase(f"load_cog:{extension_name}"):
+                        await self.load_extension(f"bot.cogs.{extension_name}")
 
                     # log the success
                     self.logger.info(f"Cog '{extension_name}' loaded!")
@@ -97,7 +208,7 @@ class DoseBot(commands.Bot):
         self.logger.info("All extensions loaded!")
 
         return None
-    
+
     async def on_ready(self) -> None:
         # get the development guild
         self.development_guild: Guild = self.get_guild(self.development_server_id)
@@ -108,15 +219,103 @@ class DoseBot(commands.Bot):
         # store when the bot was ready
         self.bot_ready_time = datetime.datetime.now(datetime.timezone.utc)
         # print how long it took for the bot to be ready
-        self.logger.info(f"Bot took {self.bot_ready_time - self.bot_start_time} to be ready!")
+        self.logger.info(
+            f"Bot took {self.bot_ready_time - self.bot_start_time} to be ready!"
+        )
         self.is_loaded = True
 
-        self.role_configuration_manager.load_role_configuration_file()
+        # finish the startup profile, if the startup is being profiled
+        startup_profiler = get_startup_profiler()
+        if startup_profiler is not None:
+            startup_profiler.mark("first_on_ready")
+            report_path = startup_profiler.write_report(self.data_handler)
+            self.logger.info(f"Startup profile written to {report_path}")
 
-        # load missing roles
-        self.role_configuration_manager.load_missing_role_configurations()
+        # the guilds could have changed while we were away, so every configuration is
+        # loaded again (with the missing roles) the next time the guild is used
+        self.role_configuration_store.unload_all()
+
+        # the role resolvers have to be rebuilt against the new guild cache
+        self.role_handler.reset_role_resolvers()
+
+        # start walking the members, it resumes where it left off before a restart,
+        # there is nothing to fix while the validations do not change roles
+        if self.role_handler.live_validation:
+            self.role_reconciler.start()
+
+        # build the role name index up front, so the first autocomplete is fast too
+        production_guild: Guild = self.get_guild(self.production_server_id)
+        if production_guild is not None:
+            # load the configuration off the event loop,
+            # the gateway is busiest right after ready
+            await self.role_handler.get_role_configuration_manager_async(
+                production_guild
+            )
+            self.role_handler.get_role_name_index(production_guild)
+            # warn about roles the bot can not manage
+            # before the first member is validated
+            self.role_handler.get_role_manageability(production_guild)
+
+    async def run_setup_without_login(self) -> None:
+        """
+        Runs the setup of the bot without logging in, then closes it.
+        Used to profile the startup without a token.
+        """
+        async with self:
+            await self.setup_hook()
+
+    def get_shard_id(self, guild: Guild) -> int:
+        """
+        Gets the shard that a guild is handled by.
+        """
+        return get_shard_id_for_guild(guild.id, self.shard_count)
+
+    def get_shard_latencies(self) -> dict[int, float]:
+        """
+        Gets the latency of every shard the bot is running, in seconds.
+        """
+        return {self.shard_id or 0: self.latency}
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        # log the shard and its latency
+        latency = self.get_shard_latencies().get(shard_id, self.latency)
+        self.logger.info(
+            f"Shard {shard_id} is ready! (latency: {latency * 1000:.0f}ms)"
+        )
+
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        # log the shard and its latency
+        latency = self.get_shard_latencies().get(shard_id, self.latency)
+        self.logger.info(f"Shard {shard_id} resumed! (latency: {latency * 1000:.0f}ms)")
+
+    def dispatch(self, event_name: str, /, *args, **kwargs) -> None:
+        # record the event before any listener gets to change the objects
+        if self.event_recorder is not None:
+            self.event_recorder.record(event_name, *args)
+
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def close(self) -> None:
+        # stop watching the event loop and the cogs folder
+        self.loop_watchdog.stop()
+        self.cog_reloader.stop()
+
+        # write what is left of the recording
+        if self.event_recorder is not None:
+            self.event_recorder.close()
+
+        # stop the reconciliation and the role validation workers
+        self.role_reconciler.stop()
+        self.validation_scheduler.stop()
+
+        # write the role configuration changes that are still waiting
+        await self.role_configuration_store.flush_journals_async()
+
+        # report what the log rate limits dropped since the last summary
+        flush_suppressed_log_summaries()
+
+        await super().close()
 
-        
     def run(self, bot_token: str) -> None:
         # log the start of the bot with the date
         self.logger.info("Starting the bot at %s", datetime.datetime.now())
@@ -127,4 +326,81 @@ class DoseBot(commands.Bot):
             # log the error
             self.logger.error("Invalid token provided!")
             input("\nPress any key to continue...")
-            quit()
\ No newline at end of file
+            quit()
+
+
+class ShardedDoseBot(DoseBot, commands.AutoShardedBot):
+    """
+    A DoseBot that splits its guilds over multiple gateway connections.
+    """
+
+    def get_shard_latencies(self) -> dict[int, float]:
+        """
+        Gets the latency of every shard the bot is running, in seconds.
+        """
+        return dict(self.latencies)
+
+
+def create_bot(
+    sharded: bool = False,
+    shard_count: int = None,
+    shard_ids: list[int] = None,
+    record_events: bool = False,
+    watch_cogs: bool = False,
+    live_validation: bool = False,
+    reconciliation_period: float = DEFAULT_RECONCILIATION_PERIOD,
+    reconciliation_interval: float = DEFAULT_SLICE_INTERVAL,
+) -> DoseBot:
+    """
+    Creates the bot.
+
+    Parameters
+    ----------
+    sharded : bool, optional
+        Whether the bot should be auto sharded. Defaults to False.
+    shard_count : int, optional
+        The total amount of shards. Defaults to the amount recommended by discord.
+    shard_ids : list of int, optional
+        The shards that this process should run. Defaults to all of them.
+    record_events : bool, optional
+        Whether the gateway events are recorded for offline replays. Defaults to False.
+    watch_cogs : bool, optional
+        Whether changed cogs are reloaded as soon as their file is saved.
+        Defaults to False.
+    live_validation : bool, optional
+        Whether validations change roles and dm members, instead of only being
+        scheduled. Defaults to False.
+    reconciliation_period : float, optional
+        How long a full reconciliation walk over the members of a guild should take,
+        in seconds. Defaults to a day.
+    reconciliation_interval : float, optional
+        How long the reconciliation waits between slices, in seconds.
+        Defaults to 10 seconds.
+
+    Returns
+    -------
+    DoseBot
+        The created bot.
+    """
+    if not sharded:
+        return DoseBot(
+            record_events=record_events,
+            watch_cogs=watch_cogs,
+            live_validation=live_validation,
+            reconciliation_period=reconciliation_period,
+            reconciliation_interval=reconciliation_interval,
+        )
+
+    # discord requires the shard count to be known when specific shards are requested
+    if shard_ids and not shard_count:
+        raise ValueError("shard_count must be set when shard_ids are given.")
+
+    return ShardedDoseBot(
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+        record_events=record_events,
+        watch_cogs=watch_cogs,
+        live_validation=live_validation,
+        reconciliation_period=reconciliation_period,
+        reconciliation_interval=reconciliation_interval,
+    )
@@ -0,0 +1,176 @@
+import discord
+
+from discord.ext import commands
+from discord import app_commands as apc
+
+from utilities.structured_logging import get_structured_logger
+from utilities.cog_reloader import CogReloader, format_reload_results
+
+logger = get_structured_logger("cogs")
+
+
+class CogReloadCog(
+    commands.GroupCog,
+    group_name="cogs",
+    group_description="Commands for reloading the cogs without restarting the bot.",
+):
+    """
+    Cog for deploying cog changes while the bot keeps running.
+    """
+
+    bot: commands.Bot = None
+
+    def __init__(self, bot) -> None:
+        # set the bot
+        self.bot = bot
+
+    def cog_unload(self) -> None:
+        """Unloads the cog."""
+        # log the unload
+        logger.info("cog.unloaded", cog=self.qualified_name)
+
+        return None
+
+    def cog_load(self) -> None:
+        """
+        This is called when the cog is loaded.
+        """
+        # log the load
+        logger.info("cog.loaded", cog=self.qualified_name)
+
+        return None
+
+    @property
+    def cog_reloader(self) -> CogReloader:
+        return self.bot.cog_reloader
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """
+        Only administrators are allowed to reload the cogs.
+        """
+        permissions = getattr(interaction.user, "guild_permissions", None)
+        if permissions is not None and permissions.administrator:
+            return True
+
+        logger.warning(
+            "command.denied", command=interaction.command, member=interaction.user
+        )
+        await interaction.response.send_message(
+            "You need the Administrator permission to reload the cogs.", ephemeral=True
+        )
+
+        return False
+
+    async def extension_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[apc.Choice[str]]:
+        """
+        Suggests the cog files by name.
+        """
+        return [
+            apc.Choice(name=extension_name, value=extension_name)
+            for extension_name in self.cog_reloader.get_extension_names()
+            if current.lower() in extension_name
+        ][:25]
+
+    @apc.command(
+        name="reload", description="Reloads the cogs that changed, or a single cog."
+    )
+    @apc.describe(
+        extension="The cog to reload, every changed cog by default.",
+        sync=(
+            "Whether the commands are synced afterwards, only needed when a command "
+            "was added or changed."
+        ),
+    )
+    @apc.autocomplete(extension=extension_autocomplete)
+    async def reload(
+        self,
+        interaction: discord.Interaction,
+        extension: str = None,
+        sync: bool = False,
+    ) -> None:
+        """
+        Reloads cogs, a cog that fails to load keeps its old version.
+        """
+        logger.info(
+            "command.used",
+            command="cogs reload",
+            member=interaction.user,
+            extension=extension,
+        )
+
+        extension_names = self.cog_reloader.get_extension_names()
+        if extension is not None and extension not in extension_names:
+            await interaction.response.send_message(
+                "There is no cog with that name.", ephemeral=True
+            )
+            return None
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        if extension is None:
+            results = await self.cog_reloader.reload_changed_extensions()
+        else:
+            results = await self.cog_reloader.reload_extensions([extension])
+
+        formatted_results = format_reload_results(results)
+
+        if sync and any(result.succeeded for result in results):
+            synced_commands = await self.bot.tree.sync(guild=self.bot.development_guild)
+            formatted_results += f"\nSynced {len(synced_commands)} commands."
+
+        logger.info(
+            "cogs.reloaded",
+            member=interaction.user,
+            reloaded=[result.extension_name for result in results if result.succeeded],
+            failed=[
+                result.extension_name for result in results if not result.succeeded
+            ],
+        )
+
+        # this cog could have been reloaded itself, the interaction is still valid
+        await interaction.followup.send(
+            f"```\n{formatted_results}\n```", ephemeral=True
+        )
+
+        return None
+
+    @apc.command(
+        name="watch",
+        description="Turns reloading cogs as soon as they are saved on or off.",
+    )
+    @apc.describe(enabled="Whether changed cogs are reloaded on their own.")
+    async def watch(self, interaction: discord.Interaction, enabled: bool) -> None:
+        """
+        Starts or stops the file watcher of the cogs folder.
+        """
+        logger.info(
+            "command.used",
+            command="cogs watch",
+            member=interaction.user,
+            enabled=enabled,
+        )
+
+        if enabled:
+            self.cog_reloader.start()
+        else:
+            self.cog_reloader.stop()
+
+        state = "on" if enabled else "off"
+        await interaction.response.send_message(
+            f"Watching the cogs folder is now {state}.", ephemeral=True
+        )
+
+        return None
+
+
+async def setup(bot: commands.Bot) -> None:
+    """
+    Sets up the cog.
+    """
+    await bot.add_cog(
+        CogReloadCog(bot),
+        guild=discord.Object(id=bot.development_server_id),
+    )
+    logger.info("cog.added", cog="cog_reload")
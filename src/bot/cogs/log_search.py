@@ -0,0 +1,140 @@
+import datetime
+import discord
+
+from discord.ext import commands
+from discord import app_commands as apc
+
+from utilities.structured_logging import get_structured_logger
+from utilities.custom_logger import get_logger_registry
+from utilities.data_handling import run_file_io
+from utilities.log_search import format_search_results, search_logs
+
+logger = get_structured_logger("cogs")
+
+# the loggers that write log files, with how they are shown to admins
+LOGGER_CHOICES: list[apc.Choice[str]] = [
+    apc.Choice(name="Role handling", value="role"),
+    apc.Choice(name="Cogs", value="cogs"),
+    apc.Choice(name="Bot", value="bot"),
+    apc.Choice(name="Main", value="main"),
+]
+
+# discord does not allow longer messages, the code block takes a few characters too
+MAX_RESULT_LENGTH: int = 1900
+
+
+class LogSearchCog(
+    commands.GroupCog,
+    group_name="logs",
+    group_description="Commands for searching the log files.",
+):
+    """
+    Cog for searching the log files during an incident, without access to the server.
+    """
+
+    bot: commands.Bot = None
+
+    def __init__(self, bot) -> None:
+        # set the bot
+        self.bot = bot
+
+    def cog_unload(self) -> None:
+        """Unloads the cog."""
+        # log the unload
+        logger.info("cog.unloaded", cog=self.qualified_name)
+
+        return None
+
+    def cog_load(self) -> None:
+        """
+        This is called when the cog is loaded.
+        """
+        # log the load
+        logger.info("cog.loaded", cog=self.qualified_name)
+
+        return None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """
+        Only administrators are allowed to read the logs.
+        """
+        permissions = getattr(interaction.user, "guild_permissions", None)
+        if permissions is not None and permissions.administrator:
+            return True
+
+        logger.warning(
+            "command.denied", command=interaction.command, member=interaction.user
+        )
+        await interaction.response.send_message(
+            "You need the Administrator permission to search the logs.", ephemeral=True
+        )
+
+        return False
+
+    @apc.command(
+        name="search",
+        description=(
+            "Searches the log files for a member ID, a role name or any other text."
+        ),
+    )
+    @apc.describe(
+        query="The text to search for, words are matched as whole words.",
+        logger_name="The logs to search, all of them by default.",
+        since="The first day to search, as YYYY-MM-DD.",
+        until="The last day to search, as YYYY-MM-DD.",
+    )
+    @apc.rename(logger_name="logger")
+    @apc.choices(logger_name=LOGGER_CHOICES)
+    async def search(
+        self,
+        interaction: discord.Interaction,
+        query: str,
+        logger_name: apc.Choice[str] = None,
+        since: str = None,
+        until: str = None,
+    ) -> None:
+        """
+        Searches the log files, the search runs off the event loop.
+        """
+        logger.info(
+            "command.used", command="logs search", member=interaction.user, query=query
+        )
+
+        try:
+            since_date = datetime.date.fromisoformat(since) if since else None
+            until_date = datetime.date.fromisoformat(until) if until else None
+        except ValueError:
+            await interaction.response.send_message(
+                "Dates have to be written as YYYY-MM-DD.", ephemeral=True
+            )
+            return None
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        # reading and decompressing the logs is blocking work
+        report = await run_file_io(
+            search_logs,
+            get_logger_registry().get_logs_folder().path,
+            query,
+            [logger_name.value] if logger_name is not None else None,
+            since_date,
+            until_date,
+        )
+
+        await interaction.followup.send(
+            f"```\n{format_search_results(report, MAX_RESULT_LENGTH)}\n```",
+            ephemeral=True,
+        )
+
+        return None
+
+
+async def setup(bot: commands.Bot) -> None:
+    """
+    Sets up the cog.
+    """
+    await bot.add_cog(
+        LogSearchCog(bot),
+        guild=discord.Object(id=bot.development_server_id),
+    )
+    logger.info("cog.added", cog="log_search")
@@ -1,14 +1,12 @@
-import datetime
 import discord
 
 from discord.ext import commands
-from discord import Embed, Guild, app_commands as apc
+from discord import Guild
 
-from logging import getLogger
-from utilities.custom_user import CustomUser
-from utilities.role_handler import RoleHandler
+from utilities.structured_logging import get_structured_logger
+from utilities.validation_scheduler import ValidationPriority
 
-logger = getLogger("main")
+logger = get_structured_logger("cogs")
 
 
 class OnMessageCog(commands.Cog):
@@ -25,7 +23,7 @@ class OnMessageCog(commands.Cog):
     def cog_unload(self) -> None:
         """Unloads the cog."""
         # log the unload
-        logger.info(f"Unloaded the cog '{self.qualified_name}'")
+        logger.info("cog.unloaded", cog=self.qualified_name)
 
         return None
 
@@ -34,36 +32,42 @@ class OnMessageCog(commands.Cog):
         This is called when the cog is loaded.
         """
         # log the load
-        logger.info(f"Loaded the cog '{self.qualified_name}'")
+        logger.info("cog.loaded", cog=self.qualified_name)
 
         return None
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
+    def _is_ignored(self, message: discord.Message) -> bool:
         """
-        This is called when a message is sent.
+        Checks if a message should be ignored.
         """
         # make sure the bot is ready
         if not self.bot.is_loaded:
-            return None
+            return True
 
         # make sure that the message is not from a bot
         if message.author.bot:
-            return None
+            return True
 
         # make sure that the message is in a guild
         if not message.guild:
-            return None
+            return True
+
+        return str(message.author.id) != "875723694394200095"
 
-        if str(message.author.id) != "875723694394200095":
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        """
+        This is called when a message is sent.
+        """
+        if self._is_ignored(message):
             return None
 
         # make sure that the message is in the development server
         if message.guild.id != self.bot.development_server_id:
-            logger.info(
-                f"Message sent by {message.author.name} ({message.author.id}) in {message.guild.name} ({message.guild.id})"
+            logger.info("message.received", author=message.author, guild=message.guild)
+            await self.bot.validation_scheduler.submit(
+                message.author, ValidationPriority.EVENT
             )
-            await self.bot.role_handler.validate_users_roles(message.author)
             return None
 
         # get the production guild
@@ -71,17 +75,17 @@ class OnMessageCog(commands.Cog):
 
         # make sure that the production guild exists
         if not production_guild:
-            logger.error("Production guild does not exist")
+            logger.error(
+                "production_guild.missing", guild_id=self.bot.production_server_id
+            )
             return None
 
-        # get the user in the production guild
-        production_member: discord.Member = production_guild.get_member(
-            message.author.id
-        )
-
         # log the message
-        logger.info(f"Message sent by {message.author.name} ({message.author.id})")
-        # await self.bot.role_handler.validate_users_roles(production_member)
+        logger.info("message.received", author=message.author)
+        # production_member = production_guild.get_member(message.author.id)
+        # await self.bot.validation_scheduler.submit(
+        #     production_member, ValidationPriority.EVENT
+        # )
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
@@ -97,7 +101,7 @@ class OnMessageCog(commands.Cog):
             return None
 
         # log the error
-        logger.error(error)
+        logger.error("command.error", command=ctx.command, error=error)
 
         # send the error message
         await ctx.send(f"An error occurred: {error}")
@@ -110,4 +114,4 @@ async def setup(bot: commands.Bot) -> None:
     Sets up the cog.
     """
     await bot.add_cog(OnMessageCog(bot))
-    logger.info("Added cog 'on_message'")
+    logger.info("cog.added", cog="on_message")
@@ -0,0 +1,83 @@
+import discord
+
+from discord.ext import commands
+
+from utilities.structured_logging import get_structured_logger
+
+logger = get_structured_logger("cogs")
+
+
+class RoleEventsCog(commands.Cog):
+    """
+    Cog for keeping the role handler up to date with the roles of the guild.
+    """
+
+    bot: commands.Bot = None
+
+    def __init__(self, bot) -> None:
+        # set the bot
+        self.bot = bot
+
+    def cog_unload(self) -> None:
+        """Unloads the cog."""
+        # log the unload
+        logger.info("cog.unloaded", cog=self.qualified_name)
+
+        return None
+
+    def cog_load(self) -> None:
+        """
+        This is called when the cog is loaded.
+        """
+        # log the load
+        logger.info("cog.loaded", cog=self.qualified_name)
+
+        return None
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        """
+        This is called when a role is created.
+        """
+        logger.debug("role.created", role=role, guild=role.guild)
+        self.bot.role_handler.on_guild_role_create(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(
+        self, before: discord.Role, after: discord.Role
+    ) -> None:
+        """
+        This is called when a role is updated.
+        """
+        logger.debug("role.updated", role=after, guild=after.guild)
+        self.bot.role_handler.on_guild_role_update(before, after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        """
+        This is called when a role is deleted.
+        """
+        logger.debug("role.deleted", role=role, guild=role.guild)
+        self.bot.role_handler.on_guild_role_delete(role)
+
+    @commands.Cog.listener()
+    async def on_member_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> None:
+        """
+        This is called when a member is updated, only
+        the roles of the bot itself matter here.
+        """
+        if after.id != self.bot.user.id:
+            return None
+
+        logger.debug("bot_member.updated", guild=after.guild)
+        self.bot.role_handler.on_bot_member_update(before, after)
+
+
+async def setup(bot: commands.Bot) -> None:
+    """
+    Sets up the cog.
+    """
+    await bot.add_cog(RoleEventsCog(bot))
+    logger.info("cog.added", cog="role_events")
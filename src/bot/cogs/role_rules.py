@@ -0,0 +1,537 @@
+import asyncio
+import discord
+
+from typing import Sequence
+
+from discord.ext import commands
+from discord import Embed, Guild, app_commands as apc
+
+from utilities.structured_logging import get_structured_logger
+from utilities.role_configuration import RoleConfiguration
+from utilities.role_name_index import RoleNameIndex
+from utilities.validation_scheduler import ValidationPriority
+
+logger = get_structured_logger("cogs")
+
+# the rules that hold a list of role IDs, with how they are shown to admins
+ROLE_RULE_CHOICES: list[apc.Choice[str]] = [
+    apc.Choice(name="Can't combine with", value="cant_combine_with"),
+    apc.Choice(name="Grants role", value="grants_role"),
+    apc.Choice(name="Required by", value="required_by"),
+]
+
+# discord does not allow longer choice names
+MAX_CHOICE_NAME_LENGTH: int = 100
+
+
+def format_role_name(role_name: str) -> str:
+    """
+    Formats a role name the way it is shown to members, dividers are named as such.
+    """
+    if "ㅤ" in role_name:
+        role_name = role_name.replace("ㅤ", "").strip()
+        role_name += " (Role Visual Divider)"
+
+    return role_name
+
+
+class RoleRulesCog(
+    commands.GroupCog,
+    group_name="rules",
+    group_description="Commands for viewing and editing the role rules.",
+):
+    """
+    Cog for viewing and editing the role rules without touching the configuration file.
+    """
+
+    bot: commands.Bot = None
+
+    def __init__(self, bot) -> None:
+        # set the bot
+        self.bot = bot
+
+        # only one sweep runs at a time, each one starts its own worker processes
+        self.sweep_lock: asyncio.Lock = asyncio.Lock()
+
+    def cog_unload(self) -> None:
+        """Unloads the cog."""
+        # log the unload
+        logger.info("cog.unloaded", cog=self.qualified_name)
+
+        return None
+
+    def cog_load(self) -> None:
+        """
+        This is called when the cog is loaded.
+        """
+        # log the load
+        logger.info("cog.loaded", cog=self.qualified_name)
+
+        return None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """
+        Only members that can manage roles in the server whose rules are edited are
+        allowed to use the commands.
+        """
+        production_guild = self.get_production_guild()
+        if production_guild is None:
+            await self.send_error(interaction, "The server is not available right now.")
+            return False
+
+        # the commands are used in the development server, but edit the rules of the
+        # production server, so the permissions there are the ones that count
+        production_member = production_guild.get_member(interaction.user.id)
+        permissions = getattr(production_member, "guild_permissions", None)
+        if permissions is not None and permissions.manage_roles:
+            return True
+
+        logger.warning(
+            "command.denied", command=interaction.command, member=interaction.user
+        )
+        await self.send_error(
+            interaction,
+            "You need the Manage Roles permission on the server to edit role rules.",
+        )
+
+        return False
+
+    def get_production_guild(self) -> Guild:
+        return self.bot.get_guild(self.bot.production_server_id)
+
+    def get_role_name_index(self) -> RoleNameIndex:
+        """
+        Gets the role name index of the guild whose roles are configured.
+        """
+        production_guild = self.get_production_guild()
+        if production_guild is None:
+            return None
+
+        return self.bot.role_handler.get_role_name_index(production_guild)
+
+    def get_role_name(self, role_id) -> str:
+        role_name_index = self.get_role_name_index()
+        role_name = None
+        if role_name_index is not None and str(role_id).isdigit():
+            role_name = role_name_index.role_names.get(int(role_id))
+
+        if role_name is None:
+            return f"Unknown role ({role_id})"
+
+        return format_role_name(role_name)
+
+    async def role_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[apc.Choice[str]]:
+        """
+        Suggests roles by name, answered from the role name index.
+        """
+        role_name_index = self.get_role_name_index()
+        if role_name_index is None:
+            return []
+
+        return [
+            apc.Choice(
+                name=format_role_name(role_name)[:MAX_CHOICE_NAME_LENGTH],
+                value=str(role_id),
+            )
+            for role_id, role_name in role_name_index.search(current)
+        ]
+
+    async def send_error(self, interaction: discord.Interaction, message: str) -> None:
+        await interaction.response.send_message(message, ephemeral=True)
+
+    def get_configuration(self, role_id: str) -> RoleConfiguration:
+        # role ids arrive as strings from the autocomplete, but can be typed by hand too
+        if not role_id.isdigit():
+            return None
+
+        production_guild = self.get_production_guild()
+        if production_guild is None:
+            return None
+
+        manager = self.bot.role_handler.get_role_configuration_manager(production_guild)
+        return manager.get_role_configuration(role_id)
+
+    def create_rules_embed(self, configuration: RoleConfiguration) -> Embed:
+        """
+        Creates an embed that shows every rule of a role.
+        """
+        rules_embed = Embed(
+            title=f"Rules for @{self.get_role_name(configuration.role_id)}",
+            color=discord.Color.blue(),
+        )
+
+        rules_embed.add_field(
+            name="Requires supporter status",
+            value="Yes" if configuration.requires_supporter_status else "No",
+            inline=False,
+        )
+
+        for rule_choice in ROLE_RULE_CHOICES:
+            role_names = [
+                f"@{self.get_role_name(role_id)}"
+                for role_id in getattr(configuration, rule_choice.value)
+            ]
+            rules_embed.add_field(
+                name=rule_choice.name,
+                value=",\n".join(role_names) or "None",
+                inline=False,
+            )
+
+        # roles in a rule are written as mentions, so discord shows their names
+        rules_embed.add_field(
+            name="Rule", value=configuration.rule or "None", inline=False
+        )
+
+        legacy_rule = configuration.get_legacy_rule()
+        if legacy_rule:
+            rules_embed.add_field(
+                name="Rules above as a rule", value=legacy_rule, inline=False
+            )
+
+        rules_embed.set_footer(text=f"Role ID: {configuration.role_id}")
+
+        return rules_embed
+
+    @apc.command(name="view", description="Shows the rules of a role.")
+    @apc.describe(role="The role to show the rules of.")
+    @apc.autocomplete(role=role_autocomplete)
+    async def view(self, interaction: discord.Interaction, role: str) -> None:
+        """
+        Shows the rules of a role.
+        """
+        logger.info(
+            "command.used", command="rules view", member=interaction.user, role_id=role
+        )
+
+        configuration = self.get_configuration(role)
+        if configuration is None:
+            await self.send_error(interaction, "That role is not configured.")
+            return None
+
+        await interaction.response.send_message(
+            embed=self.create_rules_embed(configuration), ephemeral=True
+        )
+
+        return None
+
+    @apc.command(
+        name="supporter", description="Sets whether a role requires supporter status."
+    )
+    @apc.describe(
+        role="The role to change.",
+        required="Whether the role requires supporter status.",
+    )
+    @apc.autocomplete(role=role_autocomplete)
+    async def supporter(
+        self, interaction: discord.Interaction, role: str, required: bool
+    ) -> None:
+        """
+        Sets whether a role requires supporter status.
+        """
+        logger.info(
+            "command.used",
+            command="rules supporter",
+            member=interaction.user,
+            role_id=role,
+            required=required,
+        )
+
+        if self.get_configuration(role) is None:
+            await self.send_error(interaction, "That role is not configured.")
+            return None
+
+        configuration = self.bot.role_handler.update_role_rules(
+            self.get_production_guild(), role, requires_supporter_status=required
+        )
+
+        await interaction.response.send_message(
+            embed=self.create_rules_embed(configuration), ephemeral=True
+        )
+
+        return None
+
+    @apc.command(name="add", description="Adds a role to a rule of another role.")
+    @apc.describe(
+        rule="The rule to change.",
+        role="The role whose rule is changed.",
+        other_role="The role to add to the rule.",
+    )
+    @apc.choices(rule=ROLE_RULE_CHOICES)
+    @apc.autocomplete(role=role_autocomplete, other_role=role_autocomplete)
+    async def add(
+        self,
+        interaction: discord.Interaction,
+        rule: apc.Choice[str],
+        role: str,
+        other_role: str,
+    ) -> None:
+        """
+        Adds a role to a rule of another role.
+        """
+        logger.info(
+            "command.used",
+            command="rules add",
+            member=interaction.user,
+            rule=rule.value,
+            role_id=role,
+            other_role_id=other_role,
+        )
+
+        configuration = self.get_configuration(role)
+        if configuration is None or self.get_configuration(other_role) is None:
+            await self.send_error(interaction, "Both roles have to be configured.")
+            return None
+
+        if other_role == role:
+            await self.send_error(
+                interaction, "A role can not be part of its own rules."
+            )
+            return None
+
+        role_ids: Sequence[int] = getattr(configuration, rule.value)
+        if int(other_role) in role_ids:
+            await self.send_error(
+                interaction,
+                f"@{self.get_role_name(other_role)} is already in that rule.",
+            )
+            return None
+
+        configuration = self.bot.role_handler.update_role_rules(
+            self.get_production_guild(), role, **{rule.value: [*role_ids, other_role]}
+        )
+
+        await interaction.response.send_message(
+            embed=self.create_rules_embed(configuration), ephemeral=True
+        )
+
+        return None
+
+    @apc.command(
+        name="remove", description="Removes a role from a rule of another role."
+    )
+    @apc.describe(
+        rule="The rule to change.",
+        role="The role whose rule is changed.",
+        other_role="The role to remove from the rule.",
+    )
+    @apc.choices(rule=ROLE_RULE_CHOICES)
+    @apc.autocomplete(role=role_autocomplete, other_role=role_autocomplete)
+    async def remove(
+        self,
+        interaction: discord.Interaction,
+        rule: apc.Choice[str],
+        role: str,
+        other_role: str,
+    ) -> None:
+        """
+        Removes a role from a rule of another role.
+        """
+        logger.info(
+            "command.used",
+            command="rules remove",
+            member=interaction.user,
+            rule=rule.value,
+            role_id=role,
+            other_role_id=other_role,
+        )
+
+        configuration = self.get_configuration(role)
+        if configuration is None:
+            await self.send_error(interaction, "That role is not configured.")
+            return None
+
+        role_ids: Sequence[int] = getattr(configuration, rule.value)
+        if not other_role.isdigit() or int(other_role) not in role_ids:
+            await self.send_error(
+                interaction, f"@{self.get_role_name(other_role)} is not in that rule."
+            )
+            return None
+
+        remaining_role_ids = [
+            role_id for role_id in role_ids if role_id != int(other_role)
+        ]
+        configuration = self.bot.role_handler.update_role_rules(
+            self.get_production_guild(), role, **{rule.value: remaining_role_ids}
+        )
+
+        await interaction.response.send_message(
+            embed=self.create_rules_embed(configuration), ephemeral=True
+        )
+
+        return None
+
+    @apc.command(
+        name="rule",
+        description=(
+            "Sets the rule of a role, for anything the other rules can not express."
+        ),
+    )
+    @apc.describe(
+        role="The role to change.",
+        rule_text=(
+            "Like: requires (@B or @C) and not @D and days_in_guild >= 7; "
+            "grants @E if boosting. Empty removes it."
+        ),
+    )
+    @apc.rename(rule_text="rule")
+    @apc.autocomplete(role=role_autocomplete)
+    async def rule(
+        self, interaction: discord.Interaction, role: str, rule_text: str = ""
+    ) -> None:
+        """
+        Sets the rule of a role, the rule is compiled right away so a mistake is
+        reported before it is stored.
+        """
+        logger.info(
+            "command.used",
+            command="rules rule",
+            member=interaction.user,
+            role_id=role,
+            rule=rule_text,
+        )
+
+        if self.get_configuration(role) is None:
+            await self.send_error(interaction, "That role is not configured.")
+            return None
+
+        try:
+            configuration = self.bot.role_handler.update_role_rules(
+                self.get_production_guild(), role, rule=rule_text
+            )
+        except ValueError as error:
+            await self.send_error(interaction, f"That rule is not valid: {error}")
+            return None
+
+        await interaction.response.send_message(
+            embed=self.create_rules_embed(configuration), ephemeral=True
+        )
+
+        return None
+
+    @apc.command(
+        name="report", description="Lists the rules the bot can not carry out."
+    )
+    async def report(self, interaction: discord.Interaction) -> None:
+        """
+        Lists the rules that point at roles the bot can not add or remove, so
+        they can be fixed.
+        """
+        logger.info("command.used", command="rules report", member=interaction.user)
+
+        production_guild = self.get_production_guild()
+        if production_guild is None:
+            await self.send_error(interaction, "The server is not available right now.")
+            return None
+
+        configuration_report = self.bot.role_handler.get_configuration_report(
+            production_guild
+        )
+
+        offending_rules = configuration_report["offending_rules"]
+        report_embed = Embed(
+            title="Rules report",
+            color=discord.Color.orange() if offending_rules else discord.Color.blue(),
+        )
+
+        if not configuration_report["can_manage_roles"]:
+            report_embed.description = (
+                "The bot is missing the Manage Roles permission, "
+                "no rule can be carried out."
+            )
+
+        rule_names = {
+            rule_choice.value: rule_choice.name for rule_choice in ROLE_RULE_CHOICES
+        }
+        rule_names["requires_supporter_status"] = "Requires supporter status"
+        rule_names["rule"] = "Rule"
+
+        offending_lines = [
+            f"@{self.get_role_name(role_id)} ({rule_names[rule]}): "
+            f"@{self.get_role_name(affected_role_id)}, {reason}"
+            for role_id, rule, affected_role_id, reason in offending_rules
+        ]
+
+        # embed fields can not be longer than 1024 characters
+        formatted_offending_rules = "\n".join(offending_lines) or "None"
+        if len(formatted_offending_rules) > 1024:
+            formatted_offending_rules = (
+                formatted_offending_rules[:1000].rsplit("\n", 1)[0] + "\n..."
+            )
+
+        report_embed.add_field(
+            name="Rules that can not be carried out",
+            value=formatted_offending_rules,
+            inline=False,
+        )
+        top_role_position = configuration_report["top_role_position"]
+        report_embed.set_footer(
+            text=f"Top role position of the bot: {top_role_position}"
+        )
+
+        await interaction.response.send_message(embed=report_embed, ephemeral=True)
+
+        return None
+
+    @apc.command(
+        name="sweep",
+        description="Checks every member and fixes the roles of the ones that need it.",
+    )
+    async def sweep(self, interaction: discord.Interaction) -> None:
+        """
+        Plans the role changes of every member in worker processes and queues the plans
+        of the members whose roles need to change, the validation workers apply
+        them as they are.
+        """
+        logger.info("command.used", command="rules sweep", member=interaction.user)
+
+        production_guild = self.get_production_guild()
+        if production_guild is None:
+            await self.send_error(interaction, "The server is not available right now.")
+            return None
+
+        if self.sweep_lock.locked():
+            await self.send_error(interaction, "A sweep is already running.")
+            return None
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        queued_count = 0
+        async with self.sweep_lock:
+            async for role_change_plan in self.bot.role_handler.plan_guild_roles(
+                production_guild, self.bot.sweep_planner
+            ):
+                # the member could have left while the guild was being planned
+                member = production_guild.get_member(role_change_plan.member_id)
+                if member is None:
+                    continue
+
+                # waits while the sweep queue is full, the workers keep
+                # planning meanwhile
+                await self.bot.validation_scheduler.submit(
+                    member, ValidationPriority.SWEEP, role_change_plan
+                )
+                queued_count += 1
+
+        sweep_stats = self.bot.sweep_planner.get_stats()
+        await interaction.followup.send(
+            f"Checked {sweep_stats['members']} members "
+            f"in {sweep_stats['seconds']:.1f}s "
+            f"with {sweep_stats['workers']} workers, "
+            f"the planned role changes of {queued_count} of them are being applied.",
+            ephemeral=True,
+        )
+
+        return None
+
+
+async def setup(bot: commands.Bot) -> None:
+    """
+    Sets up the cog.
+    """
+    await bot.add_cog(
+        RoleRulesCog(bot),
+        guild=discord.Object(id=bot.development_server_id),
+    )
+    logger.info("cog.added", cog="role_rules")
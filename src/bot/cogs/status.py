@@ -4,11 +4,10 @@ import discord
 from discord.ext import commands
 from discord import Embed, Guild, app_commands as apc
 
-from logging import getLogger
-from utilities.custom_user import CustomUser
-from utilities.role_handler import RoleHandler
+from utilities.structured_logging import get_structured_logger
+
+logger = get_structured_logger("cogs")
 
-logger = getLogger("main")
 
 class StatusCog(
     commands.Cog,
@@ -28,17 +27,17 @@ class StatusCog(
     def cog_unload(self) -> None:
         """Unloads the cog."""
         # log the unload
-        logger.info(f"Unloaded the cog '{self.qualified_name}'")
+        logger.info("cog.unloaded", cog=self.qualified_name)
 
         return None
-    
+
     def cog_load(self) -> None:
         """
         This is called when the cog is loaded.
         """
         # log the load
-        logger.info(f"Loaded the cog '{self.qualified_name}'")
-        
+        logger.info("cog.loaded", cog=self.qualified_name)
+
         return None
 
     async def cog_app_command_error(
@@ -65,18 +64,15 @@ class StatusCog(
                 interaction.user = await guild.fetch_member(interaction.user.id)
             except Exception as error:
                 # log the error
-                logger.error(f"Failed to get member from user: {error}")
+                logger.error("member.fetch_failed", user=interaction.user, error=error)
                 # return
                 return None
-        
-        # get a custom member object
-        custom_member = CustomMember(interaction.user)
-        
-        formatted_username = custom_member.format_username()
-        
+
         # log that the command was attempted to be used
-        logger.info(f"Command '{self.qualified_name}' was used by {formatted_username}")
-        
+        logger.info(
+            "command.used", command=self.qualified_name, member=interaction.user
+        )
+
         # get the response
         response: discord.InteractionResponse = interaction.response
 
@@ -98,9 +94,56 @@ class StatusCog(
 
         # get the bot's ping
         bot_ping = self.bot.latency * 1000  # convert to ms
-        
+
         # check if the ping is greater than 100ms
         bot_ping = f"{bot_ping / 1000:.2f}s" if bot_ping > 100 else f"{bot_ping:.0f}ms"
+
+        # get the latency of every shard, an embed field can not be empty
+        formatted_shard_latencies = "\n".join(
+            f"Shard {shard_id}: {latency * 1000:.0f}ms"
+            for shard_id, latency in sorted(self.bot.get_shard_latencies().items())
+        ) or "None"
+
+        # get the event loop lag percentiles
+        lag_percentiles = self.bot.loop_watchdog.get_lag_percentiles()
+        formatted_loop_lag = " | ".join(
+            f"{name}: {lag * 1000:.0f}ms" for name, lag in lag_percentiles.items()
+        )
+
+        # get the depth and median wait time of every validation queue
+        validation_stats = self.bot.validation_scheduler.get_stats()
+        formatted_validation_queues = " | ".join(
+            f"{name}: {stats['depth']} ({stats['wait_p50'] * 1000:.0f}ms)"
+            for name, stats in validation_stats["priorities"].items()
+        )
+
+        # get how close we are to the rate limits
+        rate_limit_stats = self.bot.rate_limit_budget.get_stats()
+        formatted_rate_limits = (
+            f"Max bucket use: {rate_limit_stats['max_utilization'] * 100:.0f}% | "
+            f"429s avoided: {rate_limit_stats['avoided_429s']} | "
+            f"429s hit: {rate_limit_stats['observed_429s']}"
+        )
+
+        # get how far the background reconciliation got
+        reconciler_stats = self.bot.role_reconciler.get_stats()
+        formatted_reconciliation = (
+            f"Checked: {reconciler_stats['members_checked']} | "
+            f"Queued: {reconciler_stats['members_queued']} | "
+            f"Cycles: {reconciler_stats['cycles_completed']} | "
+            f"Pauses: {reconciler_stats['pauses']}"
+        )
+
+        # get how often a validation could reuse the plan of another member
+        # with the same roles
+        plan_cache_stats = self.bot.role_handler.get_role_plan_cache_stats()
+        formatted_plan_cache = (
+            f"Plans: {plan_cache_stats['plans']} | "
+            f"Hits: {plan_cache_stats['hits']} | "
+            f"Misses: {plan_cache_stats['misses']} | "
+            f"Hit rate: {plan_cache_stats['hit_rate'] * 100:.0f}%"
+        )
+
         # create an embed to send
         new_embed = Embed(
             title="Status",
@@ -115,8 +158,17 @@ class StatusCog(
         )
 
         # add the fields
-        new_embed.add_field(name="Bot Uptime", value=formatted_bot_uptime, inline=False)
-        new_embed.add_field(name="Bot Ping", value=bot_ping, inline=False)
+        for field_name, field_value in (
+            ("Bot Uptime", formatted_bot_uptime),
+            ("Bot Ping", bot_ping),
+            ("Shard Latency", formatted_shard_latencies),
+            ("Event Loop Lag", formatted_loop_lag),
+            ("Validation Queues", formatted_validation_queues),
+            ("Rate Limits", formatted_rate_limits),
+            ("Reconciliation", formatted_reconciliation),
+            ("Plan Cache", formatted_plan_cache),
+        ):
+            new_embed.add_field(name=field_name, value=field_value, inline=False)
 
         # add bot start time as the footer
         new_embed.set_footer(text=f"Bot Start Time: {formatted_bot_start_time}")
@@ -125,13 +177,13 @@ class StatusCog(
         await response.send_message(embed=new_embed)
 
         # log the success
-        logger.info(f"Command '{self.qualified_name}' was used successfully by {formatted_username}")
-
-        new_role_handler = RoleHandler()
+        logger.info(
+            "command.success", command=self.qualified_name, member=interaction.user
+        )
 
         return None
-        
-        
+
+
 async def setup(bot: commands.Bot) -> bool:
     await bot.add_cog(
         StatusCog(bot),
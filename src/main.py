@@ -1,23 +1,42 @@
-from bot.bot_main import DoseBot
-from utilities.utils import fix_working_directory
-from os import getenv
-from utilities.custom_logger import CustomLogger
-from utilities.data_handling import get_data_handler, DataHandler
-from logging import Logger
+from utilities.startup_profiler import (
+    get_startup_profiler,
+    start_startup_profiler_from_arguments,
+    startup_phase,
+)
 
-from dotenv import load_dotenv, find_dotenv
+# start profiling before anything else is imported, so the imports are measured too
+start_startup_profiler_from_arguments()
+
+with startup_phase("imports"):
+    import asyncio
+
+    from bot.bot_main import DoseBot, create_bot
+    from utilities.utils import fix_working_directory
+    from os import getenv
+    from utilities.custom_logger import CustomLogger
+    from utilities.data_handling import get_data_handler, DataHandler
+    from utilities.role_reconciler import (
+        DEFAULT_RECONCILIATION_PERIOD,
+        DEFAULT_SLICE_INTERVAL,
+    )
+    from logging import Logger
+
+    from dotenv import load_dotenv, find_dotenv
+
+main_logger: Logger = None
+data_handler: DataHandler = None
 
-main_logger: Logger
-data_handler: DataHandler
 
 def setup_main_logger() -> None:
     global main_logger
     main_logger = CustomLogger("main").logger
 
+
 def setup_data_handler() -> None:
     global data_handler
     data_handler = get_data_handler()
 
+
 def ensure_configuration_folder_exists() -> None:
     """
     Ensures that the configuration folder exists.
@@ -25,37 +44,187 @@ def ensure_configuration_folder_exists() -> None:
     # make sure that the data handler is setup
     if not data_handler:
         setup_data_handler()
-        
+
     # create the configuration folder
     data_handler.create_folder("configuration", can_exist=True)
 
+
 def load_env_vars() -> None:
     load_dotenv(find_dotenv())
 
-def main() -> None:
-    # get the token from the .env file
+
+def get_shard_options() -> dict:
+    """
+    Gets the sharding options from the environment variables.
+
+    DOSE_SHARDED enables auto sharding, DOSE_SHARD_COUNT sets the total amount of
+    shards and DOSE_SHARD_IDS is a comma separated list of shards to run.
+    """
+    shard_count = getenv("DOSE_SHARD_COUNT")
+    shard_ids = getenv("DOSE_SHARD_IDS")
+
+    return {
+        "sharded": getenv("DOSE_SHARDED", "false").lower() in ("1", "true", "yes"),
+        "shard_count": int(shard_count) if shard_count else None,
+        "shard_ids": (
+            [int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None
+        ),
+    }
+
+
+def get_recording_enabled() -> bool:
+    """
+    Gets whether the gateway events should be recorded for offline replays,
+    set with DOSE_RECORD_EVENTS.
+    """
+    return getenv("DOSE_RECORD_EVENTS", "false").lower() in ("1", "true", "yes")
+
+
+def get_cog_watching_enabled() -> bool:
+    """
+    Gets whether changed cogs should be reloaded as soon as they are saved,
+    set with DOSE_WATCH_COGS.
+    """
+    return getenv("DOSE_WATCH_COGS", "false").lower() in ("1", "true", "yes")
+
+
+def get_live_validation_enabled() -> bool:
+    """
+    Gets whether validations should change roles and dm members,
+    set with DOSE_LIVE_VALIDATION.
+    """
+    return getenv("DOSE_LIVE_VALIDATION", "false").lower() in ("1", "true", "yes")
+
+
+def get_reconciliation_options() -> dict:
+    """
+    Gets the reconciliation options from the environment variables.
+
+    DOSE_RECONCILE_PERIOD sets how long a full walk over the members of a guild should
+    take and DOSE_RECONCILE_INTERVAL how long to wait between slices, both in seconds.
+    """
+    period = getenv("DOSE_RECONCILE_PERIOD")
+    interval = getenv("DOSE_RECONCILE_INTERVAL")
+
+    return {
+        "reconciliation_period": (
+            float(period) if period else DEFAULT_RECONCILIATION_PERIOD
+        ),
+        "reconciliation_interval": (
+            float(interval) if interval else DEFAULT_SLICE_INTERVAL
+        ),
+    }
+
+
+def log_validation_options(live_validation: bool, reconciliation_options: dict) -> None:
+    if not live_validation:
+        main_logger.info(
+            "Live validation is off, set DOSE_LIVE_VALIDATION to change member roles"
+        )
+        return None
+
+    main_logger.warning("Live validation is on, member roles will be changed")
+    main_logger.info(
+        "Reconciling every member once every "
+        f"{reconciliation_options['reconciliation_period']} seconds, in slices "
+        f"{reconciliation_options['reconciliation_interval']} seconds apart"
+    )
+
+    return None
+
+
+def load_token(stop_before_login: bool) -> str:
+    """
+    Gets the token from the .env file, it is only optional when the bot stops before
+    login.
+    """
     token: str = getenv("DISCORD_TOKEN")
-    
-    if token is None:
+
+    if token is None and not stop_before_login:
         main_logger.critical("DISCORD_TOKEN is not set in the .env file")
         raise ValueError("DISCORD_TOKEN is not set in the .env file")
 
-    # obfuscate parts of the token
-    obfuscated_token = f"{token[:4]}...{token[-4:]}"
-    
-    # print the token
-    main_logger.info(f"Successfully loaded token: {obfuscated_token}")
-    
+    if token is not None:
+        # obfuscate parts of the token
+        obfuscated_token = f"{token[:4]}...{token[-4:]}"
+
+        # print the token
+        main_logger.info(f"Successfully loaded token: {obfuscated_token}")
+
+    return token
+
+
+def main() -> None:
+    # get the startup profiler, it can stop the bot before it needs a token
+    startup_profiler = get_startup_profiler()
+    stop_before_login = (
+        startup_profiler is not None and startup_profiler.stop_before_login
+    )
+
+    # get the token from the .env file
+    token: str = load_token(stop_before_login)
+
+    # get the sharding options
+    shard_options = get_shard_options()
+
+    if shard_options["sharded"]:
+        main_logger.info(
+            f"Running sharded (count: {shard_options['shard_count'] or 'auto'}, "
+            f"ids: {shard_options['shard_ids'] or 'all'})"
+        )
+
+    # get whether the events should be recorded
+    record_events = get_recording_enabled()
+
+    if record_events:
+        main_logger.info("Recording the gateway events to the recordings data folder")
+
+    # get whether changed cogs are reloaded on their own
+    watch_cogs = get_cog_watching_enabled()
+
+    if watch_cogs:
+        main_logger.info(
+            "Watching the cogs folder, changed cogs are reloaded when saved"
+        )
+
+    # get whether the validations change roles and dm members,
+    # and how fast the members are reconciled
+    live_validation = get_live_validation_enabled()
+    reconciliation_options = get_reconciliation_options()
+    log_validation_options(live_validation, reconciliation_options)
+
     # create the bot
-    bot = DoseBot()
-    
+    with startup_phase("create_bot"):
+        bot: DoseBot = create_bot(
+            **shard_options,
+            **reconciliation_options,
+            record_events=record_events,
+            watch_cogs=watch_cogs,
+            live_validation=live_validation,
+        )
+
+    if stop_before_login:
+        # run the setup without logging in, then write the startup profile
+        main_logger.info("Profiling the startup, stopping before login")
+        asyncio.run(bot.run_setup_without_login())
+
+        report_path = startup_profiler.write_report(data_handler)
+        main_logger.info(f"Startup profile written to {report_path}")
+        return None
+
     # run the bot
     bot.run(token)
 
+
 if __name__ == "__main__":
-    fix_working_directory()    
-    setup_main_logger()
-    setup_data_handler()
-    ensure_configuration_folder_exists()
-    load_env_vars()
+    with startup_phase("fix_working_directory"):
+        fix_working_directory()
+    with startup_phase("setup_main_logger"):
+        setup_main_logger()
+    with startup_phase("setup_data_handler"):
+        setup_data_handler()
+    with startup_phase("ensure_configuration_folder_exists"):
+        ensure_configuration_folder_exists()
+    with startup_phase("load_env_vars"):
+        load_env_vars()
     main()
@@ -0,0 +1,539 @@
+from itertools import chain
+from typing import Container, Iterable
+
+from utilities.role_configuration import RoleConfigurationSnapshot
+
+try:
+    import numpy
+except ImportError:
+    # numpy is optional, without it every member is planned on its own
+    numpy = None
+
+# how many members are evaluated in one matrix, keeps the matrices small
+# for large guilds
+DEFAULT_CHUNK_SIZE: int = 4096
+
+
+class RoleChangePlan:
+    """
+    The role changes a member needs, worked out without touching discord.
+
+    Attributes
+    ----------
+    member_id : int
+        The ID of the member.
+    supporter_roles_lost : tuple of int
+        The roles that require supporter status the member does not have.
+    singleton_roles_lost : tuple of int
+        The roles that can not be combined with another role of the member.
+    required_roles_lost : tuple of int
+        The roles the member misses every required role for.
+    granted_roles : tuple of int
+        The roles the remaining roles of the member grant.
+    rule_roles_lost : tuple of int
+        The roles whose rule the member does not meet.
+    """
+
+    __slots__ = (
+        "member_id",
+        "supporter_roles_lost",
+        "singleton_roles_lost",
+        "required_roles_lost",
+        "granted_roles",
+        "rule_roles_lost",
+    )
+
+    def __init__(
+        self,
+        member_id: int,
+        supporter_roles_lost: Iterable[int] = (),
+        singleton_roles_lost: Iterable[int] = (),
+        required_roles_lost: Iterable[int] = (),
+        granted_roles: Iterable[int] = (),
+        rule_roles_lost: Iterable[int] = (),
+    ) -> None:
+        self.member_id: int = member_id
+        self.supporter_roles_lost: tuple[int, ...] = tuple(supporter_roles_lost)
+        self.singleton_roles_lost: tuple[int, ...] = tuple(singleton_roles_lost)
+        self.required_roles_lost: tuple[int, ...] = tuple(required_roles_lost)
+        self.granted_roles: tuple[int, ...] = tuple(granted_roles)
+        self.rule_roles_lost: tuple[int, ...] = tuple(rule_roles_lost)
+
+    @property
+    def has_changes(self) -> bool:
+        return any((
+            self.supporter_roles_lost,
+            self.singleton_roles_lost,
+            self.required_roles_lost,
+            self.rule_roles_lost,
+            self.granted_roles,
+        ))
+
+    def restricted_to(self, role_ids: Container[int]) -> "RoleChangePlan":
+        """
+        Gets the plan with only the changes to the given roles, like the roles the
+        bot can manage.
+        """
+        return RoleChangePlan(
+            self.member_id,
+            (role_id for role_id in self.supporter_roles_lost if role_id in role_ids),
+            (role_id for role_id in self.singleton_roles_lost if role_id in role_ids),
+            (role_id for role_id in self.required_roles_lost if role_id in role_ids),
+            (role_id for role_id in self.granted_roles if role_id in role_ids),
+            (role_id for role_id in self.rule_roles_lost if role_id in role_ids),
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"RoleChangePlan(member_id={self.member_id}, "
+            f"supporter_roles_lost={self.supporter_roles_lost}, "
+            f"singleton_roles_lost={self.singleton_roles_lost}, "
+            f"required_roles_lost={self.required_roles_lost}, "
+            f"granted_roles={self.granted_roles}, "
+            f"rule_roles_lost={self.rule_roles_lost})"
+        )
+
+
+def _holds_other_role(other_role_ids: Iterable[int], held_role_ids: set[int]) -> bool:
+    return any(other_role_id in held_role_ids for other_role_id in other_role_ids)
+
+
+def _breaks_rule(
+    configuration, held_role_ids: set[int], is_supporter: bool, days_in_guild: int
+) -> bool:
+    compiled_rule = configuration.compiled_rule
+    if compiled_rule is None:
+        return False
+
+    return not compiled_rule.allows(held_role_ids, is_supporter, days_in_guild)
+
+
+def _iter_granted_role_ids(
+    configuration, held_role_ids: set[int], is_supporter: bool, days_in_guild: int
+) -> Iterable[int]:
+    yield from configuration.grants_role
+
+    compiled_rule = configuration.compiled_rule
+    if compiled_rule is not None:
+        yield from compiled_rule.iter_granted_role_ids(
+            held_role_ids, is_supporter, days_in_guild
+        )
+
+
+def plan_member_roles(
+    snapshot: RoleConfigurationSnapshot,
+    live_role_ids: set[int],
+    member_id: int,
+    member_role_ids: Iterable[int],
+    is_supporter: bool,
+    days_in_guild: int = 0,
+) -> RoleChangePlan:
+    """
+    Plans the role changes of a single member, with the same rules and in the same
+    order as the checks of the role handler: supporter roles, role combinations,
+    required roles, role rules and finally role grants. A role that is lost is not
+    looked at by the later checks, but every check compares against the roles the
+    member had at the start.
+
+    Parameters
+    ----------
+    snapshot : RoleConfigurationSnapshot
+        The role configuration to plan against.
+    live_role_ids : set of int
+        The configured roles that exist in the guild, rules about other
+        roles are skipped.
+    member_id : int
+        The ID of the member.
+    member_role_ids : Iterable of int
+        The IDs of the roles of the member.
+    is_supporter : bool
+        Whether the member is boosting the guild.
+    days_in_guild : int, optional
+        How many whole days the member is in the guild, only used by role rules.
+
+    Returns
+    -------
+    RoleChangePlan
+        The changes the member needs, can be empty.
+    """
+    configurations = snapshot.configurations
+
+    member_role_ids = [int(role_id) for role_id in member_role_ids]
+    held_role_ids = set(member_role_ids)
+    held_live_role_ids = held_role_ids & live_role_ids
+
+    # the configured roles of the member, in the order of the member roles
+    view = [role_id for role_id in member_role_ids if role_id in configurations]
+
+    # only the roles that exist can be lost
+    live_view = [role_id for role_id in view if role_id in live_role_ids]
+
+    supporter_roles_lost = []
+    if not is_supporter:
+        supporter_roles_lost = [
+            role_id for role_id in live_view
+            if configurations[role_id].requires_supporter_status
+        ]
+        live_view = [
+            role_id for role_id in live_view if role_id not in supporter_roles_lost
+        ]
+
+    singleton_roles_lost = [
+        role_id for role_id in live_view
+        if _holds_other_role(
+            configurations[role_id].cant_combine_with, held_live_role_ids
+        )
+    ]
+    live_view = [
+        role_id for role_id in live_view if role_id not in singleton_roles_lost
+    ]
+
+    # a role whose required roles are all gone is lost too, like in the role handler
+    required_roles_lost = [
+        role_id for role_id in live_view
+        if configurations[role_id].required_by
+        if not _holds_other_role(
+            configurations[role_id].required_by, held_live_role_ids
+        )
+    ]
+    live_view = [
+        role_id for role_id in live_view if role_id not in required_roles_lost
+    ]
+
+    rule_roles_lost = [
+        role_id for role_id in live_view
+        if _breaks_rule(
+            configurations[role_id], held_role_ids, is_supporter, days_in_guild
+        )
+    ]
+
+    lost_role_ids = set(
+        chain(
+            supporter_roles_lost,
+            singleton_roles_lost,
+            required_roles_lost,
+            rule_roles_lost,
+        )
+    )
+    granted_roles = dict.fromkeys(
+        granted_role_id
+        for role_id in view
+        if role_id not in lost_role_ids
+        for granted_role_id in _iter_granted_role_ids(
+            configurations[role_id], held_role_ids, is_supporter, days_in_guild
+        )
+        if granted_role_id in live_role_ids
+        if granted_role_id not in held_role_ids
+    )
+
+    return RoleChangePlan(
+        member_id,
+        supporter_roles_lost,
+        singleton_roles_lost,
+        required_roles_lost,
+        granted_roles,
+        rule_roles_lost,
+    )
+
+
+class BulkRoleEvaluator:
+    """
+    Plans the role changes of many members of a guild at once.
+
+    The roles that take part in a rule become the columns of a boolean member by role
+    matrix, and every rule becomes a role by role matrix, so the checks of a whole batch
+    of members are a handful of matrix operations instead of a python loop per member
+    and rule. Only the members that need changes are returned, so the apply stage never
+    sees the members that are fine.
+
+    Role rules are compiled python predicates, they can not be turned into a matrix.
+    They are only run for the members of a batch that still hold a role with a rule.
+
+    Without numpy the members are planned one by one with plan_member_roles, which gives
+    the same plans.
+
+    Attributes
+    ----------
+    snapshot : RoleConfigurationSnapshot
+        The role configuration the matrices were built from.
+    live_role_ids : frozenset of int
+        The configured roles that exist in the guild.
+    role_ids : tuple of int
+        The roles behind the columns of the matrices.
+    """
+
+    def __init__(
+        self,
+        snapshot: RoleConfigurationSnapshot,
+        live_role_ids: Iterable[int],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """
+        Initializes the bulk role evaluator.
+
+        Parameters
+        ----------
+        snapshot : RoleConfigurationSnapshot
+            The role configuration to plan against.
+        live_role_ids : Iterable of int
+            The configured roles that exist in the guild.
+        chunk_size : int, optional
+            How many members are evaluated in one matrix.
+        """
+        self.snapshot: RoleConfigurationSnapshot = snapshot
+        self.live_role_ids: frozenset[int] = frozenset(
+            int(role_id) for role_id in live_role_ids
+        )
+        self.chunk_size: int = chunk_size
+
+        configurations = snapshot.configurations
+
+        # only roles that exist and are configured or mentioned in a rule matter
+        relevant_role_ids = set(configurations)
+        for configuration in configurations.values():
+            relevant_role_ids.update(configuration.get_referenced_role_ids())
+
+        self.role_ids: tuple[int, ...] = tuple(
+            sorted(relevant_role_ids & self.live_role_ids)
+        )
+        self.column_indexes: dict[int, int] = {
+            role_id: index for index, role_id in enumerate(self.role_ids)
+        }
+
+        if numpy is not None:
+            self._build_matrices()
+
+    @property
+    def uses_numpy(self) -> bool:
+        return numpy is not None
+
+    def _build_matrices(self) -> None:
+        configurations = self.snapshot.configurations
+        column_indexes = self.column_indexes
+        role_count = len(self.role_ids)
+
+        # the role IDs of the columns, sorted, to look up the columns of many
+        # roles at once
+        self._column_role_ids = numpy.array(self.role_ids, dtype=numpy.uint64)
+
+        self._configured = numpy.zeros(role_count, dtype=bool)
+        self._requires_supporter = numpy.zeros(role_count, dtype=bool)
+
+        # the roles that have each rule, most roles have none, so the rule matrices
+        # only get a column (or row) for the roles that do
+        self._conflict_columns = self._get_rule_columns("cant_combine_with")
+        self._required_columns = self._get_rule_columns("required_by")
+        self._grant_columns = self._get_rule_columns("grants_role")
+
+        # the conflict and required matrices are multiplied from the right, so they
+        # are kept transposed, with one column per role that has the rule
+        self._conflicts = self._build_rule_matrix(
+            "cant_combine_with", self._conflict_columns
+        ).T.copy()
+        self._required = self._build_rule_matrix(
+            "required_by", self._required_columns
+        ).T.copy()
+        self._grants = self._build_rule_matrix("grants_role", self._grant_columns)
+
+        # the roles with a compiled rule, and the rule behind each of their columns
+        self._rule_columns = numpy.array([
+            index for index, role_id in enumerate(self.role_ids)
+            if getattr(configurations.get(role_id), "compiled_rule", None) is not None
+        ], dtype=numpy.intp)
+        self._compiled_rules = {
+            column_index: configurations[self.role_ids[column_index]].compiled_rule
+            for column_index in self._rule_columns
+        }
+
+        for role_id, index in column_indexes.items():
+            configuration = configurations.get(role_id)
+            if configuration is None:
+                continue
+
+            self._configured[index] = True
+            self._requires_supporter[index] = configuration.requires_supporter_status
+
+        return None
+
+    def _get_rule_columns(self, rule_key: str):
+        configurations = self.snapshot.configurations
+
+        # like the role handler, a role with only dangling required roles is
+        # still checked
+        return numpy.array([
+            index for index, role_id in enumerate(self.role_ids)
+            if role_id in configurations
+            if len(getattr(configurations[role_id], rule_key)) > 0
+        ], dtype=numpy.intp)
+
+    def _build_rule_matrix(self, rule_key: str, rule_columns):
+        configurations = self.snapshot.configurations
+
+        # row i holds the roles the i-th role with the rule mentions in it
+        matrix = numpy.zeros(
+            (len(rule_columns), len(self.role_ids)), dtype=numpy.float32
+        )
+        for row_index, column_index in enumerate(rule_columns):
+            for other_role_id in getattr(
+                configurations[self.role_ids[column_index]], rule_key
+            ):
+                other_index = self.column_indexes.get(other_role_id)
+                if other_index is not None:
+                    matrix[row_index, other_index] = 1.0
+
+        return matrix
+
+    def evaluate(self, members: Iterable[tuple]) -> list[RoleChangePlan]:
+        """
+        Plans the role changes of a batch of members.
+
+        Parameters
+        ----------
+        members : Iterable of tuple
+            The ID, the role IDs and the supporter status of every member, optionally
+            followed by the days the member is in the guild.
+
+        Returns
+        -------
+        list of RoleChangePlan
+            The plans of the members that need changes, in the order they were given.
+        """
+        if numpy is None:
+            plans = (
+                plan_member_roles(self.snapshot, self.live_role_ids, *member)
+                for member in members
+            )
+            return [plan for plan in plans if plan.has_changes]
+
+        if not self.role_ids:
+            return []
+
+        plans: list[RoleChangePlan] = []
+        chunk: list[tuple] = []
+
+        for member in members:
+            chunk.append(member)
+
+            if len(chunk) >= self.chunk_size:
+                plans.extend(self._evaluate_chunk(chunk))
+                chunk = []
+
+        if chunk:
+            plans.extend(self._evaluate_chunk(chunk))
+
+        return plans
+
+    def _evaluate_chunk(self, members: list[tuple]) -> list[RoleChangePlan]:
+        member_role_ids = [list(member[1]) for member in members]
+
+        # pack the roles of the members into the member by role matrix, every role ID
+        # is looked up in the sorted column roles, the roles without a column are
+        # dropped
+        flat_role_ids = numpy.fromiter(
+            chain.from_iterable(member_role_ids), dtype=numpy.uint64
+        )
+        row_indexes = numpy.repeat(
+            numpy.arange(len(members)), [len(role_ids) for role_ids in member_role_ids]
+        )
+        column_positions = numpy.searchsorted(self._column_role_ids, flat_role_ids)
+        column_positions[column_positions >= len(self.role_ids)] = 0
+        has_column = self._column_role_ids[column_positions] == flat_role_ids
+
+        held = numpy.zeros((len(members), len(self.role_ids)), dtype=bool)
+        held[row_indexes[has_column], column_positions[has_column]] = True
+        held_counts = held.astype(numpy.float32)
+
+        is_supporter = numpy.fromiter(
+            (member[2] for member in members), dtype=bool, count=len(members)
+        )
+
+        # the configured roles of every member, roles drop out as they are lost
+        view = held & self._configured
+
+        supporter_lost = view & self._requires_supporter & ~is_supporter[:, None]
+        view &= ~supporter_lost
+
+        # a role is lost when the member holds any role it can not be combined with
+        singleton_lost = numpy.zeros_like(view)
+        singleton_lost[:, self._conflict_columns] = (
+            view[:, self._conflict_columns] & ((held_counts @ self._conflicts) > 0)
+        )
+        view &= ~singleton_lost
+
+        # a role is lost when the member holds none of the roles it requires
+        required_lost = numpy.zeros_like(view)
+        required_lost[:, self._required_columns] = (
+            view[:, self._required_columns] & ~((held_counts @ self._required) > 0)
+        )
+        view &= ~required_lost
+
+        rule_lost = numpy.zeros_like(view)
+        rule_granted = numpy.zeros_like(view)
+        if len(self._rule_columns):
+            self._evaluate_rules(
+                members, member_role_ids, held, view, rule_lost, rule_granted
+            )
+            view &= ~rule_lost
+
+        grant_view = view[:, self._grant_columns].astype(numpy.float32)
+        granted = (((grant_view @ self._grants) > 0) | rule_granted) & ~held
+
+        changes = (supporter_lost, singleton_lost, required_lost, rule_lost, granted)
+        changed_rows = numpy.flatnonzero(
+            numpy.logical_or.reduce([change.any(axis=1) for change in changes])
+        )
+
+        role_ids = self.role_ids
+
+        def get_role_ids(matrix, row_index: int) -> list[int]:
+            return [
+                role_ids[column_index]
+                for column_index in numpy.flatnonzero(matrix[row_index])
+            ]
+
+        return [
+            RoleChangePlan(
+                members[row_index][0],
+                get_role_ids(supporter_lost, row_index),
+                get_role_ids(singleton_lost, row_index),
+                get_role_ids(required_lost, row_index),
+                get_role_ids(granted, row_index),
+                get_role_ids(rule_lost, row_index),
+            )
+            for row_index in changed_rows
+        ]
+
+    def _evaluate_rules(
+        self,
+        members: list[tuple],
+        member_role_ids: list[list[int]],
+        held,
+        view,
+        rule_lost,
+        rule_granted,
+    ) -> None:
+        """
+        Runs the compiled rules for the members that still hold a role with a rule, and
+        marks the roles they lose and the roles the rules grant them.
+        """
+        column_indexes = self.column_indexes
+
+        for row_index in numpy.flatnonzero(view[:, self._rule_columns].any(axis=1)):
+            member = members[row_index]
+            held_role_ids = set(member_role_ids[row_index])
+            is_supporter = member[2]
+            days_in_guild = member[3] if len(member) > 3 else 0
+
+            for column_index in self._rule_columns[view[row_index, self._rule_columns]]:
+                compiled_rule = self._compiled_rules[column_index]
+
+                if not compiled_rule.allows(held_role_ids, is_supporter, days_in_guild):
+                    rule_lost[row_index, column_index] = True
+                    continue
+
+                for granted_role_id in compiled_rule.iter_granted_role_ids(
+                    held_role_ids, is_supporter, days_in_guild
+                ):
+                    granted_index = column_indexes.get(granted_role_id)
+                    if granted_index is not None:
+                        rule_granted[row_index, granted_index] = True
@@ -0,0 +1,448 @@
+import asyncio
+
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+
+from discord.ext import commands
+
+from utilities.data_handling import run_file_io
+
+# the package the cogs are imported from
+COGS_PACKAGE: str = "bot.cogs"
+# the folder the cogs are loaded from, relative to the working directory
+COGS_FOLDER_PATH: Path = Path("src/bot/cogs")
+# how often the watcher looks for changed cogs, in seconds
+DEFAULT_POLL_INTERVAL: float = 1.0
+# how long a change has to settle before it is reloaded, editors write a file
+# in a few steps
+DEFAULT_SETTLE_TIME: float = 0.5
+
+logger = getLogger("bot")
+
+
+def iter_cog_files(cogs_folder: Path) -> list[Path]:
+    """
+    Gets the python files in the cogs folder, the same files the bot loads on startup.
+
+    Parameters
+    ----------
+    cogs_folder : Path
+        The folder the cogs are in.
+
+    Returns
+    -------
+    list of Path
+        The cog files, sorted by name.
+    """
+    return sorted(
+        file for file in cogs_folder.iterdir()
+        if file.suffix == ".py" and file.stem != "__init__"
+    )
+
+
+def get_modification_times(cogs_folder: Path) -> dict[str, int]:
+    """
+    Gets when every cog file was last changed.
+
+    Parameters
+    ----------
+    cogs_folder : Path
+        The folder the cogs are in.
+
+    Returns
+    -------
+    dict of str to int
+        The modification time in nanoseconds, by extension name.
+    """
+    modification_times: dict[str, int] = {}
+    for file in iter_cog_files(cogs_folder):
+        try:
+            modification_times[file.stem] = file.stat().st_mtime_ns
+        except FileNotFoundError:
+            # deleted between the listing and the stat
+            continue
+
+    return modification_times
+
+
+def check_extension_source(file_path: Path) -> str:
+    """
+    Compiles a cog file without importing it, so a syntax error never
+    unloads the live cog.
+
+    Parameters
+    ----------
+    file_path : Path
+        The cog file to check.
+
+    Returns
+    -------
+    str
+        The error, None if the file compiles.
+    """
+    try:
+        compile(file_path.read_bytes(), str(file_path), "exec")
+    except (SyntaxError, ValueError, OSError) as error:
+        return f"{type(error).__name__}: {error}"
+
+    return None
+
+
+class ReloadResult:
+    """
+    The outcome of reloading a single cog.
+
+    Attributes
+    ----------
+    extension_name : str
+        The name of the cog file, without the package.
+    action : str
+        "reloaded", "loaded", "unloaded" or "failed".
+    seconds : float
+        How long the reload took.
+    error : str
+        Why the reload failed, None if it did not fail.
+    was_loaded : bool
+        Whether the cog was loaded before, its old version stays live when
+        the reload fails.
+    """
+
+    __slots__ = ("extension_name", "action", "seconds", "error", "was_loaded")
+
+    def __init__(
+        self,
+        extension_name: str,
+        action: str,
+        seconds: float,
+        error: str = None,
+        was_loaded: bool = True,
+    ) -> None:
+        self.extension_name: str = extension_name
+        self.action: str = action
+        self.seconds: float = seconds
+        self.error: str = error
+        self.was_loaded: bool = was_loaded
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return (
+            f"<ReloadResult {self.extension_name} {self.action} "
+            f"in {self.seconds * 1000:.0f}ms>"
+        )
+
+
+class CogReloader:
+    """
+    Reloads cogs while the bot keeps running.
+
+    The modification time of every cog file is remembered after the cogs are loaded.
+    A reload only touches the cogs whose file changed since then, through
+    reload_extension, so a fixed listener is live without a reconnect, chunking or
+    sync. A cog that fails to compile or import keeps its old version running. The
+    file watcher is optional and polls the modification times, the cogs folder is
+    small enough that this costs nothing.
+
+    Attributes
+    ----------
+    bot : commands.Bot
+        The bot the cogs are loaded into.
+    cogs_folder : Path
+        The folder the cogs are in.
+    poll_interval : float
+        How often the watcher looks for changed cogs, in seconds.
+    settle_time : float
+        How long a change has to settle before it is reloaded, in seconds.
+    reload_count : int
+        How many cogs were reloaded, loaded or unloaded.
+    failure_count : int
+        How many reloads failed.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        cogs_folder: Path = COGS_FOLDER_PATH,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        settle_time: float = DEFAULT_SETTLE_TIME,
+    ) -> None:
+        """
+        Initializes the reloader.
+
+        Parameters
+        ----------
+        bot : commands.Bot
+            The bot the cogs are loaded into.
+        cogs_folder : Path, optional
+            The folder the cogs are in.
+        poll_interval : float, optional
+            How often the watcher looks for changed cogs, in seconds.
+        settle_time : float, optional
+            How long a change has to settle before it is reloaded, in seconds.
+        """
+        self.bot: commands.Bot = bot
+        self.cogs_folder: Path = cogs_folder
+        self.poll_interval: float = poll_interval
+        self.settle_time: float = settle_time
+
+        self.reload_count: int = 0
+        self.failure_count: int = 0
+        self.last_results: list[ReloadResult] = []
+
+        # the modification times of the cog files that are live, by extension name
+        self._modification_times: dict[str, int] = {}
+
+        # the watcher and the reload command must not reload at the same time
+        self._reload_lock: asyncio.Lock = asyncio.Lock()
+        self._task: asyncio.Task = None
+
+    @property
+    def is_watching(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def remember_modification_times(self) -> None:
+        """
+        Remembers the cog files as they are now, called once the cogs are loaded.
+        """
+        self._modification_times = get_modification_times(self.cogs_folder)
+
+    def get_extension_names(self) -> list[str]:
+        """
+        Gets the names of every cog file.
+        """
+        return [file.stem for file in iter_cog_files(self.cogs_folder)]
+
+    async def get_changed_extensions(self) -> list[str]:
+        """
+        Gets the cogs whose file was changed, added or deleted since they
+        were last loaded.
+
+        Returns
+        -------
+        list of str
+            The extension names, sorted.
+        """
+        modification_times = await run_file_io(get_modification_times, self.cogs_folder)
+
+        # a changed, added or deleted file is in only one of the two
+        changed_files = modification_times.items() ^ self._modification_times.items()
+        return sorted({extension_name for extension_name, _ in changed_files})
+
+    async def reload_changed_extensions(self) -> list[ReloadResult]:
+        """
+        Reloads every cog whose file changed since it was last loaded.
+
+        Returns
+        -------
+        list of ReloadResult
+            The outcome per cog, empty if nothing changed.
+        """
+        return await self.reload_extensions(await self.get_changed_extensions())
+
+    async def reload_extensions(self, extension_names: list[str]) -> list[ReloadResult]:
+        """
+        Reloads cogs one after the other, a failing cog does not stop the others.
+
+        Parameters
+        ----------
+        extension_names : list of str
+            The names of the cog files, without the package.
+
+        Returns
+        -------
+        list of ReloadResult
+            The outcome per cog.
+        """
+        async with self._reload_lock:
+            results = [
+                await self._reload_extension(extension_name)
+                for extension_name in extension_names
+            ]
+
+        if results:
+            self.last_results = results
+
+        return results
+
+    async def _reload_extension(self, extension_name: str) -> ReloadResult:
+        """
+        Reloads, loads or unloads a single cog, depending on whether it is loaded and
+        its file exists.
+        """
+        qualified_name = f"{COGS_PACKAGE}.{extension_name}"
+        file_path = self.cogs_folder / f"{extension_name}.py"
+        is_loaded = qualified_name in self.bot.extensions
+
+        start_time = perf_counter()
+
+        if not file_path.exists():
+            action = "unloaded"
+            error = await self._unload_extension(qualified_name, is_loaded)
+        else:
+            action = "reloaded" if is_loaded else "loaded"
+            error = await self._load_extension(qualified_name, file_path, is_loaded)
+
+        seconds = perf_counter() - start_time
+
+        # the file is remembered either way, so a broken file is not retried until it
+        # changes again
+        await self._remember_modification_time(extension_name)
+
+        if error is not None:
+            self.failure_count += 1
+            if is_loaded:
+                logger.error(
+                    f"Failed to reload cog '{extension_name}', the old version stays "
+                    f"live: {error}"
+                )
+            else:
+                logger.error(f"Failed to load cog '{extension_name}': {error}")
+
+            return ReloadResult(extension_name, "failed", seconds, error, is_loaded)
+
+        self.reload_count += 1
+        logger.info(f"Cog '{extension_name}' {action} in {seconds * 1000:.0f}ms")
+
+        return ReloadResult(extension_name, action, seconds, was_loaded=is_loaded)
+
+    async def _unload_extension(self, qualified_name: str, is_loaded: bool) -> str:
+        """
+        Unloads a cog whose file was deleted, returns the error if it fails.
+        """
+        if not is_loaded:
+            return None
+
+        try:
+            await self.bot.unload_extension(qualified_name)
+        except commands.ExtensionError as extension_error:
+            return str(extension_error)
+
+        return None
+
+    async def _load_extension(
+        self, qualified_name: str, file_path: Path, is_loaded: bool
+    ) -> str:
+        """
+        Reloads a loaded cog or loads a new one, returns the error if it fails.
+        """
+        # a syntax error is caught before the live cog is touched
+        error = await run_file_io(check_extension_source, file_path)
+        if error is not None:
+            return error
+
+        try:
+            # reload_extension puts the old module back when the new one fails to
+            # set up
+            if is_loaded:
+                await self.bot.reload_extension(qualified_name)
+            else:
+                await self.bot.load_extension(qualified_name)
+        except commands.ExtensionError as extension_error:
+            cause = extension_error.__cause__
+            if cause is None:
+                return str(extension_error)
+            return f"{type(cause).__name__}: {cause}"
+
+        return None
+
+    async def _remember_modification_time(self, extension_name: str) -> None:
+        """
+        Remembers the cog file of an extension as it is now, or forgets it if it was
+        deleted.
+        """
+        modification_times = await run_file_io(
+            get_modification_times, self.cogs_folder
+        )
+        modification_time = modification_times.get(extension_name)
+        if modification_time is not None:
+            self._modification_times[extension_name] = modification_time
+        else:
+            self._modification_times.pop(extension_name, None)
+
+    def start(self) -> None:
+        """
+        Starts watching the cogs folder. Must be called from the event loop of the bot.
+        """
+        if self.is_watching:
+            return None
+
+        self._task = asyncio.get_running_loop().create_task(
+            self._watch(), name="cog-reloader"
+        )
+
+        logger.info(
+            f"Watching '{self.cogs_folder}' for changed cogs "
+            f"(interval: {self.poll_interval}s)"
+        )
+
+        return None
+
+    def stop(self) -> None:
+        """
+        Stops watching the cogs folder.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        return None
+
+    async def _watch(self) -> None:
+        """
+        Polls the cogs folder and reloads the cogs that changed.
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            try:
+                if not await self.get_changed_extensions():
+                    continue
+
+                # let the editor finish writing, the changes are read again afterwards
+                await asyncio.sleep(self.settle_time)
+                await self.reload_changed_extensions()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                # the watcher must keep running, the next change could fix it
+                logger.error(f"Cog watcher failed: {error}")
+
+    def get_stats(self) -> dict:
+        return {
+            "watching": self.is_watching,
+            "reloads": self.reload_count,
+            "failures": self.failure_count,
+        }
+
+
+def format_reload_results(results: list[ReloadResult]) -> str:
+    """
+    Formats reload results as one line per cog.
+
+    Parameters
+    ----------
+    results : list of ReloadResult
+        The results to format.
+
+    Returns
+    -------
+    str
+        The formatted results.
+    """
+    if not results:
+        return "No cogs changed."
+
+    lines = []
+    for result in results:
+        milliseconds = result.seconds * 1000
+        line = f"{result.extension_name}: {result.action} in {milliseconds:.0f}ms"
+        if result.error is not None and result.was_loaded:
+            line += f", the old version stays live ({result.error})"
+        elif result.error is not None:
+            line += f" ({result.error})"
+        lines.append(line)
+
+    return "\n".join(lines)
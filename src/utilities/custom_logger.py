@@ -1,10 +1,15 @@
-from ast import Tuple
 import coloredlogs
 import logging
 import logging.handlers
+import threading
+
+from typing import Callable, Dict, List, Tuple
 
 from .data_handling import DataHandler, get_data_handler, Folder
 from .utils import cut_off_string
+from .log_rotation import ArchivingFileHandler, get_rotation_configuration
+from .log_sampling import get_log_rate_limit_filter
+from .structured_logging import JsonLinesFormatter
 
 LOGGER_NAME_CUT_OFF_POINT = 4
 DATA_FOLDER_NAME = "data"
@@ -29,6 +34,7 @@ COLORS = {
 
 RESET_CODE = '\033[0m'
 
+
 def ensure_logs_folder_exists(data_handler: DataHandler) -> Folder:
     """
     Ensures that the logs folder exists.
@@ -36,7 +42,10 @@ def ensure_logs_folder_exists(data_handler: DataHandler) -> Folder:
     # create the configuration folder if it does not exist
     return data_handler.create_folder("logs", can_exist=True)
 
-def ensure_logger_folder_exists(data_handler: DataHandler, logs_folder: Folder, logger_name: str) -> Folder:
+
+def ensure_logger_folder_exists(
+    data_handler: DataHandler, logs_folder: Folder, logger_name: str
+) -> Folder:
     """
     Ensures that the logger folder exists.
     """
@@ -45,12 +54,164 @@ def ensure_logger_folder_exists(data_handler: DataHandler, logs_folder: Folder,
         logger_name, logs_folder, True
     )
 
+
+class LoggerRegistry:
+    """
+    Keeps track of the folders, formatters and handlers of every logger in the project,
+    so each named logger is only set up once no matter how many times it is requested.
+    This is not meant to be manually initialized.
+    Use the get_logger_registry function instead.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the logger registry.
+        """
+        self._lock = threading.RLock()
+
+        self._logs_folder: Folder = None
+        self._logger_folders: Dict[str, Folder] = {}
+        self._formatters: Dict[str, logging.Formatter] = {}
+        self._handlers: Dict[str, List[logging.Handler]] = {}
+        # whether the log file of a logger is written as json lines
+        self._structured: Dict[str, bool] = {}
+
+    def get_logs_folder(self) -> Folder:
+        """
+        Gets the logs folder, it is only looked up the first time.
+        """
+        with self._lock:
+            if self._logs_folder is None:
+                self._logs_folder = ensure_logs_folder_exists(get_data_handler())
+
+            return self._logs_folder
+
+    def get_logger_folder(self, logger_name: str) -> Folder:
+        """
+        Gets the folder of a logger, it is only looked up the first time.
+
+        Parameters
+        ----------
+        logger_name : str
+            The name of the logger.
+        """
+        with self._lock:
+            if logger_name not in self._logger_folders:
+                self._logger_folders[logger_name] = ensure_logger_folder_exists(
+                    get_data_handler(), self.get_logs_folder(), logger_name
+                )
+
+            return self._logger_folders[logger_name]
+
+    def get_formatter(
+        self, formatter_key: str, create_formatter: Callable[[], logging.Formatter]
+    ) -> logging.Formatter:
+        """
+        Gets a formatter, creating it the first time it is requested.
+
+        Parameters
+        ----------
+        formatter_key : str
+            The key the formatter is shared under.
+        create_formatter : Callable
+            Creates the formatter if it does not exist yet.
+        """
+        with self._lock:
+            if formatter_key not in self._formatters:
+                self._formatters[formatter_key] = create_formatter()
+
+            return self._formatters[formatter_key]
+
+    def get_handlers(
+        self,
+        logger_name: str,
+        create_handlers: Callable[[], List[logging.Handler]],
+        structured: bool = False,
+    ) -> Tuple[List[logging.Handler], bool]:
+        """
+        Gets the handlers of a logger, creating them the first time they are requested.
+
+        Parameters
+        ----------
+        logger_name : str
+            The name of the logger.
+        create_handlers : Callable
+            Creates the handlers if they do not exist yet.
+        structured : bool, optional
+            Whether the created handlers write json lines. Defaults to False.
+
+        Returns
+        -------
+        tuple of list of logging.Handler and bool
+            The handlers of the logger and whether they were just created.
+        """
+        with self._lock:
+            if logger_name in self._handlers:
+                return self._handlers[logger_name], False
+
+            self._handlers[logger_name] = create_handlers()
+            self._structured[logger_name] = structured
+            return self._handlers[logger_name], True
+
+    def is_structured(self, logger_name: str) -> bool:
+        """
+        Gets whether the log file of a logger that has been set up is written
+        as json lines.
+        """
+        return self._structured.get(logger_name, False)
+
+    def set_level(self, logger_name: str, logging_level: int) -> None:
+        """
+        Changes the level of a logger while the bot is running.
+
+        Parameters
+        ----------
+        logger_name : str
+            The name of the logger.
+        logging_level : int
+            The new logging level.
+        """
+        with self._lock:
+            if logger_name not in self._handlers:
+                raise ValueError(f"Logger '{logger_name}' has not been set up.")
+
+            logging.getLogger(logger_name).setLevel(logging_level)
+
+        return None
+
+
+main_logger_registry: LoggerRegistry = None
+
+
+def get_logger_registry() -> LoggerRegistry:
+    """
+    Gets the main logger registry for the project.
+
+    Returns
+    -------
+    LoggerRegistry
+        The main logger registry for the project.
+    """
+    global main_logger_registry
+
+    if main_logger_registry is None:
+        main_logger_registry = LoggerRegistry()
+
+    return main_logger_registry
+
+
 class CustomLogger:
     """
     A custom logger class that allows for easy logging in the project.
+
+    Creating the same logger more than once is safe, the folders, formatters and
+    handlers are shared through the LoggerRegistry so every line is only written once.
+    A repeated request changes the level of the logger when it gives one.
     """
 
-    def __init__(self, name: str = "main", logging_level=logging.DEBUG) -> None:
+    def __init__(
+        self, name: str = "main", logging_level=None, structured: bool = None
+    ) -> None:
         """
         Initializes the custom logger.
 
@@ -59,11 +220,20 @@ class CustomLogger:
         name : str
             The name of the logger.
         logging_level : logging._Level, optional
-            The logging level of the logger. Defaults to logging.INFO.
+            The logging level of the logger. Defaults to logging.DEBUG when the logger
+            is set up, a logger that is already set up keeps its level.
+        structured : bool, optional
+            Whether the log file should be written as json lines. Defaults to False.
+            The format of a logger that is already set up can not change, asking for
+            the other one logs a warning.
         """
         # set the logger name and logging level
         self.logger_name = name
         self.logging_level = logging_level
+        self.structured = structured
+
+        # get the registry that shares the setup between loggers
+        self.registry: LoggerRegistry = get_logger_registry()
 
         # create the logger
         self.logger = logging.getLogger(self.logger_name)
@@ -72,7 +242,7 @@ class CustomLogger:
         self._create_folders()
         # setup the logging
         self._setup_logger()
-        
+
     def _create_folders(self) -> None:
         """
         Creates the folders for the logger.
@@ -80,31 +250,24 @@ class CustomLogger:
         # get the data handler
         self.data_handler = get_data_handler()
 
-        # make sure the logs folder exists
-        self.logs_folder: Folder = ensure_logs_folder_exists(self.data_handler)
-        
-        # make sure the folder for this logger exists
-        self.logger_folder: Folder = ensure_logger_folder_exists(
-            self.data_handler, self.logs_folder, self.logger_name
-        )
-        
+        # make sure the logs folder and the folder for this logger exist
+        self.logs_folder: Folder = self.registry.get_logs_folder()
+        self.logger_folder: Folder = self.registry.get_logger_folder(self.logger_name)
+
         self.output_dir = self.logger_folder.path
-        
+
         return None
 
     def _create_colored_logging_formatter(self) -> coloredlogs.ColoredFormatter:
         # define the logging format for dates
         dt_fmt = "%H:%M:%S"
 
-        # set the logging level
-        self.logger.setLevel(self.logging_level)
-
         # create the output string
         logger_name = self.logger_name
         cut_logger_name = cut_off_string(self.logger_name, LOGGER_NAME_CUT_OFF_POINT)
         if self.logger_name in COLORS:
             logger_name = COLORS[self.logger_name] + cut_logger_name + RESET_CODE
-        
+
         output_str = f"%(asctime)s | {logger_name} | %(levelname)-5s | %(message)s"
 
         return coloredlogs.ColoredFormatter(fmt=output_str, datefmt=dt_fmt)
@@ -113,51 +276,102 @@ class CustomLogger:
         # define the logging format for dates
         dt_fmt = "%Y-%m-%d %H:%M:%S"
 
-        # set the logging level
-        self.logger.setLevel(self.logging_level)
-
         # create the output string
         output_str = "%(asctime)s | %(levelname)-5s | %(message)s"
 
         return logging.Formatter(fmt=output_str, datefmt=dt_fmt)
-    
-    def _create_file_handler(self, logging_formatter: logging.Formatter) -> logging.FileHandler:
-        # create the file handler
-        file_handler = logging.handlers.TimedRotatingFileHandler(
-            filename=f"{self.output_dir}/latest.log",
-            when="midnight",
-            encoding="utf-8",
-        )
-        file_handler.suffix = "%Y-%m-%d.log"
+
+    def _create_file_handler(
+        self, logging_formatter: logging.Formatter
+    ) -> logging.FileHandler:
+        # get the rotation settings for this logger
+        rotation_configuration = get_rotation_configuration(self.logger_name)
+
+        # create the file handler, rotated files are compressed in the background
+        file_handler = ArchivingFileHandler(self.output_dir, **rotation_configuration)
         file_handler.setFormatter(logging_formatter)
-        
-        return file_handler 
 
-    def _create_console_handler(self, logging_formatter: logging.Formatter) -> logging.StreamHandler:
+        return file_handler
+
+    def _create_console_handler(
+        self, logging_formatter: logging.Formatter
+    ) -> logging.StreamHandler:
         # make the console handler
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(logging_formatter)
-        
+
         return console_handler
 
-    def _setup_logger(self) -> None:
+    def _create_handlers(self) -> List[logging.Handler]:
         """
-        Sets up the logging for the logger.
+        Creates the handlers for the logger.
         """
-        # create the logging formatters
-        colored_logging_formatter = self._create_colored_logging_formatter()
-        logging_formatter = self._create_logging_formatter()
+        # get the logging formatters, the colored one
+        # includes the logger name so it is per logger
+        colored_logging_formatter = self.registry.get_formatter(
+            f"colored:{self.logger_name}", self._create_colored_logging_formatter
+        )
+        if self.structured:
+            logging_formatter = self.registry.get_formatter("json", JsonLinesFormatter)
+        else:
+            logging_formatter = self.registry.get_formatter(
+                "plain", self._create_logging_formatter
+            )
 
         # create the file handler
         # create the console handler
         file_handler = self._create_file_handler(logging_formatter)
         console_handler = self._create_console_handler(colored_logging_formatter)
 
-        # add the handlers to the discord logger
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        return [file_handler, console_handler]
+
+    def _setup_logger(self) -> None:
+        """
+        Sets up the logging for the logger.
+        """
+        # get the handlers, they are only created the first time this logger is set up
+        handlers, created = self.registry.get_handlers(
+            self.logger_name, self._create_handlers, bool(self.structured)
+        )
+
+        if not created:
+            self._update_logger()
+            return None
+
+        # set the logging level
+        self.logger.setLevel(
+            logging.DEBUG if self.logging_level is None else self.logging_level
+        )
+
+        # add the handlers to the logger
+        for handler in handlers:
+            self.logger.addHandler(handler)
+
+        # sample and rate limit the busy call sites
+        # before any handler formats or writes them
+        log_rate_limit_filter = get_log_rate_limit_filter(self.logger)
+        if log_rate_limit_filter is not None:
+            self.logger.addFilter(log_rate_limit_filter)
 
         # log the success
         self.logger.info(f"{self.logger_name} logger setup complete!")
 
-        return None
\ No newline at end of file
+        return None
+
+    def _update_logger(self) -> None:
+        """
+        Applies the options of a repeated request to the logger that is already set up.
+        """
+        if self.logging_level is not None:
+            self.registry.set_level(self.logger_name, self.logging_level)
+
+        # the files are already being written in one format
+        structured = self.registry.is_structured(self.logger_name)
+        if self.structured is not None and self.structured != structured:
+            self.logger.warning(
+                f"{self.logger_name} logger is already set up with "
+                f"{'json lines' if structured else 'plain'} log files, "
+                f"ignoring structured={self.structured}"
+            )
+
+        return None
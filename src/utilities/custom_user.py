@@ -4,7 +4,10 @@ from logging import getLogger
 
 logger = getLogger("role")
 
+
 class CustomUser():
+    __slots__ = ("guild_member",)
+
     def __init__(self, guild_member: Member) -> None:
         """
         Initializes a CustomUser object.
@@ -29,16 +32,11 @@ class CustomUser():
             False if the CustomUser had their roles modified, True otherwise
         """
         logger.info(f"Starting validation of roles for{str(self)}")
-        
-        
-        
+
         return True
-    
-    
-        
 
     def format_username(self) -> str:
-        return f"{self.user} (ID: {self.user.id})"
-    
+        return f"{self.guild_member} (ID: {self.guild_member.id})"
+
     def __str__(self) -> str:
-        return self.format_username()
\ No newline at end of file
+        return self.format_username()
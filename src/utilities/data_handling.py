@@ -1,16 +1,85 @@
-from os import path, makedirs, walk
-from typing import Dict
+import asyncio
+import json
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os import path, makedirs, replace, walk
+from sys import intern
+from threading import get_ident
+from typing import Any, Callable, Dict
 
 DEFAULT_RELATIVE_DATA_PATH: str = "data"
 
 DEFAULT_FOLDERS = ["configuration", "logs"]
 
+# how many threads read and write files for the event loop
+FILE_IO_WORKER_COUNT: int = 2
+
 main_data_handler: "DataHandler" = None
 
+# the threads that do the file work of the async helpers, created on first use
+_file_io_executor: ThreadPoolExecutor = None
+
+
+def get_file_io_executor() -> ThreadPoolExecutor:
+    """
+    Gets the small thread pool that the async file helpers run on.
+
+    Returns
+    -------
+    ThreadPoolExecutor
+        The thread pool, created the first time it is needed.
+    """
+    global _file_io_executor
+
+    if _file_io_executor is None:
+        _file_io_executor = ThreadPoolExecutor(
+            max_workers=FILE_IO_WORKER_COUNT, thread_name_prefix="file-io"
+        )
+
+    return _file_io_executor
+
+
+async def run_file_io(function: Callable, *args, **kwargs) -> Any:
+    """
+    Runs blocking file work in the file I/O thread pool, so the event loop keeps
+    processing the gateway while the disk is busy.
+
+    Parameters
+    ----------
+    function : Callable
+        The blocking function to run.
+    args, kwargs
+        The arguments of the function.
+
+    Returns
+    -------
+    Any
+        What the function returned.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_file_io_executor(), partial(function, *args, **kwargs)
+    )
+
+
+def write_json_file(file_path: str, data: Any, indent: int = 4) -> None:
+    """
+    Serializes data to a json file. The data is written to a temporary file first and
+    then moved over the file, so a reader never sees a half written file.
+    """
+    # one temporary file per thread, so two writes of the same file never share one
+    temporary_file_path = f"{file_path}.{get_ident()}.tmp"
+    with open(temporary_file_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=indent)
+
+    replace(temporary_file_path, file_path)
+
+
 class Folder:
     """
     Class that mimics a folder in the project.
-    
+
     Attributes
     ----------
     parent_folder : Folder
@@ -23,33 +92,43 @@ class Folder:
         The path of the folder.
     subfolders : list of Folder
         The subfolders of the folder.
-        
+
     Notes
     -----
-    This class is not meant to be used for creating folders. It is meant to be used for representing folders in the project.    
+    This class is not meant to be used for creating folders. It is meant to be used for
+    representing folders in the project.
+
+    The parent folder is held through a weak reference, so a folder tree is freed as
+    soon as its root is no longer used instead of waiting for the cycle collector.
     """
-    
+
+    __slots__ = (
+        "_parent_folder_reference", "name", "path", "subfolders", "__weakref__"
+    )
+
     def __init__(self, folder_path: str) -> None:
         """
         Initializes the folder.
-        
+
         Parameters
         ----------
         folder_path : str
             The path of the folder.
         """
-        
+
         # check if the folder path is a valid folder
         if not path.isdir(folder_path):
             raise ValueError(f"folder_path '{folder_path}' is not a valid folder path.")
-        
-        # set the name and path of the folder
-        self.parent_folder: Folder = self
-        self.parent_folder_name: str = "ROOT"
-        
-        self.name: str = path.basename(folder_path)
+
+        # set the name and path of the folder, a folder without a parent is
+        # its own parent
+        self._parent_folder_reference: weakref.ref = None
+
+        # folder names repeat a lot (one folder per guild, per logger, ...),
+        # so share them
+        self.name: str = intern(path.basename(folder_path))
         self.path: str = folder_path
-        
+
         # get the subfolders and files
         self.subfolders: list[Folder] = []
 
@@ -59,24 +138,25 @@ class Folder:
         for folder in folders:
             new_folder = Folder(path.join(self.path, folder))
             self.add_subfolder(new_folder)
-    
+
     def get_file(self, file_name: str, create_if_none: bool = False):
         """
         Gets a file in the folder.
-        
+
         Parameters
         ----------
         file_name : str
             The name of the file to get.
-        
+
         Returns
         -------
         File
-            The file with the given name. If the file does not exist, returns None unless create_if_none is True.
+            The file with the given name. If the file does not exist, returns None
+            unless create_if_none is True.
         """
         # get the folder
         file_path: str = path.join(self.path, file_name)
-        
+
         # check if the file exists
         if path.isfile(file_path):
             return file_path
@@ -88,16 +168,16 @@ class Folder:
 
             # get the new file
             return self.get_file(file_name)
-    
+
     def add_subfolder(self, subfolder: "Folder") -> None:
         """
         Adds a subfolder to the folder and sets the parent folder of the subfolder.
-        
+
         Parameters
         ----------
         subfolder : Folder
             The subfolder to add.
-        
+
         Returns
         -------
         None
@@ -107,23 +187,48 @@ class Folder:
 
         # set the parent folder of the subfolder
         subfolder.parent_folder = self
-        subfolder.parent_folder_name = self.name
-        
+
         return None
-    
+
+    @property
+    def parent_folder(self) -> "Folder":
+        """
+        The parent folder of the folder, the folder itself if it has no parent.
+        """
+        if self._parent_folder_reference is None:
+            return self
+
+        # the parent was freed, the folder is the root of what is left
+        return self._parent_folder_reference() or self
+
+    @parent_folder.setter
+    def parent_folder(self, parent_folder: "Folder") -> None:
+        self._parent_folder_reference = None
+        if parent_folder is not self:
+            self._parent_folder_reference = weakref.ref(parent_folder)
+
+    @property
+    def parent_folder_name(self) -> str:
+        """
+        The name of the parent folder of the folder, ROOT if it has no parent.
+        """
+        parent_folder = self.parent_folder
+        return "ROOT" if parent_folder is self else parent_folder.name
+
     def get_subfolder(self, subfolder_name: str) -> "Folder":
         """
         Gets a subfolder of the folder.
-        
+
         Parameters
         ----------
         subfolder_name : str
             The name of the subfolder to get.
-        
+
         Returns
         -------
         Folder
-            The subfolder with the given name. If the subfolder does not exist, returns None.
+            The subfolder with the given name. If the subfolder does not
+            exist, returns None.
         """
         return next(
             (
@@ -133,16 +238,16 @@ class Folder:
             ),
             None,
         )
-    
+
     def get_deep_str(self, depth: int = 0) -> str:
         """
         Gets a string representation of the folder and all of its subfolders.
-        
+
         Parameters
         ----------
         depth : int, optional
             The depth of the folder. Defaults to 0.
-        
+
         Returns
         -------
         str
@@ -150,30 +255,41 @@ class Folder:
         """
         # set the string representation of the folder
         folder_str: str = f"{'  ' * depth}{self.name}\n"
-        
+
         # get the string representation of the subfolders
         for subfolder in self.subfolders:
             folder_str += subfolder.get_deep_str(depth + 1)
-        
+
         return folder_str
 
+
 class DataHandler:
     """
-    Class for handling data folders for the project. This class is meant to be used as a singleton.
-    This is not meant to be manually initialized. Use the get_data_handler function instead.
+    Class for handling data folders for the project. This class is meant to be used as a
+    singleton. This is not meant to be manually initialized. Use the get_data_handler
+    function instead.
     """
-    
+
     # setup the paths
     relative_data_path: str = DEFAULT_RELATIVE_DATA_PATH
     absolute_data_path: str = path.abspath(relative_data_path)
-    
-    def __init__(self) -> None:
+
+    def __init__(self, data_path: str = None) -> None:
         """
         Initializes the data handler.
+
+        Parameters
+        ----------
+        data_path : str, optional
+            The data folder to use instead of the default one, like a temporary folder
+            for offline tools. Defaults to the data folder of the project.
         """
         global main_data_handler
         main_data_handler = self
 
+        if data_path is not None:
+            self.absolute_data_path = path.abspath(data_path)
+
         # create the data folder
         self.create_data_folder()
 
@@ -183,7 +299,7 @@ class DataHandler:
     def create_data_folder(self) -> None:
         """
         Creates the data folder for the project.
-        
+
         Returns
         -------
         Folder
@@ -191,31 +307,33 @@ class DataHandler:
         """
         # make sure the data folder exists
         makedirs(self.absolute_data_path, exist_ok=True)
-        
+
         # Create the main data folder object
         self.data_folder: Folder = Folder(self.absolute_data_path)
-        
+
         return self.data_folder
-    
-    def create_default_folders(self) -> Dict[str, Folder]: 
+
+    def create_default_folders(self) -> Dict[str, Folder]:
         """
         Creates the default folders for the project.
-        
+
         Parameters
         ----------
         data_handler : DataHandler
             The data handler for the project.
         """
-        # create all the default folders and return them 
+        # create all the default folders and return them
         return {
             folder_name: self.create_folder(folder_name, can_exist=True)
             for folder_name in DEFAULT_FOLDERS
         }
-        
-    def create_folder(self, folder_name: str, parent_folder: Folder = None, can_exist: bool = False) -> Folder:
+
+    def create_folder(
+        self, folder_name: str, parent_folder: Folder = None, can_exist: bool = False
+    ) -> Folder:
         """
         Creates a folder in the project.
-        
+
         Parameters
         ----------
         folder_name : str
@@ -238,12 +356,19 @@ class DataHandler:
 
         # create the new folder
         makedirs(new_folder_path, exist_ok=can_exist)
-        return Folder(folder_path=new_folder_path)
+
+        # reuse the folder if it is already part of the folder tree, otherwise add it
+        new_folder: Folder = parent_folder.get_subfolder(folder_name)
+        if new_folder is None:
+            new_folder = Folder(folder_path=new_folder_path)
+            parent_folder.add_subfolder(new_folder)
+
+        return new_folder
 
     def search_for_folder(self, folder_name: str, required_parent_name: str = None):
         """
         Searches for a folder in the project.
-        
+
         Parameters
         ----------
         folder_name : str
@@ -260,26 +385,26 @@ class DataHandler:
             current_folder: Folder = folders_to_search.pop()
 
             # check if the current folder is the folder we are looking for
-            if current_folder.name == folder_name and (
-                                required_parent_name
-                                and current_folder.parent_folder_name == required_parent_name
-                                or not required_parent_name
-                            ):
+            has_name = current_folder.name == folder_name
+            has_parent = current_folder.parent_folder_name == required_parent_name
+            if has_name and (has_parent or not required_parent_name):
                 return current_folder
             # add the subfolders to the folders to search
             folders_to_search.extend(current_folder.subfolders)
 
         return None
 
+
 def get_data_handler() -> DataHandler:
     """
     Gets the main data handler for the project.
-    
+
     Returns
     -------
     DataHandler
         The main data handler for the project.
-    """    
+    """
     return main_data_handler or DataHandler()
 
-main_data_handler = DataHandler()
\ No newline at end of file
+
+main_data_handler = DataHandler()
@@ -0,0 +1,330 @@
+import datetime
+import gzip
+import json
+import secrets
+
+from hashlib import blake2b
+from os import path
+from time import monotonic
+
+import discord
+
+from utilities.data_handling import DataHandler, Folder
+from utilities.role_configuration import ROLE_RULE_KEYS
+from utilities.role_name_index import ROLE_DIVIDER_CHARACTER
+from utilities.structured_logging import get_structured_logger
+
+RECORDINGS_FOLDER_NAME: str = "recordings"
+# bumped when the layout of the records changes, so old recordings are not misread
+RECORDING_FORMAT_VERSION: int = 1
+
+# the dispatched events (without the "on_" prefix) that are recorded
+RECORDED_EVENTS: tuple[str, ...] = (
+    "message",
+    "member_update",
+    "guild_role_create",
+    "guild_role_update",
+    "guild_role_delete",
+)
+
+# how many records are buffered before they are written to the file
+DEFAULT_FLUSH_EVERY: int = 256
+
+logger = get_structured_logger("bot")
+
+
+class IdAnonymizer:
+    """
+    Replaces discord IDs with keyed hashes.
+
+    The same ID always gets the same replacement within a recording, so the replay sees
+    the same member send many messages, but without the key (which is never written)
+    the replacement can not be traced back to the real ID.
+    """
+
+    __slots__ = ("_key",)
+
+    def __init__(self, key: bytes = None) -> None:
+        self._key: bytes = key or secrets.token_bytes(16)
+
+    def anonymize(self, discord_id: int) -> int:
+        digest = blake2b(
+            int(discord_id).to_bytes(8, "big"), key=self._key, digest_size=8
+        ).digest()
+
+        # keep it positive and below 2 ** 63, like a snowflake
+        return int.from_bytes(digest, "big") >> 1
+
+    def anonymize_role_name(self, role_id: int, role_name: str) -> str:
+        # divider roles are only filler characters, the amount is kept so they still
+        # look like dividers
+        if ROLE_DIVIDER_CHARACTER in role_name:
+            return ROLE_DIVIDER_CHARACTER * role_name.count(ROLE_DIVIDER_CHARACTER)
+
+        return f"role {self.anonymize(role_id) % 100000}"
+
+
+class EventRecorder:
+    """
+    Writes the dispatched gateway events that drive the role handling to a compact,
+    anonymized recording, so real traffic shapes (message bursts, mass role updates,
+    raids) can be replayed offline with utilities.event_replay.
+
+    Only the fields the cogs and the role handler look at are kept: IDs are anonymized,
+    names are replaced and message content is reduced to its length. The first time a
+    guild shows up, its roles, members and role rules are written once, so the replay
+    can rebuild the guild before the events that follow.
+
+    Every record is a json list of the seconds since the recording started, the event
+    name and the payload, one per line in a gzip file in the recordings data folder.
+
+    Attributes
+    ----------
+    file_path : str
+        The path of the recording.
+    recorded_count : int
+        How many events were recorded.
+    """
+
+    def __init__(
+        self,
+        bot: discord.Client,
+        data_handler: DataHandler,
+        flush_every: int = DEFAULT_FLUSH_EVERY,
+    ) -> None:
+        """
+        Initializes the event recorder and starts a new recording.
+
+        Parameters
+        ----------
+        bot : discord.Client
+            The bot whose events are recorded.
+        data_handler : DataHandler
+            The data handler used to find the recordings folder.
+        flush_every : int, optional
+            How many records are buffered before they are written to the file.
+        """
+        self.bot: discord.Client = bot
+        self.flush_every: int = flush_every
+
+        self.anonymizer: IdAnonymizer = IdAnonymizer()
+
+        recordings_folder: Folder = data_handler.create_folder(
+            RECORDINGS_FOLDER_NAME, can_exist=True
+        )
+        file_name = f"events-{datetime.datetime.now():%Y%m%d-%H%M%S}.jsonl.gz"
+        self.file_path: str = path.join(recordings_folder.path, file_name)
+
+        self._file = gzip.open(self.file_path, "wt", encoding="utf-8")
+        self._buffer: list[str] = []
+        self._started_at: float = monotonic()
+
+        # the guilds whose state was already written
+        self._recorded_guild_ids: set[int] = set()
+
+        self.recorded_count: int = 0
+
+        self._write_record("recording", {
+            "format": RECORDING_FORMAT_VERSION,
+            "production_guild": self.anonymizer.anonymize(bot.production_server_id),
+            "development_guild": self.anonymizer.anonymize(bot.development_server_id),
+        })
+
+        logger.info("event_recorder.started", path=self.file_path)
+
+    def get_stats(self) -> dict:
+        return {
+            "path": self.file_path,
+            "recorded": self.recorded_count,
+            "guilds": len(self._recorded_guild_ids),
+        }
+
+    def record(self, event_name: str, *args) -> None:
+        """
+        Records a dispatched event, if it is one of the recorded events. Never raises, a
+        broken recording must not break the event.
+
+        Parameters
+        ----------
+        event_name : str
+            The name of the event, without the "on_" prefix.
+        args
+            The arguments the event was dispatched with.
+        """
+        if event_name not in RECORDED_EVENTS or self._file is None:
+            return None
+
+        try:
+            payload = getattr(self, f"_minimize_{event_name}")(*args)
+            if payload is None:
+                return None
+
+            self._write_record(event_name, payload)
+            self.recorded_count += 1
+        except Exception as error:
+            logger.warning(
+                "event_recorder.record_failed", event=event_name, error=error
+            )
+
+        return None
+
+    def flush(self) -> None:
+        """
+        Writes the buffered records to the file.
+        """
+        if self._file is None or not self._buffer:
+            return None
+
+        self._file.write("".join(self._buffer))
+        self._buffer.clear()
+
+        # a sync flush, so a crash loses at most the buffered records
+        self._file.flush()
+
+        return None
+
+    def close(self) -> None:
+        """
+        Writes the buffered records and closes the recording.
+        """
+        if self._file is None:
+            return None
+
+        self.flush()
+        self._file.close()
+        self._file = None
+
+        logger.info("event_recorder.closed", **self.get_stats())
+
+        return None
+
+    def _write_record(self, event_name: str, payload: dict) -> None:
+        offset = round(monotonic() - self._started_at, 3)
+        self._buffer.append(
+            json.dumps([offset, event_name, payload], separators=(",", ":")) + "\n"
+        )
+
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def _get_role_ids(self, member: discord.Member) -> list[int]:
+        # the @everyone role is implied, it is left out like in the role checks
+        return [
+            self.anonymizer.anonymize(role.id)
+            for role in member.roles
+            if not role.is_default()
+        ]
+
+    def _record_guild(self, guild: discord.Guild) -> int:
+        """
+        Writes the roles, members and role rules of a guild the first time it is seen.
+
+        Returns
+        -------
+        int
+            The anonymized ID of the guild.
+        """
+        anonymize = self.anonymizer.anonymize
+        guild_id = anonymize(guild.id)
+
+        if guild.id in self._recorded_guild_ids:
+            return guild_id
+
+        self._recorded_guild_ids.add(guild.id)
+
+        # the rules in the file format, with every role ID anonymized
+        rules = {}
+        manager = self.bot.role_handler.get_role_configuration_manager(guild)
+        snapshot = manager.get_snapshot()
+        for role_id, configuration in snapshot.configurations.items():
+            rules[anonymize(role_id)] = {
+                "role_name": self.anonymizer.anonymize_role_name(
+                    role_id, configuration.role_name
+                ),
+                "requires_supporter_status": configuration.requires_supporter_status,
+                **{
+                    key: [
+                        anonymize(other_role_id)
+                        for other_role_id in getattr(configuration, key)
+                    ]
+                    for key in ROLE_RULE_KEYS
+                },
+            }
+
+        self._write_record("guild", {
+            "g": guild_id,
+            "roles": [
+                [
+                    anonymize(role.id),
+                    self.anonymizer.anonymize_role_name(role.id, role.name),
+                    role.position,
+                ]
+                for role in guild.roles
+                if not role.is_default()
+            ],
+            "members": [
+                [
+                    anonymize(member.id),
+                    self._get_role_ids(member),
+                    int(member.bot),
+                    int(member.premium_since is not None),
+                ]
+                for member in guild.members
+            ],
+            "rules": rules,
+        })
+
+        return guild_id
+
+    def _minimize_message(self, message: discord.Message) -> dict:
+        # direct messages never reach the role handling
+        if message.guild is None:
+            return None
+
+        author = message.author
+        anonymize = self.anonymizer.anonymize
+
+        return {
+            "g": self._record_guild(message.guild),
+            "c": anonymize(message.channel.id),
+            "a": anonymize(author.id),
+            "b": int(author.bot),
+            # the roles at the time of the message, the author could have joined after
+            # the guild was recorded
+            "r": (
+                self._get_role_ids(author)
+                if isinstance(author, discord.Member)
+                else []
+            ),
+            "p": int(getattr(author, "premium_since", None) is not None),
+            "l": len(message.content),
+        }
+
+    def _minimize_member_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> dict:
+        return {
+            "g": self._record_guild(after.guild),
+            "m": self.anonymizer.anonymize(after.id),
+            "r": self._get_role_ids(after),
+            "p": int(after.premium_since is not None),
+        }
+
+    def _minimize_role(self, role: discord.Role) -> dict:
+        return {
+            "g": self._record_guild(role.guild),
+            "r": self.anonymizer.anonymize(role.id),
+            "n": self.anonymizer.anonymize_role_name(role.id, role.name),
+            "o": role.position,
+        }
+
+    def _minimize_guild_role_create(self, role: discord.Role) -> dict:
+        return self._minimize_role(role)
+
+    def _minimize_guild_role_update(
+        self, before: discord.Role, after: discord.Role
+    ) -> dict:
+        return self._minimize_role(after)
+
+    def _minimize_guild_role_delete(self, role: discord.Role) -> dict:
+        return self._minimize_role(role)
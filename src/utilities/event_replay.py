@@ -0,0 +1,671 @@
+import argparse
+import asyncio
+import gzip
+import importlib
+import inspect
+import json
+import tempfile
+
+from collections import Counter
+from time import perf_counter
+from typing import Iterator
+
+import discord
+
+from utilities.data_handling import DataHandler
+from utilities.event_recorder import RECORDING_FORMAT_VERSION
+from utilities.role_configuration import (
+    ROLE_CONFIGURATION_FILE_NAME,
+    RoleConfigurationStore,
+    get_guild_configuration_folder,
+)
+from utilities.role_handler import RoleHandler
+from utilities.validation_scheduler import ValidationPriority, ValidationScheduler
+
+# the cogs that listen to the recorded events
+DEFAULT_REPLAY_COGS: tuple[str, ...] = ("on_message", "role_events")
+
+
+def read_recording(recording_path: str) -> Iterator[tuple[float, str, dict]]:
+    """
+    Reads the records of a recording written by the event recorder.
+
+    Yields
+    ------
+    tuple of float, str and dict
+        The seconds since the recording started, the event name and the payload.
+    """
+    with gzip.open(recording_path, "rt", encoding="utf-8") as file:
+        for line in file:
+            # the last line can be cut off when the bot crashed while recording
+            try:
+                offset, event_name, payload = json.loads(line)
+            except ValueError:
+                break
+
+            yield offset, event_name, payload
+
+
+class ReplayIO:
+    """
+    Counts the discord requests the replay would have made, nothing is sent anywhere.
+    """
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+
+    def add(self, request: str, amount: int = 1) -> None:
+        self.counts[request] += amount
+
+
+class ReplayRole:
+    """
+    A stand in for discord.Role, with the fields the cogs and the role handler use.
+    """
+
+    __slots__ = ("id", "name", "position", "guild")
+
+    # recordings only hold roles the bot could be asked to hand out
+    managed: bool = False
+
+    def __init__(
+        self, role_id: int, name: str, position: int, guild: "ReplayGuild"
+    ) -> None:
+        self.id: int = role_id
+        self.name: str = name
+        self.position: int = position
+        self.guild: ReplayGuild = guild
+
+    def is_default(self) -> bool:
+        return False
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+    def copy(self) -> "ReplayRole":
+        return ReplayRole(self.id, self.name, self.position, self.guild)
+
+    def __repr__(self) -> str:
+        return f"<ReplayRole id={self.id} name={self.name!r}>"
+
+
+class ReplayChannel:
+    """
+    A stand in for a text or dm channel, sending only counts the message.
+    """
+
+    __slots__ = ("id", "io")
+
+    def __init__(self, channel_id: int, io: ReplayIO) -> None:
+        self.id: int = channel_id
+        self.io: ReplayIO = io
+
+    async def send(self, *args, **kwargs) -> None:
+        self.io.add("messages_sent")
+
+
+class ReplayMember:
+    """
+    A stand in for discord.Member, role changes are applied to the replayed guild.
+    """
+
+    __slots__ = ("id", "guild", "roles", "bot", "premium_since", "dm_channel")
+
+    def __init__(
+        self,
+        member_id: int,
+        guild: "ReplayGuild",
+        roles: list[ReplayRole],
+        bot: bool,
+        is_supporter: bool,
+    ) -> None:
+        self.id: int = member_id
+        self.guild: ReplayGuild = guild
+        self.roles: list[ReplayRole] = roles
+        self.bot: bool = bot
+        # only whether it is set matters
+        self.premium_since = True if is_supporter else None
+        self.dm_channel: ReplayChannel = None
+
+    @property
+    def name(self) -> str:
+        return f"member {self.id % 100000}"
+
+    display_name = name
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def copy(self) -> "ReplayMember":
+        member = ReplayMember(
+            self.id,
+            self.guild,
+            list(self.roles),
+            self.bot,
+            self.premium_since is not None,
+        )
+        member.dm_channel = self.dm_channel
+        return member
+
+    async def add_roles(self, *roles: ReplayRole, reason: str = None) -> None:
+        self.guild.io.add("roles_added", len(roles))
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles: ReplayRole, reason: str = None) -> None:
+        self.guild.io.add("roles_removed", len(roles))
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def create_dm(self) -> ReplayChannel:
+        self.guild.io.add("dm_channels_created")
+        self.dm_channel = ReplayChannel(self.id, self.guild.io)
+        return self.dm_channel
+
+    def __repr__(self) -> str:
+        return f"<ReplayMember id={self.id}>"
+
+
+class ReplayBotMember:
+    """
+    A stand in for the member of the bot itself, the owner of the replayed guild, so the
+    role handler can change every role like it can on a correctly set up guild.
+    """
+
+    __slots__ = ("id", "guild", "top_role", "guild_permissions")
+
+    bot: bool = True
+
+    def __init__(self, guild: "ReplayGuild") -> None:
+        self.id: int = ReplayUser.id
+        self.guild: ReplayGuild = guild
+        self.top_role: ReplayRole = ReplayRole(guild.id, "@everyone", 0, guild)
+        self.guild_permissions: discord.Permissions = discord.Permissions.all()
+
+
+class ReplayGuild:
+    """
+    A stand in for discord.Guild, rebuilt from the guild record of a recording.
+    """
+
+    def __init__(self, guild_id: int, io: ReplayIO) -> None:
+        self.id: int = guild_id
+        self.io: ReplayIO = io
+        self.name: str = f"guild {guild_id % 100000}"
+
+        self._roles: dict[int, ReplayRole] = {}
+        self._members: dict[int, ReplayMember] = {}
+
+        self.owner_id: int = ReplayUser.id
+        self.me: ReplayBotMember = ReplayBotMember(self)
+
+    @property
+    def roles(self) -> list[ReplayRole]:
+        return sorted(self._roles.values(), key=lambda role: role.position)
+
+    @property
+    def members(self) -> list[ReplayMember]:
+        return list(self._members.values())
+
+    @property
+    def member_count(self) -> int:
+        return len(self._members)
+
+    def get_role(self, role_id: int) -> ReplayRole:
+        return self._roles.get(role_id)
+
+    def get_member(self, member_id: int) -> ReplayMember:
+        return self._members.get(member_id)
+
+    def get_or_create_role(
+        self, role_id: int, name: str = "", position: int = 0
+    ) -> ReplayRole:
+        role = self._roles.get(role_id)
+        if role is None:
+            role = self._roles[role_id] = ReplayRole(role_id, name, position, self)
+
+        return role
+
+    def remove_role(self, role_id: int) -> ReplayRole:
+        role = self._roles.pop(role_id, None)
+
+        # discord takes a deleted role away from every member
+        if role is not None:
+            for member in self._members.values():
+                if role in member.roles:
+                    member.roles.remove(role)
+
+        return role
+
+    def update_member(
+        self, member_id: int, role_ids: list[int], bot: bool, is_supporter: bool
+    ) -> ReplayMember:
+        """
+        Sets the roles of a member, adding the member if it is not known yet.
+        """
+        roles = [self.get_or_create_role(role_id) for role_id in role_ids]
+
+        member = self._members.get(member_id)
+        if member is None:
+            member = self._members[member_id] = ReplayMember(
+                member_id, self, roles, bot, is_supporter
+            )
+        else:
+            member.roles = roles
+            member.premium_since = True if is_supporter else None
+
+        return member
+
+
+class ReplayAvatar:
+    url: str = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class ReplayUser:
+    id: int = 0
+    display_avatar: ReplayAvatar = ReplayAvatar()
+
+
+class ReplayBot:
+    """
+    A stand in for DoseBot with the same role handling wiring, talking to replayed
+    guilds instead of discord. Like the bot, the validations only change roles when
+    live validation is on.
+    """
+
+    def __init__(
+        self,
+        recording_header: dict,
+        data_handler: DataHandler,
+        live_validation: bool = False,
+    ) -> None:
+        self.io: ReplayIO = ReplayIO()
+
+        self.production_server_id: int = recording_header["production_guild"]
+        self.development_server_id: int = recording_header["development_guild"]
+        self.is_loaded: bool = True
+        self.shard_count: int = None
+        self.user: ReplayUser = ReplayUser()
+
+        self.guild_map: dict[int, ReplayGuild] = {}
+        self.cogs: list = []
+
+        # the same role handling as the bot, against a temporary data folder
+        self.data_handler: DataHandler = data_handler
+        self.role_configuration_store: RoleConfigurationStore = RoleConfigurationStore(
+            self, data_handler
+        )
+        self.role_handler: RoleHandler = RoleHandler(
+            self, live_validation=live_validation
+        )
+        self.validation_scheduler: ValidationScheduler = ValidationScheduler(
+            self.role_handler.validate_roles
+        )
+
+        # the listener tasks that are still running
+        self._listener_tasks: set[asyncio.Task] = set()
+        self.handler_seconds: dict[str, list[float]] = {}
+
+    @property
+    def guilds(self) -> list[ReplayGuild]:
+        return list(self.guild_map.values())
+
+    def get_guild(self, guild_id: int) -> ReplayGuild:
+        return self.guild_map.get(guild_id)
+
+    def get_channel(self, channel_id: int) -> ReplayChannel:
+        return ReplayChannel(channel_id, self.io)
+
+    def get_shard_id(self, guild: ReplayGuild) -> int:
+        return 0
+
+    def get_shard_latencies(self) -> dict[int, float]:
+        return {0: 0.0}
+
+    async def add_cog(self, cog, **kwargs) -> None:
+        result = cog.cog_load()
+        if inspect.isawaitable(result):
+            await result
+
+        self.cogs.append(cog)
+
+    async def load_cogs(self, cog_names: tuple[str, ...]) -> None:
+        for cog_name in cog_names:
+            await importlib.import_module(f"bot.cogs.{cog_name}").setup(self)
+
+    def dispatch(self, event_name: str, *args) -> None:
+        """
+        Runs every cog listener of the event as its own task, like discord does.
+        """
+        for cog in self.cogs:
+            for listener_name, listener in cog.get_listeners():
+                if listener_name != f"on_{event_name}":
+                    continue
+
+                task = asyncio.get_running_loop().create_task(
+                    self._run_listener(event_name, listener, args)
+                )
+                self._listener_tasks.add(task)
+                task.add_done_callback(self._listener_tasks.discard)
+
+    async def _run_listener(self, event_name: str, listener, args: tuple) -> None:
+        start = perf_counter()
+        try:
+            await listener(*args)
+        finally:
+            self.handler_seconds.setdefault(event_name, []).append(
+                perf_counter() - start
+            )
+
+    async def wait_until_idle(self) -> None:
+        """
+        Waits until every listener finished and the validation queues are empty.
+        """
+        while True:
+            if self._listener_tasks:
+                await asyncio.gather(*self._listener_tasks, return_exceptions=True)
+                continue
+
+            stats = self.validation_scheduler.get_stats()
+            queue_depths = [
+                priority_stats["depth"]
+                for priority_stats in stats["priorities"].values()
+            ]
+            if not any((stats["running"], stats["deferred"], *queue_depths)):
+                return None
+
+            await asyncio.sleep(0.01)
+
+
+class ReplayMessage:
+    __slots__ = ("guild", "channel", "author", "content")
+
+    def __init__(
+        self,
+        guild: ReplayGuild,
+        channel: ReplayChannel,
+        author: ReplayMember,
+        content_length: int,
+    ) -> None:
+        self.guild: ReplayGuild = guild
+        self.channel: ReplayChannel = channel
+        self.author: ReplayMember = author
+        # only the length of the content was recorded
+        self.content: str = "x" * content_length
+
+
+class EventReplayer:
+    """
+    Feeds a recording back into the cogs and the role handler, at the recorded pace, a
+    multiple of it, or as fast as possible.
+
+    Attributes
+    ----------
+    bot : ReplayBot
+        The replayed bot, with the replayed guilds.
+    speed : float
+        How much faster than recorded to replay, 0 replays as fast as possible.
+    validate : bool
+        Whether every member event is also submitted for validation directly, so the
+        role handler is exercised even when the cogs filter the event out.
+    """
+
+    def __init__(
+        self, bot: ReplayBot, speed: float = 1.0, validate: bool = False
+    ) -> None:
+        self.bot: ReplayBot = bot
+        self.speed: float = speed
+        self.validate: bool = validate
+
+        self.event_counts: Counter = Counter()
+        self.max_lag: float = 0.0
+
+    def load_guild(self, payload: dict) -> ReplayGuild:
+        """
+        Rebuilds a guild from its record, its role rules are written to the
+        temporary data folder.
+        """
+        guild = self.bot.guild_map[payload["g"]] = ReplayGuild(
+            payload["g"], self.bot.io
+        )
+
+        for role_id, name, position in payload["roles"]:
+            guild.get_or_create_role(role_id, name, position)
+
+        for member_id, role_ids, bot, is_supporter in payload["members"]:
+            guild.update_member(member_id, role_ids, bool(bot), bool(is_supporter))
+
+        configuration_folder = get_guild_configuration_folder(
+            self.bot.data_handler, guild.id
+        )
+        file_path = f"{configuration_folder.path}/{ROLE_CONFIGURATION_FILE_NAME}"
+        with open(file_path, "w") as file:
+            json.dump(payload["rules"], file)
+
+        return guild
+
+    async def apply(self, event_name: str, payload: dict) -> None:
+        """
+        Applies a recorded event to the replayed guild and dispatches it.
+        """
+        if event_name == "guild":
+            self.load_guild(payload)
+            return None
+
+        guild = self.bot.get_guild(payload["g"])
+        if guild is None:
+            return None
+
+        self.event_counts[event_name] += 1
+
+        # like the recorder, every event has its own method
+        await getattr(self, f"_apply_{event_name}")(guild, payload)
+
+        return None
+
+    async def _apply_message(self, guild: ReplayGuild, payload: dict) -> None:
+        author = guild.update_member(
+            payload["a"], payload["r"], bool(payload["b"]), bool(payload["p"])
+        )
+        channel = ReplayChannel(payload["c"], self.bot.io)
+        message = ReplayMessage(guild, channel, author, payload["l"])
+        self.bot.dispatch("message", message)
+        await self._validate(author)
+
+    async def _apply_member_update(self, guild: ReplayGuild, payload: dict) -> None:
+        before = guild.get_member(payload["m"])
+        before = before.copy() if before is not None else None
+        after = guild.update_member(
+            payload["m"], payload["r"], False, bool(payload["p"])
+        )
+        self.bot.dispatch("member_update", before or after, after)
+        await self._validate(after)
+
+    async def _apply_guild_role_create(
+        self, guild: ReplayGuild, payload: dict
+    ) -> None:
+        role = guild.get_or_create_role(payload["r"], payload["n"], payload["o"])
+        self.bot.dispatch("guild_role_create", role)
+
+    async def _apply_guild_role_update(
+        self, guild: ReplayGuild, payload: dict
+    ) -> None:
+        role = guild.get_or_create_role(payload["r"], payload["n"], payload["o"])
+        before = role.copy()
+        role.name, role.position = payload["n"], payload["o"]
+        self.bot.dispatch("guild_role_update", before, role)
+
+    async def _apply_guild_role_delete(
+        self, guild: ReplayGuild, payload: dict
+    ) -> None:
+        role = guild.remove_role(payload["r"])
+        if role is None:
+            role = ReplayRole(payload["r"], payload["n"], payload["o"], guild)
+        self.bot.dispatch("guild_role_delete", role)
+
+    async def _validate(self, member: ReplayMember) -> None:
+        if self.validate and not member.bot:
+            await self.bot.validation_scheduler.submit(member, ValidationPriority.EVENT)
+
+    async def replay(self, records: Iterator[tuple[float, str, dict]]) -> None:
+        start = perf_counter()
+
+        for offset, event_name, payload in records:
+            if self.speed > 0:
+                # wait for the moment the event happened, scaled by the speed
+                delay = start + offset / self.speed - perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            else:
+                # as fast as possible, but give the listeners a chance to run
+                await asyncio.sleep(0)
+
+            await self.apply(event_name, payload)
+
+        await self.bot.wait_until_idle()
+
+
+async def replay_recording(
+    recording_path: str,
+    speed: float = 1.0,
+    cog_names: tuple[str, ...] = DEFAULT_REPLAY_COGS,
+    validate: bool = False,
+    live_validation: bool = False,
+) -> dict:
+    """
+    Replays a recording against the cogs and the role handler, with stubbed discord I/O
+    and a temporary data folder.
+
+    Parameters
+    ----------
+    recording_path : str
+        The path of the recording.
+    speed : float, optional
+        How much faster than recorded to replay, 0 replays as fast as possible.
+    cog_names : tuple of str, optional
+        The cogs to load and dispatch the events to.
+    validate : bool, optional
+        Whether every member event is also submitted for validation directly.
+    live_validation : bool, optional
+        Whether the validations change the roles of the replayed members.
+
+    Returns
+    -------
+    dict
+        The amount of events per type, the time taken, how far the replay fell behind,
+        the time spent in the listeners per event, the discord requests that would have
+        been made and the validation scheduler stats.
+    """
+    records = read_recording(recording_path)
+
+    _, event_name, header = next(records)
+    if event_name != "recording" or header.get("format") != RECORDING_FORMAT_VERSION:
+        raise ValueError(f"'{recording_path}' is not a recording this replay can read.")
+
+    with tempfile.TemporaryDirectory() as data_path:
+        bot = ReplayBot(header, DataHandler(data_path), live_validation)
+        await bot.load_cogs(cog_names)
+        await bot.validation_scheduler.start()
+
+        replayer = EventReplayer(bot, speed, validate)
+
+        start = perf_counter()
+        try:
+            await replayer.replay(records)
+        finally:
+            bot.validation_scheduler.stop()
+        seconds = perf_counter() - start
+
+    event_count = sum(replayer.event_counts.values())
+
+    return {
+        "events": dict(replayer.event_counts),
+        "seconds": seconds,
+        "events_per_second": event_count / seconds if seconds else 0.0,
+        "max_lag": replayer.max_lag,
+        "handlers": {
+            event_name: {
+                "count": len(samples), "total": sum(samples), "max": max(samples)
+            }
+            for event_name, samples in bot.handler_seconds.items()
+        },
+        "requests": dict(bot.io.counts),
+        "validation": bot.validation_scheduler.get_stats(),
+    }
+
+
+def format_replay_report(report: dict) -> str:
+    """
+    Formats a replay report as a few lines of text.
+    """
+    lines = [
+        f"{sum(report['events'].values())} events in {report['seconds']:.3f}s "
+        f"({report['events_per_second']:.0f}/s, "
+        f"fell behind by at most {report['max_lag']:.3f}s)",
+    ]
+
+    for event_name, count in sorted(report["events"].items()):
+        handler_stats = report["handlers"].get(event_name)
+        handler_text = ""
+        if handler_stats:
+            handler_text = (
+                f", listeners {handler_stats['total']:.3f}s total, "
+                f"{handler_stats['max'] * 1000:.1f}ms max"
+            )
+        lines.append(f"  {event_name:<20}{count:>8}{handler_text}")
+
+    validation = report["validation"]
+    lines.append(
+        f"validations: {validation['completed']} completed, "
+        f"{validation['failed']} failed, {validation['deduplicated']} deduplicated"
+    )
+    lines.append(f"requests: {report['requests'] or 'none'}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Replays a recording of gateway events against the cogs and the role "
+            "handler."
+        )
+    )
+    parser.add_argument(
+        "recording", help="The recording to replay, from the recordings data folder."
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="How much faster than recorded to replay, 0 for as fast as possible.",
+    )
+    parser.add_argument(
+        "--cogs",
+        nargs="*",
+        default=list(DEFAULT_REPLAY_COGS),
+        help="The cogs to dispatch the events to.",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Also submit every member event for validation directly.",
+    )
+    parser.add_argument(
+        "--live-validation",
+        action="store_true",
+        help="Let the validations change the roles of the replayed members.",
+    )
+    arguments = parser.parse_args()
+
+    print(format_replay_report(asyncio.run(
+        replay_recording(
+            arguments.recording,
+            arguments.speed,
+            tuple(arguments.cogs),
+            arguments.validate,
+            arguments.live_validation,
+        )
+    )))
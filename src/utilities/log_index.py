@@ -0,0 +1,277 @@
+import json
+import mmap
+import re
+import zlib
+
+from os import path, remove, rename
+from typing import Iterable, Iterator
+
+# the sidecar index of "2024-01-01.log.gz" is "2024-01-01.log.gz.idx"
+INDEX_EXTENSION: str = ".idx"
+# bumped when the layout of the index changes, older indexes are ignored and rebuilt
+INDEX_FORMAT_VERSION: int = 1
+
+# how many bytes of log lines go into a block, a search reads whole blocks
+DEFAULT_BLOCK_SIZE: int = 64 * 1024
+
+# words and IDs are indexed, short words and short numbers (times, counts) are too
+# common to help
+TOKEN_PATTERN: re.Pattern = re.compile(rb"\w{3,}")
+# discord IDs are the only numbers worth indexing
+MIN_INDEXED_NUMBER_LENGTH: int = 15
+
+# wbits for zlib to read and write gzip members
+GZIP_WBITS: int = 16 + zlib.MAX_WBITS
+
+
+def get_index_path(file_path: str) -> str:
+    """
+    Gets the path of the sidecar index of a log file.
+    """
+    return f"{file_path}{INDEX_EXTENSION}"
+
+
+def tokenize(text: bytes) -> set[str]:
+    """
+    Gets the indexed tokens of some text, lowercased.
+
+    Parameters
+    ----------
+    text : bytes
+        The utf-8 encoded text.
+
+    Returns
+    -------
+    set of str
+        The words of at least three characters and the numbers that look
+        like discord IDs.
+    """
+    return {
+        token.decode("utf-8", "replace")
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if not token.isdigit() or len(token) >= MIN_INDEXED_NUMBER_LENGTH
+    }
+
+
+class LogIndex:
+    """
+    The sidecar index of a log file.
+
+    The lines of the file are grouped into blocks of about DEFAULT_BLOCK_SIZE bytes. The
+    index keeps where every block is in the file and which blocks every token appears
+    in, so a search only reads the blocks that can contain a match. In a compressed
+    archive every block is its own gzip member, so a block can be decompressed without
+    reading anything before it, while the archive still reads like any other gzip file.
+
+    Attributes
+    ----------
+    compressed : bool
+        Whether the blocks are gzip members.
+    blocks : list of tuple of int
+        The byte offset and length of every block in the file.
+    terms : dict of str to list of int
+        The blocks every token appears in.
+    """
+
+    __slots__ = ("compressed", "blocks", "terms")
+
+    def __init__(
+        self,
+        compressed: bool,
+        blocks: list[tuple[int, int]],
+        terms: dict[str, list[int]],
+    ) -> None:
+        self.compressed: bool = compressed
+        self.blocks: list[tuple[int, int]] = blocks
+        self.terms: dict[str, list[int]] = terms
+
+    @classmethod
+    def load(cls, index_path: str) -> "LogIndex":
+        """
+        Loads an index, None if it does not exist or was written by another version.
+        """
+        if not path.isfile(index_path):
+            return None
+
+        try:
+            with open(index_path, "r", encoding="utf-8") as file:
+                index_json = json.load(file)
+        except ValueError:
+            return None
+
+        if index_json.get("format") != INDEX_FORMAT_VERSION:
+            return None
+
+        blocks = [tuple(block) for block in index_json["blocks"]]
+        return cls(index_json["compressed"], blocks, index_json["terms"])
+
+    def save(self, index_path: str) -> None:
+        # written next to the index first, so a search never loads a half written index
+        temporary_index_path = f"{index_path}.tmp"
+        with open(temporary_index_path, "w", encoding="utf-8") as file:
+            json.dump({
+                "format": INDEX_FORMAT_VERSION,
+                "compressed": self.compressed,
+                "blocks": self.blocks,
+                "terms": self.terms,
+            }, file, separators=(",", ":"))
+
+        rename(temporary_index_path, index_path)
+
+    def find_blocks(self, tokens: Iterable[str]) -> list[int]:
+        """
+        Gets the blocks that contain every token.
+
+        Parameters
+        ----------
+        tokens : Iterable of str
+            The tokens of the query, see tokenize. Without tokens every
+            block is returned.
+
+        Returns
+        -------
+        list of int
+            The matching blocks, in file order.
+        """
+        matching_blocks: set[int] = None
+        for token in tokens:
+            token_blocks = self.terms.get(token)
+            if not token_blocks:
+                return []
+
+            if matching_blocks is None:
+                matching_blocks = set(token_blocks)
+            else:
+                matching_blocks.intersection_update(token_blocks)
+
+        if matching_blocks is None:
+            return list(range(len(self.blocks)))
+
+        return sorted(matching_blocks)
+
+    def read_block(self, mapped_file: mmap.mmap, block: int) -> bytes:
+        """
+        Reads the lines of a block from the memory mapped log file.
+        """
+        offset, length = self.blocks[block]
+        data = mapped_file[offset:offset + length]
+
+        return zlib.decompress(data, GZIP_WBITS) if self.compressed else data
+
+
+class _IndexBuilder:
+    """
+    Collects the blocks and tokens while a log file is written or read.
+    """
+
+    def __init__(self, compressed: bool) -> None:
+        self.index: LogIndex = LogIndex(compressed, [], {})
+        self._block_tokens: set[str] = set()
+
+    def add_block(self, offset: int, length: int, lines: bytes) -> None:
+        block = len(self.index.blocks)
+        self.index.blocks.append((offset, length))
+
+        for token in tokenize(lines):
+            self.index.terms.setdefault(token, []).append(block)
+
+
+def _read_line_blocks(file, block_size: int) -> Iterator[bytes]:
+    """
+    Reads a file in blocks of whole lines of about block_size bytes.
+    """
+    lines: list[bytes] = []
+    size = 0
+    for line in file:
+        lines.append(line)
+        size += len(line)
+
+        if size >= block_size:
+            yield b"".join(lines)
+            lines = []
+            size = 0
+
+    if lines:
+        yield b"".join(lines)
+
+
+def compress_and_index_log_file(
+    file_path: str, block_size: int = DEFAULT_BLOCK_SIZE
+) -> str:
+    """
+    Compresses a log file into an archive of independent gzip blocks and writes its
+    sidecar index, then removes the uncompressed file.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the log file to compress.
+    block_size : int, optional
+        How many bytes of lines go into a block.
+
+    Returns
+    -------
+    str
+        The path of the compressed log file.
+    """
+    compressed_file_path = f"{file_path}.gz"
+    index_builder = _IndexBuilder(compressed=True)
+
+    # write to a temporary file first so a crash never leaves a half written
+    # archive behind
+    temporary_file_path = f"{compressed_file_path}.tmp"
+    with open(file_path, "rb") as log_file:
+        with open(temporary_file_path, "wb") as compressed_file:
+            for lines in _read_line_blocks(log_file, block_size):
+                compressor = zlib.compressobj(wbits=GZIP_WBITS)
+                compressed_block = compressor.compress(lines) + compressor.flush()
+
+                index_builder.add_block(
+                    compressed_file.tell(), len(compressed_block), lines
+                )
+                compressed_file.write(compressed_block)
+
+    index_builder.index.save(get_index_path(compressed_file_path))
+
+    rename(temporary_file_path, compressed_file_path)
+    remove(file_path)
+
+    return compressed_file_path
+
+
+def index_log_file(file_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> LogIndex:
+    """
+    Writes the sidecar index of an uncompressed log file.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the log file.
+    block_size : int, optional
+        How many bytes of lines go into a block.
+
+    Returns
+    -------
+    LogIndex
+        The written index.
+    """
+    index_builder = _IndexBuilder(compressed=False)
+
+    offset = 0
+    with open(file_path, "rb") as log_file:
+        for lines in _read_line_blocks(log_file, block_size):
+            index_builder.add_block(offset, len(lines), lines)
+            offset += len(lines)
+
+    index_builder.index.save(get_index_path(file_path))
+
+    return index_builder.index
+
+
+def remove_index(file_path: str) -> None:
+    """
+    Removes the sidecar index of a log file, if it has one.
+    """
+    index_path = get_index_path(file_path)
+    if path.isfile(index_path):
+        remove(index_path)
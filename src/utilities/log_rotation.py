@@ -0,0 +1,359 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import traceback
+
+from os import path, listdir, remove, rename, stat
+
+from .log_index import compress_and_index_log_file, remove_index
+
+# how long rotated log files are kept for, in days
+DEFAULT_RETENTION_DAYS: int = 30
+# how much disk space the rotated log files of a single logger may take up, in bytes
+DEFAULT_RETENTION_BYTES: int = 256 * 1024 * 1024
+# the size at which the log file is rotated early, 0 disables size based rotation
+DEFAULT_MAX_BYTES: int = 0
+
+LATEST_LOG_FILE_NAME: str = "latest.log"
+ROTATED_LOG_EXTENSION: str = ".log"
+COMPRESSED_LOG_EXTENSION: str = ".log.gz"
+
+# per logger rotation settings, loggers that are not listed here use the defaults
+LOG_ROTATION_CONFIGURATION: dict[str, dict] = {
+    "role": {"max_bytes": 50 * 1024 * 1024},
+    "cogs": {"max_bytes": 50 * 1024 * 1024},
+}
+
+
+def get_rotation_configuration(logger_name: str) -> dict:
+    """
+    Gets the rotation settings for a logger.
+
+    Parameters
+    ----------
+    logger_name : str
+        The name of the logger.
+
+    Returns
+    -------
+    dict
+        The max_bytes, retention_days and retention_bytes settings for the logger.
+    """
+    configuration = {
+        "max_bytes": DEFAULT_MAX_BYTES,
+        "retention_days": DEFAULT_RETENTION_DAYS,
+        "retention_bytes": DEFAULT_RETENTION_BYTES,
+    }
+    configuration.update(LOG_ROTATION_CONFIGURATION.get(logger_name, {}))
+
+    return configuration
+
+
+def is_rotated_log_file(file_name: str) -> bool:
+    """
+    Checks if a file is a rotated (not the latest) log file.
+    """
+    return file_name != LATEST_LOG_FILE_NAME and file_name.endswith(
+        (ROTATED_LOG_EXTENSION, COMPRESSED_LOG_EXTENSION)
+    )
+
+
+class LogArchiver:
+    """
+    Compresses rotated log files and enforces the retention settings on a background
+    thread, so the logging call that triggered the rollover is never blocked by it.
+
+    This is not meant to be manually initialized.
+    Use the get_log_archiver function instead.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the log archiver and starts its thread.
+        """
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="log-archiver", daemon=True
+        )
+        self._thread.start()
+
+    def submit_rotated_file(
+        self, file_path: str, retention_days: int, retention_bytes: int
+    ) -> None:
+        """
+        Queues a freshly rotated log file to be compressed, followed by a retention pass
+        over its folder.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the rotated log file.
+        retention_days : int
+            How long rotated log files are kept for, in days.
+        retention_bytes : int
+            How much disk space the rotated log files in the folder may take up.
+        """
+        self._jobs.put(
+            (file_path, path.dirname(file_path), retention_days, retention_bytes)
+        )
+
+    def submit_folder_cleanup(
+        self, folder_path: str, retention_days: int, retention_bytes: int
+    ) -> None:
+        """
+        Queues a retention pass over a log folder, compressing any rotated log files
+        that were left uncompressed.
+
+        Parameters
+        ----------
+        folder_path : str
+            The path of the log folder.
+        retention_days : int
+            How long rotated log files are kept for, in days.
+        retention_bytes : int
+            How much disk space the rotated log files in the folder may take up.
+        """
+        self._jobs.put((None, folder_path, retention_days, retention_bytes))
+
+    def wait_until_idle(self) -> None:
+        """
+        Blocks until all of the queued jobs are done.
+        """
+        self._jobs.join()
+
+    def _run(self) -> None:
+        while True:
+            file_path, folder_path, retention_days, retention_bytes = self._jobs.get()
+
+            try:
+                if file_path is not None:
+                    compress_log_file(file_path)
+                else:
+                    compress_leftover_log_files(folder_path)
+
+                apply_retention(folder_path, retention_days, retention_bytes)
+            except Exception:
+                # the logging system is what failed, report it like Handler.handleError
+                report_archive_error(folder_path)
+            finally:
+                self._jobs.task_done()
+
+
+def report_archive_error(folder_path: str) -> None:
+    """
+    Writes the error that is being handled to stderr, the same way a logging handler
+    reports its own errors, silent when logging.raiseExceptions is turned off.
+
+    Parameters
+    ----------
+    folder_path : str
+        The path of the log folder that failed to be archived.
+    """
+    if not logging.raiseExceptions or sys.stderr is None:
+        return None
+
+    try:
+        sys.stderr.write("--- Logging error ---\n")
+        sys.stderr.write(f"Failed to archive logs in '{folder_path}'\n")
+        traceback.print_exc(file=sys.stderr)
+    except OSError:
+        # stderr is gone as well, there is nowhere left to report to
+        pass
+
+    return None
+
+
+def compress_log_file(file_path: str) -> str:
+    """
+    Compresses a log file with gzip, writes its sidecar search index and removes the
+    uncompressed file.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the log file to compress.
+
+    Returns
+    -------
+    str
+        The path of the compressed log file.
+    """
+    # compressed in independent blocks, so a search
+    # can decompress only the blocks it needs
+    compressed_file_path = compress_and_index_log_file(file_path)
+
+    # an uncompressed file can have been indexed by a search before it was compressed
+    remove_index(file_path)
+
+    return compressed_file_path
+
+
+def compress_leftover_log_files(folder_path: str) -> None:
+    """
+    Compresses every rotated log file in a folder that is not compressed yet.
+    """
+    for file_name in listdir(folder_path):
+        if is_rotated_log_file(file_name) and file_name.endswith(ROTATED_LOG_EXTENSION):
+            compress_log_file(path.join(folder_path, file_name))
+
+
+def apply_retention(
+    folder_path: str, retention_days: int, retention_bytes: int
+) -> list[str]:
+    """
+    Deletes rotated log files that are too old, then the oldest rotated log files until
+    the folder is within its size budget.
+
+    Parameters
+    ----------
+    folder_path : str
+        The path of the log folder.
+    retention_days : int
+        How long rotated log files are kept for, in days. 0 or less keeps them forever.
+    retention_bytes : int
+        How much disk space the rotated log files may take up. 0 or less is unlimited.
+
+    Returns
+    -------
+    list of str
+        The paths of the deleted files.
+    """
+    # get every rotated log file with its modification time and size, oldest first
+    rotated_files: list[tuple[float, int, str]] = []
+    for file_name in listdir(folder_path):
+        if not is_rotated_log_file(file_name):
+            continue
+
+        file_path = path.join(folder_path, file_name)
+        file_stat = stat(file_path)
+        rotated_files.append((file_stat.st_mtime, file_stat.st_size, file_path))
+
+    rotated_files.sort()
+
+    deleted_files: list[str] = []
+    oldest_allowed_time = time.time() - retention_days * 86400
+    total_size = sum(file_size for _, file_size, _ in rotated_files)
+
+    for modified_time, file_size, file_path in rotated_files:
+        too_old = retention_days > 0 and modified_time < oldest_allowed_time
+        too_big = retention_bytes > 0 and total_size > retention_bytes
+
+        if not too_old and not too_big:
+            # the files are sorted from old to new, so the rest is within the budget
+            break
+
+        remove(file_path)
+        remove_index(file_path)
+        deleted_files.append(file_path)
+        total_size -= file_size
+
+    return deleted_files
+
+
+class ArchivingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    A file handler that rotates at midnight and optionally when the file grows too big.
+    Rotated files are named after their date and handed to the log archiver, which
+    compresses them and enforces the retention settings in the background.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+        retention_bytes: int = DEFAULT_RETENTION_BYTES,
+    ) -> None:
+        """
+        Initializes the file handler.
+
+        Parameters
+        ----------
+        folder_path : str
+            The path of the folder the log files are written to.
+        max_bytes : int, optional
+            The size at which the log file is rotated early, 0 disables it.
+        retention_days : int, optional
+            How long rotated log files are kept for, in days.
+        retention_bytes : int, optional
+            How much disk space the rotated log files may take up.
+        """
+        super().__init__(
+            filename=path.join(folder_path, LATEST_LOG_FILE_NAME),
+            when="midnight",
+            encoding="utf-8",
+        )
+        self.suffix = "%Y-%m-%d"
+
+        self.folder_path: str = folder_path
+        self.max_bytes: int = max_bytes
+        self.retention_days: int = retention_days
+        self.retention_bytes: int = retention_bytes
+
+        # clean up whatever was left behind by a previous run
+        get_log_archiver().submit_folder_cleanup(
+            folder_path, retention_days, retention_bytes
+        )
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+
+        if self.max_bytes <= 0 or self.stream is None:
+            return False
+
+        return self.stream.tell() >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        # turn "latest.log.YYYY-MM-DD" into
+        # "YYYY-MM-DD.log", numbering size based rotations
+        date = default_name.rsplit(".", 1)[-1]
+
+        rotated_file_path = path.join(
+            self.folder_path, f"{date}{ROTATED_LOG_EXTENSION}"
+        )
+        rotation_number = 0
+        while path.exists(rotated_file_path) or path.exists(f"{rotated_file_path}.gz"):
+            rotation_number += 1
+            rotated_file_path = path.join(
+                self.folder_path, f"{date}.{rotation_number}{ROTATED_LOG_EXTENSION}"
+            )
+
+        return rotated_file_path
+
+    def rotate(self, source: str, dest: str) -> None:
+        if not path.exists(source):
+            return None
+
+        # renaming is cheap, the compression happens on the archiver thread
+        rename(source, dest)
+        get_log_archiver().submit_rotated_file(
+            dest, self.retention_days, self.retention_bytes
+        )
+
+        return None
+
+
+main_log_archiver: LogArchiver = None
+_log_archiver_lock = threading.Lock()
+
+
+def get_log_archiver() -> LogArchiver:
+    """
+    Gets the main log archiver for the project.
+
+    Returns
+    -------
+    LogArchiver
+        The main log archiver for the project.
+    """
+    global main_log_archiver
+
+    with _log_archiver_lock:
+        if main_log_archiver is None:
+            main_log_archiver = LogArchiver()
+
+    return main_log_archiver
@@ -0,0 +1,309 @@
+import logging
+import threading
+
+from collections import OrderedDict
+from time import monotonic
+
+from .structured_logging import EVENT_ATTRIBUTE, FIELDS_ATTRIBUTE
+
+# the event of the summary records, the summaries themselves are never limited
+SUPPRESSED_EVENT: str = "log.suppressed"
+# marks a record that the filter wrote itself
+SUMMARY_ATTRIBUTE: str = "is_suppression_summary"
+
+# how many records a call site can log per second once its burst is used up,
+# 0 is unlimited
+DEFAULT_RATE: float = 0
+# how many records a call site can log at once
+DEFAULT_BURST: int = 0
+# how often the suppressed counts are written as summaries, in seconds
+DEFAULT_SUMMARY_INTERVAL: float = 60.0
+# records above this level are never sampled or limited
+DEFAULT_MAX_LEVEL: int = logging.INFO
+# how many call sites are tracked per logger, the least recently used one is
+# dropped first
+MAX_TRACKED_CALL_SITES: int = 1024
+
+# per logger sampling settings, loggers that are not listed here are not limited
+LOG_SAMPLING_CONFIGURATION: dict[str, dict] = {
+    "role": {
+        "rate": 20,
+        "burst": 200,
+        # every validation logs a start and a finish line per check, keep a
+        # sample of them
+        "sample_every": {
+            "validation.start": 10,
+            "validation.finish": 10,
+            "validation.unchanged": 50,
+            "check.skipped": 50,
+            "supporter_check.start": 50,
+            "supporter_check.finish": 50,
+            "required_check.start": 50,
+            "required_check.finish": 50,
+            "rule_check.start": 50,
+            "rule_check.finish": 50,
+            "grant_check.start": 50,
+            "grant_check.finish": 50,
+        },
+    },
+    "cogs": {
+        "rate": 10,
+        "burst": 100,
+        "sample_every": {"message.received": 10},
+    },
+    "bot": {"rate": 50, "burst": 500},
+}
+
+
+def get_sampling_configuration(logger_name: str) -> dict:
+    """
+    Gets the sampling settings for a logger.
+
+    Parameters
+    ----------
+    logger_name : str
+        The name of the logger.
+
+    Returns
+    -------
+    dict
+        The rate, burst, sample_every, summary_interval and max_level settings for the
+        logger, None if the logger is not limited.
+    """
+    if logger_name not in LOG_SAMPLING_CONFIGURATION:
+        return None
+
+    configuration = {
+        "rate": DEFAULT_RATE,
+        "burst": DEFAULT_BURST,
+        "sample_every": {},
+        "summary_interval": DEFAULT_SUMMARY_INTERVAL,
+        "max_level": DEFAULT_MAX_LEVEL,
+    }
+    configuration.update(LOG_SAMPLING_CONFIGURATION[logger_name])
+
+    return configuration
+
+
+def get_call_site(record: logging.LogRecord) -> str:
+    """
+    Gets what identifies the line that logged a record: the event of a structured
+    record, the unformatted message of any other record.
+    """
+    event = getattr(record, EVENT_ATTRIBUTE, None)
+    if event is not None:
+        return event
+
+    return str(record.msg)
+
+
+class CallSiteState:
+    """
+    The token bucket, sample counter and suppressed count of a single call site.
+    """
+
+    __slots__ = ("tokens", "updated_at", "seen", "suppressed", "suppressed_level")
+
+    def __init__(self, burst: int, now: float) -> None:
+        self.tokens: float = burst
+        self.updated_at: float = now
+        self.seen: int = 0
+        self.suppressed: int = 0
+        self.suppressed_level: int = logging.NOTSET
+
+
+class LogRateLimitFilter(logging.Filter):
+    """
+    Samples and rate limits the records of a logger per call site, before the records
+    reach any handler, so a busy call site costs no formatting and no disk writes.
+
+    A call site listed in sample_every only lets every n-th record through. Every call
+    site then has a token bucket that holds up to burst records and refills at rate
+    records per second. Records that are dropped are counted, and every summary
+    interval a "N similar messages suppressed" record is written per call site.
+    Warnings and errors are never dropped.
+
+    Attributes
+    ----------
+    logger : logging.Logger
+        The logger the filter is attached to, the summaries are written to it.
+    suppressed_count : int
+        How many records were dropped in total.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        sample_every: dict[str, int] = None,
+        summary_interval: float = DEFAULT_SUMMARY_INTERVAL,
+        max_level: int = DEFAULT_MAX_LEVEL,
+    ) -> None:
+        """
+        Initializes the filter.
+
+        Parameters
+        ----------
+        logger : logging.Logger
+            The logger the filter is attached to.
+        rate : float, optional
+            How many records a call site can log per second, 0 is unlimited.
+        burst : int, optional
+            How many records a call site can log at once.
+        sample_every : dict of str to int, optional
+            For some call sites, only every n-th record is kept.
+        summary_interval : float, optional
+            How often the suppressed counts are written, in seconds.
+        max_level : int, optional
+            Records above this level are never dropped.
+        """
+        super().__init__()
+
+        self.logger: logging.Logger = logger
+        self.rate: float = rate
+        self.burst: int = max(burst, 1)
+        self.sample_every: dict[str, int] = sample_every or {}
+        self.summary_interval: float = summary_interval
+        self.max_level: int = max_level
+
+        # records are logged from executor threads too
+        self._lock = threading.Lock()
+        self._call_sites: OrderedDict[str, CallSiteState] = OrderedDict()
+        self._next_summary_at: float = monotonic() + summary_interval
+
+        self.suppressed_count: int = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or getattr(record, SUMMARY_ATTRIBUTE, False):
+            return True
+
+        now = monotonic()
+        call_site = get_call_site(record)
+
+        with self._lock:
+            keep = self._should_keep(call_site, record.levelno, now)
+
+            summaries = None
+            if now >= self._next_summary_at:
+                summaries = self._take_summaries()
+                self._next_summary_at = now + self.summary_interval
+
+        # written outside of the lock, the handlers take their own locks
+        if summaries:
+            self._write_summaries(summaries)
+
+        return keep
+
+    def flush(self) -> None:
+        """
+        Writes the summaries of the records that were dropped since the last summary.
+        """
+        with self._lock:
+            summaries = self._take_summaries()
+            self._next_summary_at = monotonic() + self.summary_interval
+
+        self._write_summaries(summaries)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "call_sites": len(self._call_sites),
+                "suppressed": self.suppressed_count,
+                "pending": sum(state.suppressed for state in self._call_sites.values()),
+            }
+
+    def _should_keep(self, call_site: str, level: int, now: float) -> bool:
+        state = self._call_sites.get(call_site)
+        if state is None:
+            state = self._call_sites[call_site] = CallSiteState(self.burst, now)
+
+            # forget the quietest call site, its suppressed count goes with it
+            if len(self._call_sites) > MAX_TRACKED_CALL_SITES:
+                self._call_sites.popitem(last=False)
+        else:
+            self._call_sites.move_to_end(call_site)
+
+        state.seen += 1
+        keep = state.seen % self.sample_every.get(call_site, 1) == 0
+
+        if keep and self.rate > 0:
+            # refill the bucket for the time that passed, up to the burst
+            state.tokens = min(
+                self.burst, state.tokens + (now - state.updated_at) * self.rate
+            )
+            state.updated_at = now
+
+            keep = state.tokens >= 1
+            if keep:
+                state.tokens -= 1
+
+        if not keep:
+            state.suppressed += 1
+            state.suppressed_level = max(state.suppressed_level, level)
+            self.suppressed_count += 1
+
+        return keep
+
+    def _take_summaries(self) -> list[tuple[str, int, int]]:
+        summaries = []
+        for call_site, state in self._call_sites.items():
+            if state.suppressed:
+                summaries.append((call_site, state.suppressed, state.suppressed_level))
+                state.suppressed = 0
+                state.suppressed_level = logging.NOTSET
+
+        return summaries
+
+    def _write_summaries(self, summaries: list[tuple[str, int, int]]) -> None:
+        for call_site, suppressed, level in summaries:
+            record = self.logger.makeRecord(
+                self.logger.name,
+                level,
+                "(unknown file)",
+                0,
+                "%d similar messages suppressed: %s",
+                (suppressed, call_site),
+                None,
+                extra={
+                    EVENT_ATTRIBUTE: SUPPRESSED_EVENT,
+                    FIELDS_ATTRIBUTE: {
+                        "call_site": call_site, "suppressed": suppressed
+                    },
+                    SUMMARY_ATTRIBUTE: True,
+                },
+            )
+            self.logger.handle(record)
+
+
+main_log_rate_limit_filters: dict[str, LogRateLimitFilter] = {}
+
+
+def get_log_rate_limit_filter(logger: logging.Logger) -> LogRateLimitFilter:
+    """
+    Gets the rate limit filter of a logger, created the first time it is needed.
+
+    Returns
+    -------
+    LogRateLimitFilter
+        The filter, None if the logger is not limited.
+    """
+    if logger.name not in main_log_rate_limit_filters:
+        configuration = get_sampling_configuration(logger.name)
+        if configuration is None:
+            return None
+
+        main_log_rate_limit_filters[logger.name] = LogRateLimitFilter(
+            logger, **configuration
+        )
+
+    return main_log_rate_limit_filters[logger.name]
+
+
+def flush_suppressed_log_summaries() -> None:
+    """
+    Writes the pending summaries of every limited logger, so nothing goes
+    unreported on shutdown.
+    """
+    for log_rate_limit_filter in list(main_log_rate_limit_filters.values()):
+        log_rate_limit_filter.flush()
@@ -0,0 +1,413 @@
+import argparse
+import datetime
+import gzip
+import mmap
+import re
+import shutil
+
+from os import path, listdir, remove
+from typing import Iterator
+
+from utilities.log_index import (
+    LogIndex,
+    compress_and_index_log_file,
+    get_index_path,
+    tokenize,
+)
+from utilities.log_rotation import (
+    COMPRESSED_LOG_EXTENSION,
+    LATEST_LOG_FILE_NAME,
+    ROTATED_LOG_EXTENSION,
+)
+
+# how many matching lines a search returns at most
+DEFAULT_RESULT_LIMIT: int = 200
+
+DEFAULT_LOGS_FOLDER_PATH: str = path.join("data", "logs")
+
+
+def get_log_file_date(file_name: str) -> datetime.date:
+    """
+    Gets the day a log file is for, from names like "2024-01-01.log" and
+    "2024-01-01.2.log.gz".
+
+    Returns
+    -------
+    datetime.date
+        The day of the log file, today for the latest log file, None for other files.
+    """
+    if file_name == LATEST_LOG_FILE_NAME:
+        return datetime.date.today()
+
+    if not file_name.endswith((ROTATED_LOG_EXTENSION, COMPRESSED_LOG_EXTENSION)):
+        return None
+
+    try:
+        return datetime.date.fromisoformat(file_name[:10])
+    except ValueError:
+        return None
+
+
+def iter_log_files(
+    logs_folder_path: str,
+    logger_names: list[str] = None,
+    since: datetime.date = None,
+    until: datetime.date = None,
+) -> Iterator[tuple[str, str]]:
+    """
+    Gets the log files of the loggers within a date range, oldest first.
+
+    Parameters
+    ----------
+    logs_folder_path : str
+        The path of the logs folder, with a folder per logger.
+    logger_names : list of str, optional
+        The loggers to search, all of them by default.
+    since : datetime.date, optional
+        The first day to search.
+    until : datetime.date, optional
+        The last day to search.
+
+    Yields
+    ------
+    tuple of str
+        The name of the logger and the path of the log file.
+    """
+    for logger_name in sorted(logger_names or listdir(logs_folder_path)):
+        logger_folder_path = path.join(logs_folder_path, logger_name)
+        if not path.isdir(logger_folder_path):
+            continue
+
+        for file_name in get_dated_log_file_names(logger_folder_path, since, until):
+            yield logger_name, path.join(logger_folder_path, file_name)
+
+
+def get_dated_log_file_names(
+    logger_folder_path: str, since: datetime.date = None, until: datetime.date = None
+) -> list[str]:
+    """
+    Gets the names of the log files of a single logger within a date range, oldest
+    first.
+    """
+    since = since or datetime.date.min
+    until = until or datetime.date.max
+
+    dated_files: list[tuple[datetime.date, bool, str]] = []
+    for file_name in listdir(logger_folder_path):
+        file_date = get_log_file_date(file_name)
+        if file_date is None or not since <= file_date <= until:
+            continue
+
+        # the latest log file comes after the rotated files of today
+        dated_files.append((file_date, file_name == LATEST_LOG_FILE_NAME, file_name))
+
+    return [file_name for _, _, file_name in sorted(dated_files)]
+
+
+def find_matching_lines(data, pattern: re.Pattern) -> Iterator[bytes]:
+    """
+    Finds the lines that match a pattern, without splitting the data into lines first.
+
+    Parameters
+    ----------
+    data : bytes or mmap.mmap
+        The lines to search.
+    pattern : re.Pattern
+        The compiled bytes pattern.
+
+    Yields
+    ------
+    bytes
+        Every matching line once, without the line ending.
+    """
+    position = 0
+    while True:
+        match = pattern.search(data, position)
+        if match is None:
+            return None
+
+        line_start = data.rfind(b"\n", 0, match.start()) + 1
+        line_end = data.find(b"\n", match.end())
+        if line_end == -1:
+            line_end = len(data)
+
+        yield data[line_start:line_end].rstrip(b"\r")
+
+        # a line is returned once, no matter how often it matches
+        position = line_end + 1
+
+
+class LogSearch:
+    """
+    Searches the log files for a member ID, a role name or any other text.
+
+    Compressed archives that have a sidecar index (see utilities.log_index) are memory
+    mapped and only the blocks that contain every word of the query are decompressed
+    and scanned. Files without an index (the latest log file, uncompressed rotated
+    files and archives from before indexing) are scanned in full.
+
+    Matching is case insensitive. The index only knows whole words, so the words of the
+    query have to be whole words (or whole IDs) too for an indexed archive to match.
+
+    Attributes
+    ----------
+    query : str
+        The text to search for.
+    files_searched : int
+        How many log files were searched.
+    blocks_read : int
+        How many blocks of indexed archives were read.
+    blocks_skipped : int
+        How many blocks of indexed archives the index ruled out.
+    """
+
+    def __init__(self, query: str) -> None:
+        """
+        Initializes the search.
+
+        Parameters
+        ----------
+        query : str
+            The text to search for.
+        """
+        if not query.strip():
+            raise ValueError("query must not be empty.")
+
+        self.query: str = query
+
+        encoded_query = query.encode("utf-8")
+        self._pattern: re.Pattern = re.compile(re.escape(encoded_query), re.IGNORECASE)
+        self._tokens: set[str] = tokenize(encoded_query)
+
+        self.files_searched: int = 0
+        self.blocks_read: int = 0
+        self.blocks_skipped: int = 0
+
+    def search_file(self, file_path: str) -> Iterator[str]:
+        """
+        Searches a single log file.
+
+        Yields
+        ------
+        str
+            The matching lines, in file order.
+        """
+        self.files_searched += 1
+
+        # mmap can not map an empty file
+        if path.getsize(file_path) == 0:
+            return None
+
+        index = None
+        if file_path.endswith(COMPRESSED_LOG_EXTENSION):
+            index = LogIndex.load(get_index_path(file_path))
+
+            if index is None:
+                # an archive from before indexing has to be decompressed as a whole
+                with gzip.open(file_path, "rb") as file:
+                    yield from self._search_data(file.read())
+
+                return None
+
+        with open(file_path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                yield from self._search_mapped_file(mapped_file, index)
+
+        return None
+
+    def _search_mapped_file(
+        self, mapped_file: mmap.mmap, index: LogIndex
+    ) -> Iterator[str]:
+        if index is None:
+            yield from self._search_data(mapped_file)
+            return None
+
+        blocks = index.find_blocks(self._tokens)
+        self.blocks_read += len(blocks)
+        self.blocks_skipped += len(index.blocks) - len(blocks)
+
+        for block in blocks:
+            yield from self._search_data(index.read_block(mapped_file, block))
+
+    def _search_data(self, data) -> Iterator[str]:
+        for line in find_matching_lines(data, self._pattern):
+            yield line.decode("utf-8", "replace")
+
+
+def search_logs(
+    logs_folder_path: str,
+    query: str,
+    logger_names: list[str] = None,
+    since: datetime.date = None,
+    until: datetime.date = None,
+    limit: int = DEFAULT_RESULT_LIMIT,
+) -> dict:
+    """
+    Searches the log files of the loggers within a date range.
+
+    Parameters
+    ----------
+    logs_folder_path : str
+        The path of the logs folder, with a folder per logger.
+    query : str
+        The text to search for, like a member ID or a role name.
+    logger_names : list of str, optional
+        The loggers to search, all of them by default.
+    since : datetime.date, optional
+        The first day to search.
+    until : datetime.date, optional
+        The last day to search.
+    limit : int, optional
+        How many matching lines are returned at most.
+
+    Returns
+    -------
+    dict
+        The matching lines as (logger name, file name, line) tuples, whether there were
+        more matches than the limit, and how many files and blocks were searched.
+    """
+    log_search = LogSearch(query)
+
+    matches: list[tuple[str, str, str]] = []
+    truncated = False
+    for logger_name, file_path in iter_log_files(
+        logs_folder_path, logger_names, since, until
+    ):
+        for line in log_search.search_file(file_path):
+            if len(matches) >= limit:
+                truncated = True
+                break
+
+            matches.append((logger_name, path.basename(file_path), line))
+
+        if truncated:
+            break
+
+    return {
+        "query": query,
+        "matches": matches,
+        "truncated": truncated,
+        "files_searched": log_search.files_searched,
+        "blocks_read": log_search.blocks_read,
+        "blocks_skipped": log_search.blocks_skipped,
+    }
+
+
+def index_unindexed_archives(logs_folder_path: str) -> list[str]:
+    """
+    Recompresses the archives from before indexing into indexed archives.
+
+    Returns
+    -------
+    list of str
+        The paths of the archives that were indexed.
+    """
+    indexed_archives: list[str] = []
+    for _, file_path in iter_log_files(logs_folder_path):
+        if not file_path.endswith(COMPRESSED_LOG_EXTENSION):
+            continue
+        if LogIndex.load(get_index_path(file_path)) is not None:
+            continue
+
+        # unpack next to the archive, compressing replaces the archive and removes the
+        # unpacked file
+        log_file_path = file_path[:-len(".gz")]
+        with gzip.open(file_path, "rb") as compressed_file:
+            with open(log_file_path, "wb") as log_file:
+                shutil.copyfileobj(compressed_file, log_file)
+
+        try:
+            compress_and_index_log_file(log_file_path)
+        finally:
+            if path.isfile(log_file_path):
+                remove(log_file_path)
+
+        indexed_archives.append(file_path)
+
+    return indexed_archives
+
+
+def format_search_results(report: dict, max_length: int = None) -> str:
+    """
+    Formats the result of a search as text, one match per line.
+
+    Parameters
+    ----------
+    report : dict
+        The result of search_logs.
+    max_length : int, optional
+        The length the text is cut to, at a whole line.
+
+    Returns
+    -------
+    str
+        The matches and a summary line.
+    """
+    summary = (
+        f"{len(report['matches'])}{'+' if report['truncated'] else ''} matches "
+        f"for '{report['query']}' "
+        f"in {report['files_searched']} files ({report['blocks_read']} blocks read, "
+        f"{report['blocks_skipped']} skipped by the index)"
+    )
+
+    lines: list[str] = []
+    length = len(summary)
+    for logger_name, file_name, line in report["matches"]:
+        formatted_line = f"{logger_name}/{file_name}: {line}"
+
+        if max_length is not None and length + len(formatted_line) + 1 > max_length:
+            summary += ", cut off"
+            break
+
+        lines.append(formatted_line)
+        length += len(formatted_line) + 1
+
+    return "\n".join([*lines, summary])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Searches the log files for a member ID, role name or any other text."
+        )
+    )
+    parser.add_argument("query", nargs="?", help="The text to search for.")
+    parser.add_argument(
+        "--logs-folder",
+        default=DEFAULT_LOGS_FOLDER_PATH,
+        help="The logs folder, with a folder per logger.",
+    )
+    parser.add_argument(
+        "--loggers", nargs="*", help="The loggers to search, all of them by default."
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.date.fromisoformat,
+        help="The first day to search, as YYYY-MM-DD.",
+    )
+    parser.add_argument(
+        "--until",
+        type=datetime.date.fromisoformat,
+        help="The last day to search, as YYYY-MM-DD.",
+    )
+    parser.add_argument("--limit", type=int, default=DEFAULT_RESULT_LIMIT)
+    parser.add_argument(
+        "--index-archives",
+        action="store_true",
+        help="First index the archives from before indexing.",
+    )
+    arguments = parser.parse_args()
+
+    if arguments.index_archives:
+        for archive_path in index_unindexed_archives(arguments.logs_folder):
+            print(f"Indexed {archive_path}")
+
+    if arguments.query:
+        print(format_search_results(search_logs(
+            arguments.logs_folder,
+            arguments.query,
+            arguments.loggers,
+            arguments.since,
+            arguments.until,
+            arguments.limit,
+        )))
@@ -0,0 +1,267 @@
+import asyncio
+import sys
+import threading
+import traceback
+
+from collections import deque
+from logging import getLogger
+from os import path
+from time import monotonic
+
+# how often the event loop is asked to wake up, in seconds
+DEFAULT_CHECK_INTERVAL: float = 0.25
+# how late a wake up can be before it counts as a stall, in seconds
+DEFAULT_LAG_THRESHOLD: float = 0.5
+# how many lag samples are kept for the percentiles
+DEFAULT_SAMPLE_SIZE: int = 4096
+
+REPORTED_PERCENTILES: list[int] = [50, 90, 99]
+
+# the source folder, used to find the frame in our own code that is blocking the loop
+SOURCE_FOLDER_PATH: str = path.dirname(path.dirname(path.abspath(__file__)))
+
+logger = getLogger("bot")
+
+
+def calculate_percentile(sorted_samples: list[float], percentile: float) -> float:
+    """
+    Calculates a percentile from an already sorted list of samples.
+
+    Parameters
+    ----------
+    sorted_samples : list of float
+        The samples, sorted from lowest to highest.
+    percentile : float
+        The percentile to calculate, between 0 and 100.
+
+    Returns
+    -------
+    float
+        The value at the given percentile. Returns 0.0 if there are no samples.
+    """
+    if not sorted_samples:
+        return 0.0
+
+    # use the nearest rank method, it is good enough for reporting
+    rank = round(percentile / 100 * (len(sorted_samples) - 1))
+    return sorted_samples[rank]
+
+
+def find_culprit_frame(stack: traceback.StackSummary) -> traceback.FrameSummary:
+    """
+    Finds the frame that is most likely responsible for blocking the event loop.
+
+    Parameters
+    ----------
+    stack : traceback.StackSummary
+        The stack of the event loop thread, outermost frame first.
+
+    Returns
+    -------
+    traceback.FrameSummary
+        The innermost frame that belongs to the project. If no frame belongs to the
+        project, the innermost frame of the stack is returned instead.
+    """
+    for frame in reversed(stack):
+        if frame.filename.startswith(SOURCE_FOLDER_PATH):
+            return frame
+
+    return stack[-1]
+
+
+class LoopWatchdog:
+    """
+    Watches the event loop for stalls caused by blocking work.
+
+    A task on the event loop wakes up every check interval and records how late it
+    was woken up. A helper thread keeps an eye on those wake ups, when the loop stops
+    waking up for longer than the lag threshold the helper thread grabs the stack of
+    the event loop thread and logs it, so we can see what was blocking it.
+
+    Attributes
+    ----------
+    check_interval : float
+        How often the event loop is asked to wake up, in seconds.
+    lag_threshold : float
+        How late a wake up can be before it is logged, in seconds.
+    lag_samples : deque of float
+        The most recent lag samples, in seconds.
+    stall_count : int
+        How many stalls were detected since the watchdog was started.
+    """
+
+    def __init__(
+        self,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        lag_threshold: float = DEFAULT_LAG_THRESHOLD,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+    ) -> None:
+        """
+        Initializes the watchdog.
+
+        Parameters
+        ----------
+        check_interval : float, optional
+            How often the event loop is asked to wake up, in seconds.
+        lag_threshold : float, optional
+            How late a wake up can be before it is logged, in seconds.
+        sample_size : int, optional
+            How many lag samples are kept for the percentiles.
+        """
+        self.check_interval: float = check_interval
+        self.lag_threshold: float = lag_threshold
+
+        self.lag_samples: deque[float] = deque(maxlen=sample_size)
+        self.stall_count: int = 0
+
+        self._last_tick: float = monotonic()
+        self._stall_reported: bool = False
+        self._loop_thread_id: int = None
+        self._lag_task: asyncio.Task = None
+        self._watch_thread: threading.Thread = None
+        self._stop_event: threading.Event = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._lag_task is not None and not self._lag_task.done()
+
+    async def start(self) -> None:
+        """
+        Starts the watchdog. Must be awaited from the event loop that should be watched.
+        """
+        if self.is_running:
+            return None
+
+        # remember which thread runs the event loop so we can grab its stack later
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = monotonic()
+        self._stop_event.clear()
+
+        # start measuring the lag on the event loop
+        self._lag_task = asyncio.get_running_loop().create_task(self._measure_lag())
+
+        # start the helper thread that watches for stalls
+        self._watch_thread = threading.Thread(
+            target=self._watch_for_stalls, name="loop-watchdog", daemon=True
+        )
+        self._watch_thread.start()
+
+        logger.info(
+            f"Loop watchdog started (interval: {self.check_interval}s, "
+            f"threshold: {self.lag_threshold}s)"
+        )
+
+        return None
+
+    def stop(self) -> None:
+        """
+        Stops the watchdog.
+        """
+        # stop the helper thread
+        self._stop_event.set()
+
+        # stop measuring the lag
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+        return None
+
+    async def _measure_lag(self) -> None:
+        """
+        Wakes up every check interval and records how late the wake up was.
+        """
+        while True:
+            expected_wake_up = monotonic() + self.check_interval
+            await asyncio.sleep(self.check_interval)
+
+            # the loop is alive again
+            now = monotonic()
+            self._last_tick = now
+            self._stall_reported = False
+
+            lag = max(now - expected_wake_up, 0.0)
+            self.lag_samples.append(lag)
+
+            if lag > self.lag_threshold:
+                logger.warning(f"Event loop was blocked for {lag:.3f}s")
+
+    def _watch_for_stalls(self) -> None:
+        """
+        Runs on the helper thread, reports the stack of the event loop thread when it
+        has not woken up for longer than the lag threshold.
+        """
+        while not self._stop_event.wait(self.check_interval):
+            stalled_for = monotonic() - self._last_tick - self.check_interval
+
+            # only report every stall once
+            if stalled_for <= self.lag_threshold or self._stall_reported:
+                continue
+
+            self._stall_reported = True
+            self.stall_count += 1
+
+            self._report_stall(stalled_for)
+
+    def _report_stall(self, stalled_for: float) -> None:
+        """
+        Logs the stack of the event loop thread.
+
+        Parameters
+        ----------
+        stalled_for : float
+            How long the event loop has been stalled for, in seconds.
+        """
+        stack = self.capture_loop_stack()
+
+        if not stack:
+            logger.warning(
+                f"Event loop stalled for {stalled_for:.3f}s, "
+                "could not capture its stack"
+            )
+            return None
+
+        culprit = find_culprit_frame(stack)
+
+        logger.warning(
+            f"Event loop stalled for {stalled_for:.3f}s in {culprit.name} "
+            f"({culprit.filename}:{culprit.lineno})\n{''.join(stack.format())}"
+        )
+
+        return None
+
+    def capture_loop_stack(self) -> traceback.StackSummary:
+        """
+        Captures the current stack of the event loop thread.
+
+        Returns
+        -------
+        traceback.StackSummary
+            The stack of the event loop thread, outermost frame first. Empty if the
+            thread could not be found.
+        """
+        frame = sys._current_frames().get(self._loop_thread_id)
+
+        if frame is None:
+            return traceback.StackSummary()
+
+        return traceback.extract_stack(frame)
+
+    def get_lag_percentiles(self) -> dict[str, float]:
+        """
+        Gets the percentiles of the recorded lag samples.
+
+        Returns
+        -------
+        dict of str to float
+            The lag at each reported percentile and the maximum lag, in seconds.
+        """
+        sorted_samples = sorted(self.lag_samples)
+
+        percentiles = {
+            f"p{percentile}": calculate_percentile(sorted_samples, percentile)
+            for percentile in REPORTED_PERCENTILES
+        }
+        percentiles["max"] = sorted_samples[-1] if sorted_samples else 0.0
+
+        return percentiles
@@ -0,0 +1,239 @@
+import argparse
+import gc
+import random
+import tempfile
+import tracemalloc
+
+from json import dumps as json_dumps, loads as json_loads
+from os import makedirs, path, walk
+from typing import Callable
+
+from utilities.data_handling import Folder
+from utilities.role_configuration import ROLE_RULE_KEYS, RoleConfiguration
+
+DEFAULT_ROLE_COUNT: int = 2000
+DEFAULT_RULES_PER_ROLE: int = 6
+DEFAULT_FOLDER_COUNT: int = 1000
+
+
+class _DictRoleConfiguration:
+    """
+    The role configuration as it was stored before it was made compact: a per instance
+    dict, a string role ID and the rule lists of strings straight from the json.
+    """
+
+    def __init__(self, role_id: str, configuration: dict) -> None:
+        self.role_id = str(role_id)
+        self.role_name = configuration.get("role_name", "")
+        self.requires_supporter_status = configuration.get(
+            "requires_supporter_status", False
+        )
+        self.cant_combine_with = configuration.get("cant_combine_with", [])
+        self.grants_role = configuration.get("grants_role", [])
+        self.required_by = configuration.get("required_by", [])
+
+
+class _DictFolder:
+    """
+    The folder as it was stored before it was made compact: a per instance dict and a
+    strong reference to the parent, next to a copy of its name.
+    """
+
+    def __init__(self, folder_path: str) -> None:
+        self.parent_folder = self
+        self.parent_folder_name = "ROOT"
+        self.name = path.basename(folder_path)
+        self.path = folder_path
+        self.subfolders = []
+
+        for folder in next(walk(self.path))[1]:
+            new_folder = _DictFolder(path.join(self.path, folder))
+            self.subfolders.append(new_folder)
+            new_folder.parent_folder = self
+            new_folder.parent_folder_name = self.name
+
+
+def measure_allocated_bytes(build: Callable[[], object]) -> int:
+    """
+    Measures how many bytes the result of a function keeps allocated.
+
+    Parameters
+    ----------
+    build : Callable
+        The function that builds the objects to measure.
+
+    Returns
+    -------
+    int
+        The bytes that are still allocated once the function returned, so temporary
+        objects (like parsed json) are not counted.
+    """
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        before = tracemalloc.take_snapshot()
+        result = build()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    allocated_bytes = sum(
+        statistic.size_diff for statistic in after.compare_to(before, "filename")
+    )
+
+    # keep the result alive until the snapshot was taken
+    del result
+
+    return allocated_bytes
+
+
+def create_sample_configuration_json(
+    role_count: int, rules_per_role: int, seed: int = 0
+) -> str:
+    """
+    Creates a role configuration file with snowflake like role IDs and random rules.
+    """
+    generator = random.Random(seed)
+    role_ids = [str(generator.randrange(10 ** 17, 10 ** 19)) for _ in range(role_count)]
+    role_names = ["Member", "ㅤㅤㅤㅤㅤㅤ", "Supporter", "Gamer", "Artist", "Verified"]
+
+    configuration_json = {}
+    for role_id in role_ids:
+        rule_role_ids = generator.sample(role_ids, rules_per_role)
+        configuration_json[role_id] = {
+            "role_name": generator.choice(role_names),
+            "requires_supporter_status": generator.random() < 0.1,
+            # spread the rule role IDs over the rules, the rest stays empty
+            **{
+                key: rule_role_ids[index::len(ROLE_RULE_KEYS)]
+                for index, key in enumerate(ROLE_RULE_KEYS)
+            },
+        }
+
+    return json_dumps(configuration_json)
+
+
+def create_sample_folder_tree(root_path: str, folder_count: int) -> None:
+    """
+    Creates a folder tree like the data folder, with one folder per guild.
+    """
+    for index in range(folder_count):
+        makedirs(
+            path.join(root_path, "configuration", "guilds", str(10 ** 17 + index)),
+            exist_ok=True,
+        )
+
+
+def create_memory_report(
+    role_count: int = DEFAULT_ROLE_COUNT,
+    rules_per_role: int = DEFAULT_RULES_PER_ROLE,
+    folder_count: int = DEFAULT_FOLDER_COUNT,
+) -> dict:
+    """
+    Measures the memory used by the role configurations and folders, in the layout used
+    before they were made compact and in the current layout.
+
+    Parameters
+    ----------
+    role_count : int, optional
+        How many role configurations to measure.
+    rules_per_role : int, optional
+        How many role IDs each role mentions in its rules.
+    folder_count : int, optional
+        How many folders to measure.
+
+    Returns
+    -------
+    dict
+        The bytes per role, per rule and per folder, before and after.
+    """
+    configuration_text = create_sample_configuration_json(role_count, rules_per_role)
+    rule_count = role_count * rules_per_role
+
+    def measure_role_configurations(configuration_class) -> dict:
+        allocated_bytes = measure_allocated_bytes(lambda: {
+            role_id: configuration_class(role_id, configuration)
+            for role_id, configuration in json_loads(configuration_text).items()
+        })
+
+        return {
+            "total_bytes": allocated_bytes,
+            "bytes_per_role": allocated_bytes / role_count,
+            "bytes_per_rule": allocated_bytes / rule_count if rule_count else 0.0,
+        }
+
+    with tempfile.TemporaryDirectory() as root_path:
+        create_sample_folder_tree(root_path, folder_count)
+
+        # the root, configuration and guilds folders are part of the tree too
+        total_folder_count = folder_count + 3
+
+        def measure_folders(folder_class) -> dict:
+            allocated_bytes = measure_allocated_bytes(lambda: folder_class(root_path))
+
+            return {
+                "total_bytes": allocated_bytes,
+                "bytes_per_folder": allocated_bytes / total_folder_count,
+            }
+
+        folder_report = {
+            "before": measure_folders(_DictFolder),
+            "after": measure_folders(Folder),
+        }
+
+    return {
+        "role_count": role_count,
+        "rules_per_role": rules_per_role,
+        "folder_count": total_folder_count,
+        "role_configuration": {
+            "before": measure_role_configurations(_DictRoleConfiguration),
+            "after": measure_role_configurations(RoleConfiguration),
+        },
+        "folder": folder_report,
+    }
+
+
+def format_memory_report(report: dict) -> str:
+    """
+    Formats a memory report as a small table.
+    """
+    role_configuration = report["role_configuration"]
+    folder = report["folder"]
+
+    lines = [
+        (
+            f"{report['role_count']} roles with {report['rules_per_role']} rule role "
+            f"IDs each, {report['folder_count']} folders"
+        ),
+        f"{'':<20}{'before':>12}{'after':>12}",
+    ]
+
+    for label, section, key in (
+        ("bytes per role", role_configuration, "bytes_per_role"),
+        ("bytes per rule", role_configuration, "bytes_per_rule"),
+        ("bytes per folder", folder, "bytes_per_folder"),
+    ):
+        lines.append(
+            f"{label:<20}{section['before'][key]:>12.1f}{section['after'][key]:>12.1f}"
+        )
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Reports the memory used by the configuration and data model objects."
+        )
+    )
+    parser.add_argument("--roles", type=int, default=DEFAULT_ROLE_COUNT)
+    parser.add_argument("--rules-per-role", type=int, default=DEFAULT_RULES_PER_ROLE)
+    parser.add_argument("--folders", type=int, default=DEFAULT_FOLDER_COUNT)
+    arguments = parser.parse_args()
+
+    memory_report = create_memory_report(
+        arguments.roles, arguments.rules_per_role, arguments.folders
+    )
+    print(format_memory_report(memory_report))
@@ -0,0 +1,375 @@
+import asyncio
+import re
+
+from time import monotonic
+from urllib.parse import urlsplit
+
+from utilities.structured_logging import get_structured_logger
+
+# the api version prefix is not part of the route
+API_PREFIX_PATTERN = re.compile(r"^/api(?:/v\d+)?")
+# snowflakes and other numeric ids in a path segment
+ID_SEGMENT_PATTERN = re.compile(r"^\d+$")
+# the resources whose id is part of the bucket, discord calls these major parameters
+MAJOR_PARAMETER_RESOURCES: tuple[str, ...] = ("guilds", "channels", "webhooks")
+
+# how much longer we wait than the reset time, discord rounds the reset to milliseconds
+RESET_MARGIN: float = 0.05
+
+logger = get_structured_logger("bot")
+
+main_rate_limit_budget_manager: "RateLimitBudgetManager" = None
+
+
+def get_route_key(method: str, url: str) -> tuple[str, str]:
+    """
+    Gets the route and major parameter of a request, the parts discord uses
+    to pick a bucket.
+
+    Parameters
+    ----------
+    method : str
+        The http method of the request.
+    url : str
+        The url or path of the request.
+
+    Returns
+    -------
+    tuple of str
+        The route, with every id replaced by a placeholder, and the major parameter,
+        which is an empty string for routes without one.
+    """
+    request_path = API_PREFIX_PATTERN.sub("", urlsplit(url).path)
+    segments = request_path.strip("/").split("/")
+
+    major_parameter = ""
+    route_segments = []
+
+    for index, segment in enumerate(segments):
+        if not ID_SEGMENT_PATTERN.match(segment):
+            route_segments.append(segment)
+            continue
+
+        previous_segment = segments[index - 1] if index > 0 else ""
+
+        # only the first major parameter counts, every other id is a placeholder
+        if not major_parameter and previous_segment in MAJOR_PARAMETER_RESOURCES:
+            major_parameter = segment
+            route_segments.append(f"{{{previous_segment[:-1]}_id}}")
+        else:
+            route_segments.append("{id}")
+
+    return f"{method.upper()} /{'/'.join(route_segments)}", major_parameter
+
+
+class RateLimitBucket:
+    """
+    What we know about one rate limit bucket for one major parameter.
+
+    Attributes
+    ----------
+    limit : int
+        How many requests the bucket allows per window.
+    remaining : int
+        How many requests are left in the current window, minus our reservations.
+    reset_at : float
+        When the current window ends, in monotonic seconds.
+    window : float
+        The longest reset time seen, used as the length of a window we have not
+        seen a response for yet.
+    """
+
+    __slots__ = ("limit", "remaining", "reset_at", "window")
+
+    def __init__(
+        self, limit: int, remaining: int, reset_at: float, window: float
+    ) -> None:
+        self.limit: int = limit
+        self.remaining: int = remaining
+        self.reset_at: float = reset_at
+        self.window: float = window
+
+    def refresh(self, now: float) -> None:
+        """
+        Starts a new window once the reset time has passed.
+        """
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+
+    def get_utilization(self, now: float) -> float:
+        self.refresh(now)
+
+        if self.limit <= 0:
+            return 0.0
+
+        return (self.limit - self.remaining) / self.limit
+
+
+class RateLimitBudgetManager:
+    """
+    Keeps our own requests under the rate limits discord reports, instead of waiting
+    for a 429 to tell us we went over.
+
+    Every response is observed (through an aiohttp trace config on the bot) to learn
+    which bucket a route belongs to, how large the bucket is and when it resets. Before
+    a role edit or a dm is sent, acquire() reserves room in the bucket of the route and
+    waits for the reset when the bucket is used up. Routes that share a bucket, like
+    adding and removing roles of members in the same guild, share the budget.
+
+    Attributes
+    ----------
+    route_buckets : dict of str to str
+        The bucket hash of every route we have seen a response for.
+    buckets : dict of tuple to RateLimitBucket
+        The state of every bucket, per bucket hash and major parameter.
+    delayed_count : int
+        How many requests were delayed because their bucket was used up, each of
+        them would have been a 429 otherwise.
+    rate_limited_count : int
+        How many 429 responses were observed.
+    total_delay : float
+        How long requests were delayed for in total, in seconds.
+    """
+
+    def __init__(self, reset_margin: float = RESET_MARGIN) -> None:
+        """
+        Initializes the budget manager.
+
+        Parameters
+        ----------
+        reset_margin : float, optional
+            How much longer to wait than the reset time, in seconds.
+        """
+        self.reset_margin: float = reset_margin
+
+        self.route_buckets: dict[str, str] = {}
+        self.buckets: dict[tuple[str, str], RateLimitBucket] = {}
+
+        # serializes waiting for a bucket, so the waiters are released in order
+        self._bucket_locks: dict[tuple[str, str], asyncio.Lock] = {}
+        # the global rate limit, set when discord reports one
+        self._global_reset_at: float = 0.0
+
+        self.delayed_count: int = 0
+        self.rate_limited_count: int = 0
+        self.total_delay: float = 0.0
+
+    def _get_bucket_key(self, route: str, major_parameter: str) -> tuple[str, str]:
+        """
+        Gets the key of the bucket of a route, None if the bucket is not known yet.
+        """
+        bucket_hash = self.route_buckets.get(route)
+        if bucket_hash is None:
+            return None
+
+        return (bucket_hash, major_parameter)
+
+    async def acquire(self, method: str, url: str, count: int = 1) -> float:
+        """
+        Reserves room for requests in the bucket of a route, waits until the bucket
+        resets if there is not enough room.
+
+        Parameters
+        ----------
+        method : str
+            The http method of the requests.
+        url : str
+            The url or path of the requests.
+        count : int, optional
+            How many requests are going to be sent.
+
+        Returns
+        -------
+        float
+            How long the call waited, in seconds.
+        """
+        route, major_parameter = get_route_key(method, url)
+        waited = 0.0
+
+        for _ in range(count):
+            waited += await self._acquire_one(route, major_parameter)
+
+        return waited
+
+    async def _acquire_one(self, route: str, major_parameter: str) -> float:
+        waited = await self._wait_for_global_reset()
+
+        bucket_key = self._get_bucket_key(route, major_parameter)
+
+        # nothing is known about the bucket until the first response was observed
+        if bucket_key is None or bucket_key not in self.buckets:
+            return waited
+
+        lock = self._bucket_locks.setdefault(bucket_key, asyncio.Lock())
+
+        async with lock:
+            bucket = self.buckets[bucket_key]
+            bucket.refresh(monotonic())
+
+            if bucket.remaining <= 0:
+                delay = max(bucket.reset_at - monotonic(), 0.0) + self.reset_margin
+
+                self.delayed_count += 1
+                self.total_delay += delay
+                waited += delay
+
+                logger.debug(
+                    "rate_limit.delayed",
+                    route=route,
+                    major=major_parameter,
+                    delay=round(delay, 3),
+                )
+
+                await asyncio.sleep(delay)
+                bucket.refresh(monotonic())
+
+            bucket.remaining -= 1
+
+        return waited
+
+    async def _wait_for_global_reset(self) -> float:
+        delay = self._global_reset_at - monotonic()
+        if delay <= 0:
+            return 0.0
+
+        self.total_delay += delay
+        await asyncio.sleep(delay)
+
+        return delay
+
+    def observe(self, method: str, url: str, status: int, headers) -> None:
+        """
+        Learns the bucket of a route from the headers of a response.
+
+        Parameters
+        ----------
+        method : str
+            The http method of the request.
+        url : str
+            The url of the request.
+        status : int
+            The status code of the response.
+        headers : Mapping of str to str
+            The headers of the response, looked up case insensitively by aiohttp.
+        """
+        route, major_parameter = get_route_key(method, url)
+        now = monotonic()
+
+        if status == 429:
+            self.rate_limited_count += 1
+
+            retry_after = headers.get("Retry-After")
+            if headers.get("X-RateLimit-Global", "").lower() == "true" and retry_after:
+                self._global_reset_at = now + float(retry_after)
+
+            logger.warning(
+                "rate_limit.hit",
+                route=route,
+                major=major_parameter,
+                retry_after=retry_after,
+            )
+
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        limit = headers.get("X-RateLimit-Limit")
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+
+        # routes without rate limit headers are not limited per bucket
+        if None in (bucket_hash, limit, remaining, reset_after):
+            return None
+
+        self.route_buckets[route] = bucket_hash
+
+        bucket_key = (bucket_hash, major_parameter)
+        reset_at = now + float(reset_after)
+        bucket = self.buckets.get(bucket_key)
+
+        if bucket is None:
+            self.buckets[bucket_key] = RateLimitBucket(
+                int(limit), int(remaining), reset_at, float(reset_after)
+            )
+            return None
+
+        bucket.limit = int(limit)
+        bucket.window = max(bucket.window, float(reset_after))
+
+        if reset_at > bucket.reset_at + self.reset_margin:
+            # the response belongs to a new window
+            bucket.remaining = int(remaining)
+        else:
+            # responses can arrive out of order, never give back reserved room
+            bucket.remaining = min(bucket.remaining, int(remaining))
+
+        bucket.reset_at = reset_at
+
+        return None
+
+    def create_trace_config(self):
+        """
+        Creates an aiohttp trace config that observes every response of a session.
+
+        Returns
+        -------
+        aiohttp.TraceConfig
+            The trace config, passed to the bot as http_trace.
+        """
+        # discord.py depends on aiohttp, but the budget itself does not need it
+        import aiohttp
+
+        async def on_request_end(session, context, params) -> None:
+            self.observe(
+                params.method,
+                str(params.url),
+                params.response.status,
+                params.response.headers,
+            )
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_end.append(on_request_end)
+
+        return trace_config
+
+    def get_stats(self) -> dict:
+        """
+        Gets the utilization of every known bucket and the rate limit counters.
+
+        Returns
+        -------
+        dict
+            The utilization per bucket, the highest utilization, and how many requests
+            were delayed, how many 429s were observed and the total delay in seconds.
+        """
+        now = monotonic()
+
+        bucket_utilization = {
+            f"{bucket_hash}:{major_parameter}" if major_parameter else bucket_hash: (
+                bucket.get_utilization(now)
+            )
+            for (bucket_hash, major_parameter), bucket in self.buckets.items()
+        }
+
+        return {
+            "buckets": bucket_utilization,
+            "max_utilization": max(bucket_utilization.values(), default=0.0),
+            "avoided_429s": self.delayed_count,
+            "observed_429s": self.rate_limited_count,
+            "total_delay": self.total_delay,
+        }
+
+
+def get_rate_limit_budget_manager() -> RateLimitBudgetManager:
+    """
+    Gets the rate limit budget manager, creating it the first time it is requested.
+
+    Returns
+    -------
+    RateLimitBudgetManager
+        The rate limit budget manager.
+    """
+    global main_rate_limit_budget_manager
+
+    if main_rate_limit_budget_manager is None:
+        main_rate_limit_budget_manager = RateLimitBudgetManager()
+
+    return main_rate_limit_budget_manager
@@ -1,13 +1,54 @@
-from typing import Dict, Self
+import asyncio
+
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from shutil import copyfile
+from sys import intern
+from threading import Lock
+from time import monotonic
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, Sequence
 
 import discord
-from utilities.data_handling import DataHandler, Folder
-from utilities.custom_logger import CustomLogger
+from os import makedirs, path
+from utilities.data_handling import DataHandler, Folder, run_file_io, write_json_file
+from utilities.role_rule_language import (
+    CompiledRule,
+    compile_rule,
+    express_legacy_rules,
+    remove_rule_role,
+)
 from logging import getLogger
-from json import load as json_load, dump as json_dump
+from json import load as json_load, dumps as json_dumps, loads as json_loads
 
 logger = getLogger("role")
 
+ROLE_CONFIGURATION_FILE_NAME = "role_configuration.json"
+ROLE_CONFIGURATION_JOURNAL_FILE_NAME = "role_configuration.journal.jsonl"
+
+# the rule fields that hold lists of other role IDs
+ROLE_RULE_KEYS = ("cant_combine_with", "grants_role", "required_by")
+
+# shared by every rule without role IDs, an empty array would cost more than
+# the rule itself
+EMPTY_ROLE_IDS: tuple = ()
+
+# the journal is merged into the configuration file once it gets this long
+MAX_JOURNAL_ENTRIES = 500
+
+# every guild gets its own folder in the configuration folder, named after its ID
+GUILD_CONFIGURATION_FOLDER_NAME = "guilds"
+
+# how many guild configurations are kept in memory at most
+DEFAULT_MAX_LOADED_GUILDS = 64
+# how long a guild configuration can go unused before it is dropped from
+# memory, in seconds
+DEFAULT_IDLE_EVICTION_SECONDS = 60 * 60
+
+main_role_configuration_store: "RoleConfigurationStore" = None
+
+
 def get_role_configuration_file(data_handler: DataHandler, create_if_none=False) -> str:
     """
     Gets the role configuration file.
@@ -20,81 +61,626 @@ def get_role_configuration_file(data_handler: DataHandler, create_if_none=False)
     """
     # get the role configuration file
     role_configuration_folder: Folder = data_handler.search_for_folder("configuration")
-    role_configuration_file_path = role_configuration_folder.get_file("role_configuration.json", create_if_none=create_if_none)
+    role_configuration_file_path = role_configuration_folder.get_file(
+        ROLE_CONFIGURATION_FILE_NAME, create_if_none=create_if_none
+    )
 
     if role_configuration_file_path is None:
         return ""
 
     return role_configuration_file_path
 
+
+def get_guild_configuration_folder(data_handler: DataHandler, guild_id: int) -> Folder:
+    """
+    Gets the configuration folder of a guild, creating it if it does not exist.
+
+    Args:
+        data_handler: The data handler.
+        guild_id: The ID of the guild.
+
+    Returns:
+        Folder: The configuration folder of the guild.
+    """
+    configuration_folder: Folder = data_handler.create_folder(
+        "configuration", can_exist=True
+    )
+    guilds_folder: Folder = data_handler.create_folder(
+        GUILD_CONFIGURATION_FOLDER_NAME, configuration_folder, can_exist=True
+    )
+
+    return data_handler.create_folder(str(guild_id), guilds_folder, can_exist=True)
+
+
+def get_guild_configuration_folder_path(
+    data_handler: DataHandler, guild_id: int
+) -> str:
+    """
+    Gets the path of the configuration folder of a guild, without touching the folder
+    tree.
+
+    Args:
+        data_handler: The data handler.
+        guild_id: The ID of the guild.
+
+    Returns:
+        str: The path the folder of get_guild_configuration_folder is created at.
+    """
+    return path.join(
+        data_handler.data_folder.path,
+        "configuration",
+        GUILD_CONFIGURATION_FOLDER_NAME,
+        str(guild_id),
+    )
+
+
+def pack_role_ids(role_ids: Iterable) -> Sequence[int]:
+    """
+    Packs role IDs into the compact form used by the rules.
+
+    Args:
+        role_ids: The role IDs, as ints or strings.
+
+    Returns:
+        Sequence[int]: An array of unsigned 64 bit ints, or the shared empty tuple when
+        there are no role IDs. Never changed after it was created.
+    """
+    packed_role_ids = array("Q", map(int, role_ids))
+    return packed_role_ids if packed_role_ids else EMPTY_ROLE_IDS
+
+
+# how the fields that need no compiling are stored, rules are compiled instead
+FIELD_CONVERTERS = {
+    **{key: pack_role_ids for key in ROLE_RULE_KEYS},
+    "role_name": intern,
+    "requires_supporter_status": bool,
+}
+
+
+def compile_loaded_rule(role_id: int, rule: str) -> CompiledRule:
+    """
+    Compiles the rule of a role that was loaded from a file.
+
+    Args:
+        role_id: The ID of the role.
+        rule: The rule, in the rule language.
+
+    Returns:
+        CompiledRule: The compiled rule, None if the rule is empty or not valid. An
+        invalid rule is logged and ignored, so one typo does not stop the whole
+        configuration from loading.
+    """
+    try:
+        return compile_rule(rule)
+    except ValueError as error:
+        logger.error(
+            f"The rule of role '{role_id}' is not valid and is ignored: {error}"
+        )
+        return None
+
+
 class RoleConfiguration:
     """
     Initializes a RoleConfiguration object.
 
+    Role configurations are shared between snapshots, so they are never changed after
+    they are created. Use replace to get a changed copy.
+
+    Role IDs are kept as ints, the rules are packed into arrays and the role names are
+    interned, so a configuration costs a few bytes per rule instead of a python string.
+
     Args:
         role_id: The ID of the role.
         role_name: The name of the role.
-        requires_supporter_status: A boolean indicating if the role requires supporter status.
-        roles_to_give: A dictionary mapping role names to the corresponding roles to give.
-        roles_to_remove: A dictionary mapping role names to the corresponding roles to remove.
+        requires_supporter_status: A boolean indicating if the role requires
+            supporter status.
+        cant_combine_with: The IDs of the roles this role can not be combined with.
+        grants_role: The IDs of the roles this role grants.
+        required_by: The IDs of the roles of which the member needs at least one to
+            keep this role.
+        rule: A rule in the rule language, for anything the fields above can not
+            express. It is compiled once, into compiled_rule.
 
     Returns:
         None
     """
-    def __init__(self, configuration: dict) -> None:
-        self.role_id: int = configuration.get("role_id")
-        self.role_name: str = configuration.get("role_name")
+    __slots__ = (
+        "role_id",
+        "role_name",
+        "requires_supporter_status",
+        *ROLE_RULE_KEYS,
+        "rule",
+        "compiled_rule",
+    )
+
+    def __init__(self, role_id: int, configuration: dict) -> None:
+        self.role_id: int = int(role_id)
+        self.role_name: str = intern(configuration.get("role_name", ""))
+
+        self.requires_supporter_status: bool = bool(
+            configuration.get("requires_supporter_status", False)
+        )
+        self.cant_combine_with: Sequence[int] = pack_role_ids(
+            configuration.get("cant_combine_with", ())
+        )
+        self.grants_role: Sequence[int] = pack_role_ids(
+            configuration.get("grants_role", ())
+        )
+        self.required_by: Sequence[int] = pack_role_ids(
+            configuration.get("required_by", ())
+        )
+
+        self.rule: str = intern(configuration.get("rule", "").strip())
+        self.compiled_rule: CompiledRule = compile_loaded_rule(self.role_id, self.rule)
+
+    @classmethod
+    def from_role(cls, role: discord.Role) -> "RoleConfiguration":
+        """
+        Creates an empty role configuration for a role.
+        """
+        return cls(role.id, {
+            # only store valid utf-8 characters
+            "role_name": role.name.encode("utf-8", "ignore").decode(),
+        })
+
+    def replace(self, **changes) -> "RoleConfiguration":
+        """
+        Creates a copy of the role configuration with some of the fields changed.
+        """
+        new_configuration = object.__new__(RoleConfiguration)
+
+        # the unchanged fields are shared with this configuration, they are
+        # never changed
+        for field_name in self.__slots__:
+            setattr(new_configuration, field_name, getattr(self, field_name))
+
+        for field_name, value in changes.items():
+            if field_name == "rule":
+                # an invalid rule is refused here, before it is ever stored
+                value = intern(value.strip())
+                new_configuration.compiled_rule = compile_rule(value)
+            elif field_name in FIELD_CONVERTERS:
+                value = FIELD_CONVERTERS[field_name](value)
+            else:
+                raise AttributeError(f"RoleConfiguration has no field '{field_name}'.")
+
+            setattr(new_configuration, field_name, value)
+
+        return new_configuration
+
+    def without_role(self, role_id: int) -> "RoleConfiguration":
+        """
+        Creates a copy of the role configuration that no longer mentions a deleted role.
+
+        Args:
+            role_id: The ID of the deleted role.
+
+        Returns:
+            RoleConfiguration: The copy, the rule is rewritten so it keeps and grants
+                the same roles.
+        """
+        changes = {
+            key: [
+                rule_role_id
+                for rule_role_id in getattr(self, key)
+                if rule_role_id != role_id
+            ]
+            for key in ROLE_RULE_KEYS
+        }
+
+        # an invalid rule was never compiled, so it is left as it is
+        compiled_rule = self.compiled_rule
+        if compiled_rule is not None and role_id in compiled_rule.referenced_role_ids:
+            changes["rule"] = remove_rule_role(self.rule, role_id)
+            logger.info(
+                f"Removed the deleted role {role_id} from the rule of role "
+                f"{self.role_id}, it is now: '{changes['rule']}'"
+            )
+
+        return self.replace(**changes)
+
+    def get_referenced_role_ids(self) -> set[int]:
+        """
+        Gets the IDs of every role that is mentioned in the rules of this role.
+        """
+        referenced_role_ids = {
+            role_id for key in ROLE_RULE_KEYS for role_id in getattr(self, key)
+        }
+        if self.compiled_rule is not None:
+            referenced_role_ids.update(self.compiled_rule.referenced_role_ids)
+
+        return referenced_role_ids
+
+    def get_legacy_rule(self) -> str:
+        """
+        Gets the fixed rule fields of this role written in the rule language.
+        """
+        return express_legacy_rules(
+            self.requires_supporter_status,
+            self.cant_combine_with,
+            self.required_by,
+            self.grants_role,
+        )
+
+    def to_json(self) -> dict:
+        # the file keeps role IDs as strings, json numbers can not hold them
+        # safely everywhere
+        return {
+            "role_name": self.role_name,
+            "requires_supporter_status": self.requires_supporter_status,
+            "cant_combine_with": [str(role_id) for role_id in self.cant_combine_with],
+            "grants_role": [str(role_id) for role_id in self.grants_role],
+            "required_by": [str(role_id) for role_id in self.required_by],
+            "rule": self.rule,
+        }
+
+
+class RoleConfigurationSnapshot:
+    """
+    A read only, versioned view of every role configuration.
+
+    A snapshot never changes after it was created, changes to the configuration create
+    a new snapshot with a higher version. Anything that is working with a snapshot can
+    keep using it safely while the configuration is being edited.
+
+    Attributes:
+        version: The version of the configuration, increases with every change.
+        configurations: A read only mapping of role ID to RoleConfiguration.
+    """
+    __slots__ = ("version", "configurations")
+
+    def __init__(
+        self, version: int, configurations: Dict[int, RoleConfiguration]
+    ) -> None:
+        self.version: int = version
+        self.configurations: Mapping[int, RoleConfiguration] = MappingProxyType(
+            configurations
+        )
+
+    def get(self, role_id) -> RoleConfiguration:
+        return self.configurations.get(int(role_id))
+
+    def view_for_member(
+        self, member_role_ids: Iterable
+    ) -> "MemberRoleConfigurationView":
+        """
+        Gets a view of the configurations of the roles a member has.
+
+        Args:
+            member_role_ids: The IDs of the roles of the member.
+
+        Returns:
+            MemberRoleConfigurationView: A view over this snapshot, nothing is copied.
+        """
+        configurations = self.configurations
+        return MemberRoleConfigurationView(
+            self,
+            tuple(
+                role_id
+                for role_id in map(int, member_role_ids)
+                if role_id in configurations
+            ),
+        )
+
+
+class MemberRoleConfigurationView(Mapping):
+    """
+    A read only mapping of role ID to RoleConfiguration for the roles of
+    a single member.
+
+    The view only stores the role IDs, the configurations are read from the snapshot,
+    so creating one does not copy any configuration.
+    """
+    __slots__ = ("snapshot", "role_ids")
+
+    def __init__(
+        self, snapshot: RoleConfigurationSnapshot, role_ids: tuple[int, ...]
+    ) -> None:
+        self.snapshot: RoleConfigurationSnapshot = snapshot
+        self.role_ids: tuple[int, ...] = role_ids
+
+    def __getitem__(self, role_id: int) -> RoleConfiguration:
+        if role_id not in self.role_ids:
+            raise KeyError(role_id)
+
+        return self.snapshot.configurations[role_id]
+
+    def __contains__(self, role_id) -> bool:
+        return role_id in self.role_ids
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.role_ids)
+
+    def __len__(self) -> int:
+        return len(self.role_ids)
+
+    def without(self, role_ids: Iterable) -> "MemberRoleConfigurationView":
+        """
+        Gets a view without some of the roles, used once roles are removed
+        from the member.
+        """
+        removed_role_ids = {int(role_id) for role_id in role_ids}
+        if not removed_role_ids:
+            return self
+
+        return MemberRoleConfigurationView(
+            self.snapshot, tuple(
+                role_id for role_id in self.role_ids if role_id not in removed_role_ids
+            )
+        )
 
-        self.requires_supporter_status: bool = configuration.get("requires_supporter_status", False)
-        self.roles_to_give: Dict[str, str] = configuration.get("roles_to_give", {})
-        self.roles_to_remove: Dict[str, str] = configuration.get("roles_to_remove", {})
 
-        
 class RoleConfigurationManager:
-    def __init__(self, discord_bot: discord.Client, data_handler: DataHandler, role_configurations: list[RoleConfiguration] = None) -> None:
-        if not role_configurations:
-            role_configurations = []
-            
-        self.role_configurations: list[RoleConfiguration] = role_configurations
+    """
+    Manages the role configurations of a single guild and keeps its role configuration
+    file up to date.
+    Managers are created and evicted by the RoleConfigurationStore. Use its get_manager
+    method instead.
+
+    Readers get immutable snapshots through get_snapshot. Every change copies the
+    mapping of configurations, applies the change and publishes it as a new snapshot,
+    so readers never see a half applied change and never need to copy anything.
+
+    Changes are appended to a small journal file next to the configuration file instead
+    of rewriting the whole configuration. The journal is replayed when the configuration
+    is loaded and merged back into the configuration file once it gets too long.
+    """
+    def __init__(
+        self,
+        discord_bot: discord.Client,
+        data_handler: DataHandler,
+        guild_id: int,
+        legacy_file_path: str = None,
+        guild_folder: Folder = None,
+    ) -> None:
+        """
+        Args:
+            discord_bot: The bot.
+            data_handler: The data handler.
+            guild_id: The ID of the guild whose roles are managed.
+            legacy_file_path: The global configuration file from before configurations
+                were kept per guild, it is copied the first time the guild is loaded.
+            guild_folder: The configuration folder of the guild, created when it is not
+                given. No files are touched until the configuration is loaded.
+        """
         self.discord_bot: discord.Client = discord_bot
         self.data_handler: DataHandler = data_handler
-        
-        self.configuration_file_path = get_role_configuration_file(self.data_handler, True)
-    
+        self.guild_id: int = guild_id
+
+        self._snapshot: RoleConfigurationSnapshot = RoleConfigurationSnapshot(0, {})
+        self._snapshot_listeners: list[Callable[[RoleConfigurationSnapshot], None]] = []
+
+        # maps a role ID to the IDs of the roles that mention it in their rules
+        self._referenced_by: Dict[int, set[int]] = {}
+        self._journal_entry_count: int = 0
+
+        # async writes of the configuration file go one at a time
+        self._write_lock: asyncio.Lock = asyncio.Lock()
+        # the version of the snapshot that is in the configuration file
+        self._written_version: int = 0
+
+        # the journal writes wait here and are written in order, in the file I/O thread
+        # pool while the event loop runs and right away otherwise
+        self._journal_writes: deque[tuple[str, list[str]]] = deque()
+        self._journal_lock: Lock = Lock()
+        self._journal_writer: asyncio.Task = None
+        self._journal_merge: asyncio.Task = None
+
+        if guild_folder is None:
+            guild_folder = get_guild_configuration_folder(self.data_handler, guild_id)
+
+        self.guild_folder: Folder = guild_folder
+        self.legacy_file_path: str = legacy_file_path
+        self.configuration_file_path = path.join(
+            guild_folder.path, ROLE_CONFIGURATION_FILE_NAME
+        )
+        self.journal_file_path = path.join(
+            guild_folder.path, ROLE_CONFIGURATION_JOURNAL_FILE_NAME
+        )
+
+    @property
+    def role_configurations(self) -> Mapping[int, RoleConfiguration]:
+        """
+        The role configurations of the current snapshot, read only.
+        """
+        return self._snapshot.configurations
+
+    def get_snapshot(self) -> RoleConfigurationSnapshot:
+        """
+        Gets the current snapshot of the role configuration.
+        """
+        return self._snapshot
+
+    def add_snapshot_listener(
+        self, listener: Callable[[RoleConfigurationSnapshot], None]
+    ) -> None:
+        """
+        Adds a function that is called with every new snapshot.
+        """
+        self._snapshot_listeners.append(listener)
+
     def load_role_configuration_file(self) -> None:
         """
-        Loads the role configuration from the role configuration file.
+        Loads the role configuration from the role configuration file and
+        replays the journal.
+        """
+        # load the role configuration json and the changes that were made since
+        # it was written
+        role_configuration_json, journal_entries = self._load_configuration_files()
+
+        self._apply_loaded_configuration(role_configuration_json, journal_entries)
+
+        # merge the journal into the configuration file
+        if journal_entries:
+            self.write_self_to_file()
+
+    async def load_role_configuration_file_async(self) -> None:
         """
-        # load the role configuration json
-        role_configuration_json = self._load_configuration_json_from_file()
+        Loads the role configuration like load_role_configuration_file, but reads and
+        parses the files in the file I/O thread pool.
+        """
+        role_configuration_json, journal_entries = await run_file_io(
+            self._load_configuration_files
+        )
+
+        self._apply_loaded_configuration(role_configuration_json, journal_entries)
+
+        # merge the journal into the configuration file
+        if journal_entries:
+            await self.write_self_to_file_async()
 
-        for configuration in role_configuration_json:
-            self.add_configuration(RoleConfiguration(configuration))
-    
     def create_role_configuration_file(self) -> None:
         """
         Creates the role configuration file.
         """
-        # create the role configuration file json
-        role_configuration_json = self._create_role_configuration_file_json()
-        
-        # write the role configuration
-        with open(self.configuration_file_path, "w") as file:
-            json_dump(role_configuration_json, file, indent=4)
-    
-    def add_configuration(self, configuration: RoleConfiguration) -> None:
+        self.write_self_to_file()
+
+    async def create_role_configuration_file_async(self) -> None:
         """
-        Adds a role configuration.
+        Creates the role configuration file in the file I/O thread pool.
+        """
+        await self.write_self_to_file_async()
+
+    def add_configuration(
+        self, configuration: RoleConfiguration, persist: bool = True
+    ) -> None:
+        """
+        Adds a role configuration, replacing the existing configuration of the role.
 
         Args:
-            role_configuration: The role configuration to add.
+            configuration: The role configuration to add.
+            persist: Whether the change should be written to the journal.
 
         Returns:
             None
         """
-        # add the role configuration to the role configurations list
-        self.role_configurations.append(configuration)
-    
+        self.add_configurations([configuration], persist)
+
+    def add_configurations(
+        self, new_configurations: list[RoleConfiguration], persist: bool = True
+    ) -> None:
+        """
+        Adds multiple role configurations as a single new snapshot.
+
+        Args:
+            new_configurations: The role configurations to add.
+            persist: Whether the changes should be written to the journal.
+
+        Returns:
+            None
+        """
+        if not new_configurations:
+            return None
+
+        # copy on write, the current snapshot is left untouched
+        configurations = dict(self._snapshot.configurations)
+        for configuration in new_configurations:
+            self._set_configuration(configurations, configuration)
+
+        self._publish(configurations)
+
+        if persist:
+            self._write_journal_entries([
+                {
+                    "op": "set",
+                    "role_id": str(configuration.role_id),
+                    "configuration": configuration.to_json(),
+                }
+                for configuration in new_configurations
+            ])
+
+    def update_configuration(self, role_id: int, **changes) -> RoleConfiguration:
+        """
+        Changes some of the fields of a role configuration.
+
+        Args:
+            role_id: The ID of the role to change.
+            changes: The fields to change and their new values.
+
+        Returns:
+            RoleConfiguration: The changed configuration.
+        """
+        configuration = self.get_role_configuration(role_id)
+        if configuration is None:
+            raise ValueError(f"Role '{role_id}' is not configured.")
+
+        new_configuration = configuration.replace(**changes)
+        self.add_configuration(new_configuration)
+
+        return new_configuration
+
+    def remove_configuration(self, role_id: int, persist: bool = True) -> list[int]:
+        """
+        Removes the configuration of a role and strips the role from the rules of every
+        role that mentions it.
+
+        Args:
+            role_id: The ID of the role to remove.
+            persist: Whether the change should be written to the journal.
+
+        Returns:
+            list[int]: The IDs of the roles whose rules were changed.
+        """
+        role_id = int(role_id)
+
+        # copy on write, the current snapshot is left untouched
+        configurations = dict(self._snapshot.configurations)
+        removed, changed_role_ids = self._remove_configuration(configurations, role_id)
+
+        if not removed and not changed_role_ids:
+            return []
+
+        self._publish(configurations)
+
+        if persist:
+            self._write_journal_entries([{"op": "remove", "role_id": str(role_id)}])
+
+        return changed_role_ids
+
+    def on_role_create(self, role: discord.Role) -> RoleConfiguration:
+        """
+        Adds an empty configuration for a role that was just created.
+
+        Args:
+            role: The created role.
+
+        Returns:
+            RoleConfiguration: The new configuration, None if the role is not managed.
+        """
+        if not self._is_managed_guild(role.guild):
+            return None
+        if role.id in self.role_configurations:
+            return None
+
+        configuration = RoleConfiguration.from_role(role)
+        self.add_configuration(configuration)
+
+        logger.info(
+            f"Added the configuration for the created role {role.name} ({role.id})"
+        )
+        return configuration
+
+    def on_role_delete(self, role: discord.Role) -> list[int]:
+        """
+        Removes the configuration of a role that was just deleted.
+
+        Args:
+            role: The deleted role.
+
+        Returns:
+            list[int]: The IDs of the roles whose rules were changed.
+        """
+        if not self._is_managed_guild(role.guild):
+            return []
+
+        changed_role_ids = self.remove_configuration(role.id)
+
+        logger.info(
+            f"Removed the configuration for the deleted role {role.name} ({role.id}), "
+            f"updated the rules of: {changed_role_ids}"
+        )
+        return changed_role_ids
+
     def load_missing_role_configurations(self) -> None:
         """
         Loads any missing role configurations.
@@ -102,68 +688,95 @@ class RoleConfigurationManager:
         # get the roles
         roles = self._get_guild_roles()
 
-        # add the roles to the role configuration
-        for role in roles:
-            # get the role configuration for the role
-            role_configuration = self.get_role_configuration(role.id)
-            if role_configuration is not None:
-                continue
-
-            new_configuration = RoleConfiguration({
-                "role_id": role.id,
-                "role_name": role.name,
-                "requires_supporter_status": False,
-                "roles_to_give": [],
-                "roles_to_remove": []
-            })
-
-            self.add_configuration(new_configuration)
+        # add the roles that are not configured yet
+        role_configurations = self.role_configurations
+        self.add_configurations([
+            RoleConfiguration.from_role(role)
+            for role in roles
+            if role.id not in role_configurations
+        ])
 
-        self.write_self_to_file()
-        
     def write_self_to_file(self) -> None:
         """
-        Writes the role configuration manager to the role configuration file.
+        Writes the role configuration manager to the role configuration file and
+        clears the journal.
         """
-        role_configuration_json = {
-            "configurations": [
-                {
-                "role_id": configuration.role_id,
-                "role_name": configuration.role_name,
-                "requires_supporter_status": configuration.requires_supporter_status,
-                "roles_to_give": configuration.roles_to_give,
-                "roles_to_remove": configuration.roles_to_remove,
-            }
-            for configuration in self.role_configurations
-            ]
-        }
-        print("writing to file")
-        print(self.role_configurations)
         # write the role configuration
-        with open(self.configuration_file_path, "w") as file:
-            json_dump(self.role_configurations, file, indent=4)
-        print("wrote to file")
-        
-    def get_role_configuration(self, role_id: str) -> RoleConfiguration:
+        self._write_snapshot_to_file(self._snapshot)
+        self._written_version = self._snapshot.version
+
+        # the journal is now part of the configuration file, the journal writes that
+        # are still waiting are cleared along with it
+        self._queue_journal_write("w", [])
+        self._journal_entry_count = 0
+
+    async def write_self_to_file_async(self) -> None:
         """
-        Retrieves all RoleConfiguration objects.
+        Writes the role configuration file like write_self_to_file, but serializes and
+        writes it in the file I/O thread pool.
+
+        Snapshots never change, so the thread serializes the snapshot that was current
+        when the write started. Changes made while it is being written stay in the
+        journal, which is only cleared when no change was made in the meantime.
+        """
+        async with self._write_lock:
+            snapshot = self._snapshot
+
+            await run_file_io(self._write_snapshot_to_file, snapshot)
+
+            # a sync write of a newer snapshot finished first and was just overwritten
+            if self._written_version > snapshot.version:
+                self.write_self_to_file()
+                return None
+
+            self._written_version = snapshot.version
+
+            # a change during the write is only in the journal, so the
+            # journal has to stay
+            if self._snapshot is not snapshot:
+                return None
+
+            self._queue_journal_write("w", [])
+            self._journal_entry_count = 0
+
+        await self.flush_journal_async()
+
+        return None
+
+    def flush_journal(self) -> None:
+        """
+        Writes the journal writes that are still waiting. Blocks until a write that is
+        running in the file I/O thread pool is done, so only use it when the journal
+        has to be on disk right away.
+        """
+        with self._journal_lock:
+            while self._journal_writes:
+                mode, lines = self._journal_writes.popleft()
+
+                # the following appends go into the same write
+                while self._journal_writes and self._journal_writes[0][0] == "a":
+                    lines = lines + self._journal_writes.popleft()[1]
+
+                with open(self.journal_file_path, mode, encoding="utf-8") as file:
+                    file.writelines(lines)
+
+    async def flush_journal_async(self) -> None:
+        """
+        Waits until the journal writes that are waiting are written.
+        """
+        if self._journal_writer is not None:
+            await asyncio.shield(self._journal_writer)
+
+    def get_role_configuration(self, role_id: int) -> RoleConfiguration:
+        """
+        Retrieves the RoleConfiguration of a role.
 
         Returns:
-            role_configuration: A RoleConfiguration object.
+            role_configuration: A RoleConfiguration object, None if the role is
+                not configured.
         """
-        print("getting role configuration")
-        if role_configuration := next(
-            (
-                role_configuration
-                for role_configuration in self.role_configurations
-                if role_configuration.role_id == role_id
-            ),
-            None,
-        ):
-            return role_configuration
-        else:
-            return None
-        
+        return self.role_configurations.get(int(role_id))
+
     def get_role_configurations(self) -> list[RoleConfiguration]:
         """
         Retrieves all RoleConfiguration objects.
@@ -171,8 +784,17 @@ class RoleConfigurationManager:
         Returns:
             role_configurations: A list of RoleConfiguration objects.
         """
-        return self.role_configurations
-    
+        return list(self.role_configurations.values())
+
+    def get_configured_role_ids(self) -> set[int]:
+        """
+        Gets every role ID that is configured or mentioned in the rules of a role.
+        """
+        return set(self.role_configurations) | set(self._referenced_by)
+
+    def _is_managed_guild(self, guild: discord.Guild) -> bool:
+        return guild is not None and guild.id == self.guild_id
+
     def _get_guild_roles(self) -> list[discord.Role]:
         """
         Gets the roles in the guild.
@@ -180,32 +802,506 @@ class RoleConfigurationManager:
         Returns:
             roles: A list of roles.
         """
-        guild = self.discord_bot.get_guild(self.discord_bot.production_server_id)
+        guild = self.discord_bot.get_guild(self.guild_id)
 
         if guild is None:
-            raise ValueError("Development guild is not found.")
+            raise ValueError(f"Guild {self.guild_id} is not found.")
 
         guild_roles = guild.roles
         return [role for role in guild_roles if role.name != "@everyone"]
-        
+
+    def get_role_configuration_json(self) -> dict:
+        """
+        Gets the role configuration json, keyed by role ID.
+
+        Returns:
+            dict: The json role configuration.
+        """
+        return self._create_role_configuration_file_json()
+
+    def _publish(self, configurations: Dict[int, RoleConfiguration]) -> None:
+        """
+        Publishes the configurations as the next snapshot.
+        """
+        self._snapshot = RoleConfigurationSnapshot(
+            self._snapshot.version + 1, configurations
+        )
+
+        for listener in self._snapshot_listeners:
+            listener(self._snapshot)
+
+    def _set_configuration(
+        self,
+        configurations: Dict[int, RoleConfiguration],
+        configuration: RoleConfiguration,
+    ) -> None:
+        # forget what the old configuration referenced
+        old_configuration = configurations.get(configuration.role_id)
+        if old_configuration is not None:
+            self._remove_references(old_configuration)
+
+        configurations[configuration.role_id] = configuration
+        self._add_references(configuration)
+
+    def _remove_configuration(
+        self, configurations: Dict[int, RoleConfiguration], role_id: int
+    ) -> tuple[bool, list[int]]:
+        # remove the configuration of the role itself
+        configuration = configurations.pop(role_id, None)
+        if configuration is not None:
+            self._remove_references(configuration)
+
+        # strip the role from the roles that mention it, using the reverse index
+        # instead of a scan
+        changed_role_ids = sorted(self._referenced_by.pop(role_id, set()))
+        for changed_role_id in changed_role_ids:
+            changed_configuration = configurations.get(changed_role_id)
+            if changed_configuration is None:
+                continue
+
+            # the rewritten rule can mention fewer roles, so the references are rebuilt
+            self._remove_references(changed_configuration)
+            configurations[changed_role_id] = changed_configuration.without_role(
+                role_id
+            )
+            self._add_references(configurations[changed_role_id])
+
+        return configuration is not None, changed_role_ids
+
+    def _add_references(self, configuration: RoleConfiguration) -> None:
+        for referenced_role_id in configuration.get_referenced_role_ids():
+            self._referenced_by.setdefault(referenced_role_id, set()).add(
+                configuration.role_id
+            )
+
+    def _remove_references(self, configuration: RoleConfiguration) -> None:
+        for referenced_role_id in configuration.get_referenced_role_ids():
+            referencing_role_ids = self._referenced_by.get(referenced_role_id)
+            if referencing_role_ids is None:
+                continue
+
+            referencing_role_ids.discard(configuration.role_id)
+            if not referencing_role_ids:
+                del self._referenced_by[referenced_role_id]
+
+    def _write_journal_entries(self, journal_entries: list[dict]) -> None:
+        """
+        Appends changes to the journal in a single write, merging the journal into the
+        configuration file once it gets too long.
+        """
+        self._queue_journal_write(
+            "a", [json_dumps(journal_entry) + "\n" for journal_entry in journal_entries]
+        )
+
+        self._journal_entry_count += len(journal_entries)
+        if self._journal_entry_count < MAX_JOURNAL_ENTRIES:
+            return None
+
+        if not self._is_loop_running():
+            self.write_self_to_file()
+        elif self._journal_merge is None:
+            self._journal_merge = asyncio.ensure_future(self._merge_journal_async())
+
+        return None
+
+    def _queue_journal_write(self, mode: str, lines: list[str]) -> None:
+        """
+        Queues an append ("a") or a rewrite ("w") of the journal. The writes run in the
+        order they were queued, so a clear never drops a change that came after it.
+        """
+        self._journal_writes.append((mode, lines))
+
+        if not self._is_loop_running():
+            self.flush_journal()
+        elif self._journal_writer is None:
+            self._journal_writer = asyncio.ensure_future(self._write_journal_async())
+
+    async def _write_journal_async(self) -> None:
+        try:
+            while self._journal_writes:
+                await run_file_io(self.flush_journal)
+        finally:
+            self._journal_writer = None
+
+    async def _merge_journal_async(self) -> None:
+        try:
+            await self.write_self_to_file_async()
+        finally:
+            self._journal_merge = None
+
+    @staticmethod
+    def _is_loop_running() -> bool:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        return True
+
+    def _load_configuration_files(self) -> tuple[dict, list[dict]]:
+        self._create_missing_files()
+
+        return self._load_configuration_json_from_file(), self._load_journal_entries()
+
+    def _create_missing_files(self) -> None:
+        """
+        Creates the configuration file of the guild, copying the global configuration
+        over the first time the guild is loaded. Only touches files, never the folder
+        tree.
+        """
+        if path.isfile(self.configuration_file_path):
+            return None
+
+        legacy_file_path = self.legacy_file_path
+        if not legacy_file_path or not path.isfile(legacy_file_path):
+            self.guild_folder.get_file(
+                ROLE_CONFIGURATION_FILE_NAME, create_if_none=True
+            )
+            return None
+
+        # move the global configuration over the first time the guild is loaded
+        copyfile(legacy_file_path, self.configuration_file_path)
+
+        legacy_journal_file_path = path.join(
+            path.dirname(legacy_file_path), ROLE_CONFIGURATION_JOURNAL_FILE_NAME
+        )
+        if path.isfile(legacy_journal_file_path):
+            copyfile(legacy_journal_file_path, self.journal_file_path)
+
+        logger.info(
+            "Copied the global role configuration to the configuration of guild "
+            f"{self.guild_id}"
+        )
+
+        return None
+
+    def _load_journal_entries(self) -> list[dict]:
+        if not path.isfile(self.journal_file_path):
+            return []
+
+        with open(self.journal_file_path, "r", encoding="utf-8") as file:
+            return [json_loads(line) for line in file if line.strip()]
+
+    def _apply_journal_entry(
+        self, configurations: Dict[int, RoleConfiguration], journal_entry: dict
+    ) -> None:
+        if journal_entry["op"] == "set":
+            configuration = RoleConfiguration(
+                journal_entry["role_id"], journal_entry["configuration"]
+            )
+            self._set_configuration(configurations, configuration)
+        elif journal_entry["op"] == "remove":
+            self._remove_configuration(configurations, int(journal_entry["role_id"]))
+        else:
+            logger.warning(f"Unknown role configuration journal entry: {journal_entry}")
+
     def _load_configuration_json_from_file(self) -> dict:
         """
         Loads the role configuration from the role configuration file.
-        
+
         Returns:
             dict: The json role configuration loaded from the file.
         """
         # load the role configuration
         with open(self.configuration_file_path, "r") as file:
             return json_load(file)
-            
-    def _create_role_configuration_file_json(self) -> dict:
+
+    def _apply_loaded_configuration(
+        self, role_configuration_json: dict, journal_entries: list[dict]
+    ) -> None:
+        """
+        Builds the configurations from the loaded file and journal and publishes them.
+        """
+        configurations: Dict[int, RoleConfiguration] = {}
+        self._referenced_by = {}
+        for role_id, configuration in role_configuration_json.items():
+            self._set_configuration(
+                configurations, RoleConfiguration(role_id, configuration)
+            )
+
+        # replay the changes that were made since the file was last written
+        for journal_entry in journal_entries:
+            self._apply_journal_entry(configurations, journal_entry)
+
+        self._publish(configurations)
+
+    def _write_snapshot_to_file(self, snapshot: RoleConfigurationSnapshot) -> None:
+        # written to a temporary file first, so a sync and an async write never mix
+        write_json_file(
+            self.configuration_file_path,
+            self._create_role_configuration_file_json(snapshot),
+        )
+
+    def _create_role_configuration_file_json(
+        self, snapshot: RoleConfigurationSnapshot = None
+    ) -> dict:
+        configurations = (snapshot or self._snapshot).configurations
         return {
-            self.role_configurations[role_id].role_id: {
-                "role_id": self.role_configurations[role_id].role_id,
-                "role_name": self.role_configurations[role_id].role_name,
-                "requires_supporter_status": self.role_configurations[role_id].requires_supporter_status,
-                "roles_to_give": self.role_configurations[role_id].roles_to_give,
-                "roles_to_remove": self.role_configurations[role_id].roles_to_remove
-            } for role_id in self.role_configurations
-        }
\ No newline at end of file
+            str(role_id): configuration.to_json()
+            for role_id, configuration in configurations.items()
+        }
+
+
+class RoleConfigurationStore:
+    """
+    Keeps the role configuration of every guild in its own namespace.
+
+    The configuration of a guild is loaded the first time it is needed and dropped from
+    memory again when too many guilds are loaded (least recently used first) or when it
+    has not been used for a while. Every change is written to the journal of the guild
+    right away, so dropping a configuration never loses anything.
+    This is meant to be used as a singleton. Use the get_role_configuration_store
+    function instead.
+    """
+    def __init__(
+        self,
+        discord_bot: discord.Client,
+        data_handler: DataHandler,
+        max_loaded_guilds: int = DEFAULT_MAX_LOADED_GUILDS,
+        idle_eviction_seconds: float = DEFAULT_IDLE_EVICTION_SECONDS,
+    ) -> None:
+        """
+        Args:
+            discord_bot: The bot.
+            data_handler: The data handler.
+            max_loaded_guilds: How many guild configurations are kept in memory at most.
+            idle_eviction_seconds: How long a configuration can go unused
+                before it is dropped.
+        """
+        global main_role_configuration_store
+        main_role_configuration_store = self
+
+        self.discord_bot: discord.Client = discord_bot
+        self.data_handler: DataHandler = data_handler
+        self.max_loaded_guilds: int = max_loaded_guilds
+        self.idle_eviction_seconds: float = idle_eviction_seconds
+
+        # the loaded managers, the least recently used one first
+        self._managers: OrderedDict[int, RoleConfigurationManager] = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+        self._eviction_listeners: list[Callable[[int], None]] = []
+
+        # the guilds that are being loaded in the background
+        self._loading: Dict[int, asyncio.Future] = {}
+
+        self.load_count: int = 0
+        self.eviction_count: int = 0
+
+    def add_eviction_listener(self, listener: Callable[[int], None]) -> None:
+        """
+        Adds a function that is called with the guild ID of every evicted configuration,
+        so the state that was built from it can be dropped too.
+        """
+        self._eviction_listeners.append(listener)
+
+    def get_manager(self, guild) -> RoleConfigurationManager:
+        """
+        Gets the role configuration manager of a guild, loading it if it is not loaded.
+
+        Args:
+            guild: The guild or the ID of the guild.
+
+        Returns:
+            RoleConfigurationManager: The role configuration manager of the guild.
+        """
+        guild_id = getattr(guild, "id", guild)
+        now = monotonic()
+
+        manager = self._managers.get(guild_id)
+        if manager is None:
+            manager = self._load_manager(guild_id)
+        else:
+            self._managers.move_to_end(guild_id)
+
+        self._last_used[guild_id] = now
+        self._evict_unused(now)
+
+        return manager
+
+    async def get_manager_async(self, guild) -> RoleConfigurationManager:
+        """
+        Gets the role configuration manager of a guild like get_manager, but a guild
+        that is not loaded yet is loaded in the file I/O thread pool. Callers that ask
+        for the same guild while it is loading wait for the same load.
+
+        Args:
+            guild: The guild or the ID of the guild.
+
+        Returns:
+            RoleConfigurationManager: The role configuration manager of the guild.
+        """
+        guild_id = getattr(guild, "id", guild)
+
+        if guild_id not in self._managers:
+            loading = self._loading.get(guild_id)
+            if loading is None:
+                loading = self._loading[guild_id] = asyncio.ensure_future(
+                    self._load_manager_async(guild_id)
+                )
+                loading.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+
+            await asyncio.shield(loading)
+
+        # marks the guild as used and evicts like a sync get
+        return self.get_manager(guild_id)
+
+    def get_loaded_manager(self, guild_id: int) -> RoleConfigurationManager:
+        """
+        Gets the role configuration manager of a guild without loading it.
+
+        Returns:
+            RoleConfigurationManager: The manager, None if the guild is not loaded.
+        """
+        return self._managers.get(guild_id)
+
+    def get_loaded_guild_ids(self) -> list[int]:
+        return list(self._managers)
+
+    def evict(self, guild_id: int) -> bool:
+        """
+        Drops the configuration of a guild from memory.
+
+        Returns:
+            bool: Whether the configuration was loaded.
+        """
+        manager = self._managers.pop(guild_id, None)
+        self._last_used.pop(guild_id, None)
+
+        if manager is None:
+            return False
+
+        # the guild is read from its journal the next time it is loaded
+        manager.flush_journal()
+
+        self.eviction_count += 1
+        logger.debug(f"Evicted the role configuration of guild {guild_id}")
+
+        for listener in self._eviction_listeners:
+            listener(guild_id)
+
+        return True
+
+    def unload_all(self) -> None:
+        """
+        Drops every configuration from memory, they are loaded again when
+        they are needed.
+        """
+        for guild_id in list(self._managers):
+            self.evict(guild_id)
+
+    async def flush_journals_async(self) -> None:
+        """
+        Waits until the journal writes of every loaded guild are written.
+        """
+        for manager in list(self._managers.values()):
+            await manager.flush_journal_async()
+
+    def get_stats(self) -> dict:
+        return {
+            "loaded": len(self._managers),
+            "max_loaded": self.max_loaded_guilds,
+            "loads": self.load_count,
+            "evictions": self.eviction_count,
+        }
+
+    def _load_manager(self, guild_id: int) -> RoleConfigurationManager:
+        # the global configuration file belonged to the production guild
+        legacy_file_path = None
+        if guild_id == getattr(self.discord_bot, "production_server_id", None):
+            legacy_file_path = get_role_configuration_file(self.data_handler)
+
+        manager = RoleConfigurationManager(
+            self.discord_bot, self.data_handler, guild_id, legacy_file_path
+        )
+        manager.load_role_configuration_file()
+
+        # the roles can only be added while the guild is in the cache
+        if self.discord_bot.get_guild(guild_id) is not None:
+            manager.load_missing_role_configurations()
+
+        self._managers[guild_id] = manager
+        self.load_count += 1
+
+        logger.debug(
+            f"Loaded the role configuration of guild {guild_id} "
+            f"({len(manager.role_configurations)} roles)"
+        )
+
+        return manager
+
+    async def _load_manager_async(self, guild_id: int) -> None:
+        # the global configuration file belonged to the production guild
+        legacy_file_path = None
+        if guild_id == getattr(self.discord_bot, "production_server_id", None):
+            legacy_file_path = get_role_configuration_file(self.data_handler)
+
+        # the folder is created in the file I/O thread pool, but the folder tree is
+        # shared with everything on the event loop, so it is only attached to it here
+        folder_path = get_guild_configuration_folder_path(self.data_handler, guild_id)
+        await run_file_io(makedirs, folder_path, exist_ok=True)
+        guild_folder = get_guild_configuration_folder(self.data_handler, guild_id)
+
+        # the files are created, read and parsed in the file I/O thread pool
+        manager = RoleConfigurationManager(
+            self.discord_bot,
+            self.data_handler,
+            guild_id,
+            legacy_file_path,
+            guild_folder,
+        )
+        await manager.load_role_configuration_file_async()
+
+        # a sync get loaded the guild while the files were being read, keep that manager
+        if guild_id in self._managers:
+            return None
+
+        # the roles can only be added while the guild is in the cache
+        if self.discord_bot.get_guild(guild_id) is not None:
+            manager.load_missing_role_configurations()
+
+        self._managers[guild_id] = manager
+        self._last_used[guild_id] = monotonic()
+        self.load_count += 1
+
+        logger.debug(
+            f"Loaded the role configuration of guild {guild_id} in the background "
+            f"({len(manager.role_configurations)} roles)"
+        )
+
+        return None
+
+    def _evict_unused(self, now: float) -> None:
+        # too many guilds are loaded, drop the least recently used ones
+        while len(self._managers) > self.max_loaded_guilds:
+            self.evict(next(iter(self._managers)))
+
+        # the least recently used guild is first, so stop at the first one that
+        # is still in use
+        while self._managers:
+            guild_id = next(iter(self._managers))
+            if now - self._last_used[guild_id] <= self.idle_eviction_seconds:
+                break
+
+            self.evict(guild_id)
+
+
+def get_role_configuration_store(
+    discord_bot: discord.Client = None, data_handler: DataHandler = None
+) -> RoleConfigurationStore:
+    """
+    Gets the process wide role configuration store, creating it the first time.
+
+    Args:
+        discord_bot: The bot, only needed the first time.
+        data_handler: The data handler, only needed the first time.
+
+    Returns:
+        RoleConfigurationStore: The role configuration store.
+    """
+    if main_role_configuration_store is not None:
+        return main_role_configuration_store
+
+    if discord_bot is None or data_handler is None:
+        raise ValueError("The role configuration store has not been created yet.")
+
+    return RoleConfigurationStore(discord_bot, data_handler)
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import random
+
+from time import perf_counter
+
+from utilities.bulk_role_evaluation import BulkRoleEvaluator, plan_member_roles
+from utilities.role_configuration import RoleConfiguration, RoleConfigurationSnapshot
+from utilities.sweep_planner import SweepPlanner
+
+DEFAULT_MEMBER_COUNT: int = 100_000
+DEFAULT_ROLE_COUNT: int = 200
+DEFAULT_ROLES_PER_MEMBER: int = 8
+
+
+def create_sample_guild(
+    member_count: int, role_count: int, roles_per_member: int, seed: int = 0
+) -> tuple:
+    """
+    Creates a role configuration and members with random roles, where most members are
+    fine and some break a rule.
+
+    Returns
+    -------
+    tuple
+        The snapshot, the live role IDs and the (member ID, role IDs, is
+        supporter) tuples.
+    """
+    generator = random.Random(seed)
+    role_ids = [10 ** 17 + index for index in range(role_count)]
+
+    def sample_role_ids(count: int, chance: float) -> list[int]:
+        return generator.sample(role_ids, count) if generator.random() < chance else []
+
+    configurations = {}
+    for role_id in role_ids:
+        configurations[role_id] = RoleConfiguration(role_id, {
+            "role_name": f"role {role_id}",
+            "requires_supporter_status": generator.random() < 0.05,
+            "cant_combine_with": sample_role_ids(1, 0.1),
+            "grants_role": sample_role_ids(1, 0.05),
+            "required_by": sample_role_ids(3, 0.1),
+        })
+
+    snapshot = RoleConfigurationSnapshot(1, configurations)
+
+    # most members only have the common roles, which have no rules
+    common_role_ids = [role_id for role_id in role_ids if not any(
+        getattr(configurations[role_id], key)
+        for key in (
+            "requires_supporter_status",
+            "cant_combine_with",
+            "grants_role",
+            "required_by",
+        )
+    )]
+
+    members = []
+    for member_id in range(member_count):
+        candidate_role_ids = role_ids if generator.random() < 0.05 else common_role_ids
+        members.append((
+            10 ** 18 + member_id,
+            generator.sample(
+                candidate_role_ids, min(roles_per_member, len(candidate_role_ids))
+            ),
+            generator.random() < 0.02,
+        ))
+
+    return snapshot, set(role_ids), members
+
+
+def run_benchmark(
+    member_count: int = DEFAULT_MEMBER_COUNT,
+    role_count: int = DEFAULT_ROLE_COUNT,
+    roles_per_member: int = DEFAULT_ROLES_PER_MEMBER,
+) -> dict:
+    """
+    Times planning every member of a guild one by one against planning them in bulk.
+
+    Parameters
+    ----------
+    member_count : int, optional
+        How many members the guild has.
+    role_count : int, optional
+        How many configured roles the guild has.
+    roles_per_member : int, optional
+        How many roles each member has.
+
+    Returns
+    -------
+    dict
+        The seconds taken by both paths, the speedup, how many members need changes and
+        whether both paths planned the same changes.
+    """
+    snapshot, live_role_ids, members = create_sample_guild(
+        member_count, role_count, roles_per_member
+    )
+
+    start = perf_counter()
+    per_member_plans = [
+        plan for plan in (
+            plan_member_roles(
+                snapshot, live_role_ids, member_id, member_role_ids, is_supporter
+            )
+            for member_id, member_role_ids, is_supporter in members
+        )
+        if plan.has_changes
+    ]
+    per_member_seconds = perf_counter() - start
+
+    start = perf_counter()
+    evaluator = BulkRoleEvaluator(snapshot, live_role_ids)
+    bulk_plans = evaluator.evaluate(members)
+    bulk_seconds = perf_counter() - start
+
+    def as_comparable(plans) -> list:
+        # the paths list the roles in a different order, the order does not matter
+        return [
+            (plan.member_id, *(frozenset(role_ids) for role_ids in (
+                plan.supporter_roles_lost,
+                plan.singleton_roles_lost,
+                plan.required_roles_lost,
+                plan.rule_roles_lost,
+                plan.granted_roles,
+            )))
+            for plan in plans
+        ]
+
+    return {
+        "member_count": member_count,
+        "role_count": role_count,
+        "uses_numpy": evaluator.uses_numpy,
+        "per_member_seconds": per_member_seconds,
+        "bulk_seconds": bulk_seconds,
+        "speedup": per_member_seconds / bulk_seconds if bulk_seconds else 0.0,
+        "changed_members": len(bulk_plans),
+        "plans_match": as_comparable(per_member_plans) == as_comparable(bulk_plans),
+    }
+
+
+def format_benchmark(report: dict) -> str:
+    """
+    Formats a benchmark report as a few lines of text.
+    """
+    return "\n".join([
+        (
+            f"{report['member_count']} members, {report['role_count']} roles, "
+            f"numpy: {report['uses_numpy']}"
+        ),
+        f"{'per member':<12}{report['per_member_seconds']:>10.3f}s",
+        f"{'bulk':<12}{report['bulk_seconds']:>10.3f}s ({report['speedup']:.1f}x)",
+        (
+            f"{report['changed_members']} members need changes, "
+            f"plans match: {report['plans_match']}"
+        ),
+    ])
+
+
+async def measure_longest_stall(work) -> tuple[float, float]:
+    """
+    Runs a coroutine next to a task that ticks the event loop, to see how long the loop
+    was kept from running other work.
+
+    Returns
+    -------
+    tuple of float
+        The seconds the work took and the longest time between two ticks.
+    """
+    longest_stall = 0.0
+
+    async def tick() -> None:
+        nonlocal longest_stall
+        last_tick = perf_counter()
+        while True:
+            await asyncio.sleep(0.001)
+            now = perf_counter()
+            longest_stall = max(longest_stall, now - last_tick)
+            last_tick = now
+
+    ticker = asyncio.get_running_loop().create_task(tick())
+    await asyncio.sleep(0)
+
+    start = perf_counter()
+    await work
+    seconds = perf_counter() - start
+
+    # let the ticker see the stall of work that never gave the loop back
+    await asyncio.sleep(0.01)
+    ticker.cancel()
+
+    return seconds, longest_stall
+
+
+def run_process_benchmark(
+    member_count: int = DEFAULT_MEMBER_COUNT,
+    role_count: int = DEFAULT_ROLE_COUNT,
+    roles_per_member: int = DEFAULT_ROLES_PER_MEMBER,
+    worker_counts: list[int] = (1, 2, 4),
+) -> dict:
+    """
+    Times planning a guild in the process pool of the sweep planner, with a different
+    amount of workers, against planning it in bulk on the event loop. The time to start
+    the worker processes is included, like in a real sweep. Next to the time, the
+    longest stretch the event loop could not run anything else is measured, that is
+    what makes the gateway miss heartbeats.
+
+    Returns
+    -------
+    dict
+        The seconds and longest loop stall on the loop, and the seconds, speedup and
+        longest loop stall per worker count.
+    """
+    snapshot, live_role_ids, members = create_sample_guild(
+        member_count, role_count, roles_per_member
+    )
+
+    async def plan_on_loop() -> int:
+        return len(BulkRoleEvaluator(snapshot, live_role_ids).evaluate(members))
+
+    async def plan_in_workers(sweep_planner: SweepPlanner) -> int:
+        role_change_plans = sweep_planner.plan(snapshot, live_role_ids, members)
+        return len([role_change_plan async for role_change_plan in role_change_plans])
+
+    on_loop_seconds, on_loop_stall = asyncio.run(measure_longest_stall(plan_on_loop()))
+
+    workers = {}
+    for worker_count in worker_counts:
+        sweep_planner = SweepPlanner(max_workers=worker_count)
+        seconds, longest_stall = asyncio.run(
+            measure_longest_stall(plan_in_workers(sweep_planner))
+        )
+
+        workers[worker_count] = {
+            "seconds": seconds,
+            "speedup": on_loop_seconds / seconds if seconds else 0.0,
+            "longest_stall": longest_stall,
+        }
+
+    return {
+        "member_count": member_count,
+        "role_count": role_count,
+        "on_loop_seconds": on_loop_seconds,
+        "on_loop_stall": on_loop_stall,
+        "workers": workers,
+    }
+
+
+def format_process_benchmark(report: dict) -> str:
+    """
+    Formats a process benchmark report as a few lines of text.
+    """
+    lines = [
+        f"{report['member_count']} members, {report['role_count']} roles",
+        f"{'':<12}{'time':>10}{'speedup':>10}{'stall':>10}",
+        (
+            f"{'on loop':<12}{report['on_loop_seconds']:>9.3f}s"
+            f"{'1.0x':>10}{report['on_loop_stall']:>9.3f}s"
+        ),
+    ]
+
+    for worker_count, worker_report in report["workers"].items():
+        lines.append(
+            f"{f'{worker_count} workers':<12}{worker_report['seconds']:>9.3f}s"
+            f"{worker_report['speedup']:>9.1f}x{worker_report['longest_stall']:>9.3f}s"
+        )
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compares planning role changes per member against the bulk evaluation "
+            "and the sweep planner."
+        )
+    )
+    parser.add_argument("--members", type=int, default=DEFAULT_MEMBER_COUNT)
+    parser.add_argument("--roles", type=int, default=DEFAULT_ROLE_COUNT)
+    parser.add_argument(
+        "--roles-per-member", type=int, default=DEFAULT_ROLES_PER_MEMBER
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="*",
+        help="Also times the sweep planner with these worker counts.",
+    )
+    arguments = parser.parse_args()
+
+    benchmark_arguments = (
+        arguments.members, arguments.roles, arguments.roles_per_member
+    )
+    print(format_benchmark(run_benchmark(*benchmark_arguments)))
+
+    if arguments.workers:
+        print(format_process_benchmark(
+            run_process_benchmark(*benchmark_arguments, arguments.workers)
+        ))
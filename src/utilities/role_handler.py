@@ -1,77 +1,673 @@
-from logging import getLogger
+from utilities.structured_logging import get_structured_logger
 
+import datetime
 import discord
-from utilities.data_handling import get_data_handler, DataHandler, Folder
-from json import load as json_load, dump as json_dump
+from utilities.data_handling import get_data_handler, DataHandler
 from discord.ext import commands
+from typing import AsyncIterator
+
+from utilities.role_configuration import (
+    MemberRoleConfigurationView,
+    RoleConfiguration,
+    RoleConfigurationManager,
+    RoleConfigurationSnapshot,
+    RoleConfigurationStore,
+    get_role_configuration_store,
+)
+from utilities.role_resolver import RoleResolver
+from utilities.bulk_role_evaluation import BulkRoleEvaluator, RoleChangePlan
+from utilities.role_plan_cache import RolePlanCache
+from utilities.role_manageability import RoleManageability, build_configuration_report
+from utilities.sweep_planner import SweepPlanner
+from utilities.role_name_index import RoleNameIndex
+from utilities.rate_limit_budget import (
+    RateLimitBudgetManager,
+    get_rate_limit_budget_manager,
+)
+
+
+def get_days_in_guild(member: discord.Member) -> int:
+    """
+    Gets how many whole days a member is in the guild, used by the role rules.
+
+    Args:
+    - member (discord.Member): The member.
+
+    Returns:
+    - int: The days since the member joined, 0 if that is not known.
+    """
+    joined_at: datetime.datetime = getattr(member, "joined_at", None)
+    if joined_at is None:
+        return 0
+
+    return max((datetime.datetime.now(datetime.timezone.utc) - joined_at).days, 0)
+
+
+def get_member_status(member: discord.Member) -> tuple:
+    """
+    Gets what the bulk role evaluation needs to know about a member.
+
+    Args:
+    - member (discord.Member): The member.
+
+    Returns:
+    - tuple: The ID, the role IDs, the supporter status and the days in the guild.
+    """
+    return (
+        member.id,
+        [role.id for role in member.roles],
+        member.premium_since is not None,
+        get_days_in_guild(member),
+    )
+
+
+def format_role_names(roles: list[discord.Role]) -> str:
+    """
+    Lists the names of roles for a notice, one role per line.
+
+    Args:
+    - roles (list[discord.Role]): The roles to list.
+
+    Returns:
+    - str: The role names, visual divider roles are marked as such.
+    """
+    role_names = []
+    for role in roles:
+        role_name = role.name
+        if "ㅤ" in role_name:
+            role_name = role_name.replace("ㅤ", "") + " (Role Visual Divider)"
+        role_names.append(f"@{role_name}")
+
+    return ",\n".join(role_names)
 
-from utilities.role_configuration import RoleConfigurationManager, RoleConfiguration
 
 class RoleHandler():
-    def __init__(self, bot: commands.Bot) -> None:
+    def __init__(self, bot: commands.Bot, live_validation: bool = False) -> None:
         # get the data handler
         self.data_handler: DataHandler = get_data_handler()
-        
+
         # get the bot
         self.bot: commands.Bot = bot
 
-        # create the role configuration manager
-        self.role_configuration_manager: RoleConfigurationManager = RoleConfigurationManager(self.bot, self.data_handler)
+        # get the store that keeps the role configuration of every guild
+        self.role_configuration_store: RoleConfigurationStore = (
+            get_role_configuration_store()
+        )
 
         # load the logger
-        self.logger = getLogger("role")
+        self.logger = get_structured_logger("role")
+
+        # validations only change roles and dm members when this is turned on, so a
+        # deploy never edits a whole guild by surprise
+        self.live_validation: bool = live_validation
+
+        # caches are kept per shard, so shards never share or clear each others
+        # state
+        self.shard_caches: dict[int, dict] = {}
+
+        # role edits and dms are spread out to stay under the rate limits
+        self.rate_limit_budget: RateLimitBudgetManager = get_rate_limit_budget_manager()
+
+        # drop the state of a guild when its configuration is dropped from memory
+        self.role_configuration_store.add_eviction_listener(self.forget_guild)
+
+    def get_shard_cache(self, guild: discord.Guild) -> dict:
+        """
+        Gets the cache for the shard that handles the guild.
+
+        Args:
+        - guild (discord.Guild): The guild to get the shard cache for.
+
+        Returns:
+        - dict: The cache of the shard, created if it did not exist yet.
+        """
+        return self.shard_caches.setdefault(self.bot.get_shard_id(guild), {})
+
+    def get_role_configuration_manager(
+        self, guild: discord.Guild
+    ) -> RoleConfigurationManager:
+        """
+        Gets the role configuration manager of a guild, loading it on first use.
+
+        Args:
+        - guild (discord.Guild): The guild to get the role configuration manager for.
+
+        Returns:
+        - RoleConfigurationManager: The role configuration manager of the guild.
+        """
+        return self.role_configuration_store.get_manager(guild)
+
+    async def get_role_configuration_manager_async(
+        self, guild: discord.Guild
+    ) -> RoleConfigurationManager:
+        """
+        Gets the role configuration manager of a guild, loading it in the file I/O
+        thread pool on first use.
+
+        Args:
+        - guild (discord.Guild): The guild to get the role configuration manager for.
+
+        Returns:
+        - RoleConfigurationManager: The role configuration manager of the guild.
+        """
+        return await self.role_configuration_store.get_manager_async(guild)
+
+    def get_configured_role_ids(self, guild: discord.Guild) -> set[int]:
+        """
+        Gets every role ID that is mentioned in the role configuration of a guild.
+
+        Args:
+        - guild (discord.Guild): The guild to get the configured role IDs for.
+
+        Returns:
+        - set[int]: The configured role IDs, including the ones used in the rules.
+        """
+        return self.get_role_configuration_manager(guild).get_configured_role_ids()
+
+    def forget_guild(self, guild_id: int) -> None:
+        """
+        Drops the role resolver, role name index, bulk role evaluator, plan
+        cache and role manageability of a guild, they are rebuilt the next time
+        they are requested.
+
+        Args:
+        - guild_id (int): The ID of the guild to forget.
+        """
+        for shard_cache in self.shard_caches.values():
+            shard_cache.get("role_resolvers", {}).pop(guild_id, None)
+            shard_cache.get("role_name_indexes", {}).pop(guild_id, None)
+            shard_cache.get("bulk_role_evaluators", {}).pop(guild_id, None)
+            shard_cache.get("role_plan_caches", {}).pop(guild_id, None)
+            shard_cache.get("role_manageabilities", {}).pop(guild_id, None)
+
+    def forget_role_manageability(self, guild_id: int) -> None:
+        """
+        Drops which roles the bot can manage in a guild, it is worked out again the next
+        time it is needed.
+
+        Args:
+        - guild_id (int): The ID of the guild whose roles or bot roles changed.
+        """
+        for shard_cache in self.shard_caches.values():
+            shard_cache.get("role_manageabilities", {}).pop(guild_id, None)
+
+    def get_role_resolver(self, guild: discord.Guild) -> RoleResolver:
+        """
+        Gets the role resolver for a guild, building it the first time it is requested.
+
+        Args:
+        - guild (discord.Guild): The guild to get the role resolver for.
+
+        Returns:
+        - RoleResolver: The role resolver for the guild.
+        """
+        shard_cache = self.get_shard_cache(guild)
+        role_resolvers: dict[int, RoleResolver] = shard_cache.setdefault(
+            "role_resolvers", {}
+        )
+
+        if guild.id not in role_resolvers:
+            role_resolvers[guild.id] = RoleResolver(
+                guild, self.get_configured_role_ids(guild)
+            )
+
+        return role_resolvers[guild.id]
+
+    def get_role_name_index(self, guild: discord.Guild) -> RoleNameIndex:
+        """
+        Gets the role name search index for a guild, building it the first time
+        it is requested.
+
+        Args:
+        - guild (discord.Guild): The guild to get the role name index for.
+
+        Returns:
+        - RoleNameIndex: The role name index for the guild.
+        """
+        shard_cache = self.get_shard_cache(guild)
+        role_name_indexes: dict[int, RoleNameIndex] = shard_cache.setdefault(
+            "role_name_indexes", {}
+        )
+
+        if guild.id not in role_name_indexes:
+            role_name_indexes[guild.id] = RoleNameIndex.from_guild(guild)
+
+        return role_name_indexes[guild.id]
+
+    def get_bulk_role_evaluator(self, guild: discord.Guild) -> BulkRoleEvaluator:
+        """
+        Gets the bulk role evaluator for a guild, it is rebuilt when the configuration
+        or the configured roles that exist in the guild changed since it was built.
+
+        Args:
+        - guild (discord.Guild): The guild to get the bulk role evaluator for.
+
+        Returns:
+        - BulkRoleEvaluator: The bulk role evaluator for the current
+          configuration snapshot.
+        """
+        shard_cache = self.get_shard_cache(guild)
+        bulk_role_evaluators: dict[int, BulkRoleEvaluator] = shard_cache.setdefault(
+            "bulk_role_evaluators", {}
+        )
+
+        manager = self.get_role_configuration_manager(guild)
+        snapshot: RoleConfigurationSnapshot = manager.get_snapshot()
+        live_role_ids = self.get_role_resolver(guild).roles.keys()
+
+        # the evaluator is rebuilt for a new snapshot or changed live roles
+        bulk_role_evaluator = bulk_role_evaluators.get(guild.id)
+        is_current = getattr(bulk_role_evaluator, "snapshot", None) is snapshot
+        if is_current and bulk_role_evaluator.live_role_ids == live_role_ids:
+            return bulk_role_evaluator
+
+        bulk_role_evaluator = BulkRoleEvaluator(snapshot, live_role_ids)
+        bulk_role_evaluators[guild.id] = bulk_role_evaluator
+
+        return bulk_role_evaluator
+
+    def get_role_manageability(self, guild: discord.Guild) -> RoleManageability:
+        """
+        Gets the configured roles of a guild that the bot can add and remove,
+        worked out the first time it is requested after the roles of the guild or
+        of the bot changed.
+
+        Args:
+        - guild (discord.Guild): The guild to get the role manageability for.
+
+        Returns:
+        - RoleManageability: The manageable and unmanageable configured
+          roles of the guild.
+        """
+        shard_cache = self.get_shard_cache(guild)
+        role_manageabilities: dict[int, RoleManageability] = shard_cache.setdefault(
+            "role_manageabilities", {}
+        )
+
+        if guild.id not in role_manageabilities:
+            role_manageabilities[guild.id] = RoleManageability(
+                guild, self.get_role_resolver(guild)
+            )
+
+        return role_manageabilities[guild.id]
+
+    def get_configuration_report(self, guild: discord.Guild) -> dict:
+        """
+        Checks the role rules of a guild for rules the bot can never carry out, because
+        a role does not exist anymore or can not be managed by the bot.
+
+        Args:
+        - guild (discord.Guild): The guild to check the rules of.
+
+        Returns:
+        - dict: The report, see build_configuration_report.
+        """
+        return build_configuration_report(
+            self.get_role_configuration_manager(guild).get_snapshot(),
+            self.get_role_resolver(guild),
+            self.get_role_manageability(guild),
+        )
+
+    def get_role_plan_cache(self, guild: discord.Guild) -> RolePlanCache:
+        """
+        Gets the cache of planned role changes per role combination of a guild.
+
+        Args:
+        - guild (discord.Guild): The guild to get the plan cache for.
+
+        Returns:
+        - RolePlanCache: The plan cache of the guild, it drops its plans by itself when
+          the configuration changes.
+        """
+        shard_cache = self.get_shard_cache(guild)
+        role_plan_caches: dict[int, RolePlanCache] = shard_cache.setdefault(
+            "role_plan_caches", {}
+        )
+
+        if guild.id not in role_plan_caches:
+            role_plan_caches[guild.id] = RolePlanCache()
+
+        return role_plan_caches[guild.id]
+
+    def plan_member_roles(self, member: discord.Member) -> RoleChangePlan:
+        """
+        Works out the role changes of a member without changing anything, members with
+        the same roles share the work through the plan cache of the guild.
+
+        Args:
+        - member (discord.Member): The member to plan the role changes for.
+
+        Returns:
+        - RoleChangePlan: The changes the member needs that the bot can carry
+          out, can be empty.
+        """
+        guild: discord.Guild = member.guild
+
+        role_change_plan = self.get_role_plan_cache(guild).get_plan(
+            self.get_role_configuration_manager(guild).get_snapshot(),
+            self.get_role_resolver(guild).roles.keys(),
+            member.id,
+            (role.id for role in member.roles),
+            member.premium_since is not None,
+            get_days_in_guild(member),
+        )
+
+        # the cached plans do not depend on the bot roles, so they are
+        # restricted afterwards
+        return role_change_plan.restricted_to(
+            self.get_role_manageability(guild).manageable_role_ids
+        )
+
+    def get_role_plan_cache_stats(self) -> dict:
+        """
+        Gets the hit and miss counts of the plan caches of every guild combined.
+
+        Returns:
+        - dict: The amount of cached plans, the hits, misses and hit rate.
+        """
+        plans = hits = misses = 0
+        for shard_cache in self.shard_caches.values():
+            for role_plan_cache in shard_cache.get("role_plan_caches", {}).values():
+                plans += len(role_plan_cache)
+                hits += role_plan_cache.hits
+                misses += role_plan_cache.misses
+
+        return {
+            "plans": plans,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def plan_members_roles(
+        self, guild: discord.Guild, members: list[discord.Member]
+    ) -> list[RoleChangePlan]:
+        """
+        Works out the role changes of many members of a guild at once, without
+        changing anything.
+
+        Args:
+        - guild (discord.Guild): The guild the members belong to.
+        - members (list[discord.Member]): The members to plan the role changes for.
+
+        Returns:
+        - list[RoleChangePlan]: The plans of the members whose roles need to change, the
+          members that are fine or only need changes the bot can not make are left out.
+        """
+        manageable_role_ids = self.get_role_manageability(guild).manageable_role_ids
+
+        bulk_role_evaluator = self.get_bulk_role_evaluator(guild)
+        role_change_plans = [
+            role_change_plan
+            for role_change_plan in (
+                role_change_plan.restricted_to(manageable_role_ids)
+                for role_change_plan in bulk_role_evaluator.evaluate(
+                    get_member_status(member) for member in members
+                )
+            )
+            if role_change_plan.has_changes
+        ]
+
+        self.logger.debug(
+            "bulk_plan.finish",
+            guild=guild,
+            members=len(members),
+            changed=len(role_change_plans),
+        )
+
+        return role_change_plans
+
+    async def plan_guild_roles(
+        self, guild: discord.Guild, sweep_planner: SweepPlanner
+    ) -> AsyncIterator[RoleChangePlan]:
+        """
+        Works out the role changes of every member of a guild in the worker processes of
+        the sweep planner, so the event loop stays free while a large guild is planned.
+
+        Args:
+        - guild (discord.Guild): The guild to plan the role changes for.
+        - sweep_planner (SweepPlanner): The planner that runs the worker processes.
+
+        Yields:
+        - RoleChangePlan: The plan of every member whose roles need changes the bot can
+          make, as soon as the chunk of the member is planned.
+        """
+        manager = self.get_role_configuration_manager(guild)
+        snapshot: RoleConfigurationSnapshot = manager.get_snapshot()
+        live_role_ids = list(self.get_role_resolver(guild).roles)
+        manageable_role_ids = self.get_role_manageability(guild).manageable_role_ids
+
+        self.logger.info(
+            "sweep_plan.start",
+            guild=guild,
+            version=snapshot.version,
+            members=guild.member_count,
+        )
+
+        async for role_change_plan in sweep_planner.plan(
+            snapshot,
+            live_role_ids,
+            (get_member_status(member) for member in guild.members if not member.bot),
+        ):
+            role_change_plan = role_change_plan.restricted_to(manageable_role_ids)
+            if role_change_plan.has_changes:
+                yield role_change_plan
+
+    def update_role_rules(
+        self, guild: discord.Guild, role_id: int, **changes
+    ) -> RoleConfiguration:
+        """
+        Changes the rules of a role and lets the role resolver of the guild pick up the
+        roles that are mentioned in the new rules.
+
+        Args:
+        - guild (discord.Guild): The guild the role belongs to.
+        - role_id (int): The ID of the role to change.
+        - changes: The fields to change and their new values.
+
+        Returns:
+        - RoleConfiguration: The changed configuration.
+        """
+        manager = self.get_role_configuration_manager(guild)
+        new_configuration = manager.update_configuration(role_id, **changes)
+
+        self.get_role_resolver(guild).set_configured_role_ids(
+            guild, self.get_configured_role_ids(guild)
+        )
+        self.forget_role_manageability(guild.id)
+        self.logger.info("rules.updated", guild=guild, role_id=role_id, changes=changes)
+
+        return new_configuration
+
+    def reset_role_resolvers(self) -> None:
+        """
+        Drops every role resolver and the plans that were worked out against them, they
+        are rebuilt the next time they are requested.
+        """
+        for shard_cache in self.shard_caches.values():
+            shard_cache.pop("role_resolvers", None)
+            shard_cache.pop("role_plan_caches", None)
+            shard_cache.pop("role_manageabilities", None)
+
+    def on_guild_role_create(self, role: discord.Role) -> None:
+        """
+        Adds the configuration for a created role and updates the role
+        resolver of the guild.
+        """
+        # add an empty configuration for the role
+        self.get_role_configuration_manager(role.guild).on_role_create(role)
+
+        # let the resolver pick up the new role
+        role_resolver: RoleResolver = self.get_role_resolver(role.guild)
+        role_resolver.set_configured_role_ids(
+            role.guild, self.get_configured_role_ids(role.guild)
+        )
+        role_resolver.on_role_create(role)
+
+        # make the role searchable by name
+        self.get_role_name_index(role.guild).on_role_create(role)
+
+        # the new role moved the roles below it up
+        self.forget_role_manageability(role.guild.id)
+
+    def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        """
+        Updates the role resolver of the guild after a role was updated.
+        """
+        self.get_role_resolver(after.guild).on_role_update(after)
+        self.get_role_name_index(after.guild).on_role_update(after)
+
+        # the position, permissions or integration of the role can have changed
+        self.forget_role_manageability(after.guild.id)
+
+    def on_guild_role_delete(self, role: discord.Role) -> None:
+        """
+        Removes the configuration of a deleted role, strips it from the rules of the
+        other roles and updates the role resolver of the guild.
+        """
+        role_resolver: RoleResolver = self.get_role_resolver(role.guild)
+        role_resolver.on_role_delete(role)
+        self.get_role_name_index(role.guild).on_role_delete(role)
+
+        # prune the role from the configuration, the resolver stops tracking
+        # it afterwards
+        self.get_role_configuration_manager(role.guild).on_role_delete(role)
+        role_resolver.set_configured_role_ids(
+            role.guild, self.get_configured_role_ids(role.guild)
+        )
+        self.forget_role_manageability(role.guild.id)
+
+    def on_bot_member_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> None:
+        """
+        Works out which roles the bot can manage again after the roles of
+        the bot changed.
+        """
+        if before.roles != after.roles:
+            self.forget_role_manageability(after.guild.id)
 
-    async def get_matching_role_configurations(self, member: discord.Member) -> dict:
+    async def get_matching_role_configurations(
+        self, member: discord.Member
+    ) -> MemberRoleConfigurationView:
         """
             Gets the matching role configurations for a member.
-            
+
             Args:
-            - member (discord.Member): The member for whom to get the matching role configurations.
-            
+            - member (discord.Member): The member for whom to get the matching role
+              configurations.
+
             Returns:
-            - dict: A dictionary containing the matching role configurations for the member.
+            - MemberRoleConfigurationView: A read only view of the configurations of the
+              members roles, over the current configuration snapshot.
             """
-        self.logger.info(f"Getting role configurations for {member.name} ({member.id})")
+        self.logger.info("role_configurations.get", member=member)
 
-        # get the role configuration
-        role_configuration_json = self.stored_role_configuration
+        # get the current snapshot, it will not change while the member is
+        # being validated
+        manager = self.get_role_configuration_manager(member.guild)
+        role_configuration_snapshot: RoleConfigurationSnapshot = manager.get_snapshot()
 
         # get all of users roles that are in the role configuration.
-        members_roles = [role for role in member.roles if str(role.id) in role_configuration_json]
+        users_role_configurations = role_configuration_snapshot.view_for_member(
+            role.id for role in member.roles
+        )
 
-        users_role_configurations: dict = {
-            str(role.id): role_configuration_json[str(role.id)]
-            for role in members_roles
-        }
         self.logger.debug(
-            f"Found configurations for the following roles: {list(users_role_configurations)}"
+            "role_configurations.found",
+            role_ids=users_role_configurations.role_ids,
+            version=role_configuration_snapshot.version,
         )
 
-        try:
-            # remove empty configurations from the dict eg: "cant_combine_with": [] and "required_by": []
-            for configuration in users_role_configurations.values():
-                # loop through the keys in the configuration
-                for key, value in configuration.copy().items():
-                    # check if the key is empty
-                    if isinstance(value, list) and value == []:
-                        # remove the key
-                        configuration.pop(key)
-
-            self.logger.debug(users_role_configurations)
-            self.logger.debug(
-                f"Found configurations for the following roles 2: {list(users_role_configurations)}"
+        return users_role_configurations
+
+    async def remove_member_roles(
+        self, member: discord.Member, roles: list[discord.Role], reason: str = None
+    ) -> list[discord.Role]:
+        """
+        Removes roles from a member, within the rate limit budget of the guild. Roles
+        the bot can not manage are skipped, discord would refuse them anyway.
+
+        Args:
+        - member (discord.Member): The member to remove the roles from.
+        - roles (list[discord.Role]): The roles to remove.
+        - reason (str): The reason shown in the audit log.
+
+        Returns:
+        - list[discord.Role]: The roles that were removed.
+        """
+        roles = self.skip_unmanageable_roles(member, roles, "remove")
+        if not roles:
+            return roles
+
+        # every role is removed with its own request
+        route = f"/guilds/{member.guild.id}/members/{member.id}/roles/{roles[0].id}"
+        await self.rate_limit_budget.acquire("DELETE", route, count=len(roles))
+        await member.remove_roles(*roles, reason=reason)
+
+        return roles
+
+    async def add_member_roles(
+        self, member: discord.Member, roles: list[discord.Role], reason: str = None
+    ) -> list[discord.Role]:
+        """
+        Adds roles to a member, within the rate limit budget of the guild. Roles the bot
+        can not manage are skipped, discord would refuse them anyway.
+
+        Args:
+        - member (discord.Member): The member to add the roles to.
+        - roles (list[discord.Role]): The roles to add.
+        - reason (str): The reason shown in the audit log.
+
+        Returns:
+        - list[discord.Role]: The roles that were added.
+        """
+        roles = self.skip_unmanageable_roles(member, roles, "add")
+        if not roles:
+            return roles
+
+        # every role is added with its own request
+        route = f"/guilds/{member.guild.id}/members/{member.id}/roles/{roles[0].id}"
+        await self.rate_limit_budget.acquire("PUT", route, count=len(roles))
+        await member.add_roles(*roles, reason=reason)
+
+        return roles
+
+    def skip_unmanageable_roles(
+        self, member: discord.Member, roles: list[discord.Role], action: str
+    ) -> list[discord.Role]:
+        """
+        Leaves out the roles the bot can not manage, before a request is wasted on them.
+
+        Args:
+        - member (discord.Member): The member whose roles are changed.
+        - roles (list[discord.Role]): The roles to change.
+        - action (str): Whether the roles are added or removed, for the log.
+
+        Returns:
+        - list[discord.Role]: The roles the bot can manage.
+        """
+        if not roles:
+            return []
+
+        role_manageability = self.get_role_manageability(member.guild)
+        manageable_roles, unmanageable_roles = role_manageability.filter_roles(roles)
+        if unmanageable_roles:
+            self.logger.warning(
+                "role_change.unmanageable",
+                member=member,
+                action=action,
+                roles=unmanageable_roles,
             )
 
-            return users_role_configurations
-        except Exception as error:
-            self.logger.error(f"Failed to get matching role configurations for {member.name} ({member.id})")
-            self.logger.error(error)
-            return {}
+        return manageable_roles
 
-    async def send_user_dm_notice(self, member: discord.Member, discord_embed: discord.Embed, force_msg: bool) -> bool:
+    async def send_user_dm_notice(
+        self, member: discord.Member, discord_embed: discord.Embed, force_msg: bool
+    ) -> bool:
         """
         Sends a user a dm notice.
-        
+
         Args:
         - member (discord.Member): The member to send the dm to.
         - discord_embed (discord.Embed): The embed to send to the user.
@@ -79,286 +675,599 @@ class RoleHandler():
         Returns:
         - bool: Whether or not the dm was sent successfully.
         """
-        # create a str containing the members name and id.
-        member_str = f"{member.name} ({member.id})"
-        
         # log the start of the dm send
-        self.logger.info(f"Starting dm send for {member_str}")
-        
+        self.logger.info("dm.start", member=member)
+
         # get the guild
         guild: discord.Guild = member.guild
-        
+
         # if there is no guild, return false
         if guild is None:
-            self.logger.info(f"{member_str} is not in our server?, skipping dm send.")
+            self.logger.info("dm.skipped", member=member, reason="not in guild")
             return False
-        
+
         try:
             # get the dm channel
-            dm_channel: discord.DMChannel = member.dm_channel
-            # check if the user has a dm channel
-            if dm_channel is None:
-                # create a dm channel
-                dm_channel = await member.create_dm()
+            dm_channel: discord.DMChannel = await self.get_dm_channel(member)
             # send the dm
+            await self.rate_limit_budget.acquire(
+                "POST", f"/channels/{dm_channel.id}/messages"
+            )
             await dm_channel.send(embed=discord_embed)
         except discord.errors.Forbidden:
-            self.logger.info(f"Failed to send dm to {member_str}, user has dm's disabled.")
-            if force_msg:
-                # get channel with ID 1000794580662354020 (bots channel)
-                channel = self.bot.get_channel(1000794580662354020)
-                # if the channel is not found, return false
-                if channel is None:
-                    self.logger.info(f"Failed to send dm to {member_str}, user has dm's disabled and the bots channel is not found.")
-                    return False
-                
-                # add a message to the embed to let the user know that they have dm's disabled
-                discord_embed.add_field(name="DM's Disabled", value="You have dm's disabled, please enable them to receive important messages from the bot. This message will self delete in 30 seconds.", inline=False)
-                
-                # send the user a message in the bots channel
-                await channel.send(f"{member.mention}", embed=discord_embed, delete_after=30)
+            self.logger.info("dm.forbidden", member=member)
+            if force_msg and not await self.send_bots_channel_notice(
+                member, discord_embed
+            ):
+                return False
         except Exception as error:
-            self.logger.error(f"Failed to send dm to {member_str}")
-            self.logger.error(error)
+            self.logger.error("dm.failed", member=member, error=error)
             return False
-        
+
         # log the end of the dm send
-        self.logger.info(f"Finished dm send for {member_str}")
-        
+        self.logger.info("dm.finish", member=member)
+
+        return True
+
+    async def get_dm_channel(self, member: discord.Member) -> discord.DMChannel:
+        """
+        Gets the dm channel of a member, creating it if the member has none yet.
+
+        Args:
+        - member (discord.Member): The member to get the dm channel of.
+
+        Returns:
+        - discord.DMChannel: The dm channel of the member.
+        """
+        # check if the user has a dm channel
+        if member.dm_channel is not None:
+            return member.dm_channel
+
+        # create a dm channel
+        await self.rate_limit_budget.acquire("POST", "/users/@me/channels")
+        return await member.create_dm()
+
+    async def send_bots_channel_notice(
+        self, member: discord.Member, discord_embed: discord.Embed
+    ) -> bool:
+        """
+        Sends a notice to a member in the bots channel, for members with dm's disabled.
+
+        Args:
+        - member (discord.Member): The member to mention.
+        - discord_embed (discord.Embed): The embed to send to the user.
+
+        Returns:
+        - bool: Whether or not the bots channel was found.
+        """
+        # get channel with ID 1000794580662354020 (bots channel)
+        channel = self.bot.get_channel(1000794580662354020)
+        # if the channel is not found, return false
+        if channel is None:
+            self.logger.info(
+                "dm.fallback_failed",
+                member=member,
+                reason="bots channel not found",
+            )
+            return False
+
+        # add a message to the embed to let the user know that they have dm's
+        # disabled
+        discord_embed.add_field(
+            name="DM's Disabled",
+            value=(
+                "You have dm's disabled, please enable them to receive important "
+                "messages from the bot. This message will self delete in 30 seconds."
+            ),
+            inline=False,
+        )
+
+        # send the user a message in the bots channel
+        await self.rate_limit_budget.acquire("POST", f"/channels/{channel.id}/messages")
+        await channel.send(f"{member.mention}", embed=discord_embed, delete_after=30)
+
         return True
 
-    async def validate_supporter_roles(self, member: discord.Member, members_role_configurations: dict) -> list[discord.Role]:
+    async def validate_supporter_roles(
+        self,
+        member: discord.Member,
+        members_role_configurations: MemberRoleConfigurationView,
+    ) -> list[discord.Role]:
         """
-        Checks if a user has supporter status and removes any roles that require supporter status if the user does not have it.
-        
+        Checks if a user has supporter status and removes any roles that require
+        supporter status if the user does not have it.
+
         Args:
             member (discord.Member): The user to check booster status for.
-            members_role_configurations (dict): A dict containing the role configurations for the members roles.
+            members_role_configurations (MemberRoleConfigurationView): The role
+                configurations for the members roles.
         Returns:
             list[discord.Role]: A list of roles that were removed.
         """
-        # create a str containing the members name and id.
-        member_str = f"{member.name} ({member.id})"
-        
         # log the start of the supporter check
-        self.logger.info(f"Starting supporter check for {member_str}")
-        
+        self.logger.info("supporter_check.start", member=member)
+
         # get the guild
         guild: discord.Guild = member.guild
-        
+
         # if there is no guild, return an empty list
         if guild is None:
-            self.logger.info(f"{member_str} is not in our server?, skipping check.")
+            self.logger.info("check.skipped", member=member, reason="not in guild")
             return []
-        
+
         # if the user is a supporter, return an empty list
         if member.premium_since is not None:
-            self.logger.info(f"{member_str}) is a supporter, skipping check.")
+            self.logger.info(
+                "supporter_check.skipped", member=member, reason="is a supporter"
+            )
             return []
 
         # get the roles that require you to be supporting the server.
-        supporter_roles: list = [role_id for role_id in members_role_configurations if members_role_configurations[role_id]["requires_supporter_status"]]
+        supporter_roles: list = [
+            role_id
+            for role_id in members_role_configurations
+            if members_role_configurations[role_id].requires_supporter_status
+        ]
 
         # check if there are any roles that require booster status
         if len(supporter_roles) <= 0:
-            self.logger.info(f"{member_str} does not have any roles that require supporter status, skipping check.")
-            
+            self.logger.info(
+                "supporter_check.skipped", member=member, reason="no supporter roles"
+            )
+
         # get the roles that require booster status from the role configuration dict
-        roles_to_remove = [guild.get_role(int(role_id)) for role_id in supporter_roles]
-        
+        roles_to_remove = self.get_role_resolver(guild).resolve_many(supporter_roles)
+
         # log the roles that are being removed
-        self.logger.info(f"{member_str} does not have supporter status, removing the following roles: {[role.name.strip() for role in roles_to_remove]}")
+        self.logger.info("supporter_check.remove", member=member, roles=roles_to_remove)
 
         # remove the roles
-        await member.remove_roles(*roles_to_remove)
-        
-        self.logger.info(f"Finished supporter check for {member_str}")
+        roles_to_remove = await self.remove_member_roles(member, roles_to_remove)
+
+        self.logger.info("supporter_check.finish", member=member)
         return roles_to_remove
-    
-    async def validate_singleton_roles(self, member: discord.Member, members_role_configurations: dict) -> list[discord.Role]:
+
+    async def validate_singleton_roles(
+        self,
+        member: discord.Member,
+        members_role_configurations: MemberRoleConfigurationView,
+    ) -> list[discord.Role]:
         """
-        Check if a member has any roles that cannot be combined with other roles, based on the configuration in members_role_configurations.
+        Check if a member has any roles that cannot be combined with other roles, based
+        on the configuration in members_role_configurations.
 
         Args:
             member (discord.Member): The user to validate the roles for.
-            members_role_configurations (dict): A dict containing the role configurations for the users roles.
+            members_role_configurations (MemberRoleConfigurationView): The role
+                configurations for the users roles.
         Returns:
             list[discord.Role]: A list of roles that were removed.
         """
-        # create a str containing the members name and id.
-        member_str: str = f"{member.name} ({member.id})"
-        
         # log the start of the role combination check
-        self.logger.info(f"Starting role combination check for {member_str}")
-        
+        self.logger.info("combination_check.start", member=member)
+
         # get the guild
         guild: discord.Guild = member.guild
-        
+
         # if there is no guild, return an empty list
         if guild is None:
-            self.logger.info(f"{member_str} is not in our server?, skipping check.")
+            self.logger.info("check.skipped", member=member, reason="not in guild")
             return []
 
-        # get the roles that cannot be combined with other roles
-        cannot_combine_roles: dict = {}
-        # get all of the roles that have a cant_combine_with field
-        for role_id in members_role_configurations:
-            # check if the role has a cant_combine_with field
-            if "cant_combine_with" in members_role_configurations[role_id]:
-                cannot_combine_roles[role_id] = members_role_configurations[role_id]
+        # get all of the roles that have a cant_combine_with rule
+        cannot_combine_roles: dict[str, RoleConfiguration] = {
+            role_id: configuration
+            for role_id, configuration in members_role_configurations.items()
+            if configuration.cant_combine_with
+        }
 
         # check if there are any roles that cannot be combined with other roles
         if len(cannot_combine_roles) <= 0:
             # return an empty list
-            self.logger.info(f"{member.name} does not have any roles that cannot be combined with other roles, skipping check.")
+            self.logger.info(
+                "combination_check.skipped", member=member, reason="no singleton roles"
+            )
             return []
 
-        # get the roles that cannot be combined with other roles from the role configuration dict
+        # get the role resolver, dangling roles are skipped by it
+        role_resolver: RoleResolver = self.get_role_resolver(guild)
+
+        # get the roles that cannot be combined with other roles from the role
+        # configuration dict
+        roles_to_remove = self.find_singleton_conflicts(
+            member, role_resolver, cannot_combine_roles
+        )
+
+        if len(roles_to_remove) > 0:
+            self.logger.info(
+                "combination_check.remove", member=member, roles=roles_to_remove
+            )
+
+        roles_to_remove = await self.remove_member_roles(
+            member, roles_to_remove, reason="Role combination check"
+        )
+
+        self.logger.info("combination_check.finish", member=member)
+        return roles_to_remove
+
+    def find_singleton_conflicts(
+        self,
+        member: discord.Member,
+        role_resolver: RoleResolver,
+        cannot_combine_roles: dict[int, RoleConfiguration],
+    ) -> list[discord.Role]:
+        """
+        Gets the roles of a member that are combined with a role they can not be
+        combined with.
+
+        Args:
+            member (discord.Member): The user to check the roles of.
+            role_resolver (RoleResolver): The role resolver of the guild.
+            cannot_combine_roles (dict[int, RoleConfiguration]): The configurations of
+                the roles of the member that have a cant_combine_with rule.
+        Returns:
+            list[discord.Role]: A list of roles that have to be removed.
+        """
         roles_to_remove: list[discord.Role] = []
         for role_id in cannot_combine_roles:
             # get the roles that the role cannot be combined
-            roles_that_cannot_be_combined = [guild.get_role(int(role_id)) for role_id in cannot_combine_roles[role_id]["cant_combine_with"]]
-            
-            # check if the user has any of the roles that the role cannot be combined with
-            user_matching_roles: list[discord.Role] = [role for role in member.roles if role in roles_that_cannot_be_combined]
-            
+            roles_that_cannot_be_combined = role_resolver.resolve_many(
+                cannot_combine_roles[role_id].cant_combine_with
+            )
+
+            # check if the user has any of the roles that the role cannot be
+            # combined with
+            user_matching_roles: list[discord.Role] = [
+                role for role in member.roles if role in roles_that_cannot_be_combined
+            ]
+
             if len(user_matching_roles) <= 0:
                 continue
-                
+
             # get the role
-            role: discord.Role = guild.get_role(int(role_id))
-            
+            role: discord.Role = role_resolver.resolve(role_id)
+            if role is None:
+                continue
+
             # log the roles that are being removed
-            self.logger.info(f"{member_str} has the following role that cannot be combined with {role.name}: {[role.name.strip() for role in user_matching_roles]}, removing them.")
-            
+            self.logger.info(
+                "combination_check.conflict",
+                member=member,
+                role=role,
+                conflicting_roles=user_matching_roles,
+            )
+
             # remove the roles
             roles_to_remove.append(role)
 
-        if len(roles_to_remove) > 0:
-            self.logger.info(f"Singleton check removed the following roles: {[role.name.strip() for role in roles_to_remove]} from {member_str}")
-
-        await member.remove_roles(*roles_to_remove, reason="Role combination check")
-        
-        self.logger.info(f"Finished role combination check for {member_str}")
         return roles_to_remove
 
-    async def validate_required_roles(self, member: discord.Member, members_role_configurations: dict) -> list[discord.Role]:
+    async def validate_required_roles(
+        self,
+        member: discord.Member,
+        members_role_configurations: MemberRoleConfigurationView,
+    ) -> list[discord.Role]:
         """
-        Checks if a member has any roles that are required by other roles, based on the configuration in members_role_configurations.
-        If the member does not have any of the required roles, then we remove the role that requires the other roles.
-        
+        Checks if a member has any roles that are required by other roles, based on the
+        configuration in members_role_configurations. If the member does not have any of
+        the required roles, then we remove the role that requires the other roles.
+
         Args:
             member (discord.Member): The user to validate the roles for.
-            members_role_configurations (dict): A dict containing the role configurations for the users roles.
+            members_role_configurations (MemberRoleConfigurationView): The role
+                configurations for the users roles.
         Returns:
             list[discord.Role]: A list of roles that were removed.
         """
-        # create a str containing the members name and id.
-        member_str: str = f"{member.name} ({member.id})"
-        
         # log the start of the required role check
-        self.logger.info(f"Starting required role check for {member_str}")
-        
+        self.logger.info("required_check.start", member=member)
+
         # get the guild
         guild: discord.Guild = member.guild
-        
+
         # if there is no guild, return an empty list
         if guild is None:
-            self.logger.info(f"{member_str} is not in our server?, skipping check.")
+            self.logger.info("check.skipped", member=member, reason="not in guild")
             return []
 
-        # get the roles that are required by other roles
-        required_by_configurations: dict = {}
-        # get all of the roles that have a required_by field
-        for role_id in members_role_configurations:
-            # check if the role has a required_by field
-            if "required_by" in members_role_configurations[role_id]:
-                required_by_configurations[role_id] = members_role_configurations[role_id]
+        # get all of the roles that have a required_by rule
+        required_by_configurations: dict[str, RoleConfiguration] = {
+            role_id: configuration
+            for role_id, configuration in members_role_configurations.items()
+            if configuration.required_by
+        }
 
         # check if there are any roles that require other roles
         if len(required_by_configurations) <= 0:
             # return an empty list
-            self.logger.info(f"{member.name} does not have any roles that require other roles, skipping check.")
+            self.logger.info(
+                "required_check.skipped", member=member, reason="no required roles"
+            )
             return []
-        
-        self.logger.debug(f"Found configurations for the following roles: {[required_by_configurations[role_id]['role_name'].strip() for role_id in required_by_configurations]}")
 
-        # get the roles that are required by other roles from the role configuration dict
+        self.logger.debug(
+            "required_check.configurations", role_ids=required_by_configurations.keys()
+        )
+
+        # get the role resolver, dangling roles are skipped by it
+        role_resolver: RoleResolver = self.get_role_resolver(guild)
+
+        # get the roles that are required by other roles from the role
+        # configuration dict
+        roles_to_remove = self.find_missing_required_roles(
+            member, role_resolver, required_by_configurations
+        )
+
+        if len(roles_to_remove) > 0:
+            self.logger.info(
+                "required_check.remove", member=member, roles=roles_to_remove
+            )
+
+        # remove the roles
+        roles_to_remove = await self.remove_member_roles(member, roles_to_remove)
+
+        self.logger.info("required_check.finish", member=member)
+        return roles_to_remove
+
+    def find_missing_required_roles(
+        self,
+        member: discord.Member,
+        role_resolver: RoleResolver,
+        required_by_configurations: dict[int, RoleConfiguration],
+    ) -> list[discord.Role]:
+        """
+        Gets the roles of a member that the member misses every required role for.
+
+        Args:
+            member (discord.Member): The user to check the roles of.
+            role_resolver (RoleResolver): The role resolver of the guild.
+            required_by_configurations (dict[int, RoleConfiguration]): The
+                configurations of the roles of the member that have a required_by
+                rule.
+        Returns:
+            list[discord.Role]: A list of roles that have to be removed.
+        """
         roles_to_remove: list[discord.Role] = []
         for role_id in required_by_configurations:
             # get the roles that the role requires
-            roles_that_are_required = [guild.get_role(int(role_id)) for role_id in required_by_configurations[role_id]["required_by"]]
-            
+            roles_that_are_required = role_resolver.resolve_many(
+                required_by_configurations[role_id].required_by
+            )
+
             # check if the user has any of the roles that the role requires
-            user_matching_roles: list[discord.Role] = [role for role in member.roles if role in roles_that_are_required]
-            
+            user_matching_roles: list[discord.Role] = [
+                role for role in member.roles if role in roles_that_are_required
+            ]
+
             if len(user_matching_roles) > 0:
                 continue
-                
+
             # get the role
-            role: discord.Role = guild.get_role(int(role_id))
-            
+            role: discord.Role = role_resolver.resolve(role_id)
+            if role is None:
+                continue
+
             # log the roles that are being removed
-            self.logger.info(f"{member_str} does not have any of the roles that are required by {role.name}, removing it.")
-            
+            self.logger.info("required_check.missing", member=member, role=role)
+
             # remove the roles
             roles_to_remove.append(role)
-            
+
+        return roles_to_remove
+
+    async def validate_rule_roles(
+        self,
+        member: discord.Member,
+        members_role_configurations: MemberRoleConfigurationView,
+    ) -> list[discord.Role]:
+        """
+        Checks if a member meets the rules of their roles, based on the compiled rules
+        in members_role_configurations. If the member does not meet the rule of a role,
+        then we remove the role.
+
+        Args:
+            member (discord.Member): The user to validate the roles for.
+            members_role_configurations (MemberRoleConfigurationView): The role
+                configurations for the users roles.
+        Returns:
+            list[discord.Role]: A list of roles that were removed.
+        """
+        # log the start of the role rule check
+        self.logger.info("rule_check.start", member=member)
+
+        # get the guild
+        guild: discord.Guild = member.guild
+
+        # if there is no guild, return an empty list
+        if guild is None:
+            self.logger.info("check.skipped", member=member, reason="not in guild")
+            return []
+
+        # get all of the roles that have a rule
+        rule_configurations: dict[int, RoleConfiguration] = {
+            role_id: configuration
+            for role_id, configuration in members_role_configurations.items()
+            if configuration.compiled_rule is not None
+        }
+
+        # check if there are any roles with a rule
+        if len(rule_configurations) <= 0:
+            self.logger.info(
+                "rule_check.skipped", member=member, reason="no rule roles"
+            )
+            return []
+
+        # get the role resolver, dangling roles are skipped by it
+        role_resolver: RoleResolver = self.get_role_resolver(guild)
+
+        roles_to_remove = self.find_failed_rule_roles(
+            member, role_resolver, rule_configurations
+        )
+
         if len(roles_to_remove) > 0:
-            self.logger.info(f"Required role check removed the following roles: {[role.name.strip() for role in roles_to_remove]} from {member_str}")
-        
+            self.logger.info("rule_check.remove", member=member, roles=roles_to_remove)
+
         # remove the roles
-        await member.remove_roles(*roles_to_remove)
+        roles_to_remove = await self.remove_member_roles(
+            member, roles_to_remove, reason="Role rule check"
+        )
+
+        self.logger.info("rule_check.finish", member=member)
+        return roles_to_remove
+
+    def find_failed_rule_roles(
+        self,
+        member: discord.Member,
+        role_resolver: RoleResolver,
+        rule_configurations: dict[int, RoleConfiguration],
+    ) -> list[discord.Role]:
+        """
+        Gets the roles of a member whose rule the member does not meet.
+
+        Args:
+            member (discord.Member): The user to check the roles of.
+            role_resolver (RoleResolver): The role resolver of the guild.
+            rule_configurations (dict[int, RoleConfiguration]): The configurations
+                of the roles of the member that have a rule.
+        Returns:
+            list[discord.Role]: A list of roles that have to be removed.
+        """
+        # the rules compare against the roles the member had at the start, like
+        # the other checks
+        held_role_ids: set[int] = {role.id for role in member.roles}
+        is_supporter: bool = member.premium_since is not None
+        days_in_guild: int = get_days_in_guild(member)
+
+        roles_to_remove: list[discord.Role] = []
+        for role_id, configuration in rule_configurations.items():
+            # check if the member meets the rule
+            if configuration.compiled_rule.allows(
+                held_role_ids, is_supporter, days_in_guild
+            ):
+                continue
+
+            # get the role
+            role: discord.Role = role_resolver.resolve(role_id)
+            if role is None:
+                continue
+
+            # log the role that is being removed
+            self.logger.info(
+                "rule_check.failed", member=member, role=role, rule=configuration.rule
+            )
+
+            roles_to_remove.append(role)
 
-        self.logger.info(f"Finished required role check for {member_str}")
         return roles_to_remove
 
-    async def validate_role_grants(self, member: discord.Member, members_role_configurations: dict) -> list[discord.Role]:
+    async def validate_role_grants(
+        self,
+        member: discord.Member,
+        members_role_configurations: MemberRoleConfigurationView,
+    ) -> list[discord.Role]:
         """
-        Checks if a member has any roles that grant other roles, based on the configuration in members_role_configurations.
-        
+        Checks if a member has any roles that grant other roles, based on the
+        configuration in members_role_configurations.
+
         Args:
             member (discord.Member): The user to validate the roles for.
-            members_role_configurations (dict): A dict containing the role configurations for the users roles.
+            members_role_configurations (MemberRoleConfigurationView): The role
+                configurations for the users roles.
         Returns:
             list[discord.Role]: A list of roles that were added.
         """
-        # create a str containing the members name and id.
-        member_str: str = f"{member.name} ({member.id})"
-
         # log the start of the role grant check
-        self.logger.info(f"Starting role grant check for {member_str}")
+        self.logger.info("grant_check.start", member=member)
 
         # get the guild
         guild: discord.Guild = member.guild
 
         # if there is no guild, return an empty list
         if guild is None:
-            self.logger.info(f"{member_str} is not in our server?, skipping check.")
+            self.logger.info("check.skipped", member=member, reason="not in guild")
             return []
 
-        role_grant_configurations: dict = {
-            role_id: members_role_configurations[role_id]
-            for role_id, value in members_role_configurations.items()
-            if "grants_role" in value
+        role_grant_configurations: dict[str, RoleConfiguration] = {
+            role_id: configuration
+            for role_id, configuration in members_role_configurations.items()
+            if any((
+                configuration.grants_role,
+                getattr(configuration.compiled_rule, "grants", ()),
+            ))
         }
-        
+
         # check if there are any roles that grant other roles
         if len(role_grant_configurations) <= 0:
             # return an empty list
-            self.logger.info(f"{member.name} does not have any roles that grant other roles, skipping check.")
+            self.logger.info(
+                "grant_check.skipped", member=member, reason="no granting roles"
+            )
             return []
 
-        self.logger.debug(f"Found configurations for the following roles: {[role_grant_configurations[role_id]['role_name'] for role_id in role_grant_configurations]}")
+        self.logger.debug(
+            "grant_check.configurations", role_ids=role_grant_configurations.keys()
+        )
+
+        # get the role resolver, dangling roles are skipped by it
+        role_resolver: RoleResolver = self.get_role_resolver(guild)
 
         # get the roles that grant other roles from the role configuration dict
+        roles_to_add = self.find_missing_grants(
+            member, role_resolver, role_grant_configurations
+        )
+
+        if roles_to_add:
+            self.logger.info("grant_check.add", member=member, roles=roles_to_add)
+
+        # add the roles
+        roles_to_add = await self.add_member_roles(member, roles_to_add)
+
+        self.logger.info("grant_check.finish", member=member)
+        return roles_to_add
+
+    def find_missing_grants(
+        self,
+        member: discord.Member,
+        role_resolver: RoleResolver,
+        role_grant_configurations: dict[int, RoleConfiguration],
+    ) -> list[discord.Role]:
+        """
+        Gets the roles that the roles of a member grant, but the member does not have.
+
+        Args:
+            member (discord.Member): The user to check the roles of.
+            role_resolver (RoleResolver): The role resolver of the guild.
+            role_grant_configurations (dict[int, RoleConfiguration]): The
+                configurations of the roles of the member that grant other roles.
+        Returns:
+            list[discord.Role]: A list of roles that have to be added, without
+                duplicates.
+        """
+        # the conditions of rule grants compare against the roles the member
+        # had at the start
+        held_role_ids: set[int] = {role.id for role in member.roles}
+        is_supporter: bool = member.premium_since is not None
+        days_in_guild: int = get_days_in_guild(member)
+
         roles_to_add: list[discord.Role] = []
         for role_id, value_ in role_grant_configurations.items():
-            # get the roles that the role grants
-            roles_that_are_granted: list[discord.Role] = [guild.get_role(int(role_id)) for role_id in role_grant_configurations[role_id]["grants_role"]]
+            # get the roles that the role grants, by its grants and by its rule
+            granted_role_ids = list(value_.grants_role)
+            if value_.compiled_rule is not None:
+                granted_role_ids.extend(
+                    value_.compiled_rule.iter_granted_role_ids(
+                        held_role_ids, is_supporter, days_in_guild
+                    )
+                )
+
+            roles_that_are_granted: list[discord.Role] = role_resolver.resolve_many(
+                granted_role_ids
+            )
 
             # get all of the roles that should be granted that the user does not have
-            roles_that_should_be_granted: list[discord.Role] = [role for role in roles_that_are_granted if role not in member.roles]
+            roles_that_should_be_granted: list[discord.Role] = [
+                role for role in roles_that_are_granted if role not in member.roles
+            ]
 
             # check if the user has any of the roles that the role grants
             if len(roles_that_should_be_granted) <= 0:
@@ -366,186 +1275,300 @@ class RoleHandler():
 
             # log the roles that are being added
             self.logger.info(
-                f"{member_str} does not have the following roles that are granted by {value_['role_name']}: {[role.name for role in roles_that_should_be_granted]}, adding them."
+                "grant_check.missing",
+                member=member,
+                granted_by=value_.role_name,
+                roles=roles_that_should_be_granted,
             )
 
             # add the roles
-            roles_to_add.append(*roles_that_should_be_granted)
+            roles_to_add.extend(roles_that_should_be_granted)
 
         # remove duplicates from the list
-        roles_to_add = list(dict.fromkeys(roles_to_add))
+        return list(dict.fromkeys(roles_to_add))
 
-        if roles_to_add:
-            self.logger.info(f"Role grant check added the following roles: {[role.name for role in roles_to_add]} to {member_str}")
+    async def validate_roles(
+        self, member: discord.Member, role_change_plan: RoleChangePlan = None
+    ) -> bool:
+        """
+        Validates the users roles.
 
-        # add the roles
-        await member.add_roles(*roles_to_add)
+        Args:
+        - member (discord.Member): The member to validate.
+        - role_change_plan (RoleChangePlan): The role changes that were already worked
+          out for the member, like the plans of a sweep. They are applied instead of
+          checking the member again.
 
-        self.logger.info(f"Finished role grant check for {member_str}")
-        return roles_to_add
+        Returns:
+        - bool: Whether any roles of the member changed.
+        """
+        if not self.live_validation:
+            self.logger.debug(
+                "validation.skipped", member=member, reason="live validation is off"
+            )
+            return False
+
+        if role_change_plan is not None:
+            return await self.apply_role_change_plan(member, role_change_plan)
+
+        self.logger.info("validation.start", member=member)
+
+        # most members have a role combination that was already planned, and most
+        # plans are empty
+        if member.guild is not None and not self.plan_member_roles(member).has_changes:
+            self.logger.info("validation.unchanged", member=member, cached=True)
+            return False
+
+        members_role_configurations = await self.get_matching_role_configurations(
+            member
+        )
+
+        # remove any lost roles from the list of roles to check
+        supporter_roles_lost = await self.validate_supporter_roles(
+            member, members_role_configurations
+        )
+        members_role_configurations = members_role_configurations.without(
+            role.id for role in supporter_roles_lost
+        )
+        singleton_roles_lost = await self.validate_singleton_roles(
+            member, members_role_configurations
+        )
+        members_role_configurations = members_role_configurations.without(
+            role.id for role in singleton_roles_lost
+        )
+        required_roles_lost = await self.validate_required_roles(
+            member, members_role_configurations
+        )
+        members_role_configurations = members_role_configurations.without(
+            role.id for role in required_roles_lost
+        )
+        rule_roles_lost = await self.validate_rule_roles(
+            member, members_role_configurations
+        )
+        members_role_configurations = members_role_configurations.without(
+            role.id for role in rule_roles_lost
+        )
+        received_grant_roles = await self.validate_role_grants(
+            member, members_role_configurations
+        )
+
+        return await self.finish_validation(member, [
+            (
+                "Roles lost due to supporter/server boosting status",
+                supporter_roles_lost,
+            ),
+            ("Roles lost due to overlap", singleton_roles_lost),
+            ("Roles Lost", required_roles_lost),
+            ("Roles lost due to role rules", rule_roles_lost),
+            ("Roles Gained", received_grant_roles),
+        ])
 
-    async def validate_roles(self, member: discord.Member) -> bool:
+    async def apply_role_change_plan(
+        self, member: discord.Member, role_change_plan: RoleChangePlan
+    ) -> bool:
         """
-        Validates the users roles.
+        Carries out role changes that were already worked out for a member. Roles
+        the member no longer has are not removed and roles the member already has
+        are not added again.
+
+        Args:
+        - member (discord.Member): The member to change the roles of.
+        - role_change_plan (RoleChangePlan): The planned role changes of the member.
+
+        Returns:
+        - bool: Whether any roles of the member changed.
+        """
+        self.logger.info("validation.start", member=member, planned=True)
+
+        role_resolver: RoleResolver = self.get_role_resolver(member.guild)
+        held_role_ids: set[int] = {role.id for role in member.roles}
+
+        lost_roles = [
+            (
+                field_name,
+                role_resolver.resolve_many(
+                    role_id for role_id in role_ids if role_id in held_role_ids
+                ),
+            )
+            for field_name, role_ids in (
+                (
+                    "Roles lost due to supporter/server boosting status",
+                    role_change_plan.supporter_roles_lost,
+                ),
+                ("Roles lost due to overlap", role_change_plan.singleton_roles_lost),
+                ("Roles Lost", role_change_plan.required_roles_lost),
+                ("Roles lost due to role rules", role_change_plan.rule_roles_lost),
+            )
+        ]
+        removed_roles = await self.remove_member_roles(
+            member,
+            [role for _, roles in lost_roles for role in roles],
+            reason="Planned role changes",
+        )
+
+        granted_roles = role_resolver.resolve_many(
+            role_id
+            for role_id in role_change_plan.granted_roles
+            if role_id not in held_role_ids
+        )
+        added_roles = await self.add_member_roles(
+            member, granted_roles, reason="Planned role changes"
+        )
+
+        return await self.finish_validation(member, [
+            *(
+                (field_name, [role for role in roles if role in removed_roles])
+                for field_name, roles in lost_roles
+            ),
+            ("Roles Gained", added_roles),
+        ])
+
+    async def finish_validation(
+        self, member: discord.Member, role_changes: list[tuple[str, list[discord.Role]]]
+    ) -> bool:
+        """
+        Tells the member which of their roles changed, if any did.
+
+        Args:
+        - member (discord.Member): The validated member.
+        - role_changes (list[tuple[str, list[discord.Role]]]): The field name and the
+          changed roles of every kind of change, in the order they are shown.
+
+        Returns:
+        - bool: Whether any roles of the member changed.
         """
-        return
-        # create a str containing the users name and id and store it inside of the member class, temporarily until I write a custom member class.
-        member_str = f"{member.name} ({member.id})"
-        
-        self.logger.info(f"Starting validation of roles for user: {member_str}")
-        
-
-        
-        self.logger.info("Getting role configurations...")
-        members_role_configurations = await self.get_matching_role_configurations(member)
-        self.logger.info("Got role configurations!")
-        
-        # remove any lost roles from the list of roles to check
-        supporter_roles_lost = await self.validate_supporter_roles(member, members_role_configurations)
-        for role in supporter_roles_lost:
-            members_role_configurations.pop(str(role.id))
-        singleton_roles_lost = await self.validate_singleton_roles(member, members_role_configurations)
-        for role in singleton_roles_lost:
-            members_role_configurations.pop(str(role.id))
-        required_roles_lost  = await self.validate_required_roles(member, members_role_configurations)
-        for role in required_roles_lost:
-            members_role_configurations.pop(str(role.id))
-        received_grant_roles = await self.validate_role_grants(member, members_role_configurations)
-        
         # check if any roles were lost or gained
-        if len(supporter_roles_lost) <= 0 and len(singleton_roles_lost) <= 0 and len(required_roles_lost) <= 0 and len(received_grant_roles) <= 0:
-            self.logger.info(f"No roles were lost or gained for {member_str}, skipping dm send.")
+        if not any(roles for _, roles in role_changes):
+            self.logger.info("validation.unchanged", member=member)
             return False
-        
+
+        # send the user a dm
+        await self.send_user_dm_notice(
+            member, self.create_role_notice_embed(role_changes), force_msg=True
+        )
+
+        # log the end of the validation
+        self.logger.info("validation.finish", member=member)
+
+        return True
+
+    def create_role_notice_embed(
+        self, role_changes: list[tuple[str, list[discord.Role]]]
+    ) -> discord.Embed:
+        """
+        Creates the notice that tells a member which of their roles changed.
+
+        Args:
+        - role_changes (list[tuple[str, list[discord.Role]]]): The field name and the
+          changed roles of every kind of change, kinds without roles are left out.
+
+        Returns:
+        - discord.Embed: The notice embed.
+        """
         # create an notice embed
         notice_embed = discord.Embed(
-            title="Hey! we have corrected your roles, and you either lost or just gained some roles!",
-            description="Please check the following information to see what roles you have lost or gained. If you believe this is a mistake, please contact Casper through DMs.",
+            title=(
+                "Hey! we have corrected your roles, and you either lost or just gained "
+                "some roles!"
+            ),
+            description=(
+                "Please check the following information to see what roles you have "
+                "lost or gained. If you believe this is a mistake, please contact "
+                "Casper through DMs."
+            ),
             color=discord.Color.yellow(),
         )
-    
+
         # set the embed author to the bot
-        notice_embed.set_author(name="DOSE Official", icon_url=self.bot.user.display_avatar.url)
-        
-        # check if the user lost any roles due to supporter status
-        if len(supporter_roles_lost) > 0:
-            # create a str containing the roles names
-            roles_str = ""
-            
-            for role in supporter_roles_lost:
-                role_name = role.name
-                if "ㅤ" in role_name:
-                    role_name = role_name.replace("ㅤ", "")
-                    role_name += " (Role Visual Divider)"
-                roles_str += f"@{role_name},\n"
-            
-            roles_str = roles_str[:-2]
-
-            notice_embed.add_field(name="Roles lost due to supporter/server boosting status", value=roles_str, inline=False)
-        # check if the user lost any roles due to role combination
-        if len(singleton_roles_lost) > 0:
-            # create a str containing the roles names
-            roles_str = ""
-            
-            for role in singleton_roles_lost:
-                role_name = role.name
-                if "ㅤ" in role_name:
-                    role_name = role_name.replace("ㅤ", "")
-                    role_name += " (Role Visual Divider)"
-                roles_str += f"@{role_name},\n"
-            
-            roles_str = roles_str[:-2]
-            
-            notice_embed.add_field(name="Roles lost due to overlap", value=roles_str, inline=False)
-
-        # check if the user lost any roles due to required roles
-        if len(required_roles_lost) > 0:
-            # create a str containing the roles names
-            roles_str = ""
-            
-            for role in required_roles_lost:
-                role_name = role.name
-                if "ㅤ" in role_name:
-                    role_name = role_name.replace("ㅤ", "")
-                    role_name += " (Role Visual Divider)"
-                roles_str += f"@{role_name},\n"
-            
-            roles_str = roles_str[:-2]
-            
-            notice_embed.add_field(name="Roles Lost", value=roles_str, inline=False)
-            
-        # check if the user gained any roles due to role grants
-        if len(received_grant_roles) > 0:
-            # create a str containing the roles names
-            roles_str = ""
-            
-            for role in received_grant_roles:
-                role_name = role.name
-                if "ㅤ" in role_name:
-                    role_name = role_name.replace("ㅤ", "")
-                    role_name += " (Role Visual Divider)"
-                roles_str += f"@{role_name},\n"
-            
-            roles_str = roles_str[:-2]
-            
-            notice_embed.add_field(name="Roles Gained", value=roles_str, inline=False)
-        
+        notice_embed.set_author(
+            name="DOSE Official", icon_url=self.bot.user.display_avatar.url
+        )
 
-        # send the user a dm
-        await self.send_user_dm_notice(member, notice_embed, force_msg = True)    
-        
-        # log the end of the validation
-        self.logger.info(f"Finished validation of roles for user: {member_str}")
-        
-        return True
-                
-    
-    
-    def create_role_configuration(self) -> None:
-        """
-        Creates the role configuration file.
-        """
-        # get the configuration folder
-        role_configuration_folder: Folder = self.data_handler.search_for_folder("configuration")
-        
-        # get the role configuration file
-        role_configuration_file = role_configuration_folder.get_file("role_configuration.json", create_if_none=True)
-        
-        # create the role configuration
-        role_configuration_json = {}
-        
+        for field_name, roles in role_changes:
+            if roles:
+                notice_embed.add_field(
+                    name=field_name, value=format_role_names(roles), inline=False
+                )
+
+        return notice_embed
+
+    def create_role_configuration(self, guild: discord.Guild = None) -> None:
+        """
+        Creates the role configuration file of a guild, the production guild by default.
+        """
+        # get the guild
+        guild = self._get_role_configuration_guild(guild)
+
+        role_configuration_manager: RoleConfigurationManager = (
+            self.get_role_configuration_manager(guild)
+        )
+
+        self._add_guild_role_configurations(guild, role_configuration_manager)
+
+        # write the role configuration
+        role_configuration_manager.write_self_to_file()
+
+        self._finish_role_configuration(guild, role_configuration_manager)
+
+        return None
+
+    async def create_role_configuration_async(
+        self, guild: discord.Guild = None
+    ) -> None:
+        """
+        Creates the role configuration file of a guild like create_role_configuration,
+        but loads and writes the files in the file I/O thread pool.
+        """
         # get the guild
-        guild = self.bot.get_guild(self.bot.production_server_id)
-        
+        guild = self._get_role_configuration_guild(guild)
+
+        role_configuration_manager: RoleConfigurationManager = (
+            await self.get_role_configuration_manager_async(guild)
+        )
+
+        self._add_guild_role_configurations(guild, role_configuration_manager)
+
+        # write the role configuration
+        await role_configuration_manager.write_self_to_file_async()
+
+        self._finish_role_configuration(guild, role_configuration_manager)
+
+        return None
+
+    def _get_role_configuration_guild(
+        self, guild: discord.Guild = None
+    ) -> discord.Guild:
+        if guild is None:
+            guild = self.bot.get_guild(self.bot.production_server_id)
+
         if guild is None:
             raise ValueError("Development guild is not found.")
-        
-        self.logger.info(f"Creating role configuration for guild: {guild.name} ({guild.id})")
-        self.logger.info(f"Creating role configuration for roles: {guild.roles}")
-                
-        # get the roles
-        roles = guild.roles
-        
-        # add the roles to the role configuration
-        for role in roles:
-            if role.name == "@everyone":
-                continue
-            
-            role_configuration_json[role.id] = {
-                # only store valid utf-8 characters
-                "role_name": role.name.encode("utf-8", "ignore").decode(),
-                "requires_supporter_status": False,
-                "cant_combine_with": [],
-                "grants_role": [],
-                "required_by" : []
-            }
-            
-        self.logger.info(f"Created role configuration: {role_configuration_json}")
-        
-        # write the role configuration
-        with open(role_configuration_file, "w") as file:
-            json_dump(role_configuration_json, file, indent=4)
-        
-        self.stored_role_configuration = role_configuration_json
-        
-        return None
\ No newline at end of file
+
+        return guild
+
+    def _add_guild_role_configurations(
+        self, guild: discord.Guild, role_configuration_manager: RoleConfigurationManager
+    ) -> None:
+        self.logger.info("role_configuration.create", guild=guild)
+        self.logger.debug("role_configuration.create_roles", roles=guild.roles)
+
+        # add the roles to the role configuration as a single snapshot, not one per role
+        role_configuration_manager.add_configurations(
+            [
+                RoleConfiguration.from_role(role)
+                for role in guild.roles
+                if role.name != "@everyone"
+            ],
+            persist=False,
+        )
+
+    def _finish_role_configuration(
+        self, guild: discord.Guild, role_configuration_manager: RoleConfigurationManager
+    ) -> None:
+        self.logger.debug(
+            "role_configuration.created",
+            role_ids=role_configuration_manager.role_configurations.keys(),
+        )
+
+        # the configured roles changed, so the role resolver has to be rebuilt
+        self.forget_guild(guild.id)
@@ -0,0 +1,226 @@
+import discord
+
+from typing import Callable, Iterator
+
+from utilities.role_configuration import RoleConfiguration, RoleConfigurationSnapshot
+from utilities.role_rule_language import CompiledRule
+from utilities.role_resolver import RoleResolver
+from utilities.structured_logging import get_structured_logger
+
+logger = get_structured_logger("role")
+
+# why the bot can not add or remove a role
+MISSING_PERMISSION_REASON: str = "the bot is missing the Manage Roles permission"
+MANAGED_ROLE_REASON: str = "the role is managed by an integration"
+ROLE_HIERARCHY_REASON: str = "the role is not below the top role of the bot"
+DANGLING_ROLE_REASON: str = "the role does not exist anymore"
+
+
+class RoleManageability:
+    """
+    The configured roles of a guild that the bot can add and remove.
+
+    Discord refuses a role change when the bot lacks the Manage Roles permission, when
+    the role is managed by an integration (like the booster role) or when the role is
+    not below the top role of the bot. Every such request would still use up the rate
+    limit budget before it fails, so the role changes are checked against this first.
+    It is worked out once from the role resolver and built again after the roles of the
+    guild or of the bot changed.
+
+    Attributes
+    ----------
+    guild_id : int
+        The ID of the guild.
+    can_manage_roles : bool
+        Whether the bot has the Manage Roles permission.
+    top_role_position : int
+        The position of the top role of the bot.
+    manageable_role_ids : frozenset of int
+        The configured roles the bot can add and remove.
+    unmanageable_roles : dict of int to str
+        The configured roles the bot can not add or remove, with the reason.
+    """
+
+    __slots__ = (
+        "guild_id",
+        "can_manage_roles",
+        "top_role_position",
+        "manageable_role_ids",
+        "unmanageable_roles",
+    )
+
+    def __init__(self, guild: discord.Guild, role_resolver: RoleResolver) -> None:
+        """
+        Works out which configured roles the bot can manage.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild the roles belong to.
+        role_resolver : RoleResolver
+            The resolver with the configured roles that exist in the guild.
+        """
+        self.guild_id: int = guild.id
+
+        bot_member: discord.Member = guild.me
+        is_owner = bot_member is not None and guild.owner_id == bot_member.id
+        permissions = bot_member.guild_permissions if bot_member is not None else None
+
+        self.can_manage_roles: bool = permissions is not None and (
+            permissions.manage_roles or permissions.administrator
+        )
+        self.top_role_position: int = (
+            bot_member.top_role.position if bot_member is not None else 0
+        )
+
+        manageable_role_ids: set[int] = set()
+        self.unmanageable_roles: dict[int, str] = {}
+
+        for role_id, role in role_resolver.roles.items():
+            if not self.can_manage_roles:
+                self.unmanageable_roles[role_id] = MISSING_PERMISSION_REASON
+            elif role.managed:
+                self.unmanageable_roles[role_id] = MANAGED_ROLE_REASON
+            elif not is_owner and role.position >= self.top_role_position:
+                self.unmanageable_roles[role_id] = ROLE_HIERARCHY_REASON
+            else:
+                manageable_role_ids.add(role_id)
+
+        self.manageable_role_ids: frozenset[int] = frozenset(manageable_role_ids)
+
+        if self.unmanageable_roles:
+            logger.warning(
+                "role_manageability.unmanageable",
+                guild=guild,
+                can_manage_roles=self.can_manage_roles,
+                role_ids=self.unmanageable_roles.keys(),
+            )
+
+    def can_manage(self, role_id: int) -> bool:
+        return role_id in self.manageable_role_ids
+
+    def filter_roles(
+        self, roles: list[discord.Role]
+    ) -> tuple[list[discord.Role], list[discord.Role]]:
+        """
+        Splits roles into the ones the bot can manage and the ones it can not.
+
+        Returns
+        -------
+        tuple of list of discord.Role
+            The manageable and the unmanageable roles.
+        """
+        manageable_roles: list[discord.Role] = []
+        unmanageable_roles: list[discord.Role] = []
+        for role in roles:
+            if role.id in self.manageable_role_ids:
+                manageable_roles.append(role)
+            else:
+                unmanageable_roles.append(role)
+
+        return manageable_roles, unmanageable_roles
+
+
+def build_configuration_report(
+    snapshot: RoleConfigurationSnapshot,
+    role_resolver: RoleResolver,
+    role_manageability: RoleManageability,
+) -> dict:
+    """
+    Checks the role rules of a guild for rules that can never be carried out.
+
+    A rule can not be carried out when the role it would add or remove does not exist
+    anymore or can not be managed by the bot. Supporter, combination and required rules
+    remove the role they are set on, grant rules add the granted roles. A role rule does
+    both, and every role it mentions has to exist for its conditions to mean anything.
+
+    Parameters
+    ----------
+    snapshot : RoleConfigurationSnapshot
+        The role configuration to check.
+    role_resolver : RoleResolver
+        The resolver with the configured roles that exist in the guild.
+    role_manageability : RoleManageability
+        The roles the bot can manage.
+
+    Returns
+    -------
+    dict
+        Whether the bot can manage roles at all, the position of its top role, the
+        unmanageable roles with their reason, the dangling role IDs, and every rule that
+        can not be carried out as (role ID, rule, affected role ID, reason) tuples.
+    """
+    def get_reason(role_id: int) -> str:
+        if role_resolver.is_dangling(role_id):
+            return DANGLING_ROLE_REASON
+
+        return role_manageability.unmanageable_roles.get(role_id)
+
+    offending_rules: list[tuple[int, str, int, str]] = []
+    for role_id, configuration in snapshot.configurations.items():
+        offending_rules.extend(
+            _iter_offending_field_rules(role_id, configuration, get_reason)
+        )
+
+        if configuration.compiled_rule is not None:
+            offending_rules.extend(
+                _iter_offending_rule_roles(
+                    role_id, configuration.compiled_rule, get_reason
+                )
+            )
+
+    return {
+        "can_manage_roles": role_manageability.can_manage_roles,
+        "top_role_position": role_manageability.top_role_position,
+        "unmanageable_roles": dict(role_manageability.unmanageable_roles),
+        "dangling_role_ids": sorted(role_resolver.dangling_role_ids),
+        "offending_rules": offending_rules,
+    }
+
+
+def _iter_offending_field_rules(
+    role_id: int,
+    configuration: RoleConfiguration,
+    get_reason: Callable[[int], str],
+) -> Iterator[tuple[int, str, int, str]]:
+    # these rules take away the role they are set on
+    removing_rules = [
+        rule
+        for rule, is_set in (
+            ("requires_supporter_status", configuration.requires_supporter_status),
+            ("cant_combine_with", bool(configuration.cant_combine_with)),
+            ("required_by", bool(configuration.required_by)),
+        )
+        if is_set
+    ]
+
+    reason = get_reason(role_id)
+    if reason is not None:
+        yield from ((role_id, rule, role_id, reason) for rule in removing_rules)
+
+    # a grant adds the granted roles
+    for granted_role_id in configuration.grants_role:
+        reason = get_reason(granted_role_id)
+        if reason is not None:
+            yield role_id, "grants_role", granted_role_id, reason
+
+
+def _iter_offending_rule_roles(
+    role_id: int,
+    compiled_rule: CompiledRule,
+    get_reason: Callable[[int], str],
+) -> Iterator[tuple[int, str, int, str]]:
+    reason = get_reason(role_id)
+    if reason is not None and compiled_rule.requirement is not None:
+        yield role_id, "rule", role_id, reason
+
+    for referenced_role_id in sorted(compiled_rule.referenced_role_ids):
+        reason = get_reason(referenced_role_id)
+        if reason is None:
+            continue
+
+        # a condition on a role the bot can not manage still works, a grant of it
+        # does not
+        is_granted = referenced_role_id in compiled_rule.granted_role_ids
+        if reason == DANGLING_ROLE_REASON or is_granted:
+            yield role_id, "rule", referenced_role_id, reason
@@ -0,0 +1,285 @@
+import re
+import unicodedata
+
+from bisect import bisect_left, insort
+from typing import Iterable
+
+import discord
+
+# the hangul filler the server uses to build visual divider roles
+ROLE_DIVIDER_CHARACTER: str = "ㅤ"
+# the unicode categories that are dropped from names: symbols (emoji), marks and
+# format characters
+IGNORED_CATEGORIES: tuple[str, ...] = ("So", "Sk", "Mn", "Me", "Cf", "Cs", "Co")
+# how many characters a query needs before substring matches are used
+TRIGRAM_LENGTH: int = 3
+# discord shows at most 25 autocomplete choices
+DEFAULT_RESULT_LIMIT: int = 25
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_role_name(role_name: str) -> str:
+    """
+    Normalizes a role name for searching.
+
+    The divider character and emoji are dropped, compatibility characters are folded
+    (so fancy letters match their plain version) and the case is folded, so a search
+    for "vip" finds "✨ VIP ✨" and "ㅤㅤVIPㅤㅤ". A name made only of emoji keeps them,
+    so "🔑" can still be found.
+
+    Parameters
+    ----------
+    role_name : str
+        The name of the role.
+
+    Returns
+    -------
+    str
+        The normalized name.
+    """
+    role_name = unicodedata.normalize(
+        "NFKC", role_name.replace(ROLE_DIVIDER_CHARACTER, " ")
+    )
+
+    kept_characters = [
+        character
+        for character in role_name
+        if unicodedata.category(character) not in IGNORED_CATEGORIES
+    ]
+
+    normalized_name = WHITESPACE_PATTERN.sub(" ", "".join(kept_characters)).strip()
+    if not normalized_name:
+        normalized_name = WHITESPACE_PATTERN.sub(" ", role_name).strip()
+
+    return normalized_name.casefold()
+
+
+def get_trigrams(text: str) -> set[str]:
+    return {
+        text[index:index + TRIGRAM_LENGTH]
+        for index in range(len(text) - TRIGRAM_LENGTH + 1)
+    }
+
+
+class RoleNameIndex:
+    """
+    An in memory search index over the names of the roles of a guild.
+
+    The index is built once and kept current by the role events, so a search never
+    looks at every role. Short queries are answered from a sorted list of the names and
+    the words in them, longer queries also match anywhere in the name through a
+    trigram index.
+
+    Attributes
+    ----------
+    guild_id : int
+        The ID of the guild the roles belong to.
+    role_names : dict of int to str
+        The display name of every indexed role.
+    normalized_names : dict of int to str
+        The normalized name of every indexed role.
+    """
+
+    def __init__(self, guild_id: int, roles: Iterable[discord.Role] = ()) -> None:
+        """
+        Initializes the role name index.
+
+        Parameters
+        ----------
+        guild_id : int
+            The ID of the guild the roles belong to.
+        roles : Iterable of discord.Role, optional
+            The roles to index.
+        """
+        self.guild_id: int = guild_id
+
+        self.role_names: dict[int, str] = {}
+        self.normalized_names: dict[int, str] = {}
+
+        # sorted (prefix key, role id) pairs, for the full name and every word in it
+        self._prefix_entries: list[tuple[str, int]] = []
+        # the roles whose normalized name contains a trigram
+        self._trigram_postings: dict[str, set[int]] = {}
+
+        for role in roles:
+            self.add_role(role.id, role.name)
+
+    @classmethod
+    def from_guild(cls, guild: discord.Guild) -> "RoleNameIndex":
+        """
+        Builds the index over every role of a guild, except @everyone.
+        """
+        return cls(guild.id, (role for role in guild.roles if not role.is_default()))
+
+    def __len__(self) -> int:
+        return len(self.role_names)
+
+    def _get_prefix_keys(self, normalized_name: str) -> set[str]:
+        return {normalized_name, *normalized_name.split(" ")} - {""}
+
+    def add_role(self, role_id: int, role_name: str) -> None:
+        """
+        Adds a role to the index, replacing it if it was already indexed.
+
+        Parameters
+        ----------
+        role_id : int
+            The ID of the role.
+        role_name : str
+            The name of the role.
+        """
+        role_id = int(role_id)
+
+        if role_id in self.role_names:
+            self.remove_role(role_id)
+
+        normalized_name = normalize_role_name(role_name)
+
+        self.role_names[role_id] = role_name
+        self.normalized_names[role_id] = normalized_name
+
+        for prefix_key in self._get_prefix_keys(normalized_name):
+            insort(self._prefix_entries, (prefix_key, role_id))
+
+        for trigram in get_trigrams(normalized_name):
+            self._trigram_postings.setdefault(trigram, set()).add(role_id)
+
+        return None
+
+    def remove_role(self, role_id: int) -> None:
+        """
+        Removes a role from the index.
+
+        Parameters
+        ----------
+        role_id : int
+            The ID of the role.
+        """
+        role_id = int(role_id)
+
+        normalized_name = self.normalized_names.pop(role_id, None)
+        if normalized_name is None:
+            return None
+
+        del self.role_names[role_id]
+
+        self._remove_prefix_entries(role_id, normalized_name)
+        self._remove_trigram_postings(role_id, normalized_name)
+
+        return None
+
+    def _remove_prefix_entries(self, role_id: int, normalized_name: str) -> None:
+        for prefix_key in self._get_prefix_keys(normalized_name):
+            entry = (prefix_key, role_id)
+            index = bisect_left(self._prefix_entries, entry)
+            if self._prefix_entries[index:index + 1] == [entry]:
+                del self._prefix_entries[index]
+
+    def _remove_trigram_postings(self, role_id: int, normalized_name: str) -> None:
+        for trigram in get_trigrams(normalized_name):
+            postings = self._trigram_postings.get(trigram)
+            if postings is None:
+                continue
+
+            postings.discard(role_id)
+            if not postings:
+                del self._trigram_postings[trigram]
+
+    def on_role_create(self, role: discord.Role) -> None:
+        self.add_role(role.id, role.name)
+
+    def on_role_update(self, after: discord.Role) -> None:
+        # only re index the role when its name changed
+        if self.role_names.get(after.id) != after.name:
+            self.add_role(after.id, after.name)
+
+    def on_role_delete(self, role: discord.Role) -> None:
+        self.remove_role(role.id)
+
+    def _search_prefix(self, query: str, limit: int) -> list[int]:
+        """
+        Gets the roles whose name, or a word in it, starts with the query.
+        """
+        matches: list[int] = []
+        seen: set[int] = set()
+
+        index = bisect_left(self._prefix_entries, (query, -1))
+
+        while index < len(self._prefix_entries) and len(matches) < limit:
+            prefix_key, role_id = self._prefix_entries[index]
+            if not prefix_key.startswith(query):
+                break
+
+            if role_id not in seen:
+                seen.add(role_id)
+                matches.append(role_id)
+
+            index += 1
+
+        return matches
+
+    def _search_substring(self, query: str) -> set[int]:
+        """
+        Gets the roles whose name contains the query.
+        """
+        candidates: set[int] = None
+
+        # intersect the postings, starting with the smallest
+        trigram_postings = [
+            self._trigram_postings.get(trigram, set())
+            for trigram in get_trigrams(query)
+        ]
+        for postings in sorted(trigram_postings, key=len):
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+
+        # the trigrams can be spread over the name, check the candidates
+        return {
+            role_id
+            for role_id in candidates or ()
+            if query in self.normalized_names[role_id]
+        }
+
+    def search(
+        self, query: str, limit: int = DEFAULT_RESULT_LIMIT
+    ) -> list[tuple[int, str]]:
+        """
+        Searches the roles by name.
+
+        Names that start with the query come first, then names with a word that starts
+        with the query, then names that contain the query anywhere.
+
+        Parameters
+        ----------
+        query : str
+            What the user typed so far.
+        limit : int, optional
+            The maximum amount of results.
+
+        Returns
+        -------
+        list of tuple of int and str
+            The ID and display name of every matching role.
+        """
+        normalized_query = normalize_role_name(query)
+
+        prefix_matches = self._search_prefix(normalized_query, limit)
+
+        # names that start with the query rank above names with a word that does
+        def is_word_match(role_id: int) -> bool:
+            return not self.normalized_names[role_id].startswith(normalized_query)
+
+        prefix_matches.sort(key=is_word_match)
+
+        role_ids = prefix_matches
+        if len(role_ids) < limit and len(normalized_query) >= TRIGRAM_LENGTH:
+            seen = set(role_ids)
+            substring_matches = sorted(
+                self._search_substring(normalized_query) - seen,
+                key=self.normalized_names.get,
+            )
+            role_ids = role_ids + substring_matches[:limit - len(role_ids)]
+
+        return [(role_id, self.role_names[role_id]) for role_id in role_ids]
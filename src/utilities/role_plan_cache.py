@@ -0,0 +1,198 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Collection, Iterable
+
+from utilities.bulk_role_evaluation import RoleChangePlan, plan_member_roles
+from utilities.role_configuration import RoleConfigurationSnapshot
+
+# how many distinct role combinations are remembered per guild
+DEFAULT_MAX_CACHED_PLANS: int = 4096
+
+
+class RolePlanCache:
+    """
+    Remembers the planned role changes per combination of roles.
+
+    The changes a member needs only depend on the roles the member has and whether the
+    member is boosting, not on who the member is, and most members of a guild share a
+    few role combinations. So a plan is worked out once per combination and reused for
+    every member with the same roles, until the configuration or the roles of the guild
+    change, which drops every plan. Role rules about the days in the guild only change
+    their outcome at a few thresholds, so members between the same thresholds share
+    their plans too.
+
+    Attributes
+    ----------
+    max_size : int
+        How many plans are kept, the least recently used one is dropped first.
+    snapshot : RoleConfigurationSnapshot
+        The configuration the cached plans were worked out against.
+    live_role_ids : frozenset of int
+        The configured roles that existed in the guild when the plans were worked out.
+    day_thresholds : list of int
+        The days in the guild at which a role rule of the configuration can
+        change its outcome.
+    hits : int
+        How many plans were answered from the cache.
+    misses : int
+        How many plans had to be worked out.
+    invalidations : int
+        How many times every plan was dropped.
+    """
+
+    __slots__ = (
+        "max_size",
+        "snapshot",
+        "live_role_ids",
+        "day_thresholds",
+        "_plans",
+        "hits",
+        "misses",
+        "invalidations",
+    )
+
+    def __init__(self, max_size: int = DEFAULT_MAX_CACHED_PLANS) -> None:
+        """
+        Initializes the plan cache.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            How many plans are kept.
+        """
+        self.max_size: int = max_size
+
+        self.snapshot: RoleConfigurationSnapshot = None
+        self.live_role_ids: frozenset[int] = frozenset()
+        self.day_thresholds: list[int] = []
+
+        # maps (role IDs, is supporter, days bucket, configuration version) to the
+        # planned role lists
+        self._plans: OrderedDict[tuple, tuple] = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def get_plan(
+        self,
+        snapshot: RoleConfigurationSnapshot,
+        live_role_ids: Collection[int],
+        member_id: int,
+        member_role_ids: Iterable[int],
+        is_supporter: bool,
+        days_in_guild: int = 0,
+    ) -> RoleChangePlan:
+        """
+        Gets the planned role changes of a member, worked out once per role combination.
+
+        Parameters
+        ----------
+        snapshot : RoleConfigurationSnapshot
+            The current role configuration.
+        live_role_ids : Collection of int
+            The configured roles that exist in the guild.
+        member_id : int
+            The ID of the member.
+        member_role_ids : Iterable of int
+            The IDs of the roles of the member.
+        is_supporter : bool
+            Whether the member is boosting the guild.
+        days_in_guild : int, optional
+            How many whole days the member is in the guild.
+
+        Returns
+        -------
+        RoleChangePlan
+            The changes the member needs, can be empty.
+        """
+        # a reloaded configuration is a new snapshot, even when its version number is
+        # the same. roles are only created and deleted together with their
+        # configuration, so comparing the amount of live roles is enough to notice a
+        # resolver that was rebuilt
+        live_roles_changed = len(live_role_ids) != len(self.live_role_ids)
+        if snapshot is not self.snapshot or live_roles_changed:
+            self.invalidate(snapshot, live_role_ids)
+
+        member_role_ids = frozenset(int(role_id) for role_id in member_role_ids)
+        key = (
+            member_role_ids,
+            is_supporter,
+            bisect_right(self.day_thresholds, days_in_guild),
+            snapshot.version,
+        )
+
+        planned_roles = self._plans.get(key)
+        if planned_roles is not None:
+            self._plans.move_to_end(key)
+            self.hits += 1
+
+            return RoleChangePlan(member_id, *planned_roles)
+
+        self.misses += 1
+
+        role_change_plan = plan_member_roles(
+            snapshot,
+            self.live_role_ids,
+            member_id,
+            member_role_ids,
+            is_supporter,
+            days_in_guild,
+        )
+        self._plans[key] = (
+            role_change_plan.supporter_roles_lost,
+            role_change_plan.singleton_roles_lost,
+            role_change_plan.required_roles_lost,
+            role_change_plan.granted_roles,
+            role_change_plan.rule_roles_lost,
+        )
+
+        if len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+
+        return role_change_plan
+
+    def invalidate(
+        self,
+        snapshot: RoleConfigurationSnapshot = None,
+        live_role_ids: Iterable[int] = (),
+    ) -> None:
+        """
+        Drops every plan, the next plans are worked out against the given configuration.
+        """
+        if self._plans:
+            self.invalidations += 1
+
+        self._plans.clear()
+        self.snapshot = snapshot
+        self.live_role_ids = frozenset(live_role_ids)
+
+        day_thresholds: set[int] = set()
+        if snapshot is not None:
+            for configuration in snapshot.configurations.values():
+                if configuration.compiled_rule is not None:
+                    day_thresholds.update(configuration.compiled_rule.day_thresholds)
+
+        self.day_thresholds = sorted(day_thresholds)
+
+    def get_stats(self) -> dict:
+        """
+        Gets the size, hit and miss counts of the cache.
+
+        Returns
+        -------
+        dict
+            The amount of plans, the hits, misses, hit rate and invalidations.
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            "plans": len(self._plans),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,382 @@
+import asyncio
+import math
+import random
+
+from bisect import bisect_left, bisect_right
+from json import dump as json_dump, load as json_load
+from os import path, replace
+from time import monotonic
+
+import discord
+
+from utilities.data_handling import DataHandler, Folder, run_file_io
+from utilities.role_handler import RoleHandler
+from utilities.structured_logging import get_structured_logger
+from utilities.validation_scheduler import ValidationPriority, ValidationScheduler
+
+RECONCILIATION_FOLDER_NAME: str = "reconciliation"
+RECONCILIATION_CURSOR_FILE_NAME: str = "cursor.json"
+
+# every member is checked at least once per period, in seconds
+DEFAULT_RECONCILIATION_PERIOD: float = 24 * 60 * 60
+# how long to wait between slices, in seconds
+DEFAULT_SLICE_INTERVAL: float = 10.0
+# how much the interval is randomly changed, as a fraction of the interval
+DEFAULT_SLICE_JITTER: float = 0.2
+# how long a single slice is allowed to run on the event loop, in seconds
+DEFAULT_SLICE_TIME_BUDGET: float = 0.05
+# the gateway latency above which the reconciliation pauses, in seconds
+DEFAULT_MAX_LATENCY: float = 1.0
+# the amount of queued validations above which the reconciliation pauses
+DEFAULT_MAX_QUEUE_DEPTH: int = 500
+
+logger = get_structured_logger("role")
+
+
+class RoleReconciler:
+    """
+    Walks every member of every guild in ID order and queues a sweep validation for
+    the ones whose roles need to change, so drift that no event told us about (missed
+    events, manual edits, expired boosts) is fixed within the reconciliation period.
+    The members of a slice are checked in bulk first, so the validation queue only
+    gets the members that actually need a fix.
+
+    The walk runs in small slices with a jittered interval, and each slice is sized so
+    the whole guild is covered once per period, which keeps the api cost smooth. A
+    slice is skipped while the gateway is slow or the validation queues are backed up.
+    The position in every guild is written to the data folder after each slice that
+    moved it, so a restart resumes where the walk left off.
+
+    Attributes
+    ----------
+    period : float
+        How long a full walk over a guild should take, in seconds.
+    cursors : dict of int to int
+        The ID of the last member that was queued, per guild ID.
+    members_checked : int
+        How many members were checked since the reconciler was started.
+    members_queued : int
+        How many of the checked members needed changes and were queued.
+    cycles_completed : int
+        How many full walks over a guild were completed.
+    pause_count : int
+        How many slices were skipped because the bot was busy.
+    """
+
+    def __init__(
+        self,
+        bot: discord.Client,
+        validation_scheduler: ValidationScheduler,
+        role_handler: RoleHandler,
+        data_handler: DataHandler,
+        period: float = DEFAULT_RECONCILIATION_PERIOD,
+        slice_interval: float = DEFAULT_SLICE_INTERVAL,
+        slice_jitter: float = DEFAULT_SLICE_JITTER,
+        slice_time_budget: float = DEFAULT_SLICE_TIME_BUDGET,
+        max_latency: float = DEFAULT_MAX_LATENCY,
+        max_queue_depth: int = DEFAULT_MAX_QUEUE_DEPTH,
+    ) -> None:
+        """
+        Initializes the role reconciler.
+
+        Parameters
+        ----------
+        bot : discord.Client
+            The bot whose guilds are reconciled.
+        validation_scheduler : ValidationScheduler
+            The scheduler the sweep validations are submitted to.
+        role_handler : RoleHandler
+            The role handler that checks the members of a slice in bulk.
+        data_handler : DataHandler
+            The data handler used to find the folder the cursors are written to.
+        period : float, optional
+            How long a full walk over a guild should take, in seconds.
+        slice_interval : float, optional
+            How long to wait between slices, in seconds.
+        slice_jitter : float, optional
+            How much the interval is randomly changed, as a fraction of the interval.
+        slice_time_budget : float, optional
+            How long a single slice is allowed to run on the event loop, in seconds.
+        max_latency : float, optional
+            The gateway latency above which the reconciliation pauses, in seconds.
+        max_queue_depth : int, optional
+            The amount of queued validations above which the reconciliation pauses.
+        """
+        if period <= 0 or slice_interval <= 0:
+            raise ValueError(
+                "The reconciliation period and the slice interval must be positive."
+            )
+
+        self.bot: discord.Client = bot
+        self.validation_scheduler: ValidationScheduler = validation_scheduler
+        self.role_handler: RoleHandler = role_handler
+
+        self.period: float = period
+        self.slice_interval: float = slice_interval
+        self.slice_jitter: float = slice_jitter
+        self.slice_time_budget: float = slice_time_budget
+        self.max_latency: float = max_latency
+        self.max_queue_depth: int = max_queue_depth
+
+        reconciliation_folder: Folder = data_handler.create_folder(
+            RECONCILIATION_FOLDER_NAME, can_exist=True
+        )
+        self.cursor_file_path: str = path.join(
+            reconciliation_folder.path, RECONCILIATION_CURSOR_FILE_NAME
+        )
+
+        self.cursors: dict[int, int] = self._load_cursors()
+        # the cursors as they are in the cursor file
+        self._written_cursors: dict[int, int] = dict(self.cursors)
+
+        # the sorted member IDs of every guild, taken once per walk
+        self._member_ids: dict[int, list[int]] = {}
+        self._task: asyncio.Task = None
+
+        self.members_checked: int = 0
+        self.members_queued: int = 0
+        self.cycles_completed: int = 0
+        self.pause_count: int = 0
+        self.last_pause_reason: str = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Starts the reconciliation. Must be called from the event loop of the bot.
+        """
+        if self.is_running:
+            return None
+
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(), name="role-reconciler"
+        )
+
+        logger.info(
+            "reconciler.started",
+            period=self.period,
+            interval=self.slice_interval,
+            resumed_guilds=len(self.cursors),
+        )
+
+        return None
+
+    def stop(self) -> None:
+        """
+        Stops the reconciliation, the cursors are already written after every slice.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        return None
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.is_running,
+            "guilds": len(self.cursors),
+            "members_checked": self.members_checked,
+            "members_queued": self.members_queued,
+            "cycles_completed": self.cycles_completed,
+            "pauses": self.pause_count,
+            "last_pause_reason": self.last_pause_reason,
+        }
+
+    def get_pause_reason(self) -> str:
+        """
+        Gets why the reconciliation should not run right now.
+
+        Returns
+        -------
+        str
+            The reason, None if the reconciliation can run.
+        """
+        latencies = [
+            latency
+            for latency in self.bot.get_shard_latencies().values()
+            if math.isfinite(latency)
+        ]
+        if latencies and max(latencies) > self.max_latency:
+            return "latency"
+
+        stats = self.validation_scheduler.get_stats()
+        queue_depth = sum(
+            priority_stats["depth"] for priority_stats in stats["priorities"].values()
+        )
+        if queue_depth > self.max_queue_depth:
+            return "queue_depth"
+
+        return None
+
+    def get_slice_size(self, member_count: int) -> int:
+        """
+        Gets how many members a slice should queue, so the guild is covered
+        once per period.
+        """
+        return max(1, math.ceil(member_count * self.slice_interval / self.period))
+
+    async def _run(self) -> None:
+        while True:
+            # spread the slices out a little, so they do not line up with other
+            # periodic work
+            jitter = random.uniform(-self.slice_jitter, self.slice_jitter)
+            await asyncio.sleep(self.slice_interval * (1 + jitter))
+
+            pause_reason = self.get_pause_reason()
+            if pause_reason is not None:
+                self.pause_count += 1
+                self.last_pause_reason = pause_reason
+                logger.debug("reconciler.paused", reason=pause_reason)
+                continue
+
+            try:
+                await self.run_slice()
+            except Exception as error:
+                logger.exception("reconciler.slice_failed", error=error)
+
+    async def run_slice(self) -> int:
+        """
+        Checks the next members of every guild and queues the ones that need changes,
+        within the time budget of a slice. The cursors are written in the file I/O
+        thread pool when they changed.
+
+        Returns
+        -------
+        int
+            How many members were queued.
+        """
+        deadline = monotonic() + self.slice_time_budget
+        queued_count = 0
+
+        for guild in sorted(self.bot.guilds, key=lambda guild: guild.id):
+            if monotonic() >= deadline:
+                break
+
+            queued_count += self._run_guild_slice(guild, deadline)
+
+        # forget the guilds the bot is no longer in
+        guild_ids = {guild.id for guild in self.bot.guilds}
+        removed_guild_ids = [
+            guild_id for guild_id in self.cursors if guild_id not in guild_ids
+        ]
+        for guild_id in removed_guild_ids:
+            del self.cursors[guild_id]
+            self._member_ids.pop(guild_id, None)
+
+        await self._write_cursors()
+
+        return queued_count
+
+    def _run_guild_slice(self, guild: discord.Guild, deadline: float) -> int:
+        member_ids = self._member_ids.get(guild.id)
+        if member_ids is None:
+            member_ids = self._member_ids[guild.id] = sorted(
+                member.id for member in guild.members
+            )
+
+        # continue after the last member that was checked
+        index = bisect_right(member_ids, self.cursors.get(guild.id, 0))
+        slice_members, index = self._collect_slice_members(
+            guild, member_ids, index, deadline
+        )
+
+        # only the members whose roles need to change are queued
+        members_by_id = {member.id: member for member in slice_members}
+        queued_count = 0
+        for role_change_plan in self.role_handler.plan_members_roles(
+            guild, slice_members
+        ):
+            member = members_by_id[role_change_plan.member_id]
+
+            future = self.validation_scheduler.try_submit(
+                member, ValidationPriority.SWEEP
+            )
+            if future is None:
+                # the sweep queue is full, check this member again in the next
+                # slice
+                index = bisect_left(member_ids, member.id)
+                break
+
+            queued_count += 1
+
+        self.cursors[guild.id] = member_ids[index - 1] if index > 0 else 0
+
+        self.members_checked += len(slice_members)
+        self.members_queued += queued_count
+
+        if index >= len(member_ids):
+            # the walk is done, start over with the members as they are now
+            self.cycles_completed += 1
+            self.cursors[guild.id] = 0
+            del self._member_ids[guild.id]
+
+            logger.info(
+                "reconciler.cycle_completed", guild=guild, members=len(member_ids)
+            )
+
+        return queued_count
+
+    def _collect_slice_members(
+        self, guild: discord.Guild, member_ids: list[int], index: int, deadline: float
+    ) -> tuple[list[discord.Member], int]:
+        """
+        Gets the members of the next slice of a guild, starting at index.
+
+        Returns
+        -------
+        tuple[list[discord.Member], int]
+            The members, and the index of the first member after the slice.
+        """
+        slice_end = min(index + self.get_slice_size(len(member_ids)), len(member_ids))
+
+        slice_members: list[discord.Member] = []
+        while index < slice_end and monotonic() < deadline:
+            # the member could have left since the walk started
+            member = guild.get_member(member_ids[index])
+            if member is not None and not member.bot:
+                slice_members.append(member)
+
+            index += 1
+
+        return slice_members, index
+
+    def _load_cursors(self) -> dict[int, int]:
+        if not path.isfile(self.cursor_file_path):
+            return {}
+
+        try:
+            with open(self.cursor_file_path, "r") as file:
+                return {
+                    int(guild_id): int(member_id)
+                    for guild_id, member_id in json_load(file).items()
+                }
+        except (ValueError, OSError) as error:
+            logger.warning(
+                "reconciler.cursor_unreadable", path=self.cursor_file_path, error=error
+            )
+            return {}
+
+    async def _write_cursors(self) -> None:
+        if self.cursors == self._written_cursors:
+            return None
+
+        # the thread writes a copy, the walk keeps moving the cursors
+        cursors = dict(self.cursors)
+        await run_file_io(self._write_cursor_file, cursors)
+        self._written_cursors = cursors
+
+        return None
+
+    def _write_cursor_file(self, cursors: dict[int, int]) -> None:
+        # write to a temporary file first, so a crash never leaves a half
+        # written cursor
+        temporary_file_path = f"{self.cursor_file_path}.tmp"
+        cursors_json = {
+            str(guild_id): member_id for guild_id, member_id in cursors.items()
+        }
+        with open(temporary_file_path, "w") as file:
+            json_dump(cursors_json, file)
+
+        replace(temporary_file_path, self.cursor_file_path)
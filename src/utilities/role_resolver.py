@@ -0,0 +1,176 @@
+from typing import Iterable
+
+import discord
+
+from utilities.structured_logging import get_structured_logger
+
+logger = get_structured_logger("role")
+
+
+class RoleResolver:
+    """
+    Maps the configured role IDs of a guild to the live role objects.
+
+    The roles are looked up once when the resolver is built and then kept up to date
+    by the guild role events, so the role checks never have to ask the guild for a
+    role. Configured roles that no longer exist in the guild are tracked as dangling,
+    so the checks can skip them instead of crashing on a missing role.
+
+    Attributes
+    ----------
+    guild_id : int
+        The ID of the guild the roles belong to.
+    configured_role_ids : set of int
+        Every role ID that is mentioned in the role configuration.
+    roles : dict of int to discord.Role
+        The configured roles that exist in the guild.
+    dangling_role_ids : set of int
+        The configured role IDs that do not exist in the guild.
+    """
+
+    def __init__(self, guild: discord.Guild, configured_role_ids: Iterable) -> None:
+        """
+        Initializes the role resolver.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild to resolve the roles in.
+        configured_role_ids : Iterable of int or str
+            Every role ID that is mentioned in the role configuration.
+        """
+        self.guild_id: int = guild.id
+        self.configured_role_ids: set[int] = {
+            int(role_id) for role_id in configured_role_ids
+        }
+
+        self.roles: dict[int, discord.Role] = {}
+        self.dangling_role_ids: set[int] = set()
+
+        self.rebuild(guild)
+
+    def rebuild(self, guild: discord.Guild) -> None:
+        """
+        Looks up every configured role in the guild again.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild to resolve the roles in.
+        """
+        self.roles.clear()
+        self.dangling_role_ids.clear()
+
+        for role_id in self.configured_role_ids:
+            role = guild.get_role(role_id)
+
+            if role is None:
+                self.dangling_role_ids.add(role_id)
+            else:
+                self.roles[role_id] = role
+
+        if self.dangling_role_ids:
+            logger.warning(
+                "role_resolver.dangling", guild=guild, role_ids=self.dangling_role_ids
+            )
+
+        return None
+
+    def set_configured_role_ids(
+        self, guild: discord.Guild, configured_role_ids: Iterable
+    ) -> None:
+        """
+        Changes the configured role IDs, only the new IDs are looked up.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild to resolve the roles in.
+        configured_role_ids : Iterable of int or str
+            Every role ID that is mentioned in the role configuration.
+        """
+        new_configured_role_ids = {int(role_id) for role_id in configured_role_ids}
+
+        # forget the roles that are no longer configured
+        for role_id in self.configured_role_ids - new_configured_role_ids:
+            self.roles.pop(role_id, None)
+            self.dangling_role_ids.discard(role_id)
+
+        # look up the roles that were added to the configuration
+        for role_id in new_configured_role_ids - self.configured_role_ids:
+            role = guild.get_role(role_id)
+
+            if role is None:
+                self.dangling_role_ids.add(role_id)
+            else:
+                self.roles[role_id] = role
+
+        self.configured_role_ids = new_configured_role_ids
+
+        return None
+
+    def resolve(self, role_id) -> discord.Role:
+        """
+        Gets the live role for a configured role ID.
+
+        Parameters
+        ----------
+        role_id : int or str
+            The ID of the role.
+
+        Returns
+        -------
+        discord.Role
+            The role, None if it is dangling or not configured.
+        """
+        return self.roles.get(int(role_id))
+
+    def resolve_many(self, role_ids: Iterable) -> list[discord.Role]:
+        """
+        Gets the live roles for configured role IDs, skipping the dangling ones.
+
+        Parameters
+        ----------
+        role_ids : Iterable of int or str
+            The IDs of the roles.
+
+        Returns
+        -------
+        list of discord.Role
+            The roles that exist in the guild.
+        """
+        roles = self.roles
+        return [roles[role_id] for role_id in map(int, role_ids) if role_id in roles]
+
+    def is_dangling(self, role_id) -> bool:
+        return int(role_id) in self.dangling_role_ids
+
+    def on_role_create(self, role: discord.Role) -> None:
+        if role.id not in self.configured_role_ids:
+            return None
+
+        # a role was recreated with a configured id (or the cache caught up)
+        self.roles[role.id] = role
+        self.dangling_role_ids.discard(role.id)
+
+        return None
+
+    def on_role_update(self, after: discord.Role) -> None:
+        if after.id not in self.configured_role_ids:
+            return None
+
+        # keep the newest version of the role, so names and positions stay current
+        self.roles[after.id] = after
+
+        return None
+
+    def on_role_delete(self, role: discord.Role) -> None:
+        if role.id not in self.configured_role_ids:
+            return None
+
+        self.roles.pop(role.id, None)
+        self.dangling_role_ids.add(role.id)
+
+        logger.warning("role_resolver.role_deleted", role=role)
+
+        return None
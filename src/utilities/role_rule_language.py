@@ -0,0 +1,808 @@
+import operator
+import re
+
+from functools import reduce
+from typing import AbstractSet, Callable, Iterable
+
+# a compiled condition, called with the roles the member had at the start of the
+# validation, whether the member is boosting and how many days the member
+# is in the guild
+RulePredicate = Callable[[AbstractSet[int], bool, int], bool]
+
+# the words of the language, everything else is a role or a number
+KEYWORDS: frozenset[str] = frozenset((
+    "requires", "grants", "if", "and", "or", "not", "boosting", "days_in_guild",
+    "true", "false",
+))
+
+# how deep parentheses and "not" can be nested, the parser and the compiler recurse
+# once per level
+MAX_CONDITION_DEPTH: int = 32
+
+# the words that are a whole condition by themselves
+WORD_CONDITIONS: dict[str, tuple] = {
+    "boosting": ("boosting",),
+    "true": ("constant", True),
+    "false": ("constant", False),
+}
+
+COMPARISON_OPERATORS: dict[str, Callable[[int, int], bool]] = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:"
+    r"<@&(?P<mention>\d+)>"
+    r"|(?P<number>\d+)"
+    r"|(?P<operator>>=|<=|==|!=|>|<)"
+    r"|(?P<punctuation>[(),;])"
+    r"|(?P<word>[A-Za-z_]+)"
+    r")"
+)
+
+
+def tokenize_rule(rule_text: str) -> list[tuple[str, str, int]]:
+    """
+    Splits a rule into tokens.
+
+    Parameters
+    ----------
+    rule_text : str
+        The rule, like "requires (<@&1> or <@&2>) and not <@&3>; grants
+        <@&4> if boosting".
+
+    Returns
+    -------
+    list of tuple of str, str and int
+        The kind, the text and the position of every token. A mentioned role and a
+        plain number are both of the "number" kind.
+    """
+    tokens: list[tuple[str, str, int]] = []
+    position = 0
+    rule_text = rule_text.rstrip()
+
+    while position < len(rule_text):
+        match = TOKEN_PATTERN.match(rule_text, position)
+        if match is None or match.end() == position:
+            # point at the character itself, not at the whitespace before it
+            position += len(rule_text[position:]) - len(rule_text[position:].lstrip())
+            raise ValueError(
+                f"Unexpected character '{rule_text[position]}' at position "
+                f"{position + 1}."
+            )
+
+        kind = match.lastgroup
+        text = match.group(kind)
+        start = match.start(kind)
+        if kind == "mention":
+            kind = "number"
+        elif kind == "word":
+            text = text.lower()
+            if text not in KEYWORDS:
+                raise ValueError(
+                    f"Unknown word '{match.group(kind)}' at position {start + 1}."
+                )
+
+        tokens.append((kind, text, start))
+        position = match.end()
+
+    return tokens
+
+
+class RuleParser:
+    """
+    Parses a rule into a tree of tuples.
+
+    A rule is one or more statements separated by ";":
+
+    - "requires <condition>": the member only keeps the role while the condition holds.
+    - "grants <role>, <role> [if <condition>]": the roles are added while the member has
+      the role, and the condition holds.
+
+    A condition combines roles (mentions or IDs), "boosting", "days_in_guild >= N" (or
+    any other comparison), "true" and "false" with "not", "and", "or" and parentheses,
+    where "not" binds tightest and "or" loosest. Parentheses and "not" can be nested
+    MAX_CONDITION_DEPTH deep.
+    """
+
+    def __init__(self, rule_text: str) -> None:
+        self.rule_text: str = rule_text
+        self.tokens: list[tuple[str, str, int]] = tokenize_rule(rule_text)
+        self.index: int = 0
+        self.depth: int = 0
+
+    def parse(self) -> list[tuple]:
+        """
+        Parses the whole rule.
+
+        Returns
+        -------
+        list of tuple
+            ("requires", condition) and ("grants", role IDs, condition or
+            None) statements.
+        """
+        statements = [self._parse_statement()]
+        while self._accept("punctuation", ";"):
+            # a trailing ";" is allowed
+            if self._peek() is None:
+                break
+            statements.append(self._parse_statement())
+
+        token = self._peek()
+        if token is not None:
+            raise ValueError(f"Unexpected '{token[1]}' at position {token[2] + 1}.")
+
+        return statements
+
+    def _peek(self) -> tuple[str, str, int]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def _accept(self, kind: str, text: str = None) -> tuple[str, str, int]:
+        token = self._peek()
+        if token is None or token[0] != kind or (text is not None and token[1] != text):
+            return None
+
+        self.index += 1
+        return token
+
+    def _expect(
+        self, kind: str, text: str = None, description: str = None
+    ) -> tuple[str, str, int]:
+        token = self._accept(kind, text)
+        if token is not None:
+            return token
+
+        found = self._peek()
+        expected = description or f"'{text}'"
+        if found is None:
+            raise ValueError(f"Expected {expected} at the end of the rule.")
+
+        raise ValueError(
+            f"Expected {expected} at position {found[2] + 1}, found '{found[1]}'."
+        )
+
+    def _parse_statement(self) -> tuple:
+        if self._accept("word", "requires"):
+            return ("requires", self._parse_or())
+
+        self._expect("word", "grants", "'requires' or 'grants'")
+
+        role_ids = [int(self._expect("number", description="a role")[1])]
+        while self._accept("punctuation", ","):
+            role_ids.append(int(self._expect("number", description="a role")[1]))
+
+        condition = self._parse_or() if self._accept("word", "if") else None
+
+        return ("grants", tuple(dict.fromkeys(role_ids)), condition)
+
+    def _parse_or(self) -> tuple:
+        operands = [self._parse_and()]
+        while self._accept("word", "or"):
+            operands.append(self._parse_and())
+
+        return operands[0] if len(operands) == 1 else ("or", tuple(operands))
+
+    def _parse_and(self) -> tuple:
+        operands = [self._parse_not()]
+        while self._accept("word", "and"):
+            operands.append(self._parse_not())
+
+        return operands[0] if len(operands) == 1 else ("and", tuple(operands))
+
+    def _parse_nested(
+        self, token: tuple[str, str, int], parse: Callable[[], tuple]
+    ) -> tuple:
+        if self.depth >= MAX_CONDITION_DEPTH:
+            raise ValueError(
+                f"Condition nested too deep at position {token[2] + 1}, at most "
+                f"{MAX_CONDITION_DEPTH} levels are allowed."
+            )
+
+        self.depth += 1
+        condition = parse()
+        self.depth -= 1
+
+        return condition
+
+    def _parse_not(self) -> tuple:
+        token = self._accept("word", "not")
+        if token is not None:
+            return ("not", self._parse_nested(token, self._parse_not))
+
+        return self._parse_atom()
+
+    def _parse_atom(self) -> tuple:
+        token = self._accept("punctuation", "(")
+        if token is not None:
+            condition = self._parse_nested(token, self._parse_or)
+            self._expect("punctuation", ")")
+            return condition
+
+        token = self._accept("number")
+        if token is not None:
+            return ("role", int(token[1]))
+
+        token = self._peek()
+        if token is not None and token[0] == "word" and token[1] in WORD_CONDITIONS:
+            self.index += 1
+            return WORD_CONDITIONS[token[1]]
+
+        if self._accept("word", "days_in_guild"):
+            comparison = self._expect("operator", description="a comparison like '>='")
+            days = self._expect("number", description="a number of days")
+            return ("days", comparison[1], int(days[1]))
+
+        found = self._peek()
+        if found is None:
+            raise ValueError("Expected a condition at the end of the rule.")
+
+        raise ValueError(
+            f"Expected a condition at position {found[2] + 1}, found '{found[1]}'."
+        )
+
+
+def parse_rule(rule_text: str) -> list[tuple]:
+    """
+    Parses a rule, see RuleParser for the language.
+
+    Raises
+    ------
+    ValueError
+        When the rule is not valid, the message says where.
+    """
+    return RuleParser(rule_text).parse()
+
+
+def _always(
+    held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+) -> bool:
+    return True
+
+
+def _never(
+    held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+) -> bool:
+    return False
+
+
+def _is_boosting(
+    held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+) -> bool:
+    return is_supporter
+
+
+def _is_not_boosting(
+    held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+) -> bool:
+    return not is_supporter
+
+
+def _both(first: RulePredicate, second: RulePredicate) -> RulePredicate:
+    def both(
+        held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+    ) -> bool:
+        if not first(held_role_ids, is_supporter, days_in_guild):
+            return False
+        return second(held_role_ids, is_supporter, days_in_guild)
+
+    return both
+
+
+def _either(first: RulePredicate, second: RulePredicate) -> RulePredicate:
+    def either(
+        held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+    ) -> bool:
+        if first(held_role_ids, is_supporter, days_in_guild):
+            return True
+        return second(held_role_ids, is_supporter, days_in_guild)
+
+    return either
+
+
+def _negate(predicate: RulePredicate) -> RulePredicate:
+    return lambda held_role_ids, is_supporter, days_in_guild: not predicate(
+        held_role_ids, is_supporter, days_in_guild
+    )
+
+
+def _compile_constant(condition: tuple) -> RulePredicate:
+    return _always if condition[1] else _never
+
+
+def _compile_boosting(condition: tuple) -> RulePredicate:
+    return _is_boosting
+
+
+def _compile_role(condition: tuple) -> RulePredicate:
+    role_id = condition[1]
+    return lambda held_role_ids, is_supporter, days_in_guild: (
+        role_id in held_role_ids
+    )
+
+
+def _compile_days(condition: tuple) -> RulePredicate:
+    compare = COMPARISON_OPERATORS[condition[1]]
+    days = condition[2]
+    return lambda held_role_ids, is_supporter, days_in_guild: compare(
+        days_in_guild, days
+    )
+
+
+def _compile_not(condition: tuple) -> RulePredicate:
+    operand = condition[1]
+
+    if operand[0] == "role":
+        role_id = operand[1]
+        return lambda held_role_ids, is_supporter, days_in_guild: (
+            role_id not in held_role_ids
+        )
+
+    # "not (a or b)" is one isdisjoint call
+    if operand[0] == "or" and all(child[0] == "role" for child in operand[1]):
+        role_ids = frozenset(child[1] for child in operand[1])
+        return lambda held_role_ids, is_supporter, days_in_guild: (
+            role_ids.isdisjoint(held_role_ids)
+        )
+
+    if operand[0] == "boosting":
+        return _is_not_boosting
+
+    predicate = compile_condition(operand)
+    if predicate is _always:
+        return _never
+    if predicate is _never:
+        return _always
+
+    return _negate(predicate)
+
+
+def _compile_role_set(role_ids: frozenset[int], is_and: bool) -> RulePredicate:
+    if is_and:
+        return lambda held_role_ids, is_supporter, days_in_guild: (
+            role_ids.issubset(held_role_ids)
+        )
+
+    return lambda held_role_ids, is_supporter, days_in_guild: (
+        not role_ids.isdisjoint(held_role_ids)
+    )
+
+
+def _compile_junction(condition: tuple) -> RulePredicate:
+    # an "and" or an "or", the roles are tested at once and before the other operands
+    is_and = condition[0] == "and"
+    role_ids = frozenset(
+        operand[1] for operand in condition[1] if operand[0] == "role"
+    )
+    other_operands = [operand for operand in condition[1] if operand[0] != "role"]
+
+    predicates: list[RulePredicate] = []
+    if role_ids:
+        predicates.append(_compile_role_set(role_ids, is_and))
+
+    for operand in other_operands:
+        predicate = compile_condition(operand)
+
+        # fold the constants away
+        if predicate is (_always if is_and else _never):
+            continue
+        if predicate is (_never if is_and else _always):
+            return predicate
+
+        predicates.append(predicate)
+
+    if not predicates:
+        return _always if is_and else _never
+
+    return reduce(_both if is_and else _either, predicates)
+
+
+# the compiler of every kind of condition
+CONDITION_COMPILERS: dict[str, Callable[[tuple], RulePredicate]] = {
+    "constant": _compile_constant,
+    "boosting": _compile_boosting,
+    "role": _compile_role,
+    "days": _compile_days,
+    "not": _compile_not,
+    "and": _compile_junction,
+    "or": _compile_junction,
+}
+
+
+def compile_condition(condition: tuple) -> RulePredicate:
+    """
+    Compiles a parsed condition into a predicate.
+
+    The roles of an "and" or an "or" are collapsed into a single frozenset, tested with
+    one issubset or isdisjoint call against the roles of the member, so most conditions
+    are one or two set operations. Nothing is allocated when a predicate is called, as
+    long as the roles of the member are passed as a set or frozenset.
+
+    Parameters
+    ----------
+    condition : tuple
+        A condition from parse_rule.
+
+    Returns
+    -------
+    RulePredicate
+        The compiled condition.
+    """
+    return CONDITION_COMPILERS[condition[0]](condition)
+
+
+def _get_comparison_thresholds(comparison: str, days: int) -> set[int]:
+    # with whole days, "> N" and "<= N" change at N + 1, "==" and "!=" at both
+    if comparison in (">=", "<"):
+        return {days}
+    if comparison in (">", "<="):
+        return {days + 1}
+    return {days, days + 1}
+
+
+def get_day_thresholds(condition: tuple) -> set[int]:
+    """
+    Gets the days in the guild at which a condition can change its outcome.
+
+    Members whose days in the guild fall between the same two thresholds get the same
+    outcome, which lets the plans of members be shared.
+    """
+    if condition is None:
+        return set()
+
+    kind = condition[0]
+    if kind == "days":
+        return _get_comparison_thresholds(condition[1], condition[2])
+
+    if kind == "not":
+        return get_day_thresholds(condition[1])
+
+    if kind in ("and", "or"):
+        return set().union(*(get_day_thresholds(operand) for operand in condition[1]))
+
+    return set()
+
+
+def get_condition_role_ids(condition: tuple) -> set[int]:
+    """
+    Gets every role that is mentioned in a condition.
+    """
+    if condition is None:
+        return set()
+
+    kind = condition[0]
+    if kind == "role":
+        return {condition[1]}
+
+    if kind == "not":
+        return get_condition_role_ids(condition[1])
+
+    if kind in ("and", "or"):
+        return set().union(
+            *(get_condition_role_ids(operand) for operand in condition[1])
+        )
+
+    return set()
+
+
+def _format_atom(condition: tuple) -> str:
+    kind = condition[0]
+
+    if kind == "constant":
+        return "true" if condition[1] else "false"
+
+    if kind == "boosting":
+        return "boosting"
+
+    if kind == "role":
+        return f"<@&{condition[1]}>"
+
+    return f"days_in_guild {condition[1]} {condition[2]}"
+
+
+def format_condition(condition: tuple, parent_kind: str = None) -> str:
+    """
+    Writes a parsed condition back as text, with only the parentheses that are needed.
+    """
+    kind = condition[0]
+
+    if kind == "not":
+        return f"not {format_condition(condition[1], 'not')}"
+
+    if kind not in ("and", "or"):
+        return _format_atom(condition)
+
+    text = f" {kind} ".join(format_condition(operand, kind) for operand in condition[1])
+
+    # "not" binds tightest and "or" loosest
+    if parent_kind == "not" or (parent_kind == "and" and kind == "or"):
+        return f"({text})"
+
+    return text
+
+
+def format_statement(statement: tuple) -> str:
+    """
+    Writes a parsed statement back as text.
+    """
+    if statement[0] == "requires":
+        return f"requires {format_condition(statement[1])}"
+
+    _, role_ids, condition = statement
+    text = "grants " + ", ".join(f"<@&{role_id}>" for role_id in role_ids)
+
+    return text if condition is None else f"{text} if {format_condition(condition)}"
+
+
+def _join_conditions(kind: str, conditions: list[tuple]) -> tuple:
+    # a single condition is not wrapped in an "and" or an "or"
+    return conditions[0] if len(conditions) == 1 else (kind, tuple(conditions))
+
+
+def _fold_constants(kind: str, operands: list[tuple]) -> tuple:
+    # "true" does not change an "and" and "false" does not change an "or"
+    is_and = kind == "and"
+    kept_operands = []
+    for operand in operands:
+        if operand[0] != "constant":
+            kept_operands.append(operand)
+        elif operand[1] != is_and:
+            return operand
+
+    if not kept_operands:
+        return ("constant", is_and)
+
+    return _join_conditions(kind, kept_operands)
+
+
+def remove_role_from_condition(condition: tuple, role_id: int) -> tuple:
+    """
+    Rewrites a parsed condition for a role that was deleted, nobody can have the role
+    anymore so it becomes "false", and the constants that leaves are folded away.
+    """
+    kind = condition[0]
+
+    if kind == "role":
+        return ("constant", False) if condition[1] == role_id else condition
+
+    if kind == "not":
+        operand = remove_role_from_condition(condition[1], role_id)
+        if operand[0] == "constant":
+            return ("constant", not operand[1])
+        return ("not", operand)
+
+    if kind in ("and", "or"):
+        return _fold_constants(kind, [
+            remove_role_from_condition(operand, role_id) for operand in condition[1]
+        ])
+
+    return condition
+
+
+def remove_role_from_statement(statement: tuple, role_id: int) -> tuple:
+    """
+    Rewrites a parsed statement for a role that was deleted.
+
+    Returns
+    -------
+    tuple
+        The statement, None when it no longer does anything.
+    """
+    if statement[0] == "requires":
+        condition = remove_role_from_condition(statement[1], role_id)
+        return None if condition == ("constant", True) else ("requires", condition)
+
+    _, role_ids, condition = statement
+    role_ids = tuple(
+        granted_role_id for granted_role_id in role_ids if granted_role_id != role_id
+    )
+    if condition is not None:
+        condition = remove_role_from_condition(condition, role_id)
+
+    if not role_ids or condition == ("constant", False):
+        return None
+
+    return ("grants", role_ids, None if condition == ("constant", True) else condition)
+
+
+def remove_rule_role(rule_text: str, role_id: int) -> str:
+    """
+    Rewrites a rule for a role that was deleted, so it no longer mentions the role and
+    still keeps and grants the same roles.
+
+    Parameters
+    ----------
+    rule_text : str
+        The rule, see RuleParser for the language.
+    role_id : int
+        The ID of the deleted role.
+
+    Returns
+    -------
+    str
+        The rewritten rule, empty when nothing of the rule is left.
+
+    Raises
+    ------
+    ValueError
+        When the rule is not valid, the message says where.
+    """
+    statements = (
+        remove_role_from_statement(statement, role_id)
+        for statement in parse_rule(rule_text)
+    )
+
+    return "; ".join(
+        format_statement(statement) for statement in statements if statement is not None
+    )
+
+
+class CompiledRule:
+    """
+    A rule of a role, compiled once when the role configuration is loaded.
+
+    Attributes
+    ----------
+    source : str
+        The rule as it was written.
+    requirement : RulePredicate
+        The condition the member has to meet to keep the role, None when the rule has
+        no "requires" statement. Several statements are combined with "and".
+    grants : tuple of tuple of tuple of int and RulePredicate
+        The roles that are granted, each with the condition they are granted under, or
+        None when they are always granted.
+    granted_role_ids : frozenset of int
+        Every role the rule can grant.
+    referenced_role_ids : frozenset of int
+        Every role the rule mentions.
+    day_thresholds : tuple of int
+        The days in the guild at which an outcome of the rule can change, sorted.
+    """
+
+    __slots__ = (
+        "source",
+        "requirement",
+        "grants",
+        "granted_role_ids",
+        "referenced_role_ids",
+        "day_thresholds",
+    )
+
+    def __init__(self, source: str, statements: list[tuple]) -> None:
+        self.source: str = source
+
+        requirements = [
+            statement[1] for statement in statements if statement[0] == "requires"
+        ]
+        grant_statements = [
+            statement for statement in statements if statement[0] == "grants"
+        ]
+        grant_conditions = [condition for _, _, condition in grant_statements]
+
+        requirement = None
+        self.requirement: RulePredicate = None
+        if requirements:
+            requirement = _join_conditions("and", requirements)
+            self.requirement = compile_condition(requirement)
+
+        self.grants: tuple[tuple[tuple[int, ...], RulePredicate], ...] = tuple(
+            (role_ids, compile_condition(condition) if condition is not None else None)
+            for _, role_ids, condition in grant_statements
+        )
+
+        self.granted_role_ids: frozenset[int] = frozenset(
+            role_id for _, role_ids, _ in grant_statements for role_id in role_ids
+        )
+        self.referenced_role_ids: frozenset[int] = self.granted_role_ids.union(
+            get_condition_role_ids(requirement),
+            *(get_condition_role_ids(condition) for condition in grant_conditions),
+        )
+        day_thresholds = get_day_thresholds(requirement).union(
+            *(get_day_thresholds(condition) for condition in grant_conditions)
+        )
+        self.day_thresholds: tuple[int, ...] = tuple(sorted(day_thresholds))
+
+    def allows(
+        self, held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+    ) -> bool:
+        """
+        Checks whether a member can keep the role.
+        """
+        if self.requirement is None:
+            return True
+        return self.requirement(held_role_ids, is_supporter, days_in_guild)
+
+    def iter_granted_role_ids(
+        self, held_role_ids: AbstractSet[int], is_supporter: bool, days_in_guild: int
+    ) -> Iterable[int]:
+        """
+        Gets the roles a member that keeps the role is granted, including the ones the
+        member already has.
+        """
+        for role_ids, condition in self.grants:
+            is_granted = condition is None or condition(
+                held_role_ids, is_supporter, days_in_guild
+            )
+            if is_granted:
+                yield from role_ids
+
+    def __repr__(self) -> str:
+        return f"CompiledRule({self.source!r})"
+
+
+def compile_rule(rule_text: str) -> CompiledRule:
+    """
+    Parses and compiles a rule.
+
+    Parameters
+    ----------
+    rule_text : str
+        The rule, see RuleParser for the language.
+
+    Returns
+    -------
+    CompiledRule
+        The compiled rule, None if the rule is empty.
+
+    Raises
+    ------
+    ValueError
+        When the rule is not valid, the message says where.
+    """
+    if not rule_text or not rule_text.strip():
+        return None
+
+    return CompiledRule(rule_text, parse_rule(rule_text))
+
+
+def express_legacy_rules(
+    requires_supporter_status: bool,
+    cant_combine_with: Iterable[int],
+    required_by: Iterable[int],
+    grants_role: Iterable[int],
+) -> str:
+    """
+    Writes the fixed rule fields of a role configuration in the rule language, the rule
+    that comes out keeps and grants the same roles.
+
+    Parameters
+    ----------
+    requires_supporter_status : bool
+        Whether the role requires supporter status.
+    cant_combine_with : Iterable of int
+        The roles the role can not be combined with.
+    required_by : Iterable of int
+        The roles of which the member needs at least one to keep the role.
+    grants_role : Iterable of int
+        The roles the role grants.
+
+    Returns
+    -------
+    str
+        The rule, empty when the fields hold no rules.
+    """
+    requirements: list[tuple] = []
+    if requires_supporter_status:
+        requirements.append(("boosting",))
+
+    conflicting_roles = tuple(("role", int(role_id)) for role_id in cant_combine_with)
+    if conflicting_roles:
+        requirements.append(("not", _join_conditions("or", conflicting_roles)))
+
+    required_roles = tuple(("role", int(role_id)) for role_id in required_by)
+    if required_roles:
+        requirements.append(_join_conditions("or", required_roles))
+
+    statements: list[tuple] = []
+    if requirements:
+        statements.append(("requires", _join_conditions("and", requirements)))
+
+    granted_role_ids = tuple(int(role_id) for role_id in grants_role)
+    if granted_role_ids:
+        statements.append(("grants", granted_role_ids, None))
+
+    return "; ".join(format_statement(statement) for statement in statements)
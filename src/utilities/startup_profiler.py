@@ -0,0 +1,283 @@
+import argparse
+import cProfile
+import datetime
+import sys
+
+from contextlib import contextmanager, nullcontext
+from importlib.abc import MetaPathFinder
+from json import dump as json_dump
+from os import path
+from time import perf_counter
+
+PROFILING_FOLDER_NAME: str = "profiling"
+
+main_startup_profiler: "StartupProfiler" = None
+
+
+class _TimedLoader:
+    """
+    Wraps a module loader and adds the time spent executing top level imports to the
+    import timer. Nested imports are part of the import that triggered them, so they
+    are not counted twice.
+    """
+
+    def __init__(self, loader, import_timer: "ImportTimer") -> None:
+        self._loader = loader
+        self._import_timer = import_timer
+
+    def __getattr__(self, name: str):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._import_timer.depth += 1
+        start_time = perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._import_timer.depth -= 1
+            if self._import_timer.depth == 0:
+                self._import_timer.total_import_time += perf_counter() - start_time
+
+
+class ImportTimer(MetaPathFinder):
+    """
+    A meta path finder that measures how long imports take, by wrapping the loaders
+    found by the other finders.
+
+    Attributes
+    ----------
+    total_import_time : float
+        The total time spent importing modules, in seconds.
+    depth : int
+        How deep the import that is currently running is nested.
+    """
+
+    def __init__(self) -> None:
+        self.total_import_time: float = 0.0
+        self.depth: int = 0
+
+    def find_spec(self, fullname, target_path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, target_path, target)
+            if spec is None:
+                continue
+
+            # only wrap loaders that execute code, the rest are left alone
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self)
+
+            return spec
+
+        return None
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupProfiler:
+    """
+    Records how long each phase of the startup takes.
+
+    Attributes
+    ----------
+    phases : list of dict
+        The recorded phases, in the order they finished.
+    marks : dict of str to float
+        Points in time, in seconds since the profiler was started.
+    stop_before_login : bool
+        Whether the bot should stop before it logs in.
+    """
+
+    def __init__(
+        self, use_cprofile: bool = False, stop_before_login: bool = False
+    ) -> None:
+        """
+        Initializes the startup profiler.
+
+        Parameters
+        ----------
+        use_cprofile : bool, optional
+            Whether a cProfile dump should be written alongside the report.
+        stop_before_login : bool, optional
+            Whether the bot should stop before it logs in.
+        """
+        self.phases: list[dict] = []
+        self.marks: dict[str, float] = {}
+        self.stop_before_login: bool = stop_before_login
+
+        self.started_at: datetime.datetime = datetime.datetime.now(
+            datetime.timezone.utc
+        )
+        self._start_time: float = perf_counter()
+
+        self._import_timer = ImportTimer()
+        self._profile: cProfile.Profile = cProfile.Profile() if use_cprofile else None
+        self._report_path: str = None
+
+    def start(self) -> None:
+        """
+        Starts measuring imports and, if enabled, the cProfile profile.
+        """
+        self._import_timer.install()
+
+        if self._profile is not None:
+            self._profile.enable()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measures the wall time, import time and amount of imported modules of a phase.
+
+        Parameters
+        ----------
+        name : str
+            The name of the phase.
+        """
+        start_time = perf_counter()
+        start_import_time = self._import_timer.total_import_time
+        start_module_count = len(sys.modules)
+
+        try:
+            yield
+        finally:
+            self.phases.append({
+                "name": name,
+                "started_at": start_time - self._start_time,
+                "wall_time": perf_counter() - start_time,
+                "import_time": self._import_timer.total_import_time - start_import_time,
+                "modules_imported": len(sys.modules) - start_module_count,
+            })
+
+    def mark(self, name: str) -> None:
+        """
+        Records a point in time, only the first time it happens.
+
+        Parameters
+        ----------
+        name : str
+            The name of the mark.
+        """
+        self.marks.setdefault(name, perf_counter() - self._start_time)
+
+    def write_report(self, data_handler) -> str:
+        """
+        Stops profiling and writes the report, and the cProfile dump if enabled, to the
+        profiling folder. Only the first call writes anything.
+
+        Parameters
+        ----------
+        data_handler : DataHandler
+            The data handler used to find the profiling folder.
+
+        Returns
+        -------
+        str
+            The path of the report.
+        """
+        if self._report_path is not None:
+            return self._report_path
+
+        # stop profiling
+        self._import_timer.uninstall()
+        if self._profile is not None:
+            self._profile.disable()
+
+        profiling_folder = data_handler.create_folder(
+            PROFILING_FOLDER_NAME, can_exist=True
+        )
+        file_name = f"startup-{self.started_at.strftime('%Y-%m-%d-%H%M%S')}"
+
+        report = {
+            "started_at": self.started_at.isoformat(),
+            "total_time": perf_counter() - self._start_time,
+            "total_import_time": self._import_timer.total_import_time,
+            "phases": self.phases,
+            "marks": self.marks,
+        }
+
+        self._report_path = path.join(profiling_folder.path, f"{file_name}.json")
+        with open(self._report_path, "w") as file:
+            json_dump(report, file, indent=4)
+
+        if self._profile is not None:
+            self._profile.dump_stats(
+                path.join(profiling_folder.path, f"{file_name}.prof")
+            )
+
+        return self._report_path
+
+
+def start_startup_profiler_from_arguments(
+    arguments: list[str] = None
+) -> StartupProfiler:
+    """
+    Starts the startup profiler if it was requested on the command line.
+
+    Parameters
+    ----------
+    arguments : list of str, optional
+        The command line arguments. Defaults to sys.argv.
+
+    Returns
+    -------
+    StartupProfiler
+        The started profiler, None if profiling was not requested.
+    """
+    global main_startup_profiler
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile-startup", action="store_true")
+    parser.add_argument("--profile-cprofile", action="store_true")
+    parser.add_argument("--profile-stop-before-login", action="store_true")
+    parsed_arguments, _ = parser.parse_known_args(
+        sys.argv[1:] if arguments is None else arguments
+    )
+
+    if not parsed_arguments.profile_startup:
+        return None
+
+    main_startup_profiler = StartupProfiler(
+        use_cprofile=parsed_arguments.profile_cprofile,
+        stop_before_login=parsed_arguments.profile_stop_before_login,
+    )
+    main_startup_profiler.start()
+
+    return main_startup_profiler
+
+
+def get_startup_profiler() -> StartupProfiler:
+    """
+    Gets the running startup profiler.
+
+    Returns
+    -------
+    StartupProfiler
+        The running startup profiler, None if the startup is not being profiled.
+    """
+    return main_startup_profiler
+
+
+def startup_phase(name: str):
+    """
+    Measures a phase of the startup, does nothing if the startup is not being profiled.
+
+    Parameters
+    ----------
+    name : str
+        The name of the phase.
+    """
+    if main_startup_profiler is None:
+        return nullcontext()
+
+    return main_startup_profiler.phase(name)
@@ -0,0 +1,171 @@
+import logging
+
+from collections.abc import KeysView, ValuesView
+from json import dumps as json_dumps
+
+# the attributes that are added to a log record by the structured logger
+EVENT_ATTRIBUTE: str = "event"
+FIELDS_ATTRIBUTE: str = "fields"
+
+
+def format_field_value(value) -> str:
+    """
+    Formats a field value for the plain text log output.
+
+    Discord objects (anything with a name and an id) are shown as "name (id)" and
+    collections are formatted item by item, so callers can pass members and roles as
+    is instead of building strings for messages that might never be emitted.
+    """
+    if isinstance(value, str):
+        return value
+
+    if isinstance(value, (list, tuple, set, frozenset, KeysView, ValuesView)):
+        return "[" + ", ".join(format_field_value(item) for item in value) + "]"
+
+    if hasattr(value, "id") and hasattr(value, "name"):
+        return f"{str(value.name).strip()} ({value.id})"
+
+    return str(value)
+
+
+def to_json_value(value):
+    """
+    Converts a field value that json can not serialize on its own.
+    """
+    if isinstance(value, (set, frozenset, tuple, KeysView, ValuesView)):
+        return list(value)
+
+    if hasattr(value, "id") and hasattr(value, "name"):
+        return {"id": str(value.id), "name": str(value.name).strip()}
+
+    return str(value)
+
+
+class StructuredMessage:
+    """
+    The message of a structured log record, only formatted when the record is emitted.
+    """
+
+    __slots__ = ("event", "fields")
+
+    def __init__(self, event: str, fields: dict) -> None:
+        self.event: str = event
+        self.fields: dict = fields
+
+    def __str__(self) -> str:
+        if not self.fields:
+            return self.event
+
+        formatted_fields = " ".join(
+            f"{key}={format_field_value(value)}" for key, value in self.fields.items()
+        )
+        return f"{self.event} {formatted_fields}"
+
+
+class StructuredLogger:
+    """
+    Logs events with key/value fields instead of pre formatted strings.
+
+    The level is checked before anything else happens, so a disabled log call costs
+    no formatting at all. The fields are attached to the log record, which allows the
+    JsonLinesFormatter to write them as machine readable json.
+
+    Attributes
+    ----------
+    logger : logging.Logger
+        The logger the records are sent to.
+    """
+
+    def __init__(self, logger: logging.Logger) -> None:
+        """
+        Initializes the structured logger.
+
+        Parameters
+        ----------
+        logger : logging.Logger
+            The logger the records are sent to.
+        """
+        self.logger: logging.Logger = logger
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, event: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def _log(
+        self, level: int, event: str, fields: dict, exc_info: bool = False
+    ) -> None:
+        self.logger.log(
+            level,
+            StructuredMessage(event, fields),
+            exc_info=exc_info,
+            extra={EVENT_ATTRIBUTE: event, FIELDS_ATTRIBUTE: fields},
+        )
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats log records as a single line of json.
+
+    Structured records are written with their event and fields, plain records are
+    written with their message so both can live in the same file. The fields are
+    nested under "fields", so a field never overwrites the time, level, logger or
+    event of the record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        json_record = {
+            "time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+
+        event = getattr(record, EVENT_ATTRIBUTE, None)
+        if event is not None:
+            json_record[EVENT_ATTRIBUTE] = event
+
+            fields = getattr(record, FIELDS_ATTRIBUTE, None)
+            if fields:
+                json_record[FIELDS_ATTRIBUTE] = fields
+        else:
+            json_record["message"] = record.getMessage()
+
+        if record.exc_info:
+            json_record["exception"] = self.formatException(record.exc_info)
+
+        return json_dumps(json_record, default=to_json_value, ensure_ascii=False)
+
+
+def get_structured_logger(name: str) -> StructuredLogger:
+    """
+    Gets a structured logger for the logger with the given name.
+
+    Parameters
+    ----------
+    name : str
+        The name of the logger.
+
+    Returns
+    -------
+    StructuredLogger
+        The structured logger.
+    """
+    return StructuredLogger(logging.getLogger(name))
@@ -0,0 +1,225 @@
+import asyncio
+import multiprocessing
+import os
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import AsyncIterator, Iterable, Iterator
+
+from utilities.bulk_role_evaluation import BulkRoleEvaluator, RoleChangePlan
+from utilities.role_configuration import RoleConfiguration, RoleConfigurationSnapshot
+from utilities.structured_logging import get_structured_logger
+
+# how many members a worker plans at a time, plans stream back to the loop per chunk
+DEFAULT_SWEEP_CHUNK_SIZE: int = 4096
+
+logger = get_structured_logger("role")
+
+# the evaluator of a worker process, built once from the rules the pool was started with
+_worker_evaluator: BulkRoleEvaluator = None
+
+
+def get_default_worker_count() -> int:
+    """
+    Gets how many worker processes to use, one core is left for the event loop.
+    """
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def compile_role_rules(
+    snapshot: RoleConfigurationSnapshot, live_role_ids: Iterable[int]
+) -> tuple:
+    """
+    Packs the rules of a snapshot into plain data that can be sent to a worker process.
+
+    Parameters
+    ----------
+    snapshot : RoleConfigurationSnapshot
+        The role configuration to plan against.
+    live_role_ids : Iterable of int
+        The configured roles that exist in the guild.
+
+    Returns
+    -------
+    tuple
+        The version of the snapshot, the rules of every role in the file format and the
+        live role IDs.
+    """
+    rules = {
+        role_id: configuration.to_json()
+        for role_id, configuration in snapshot.configurations.items()
+    }
+    return snapshot.version, rules, array("Q", live_role_ids)
+
+
+def _discard_futures(futures: list[asyncio.Future]) -> None:
+    """
+    Cancels the futures that are still running and retrieves the errors of the rest,
+    nobody is going to await them, so asyncio should not warn about unretrieved errors.
+    """
+    for future in futures:
+        if not future.done():
+            future.cancel()
+        elif not future.cancelled():
+            future.exception()
+
+
+def _initialize_worker(compiled_role_rules: tuple) -> None:
+    global _worker_evaluator
+
+    version, rules, live_role_ids = compiled_role_rules
+    snapshot = RoleConfigurationSnapshot(version, {
+        role_id: RoleConfiguration(role_id, configuration)
+        for role_id, configuration in rules.items()
+    })
+
+    _worker_evaluator = BulkRoleEvaluator(snapshot, live_role_ids)
+
+
+def _plan_chunk(members: list[tuple]) -> list[RoleChangePlan]:
+    return _worker_evaluator.evaluate(members)
+
+
+class SweepPlanner:
+    """
+    Plans the role changes of every member of a guild in worker processes.
+
+    Planning a sweep is pure cpu work, on a large guild it would keep the event loop
+    busy long enough to miss gateway heartbeats. The planner sends the compiled rules to
+    every worker once, then sends the role IDs of the members in compact chunks. The
+    workers plan the chunks in parallel and the plans stream back to the loop as each
+    chunk finishes, so applying them can start before the whole guild is planned.
+
+    Attributes
+    ----------
+    max_workers : int
+        How many worker processes plan at the same time.
+    chunk_size : int
+        How many members are sent to a worker at a time.
+    last_sweep_stats : dict
+        How the last sweep went, see get_stats.
+    """
+
+    def __init__(
+        self, max_workers: int = None, chunk_size: int = DEFAULT_SWEEP_CHUNK_SIZE
+    ) -> None:
+        """
+        Initializes the sweep planner.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            How many worker processes plan at the same time, all but one
+            core by default.
+        chunk_size : int, optional
+            How many members are sent to a worker at a time.
+        """
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+
+        self.max_workers: int = max_workers or get_default_worker_count()
+        self.chunk_size: int = chunk_size
+
+        self.last_sweep_stats: dict = {}
+
+    def get_stats(self) -> dict:
+        """
+        Gets the amount of workers and how the last sweep went.
+
+        Returns
+        -------
+        dict
+            The worker count, and the members, chunks, changed members and seconds of
+            the last sweep.
+        """
+        return {"workers": self.max_workers, **self.last_sweep_stats}
+
+    def _create_executor(self, compiled_role_rules: tuple) -> ProcessPoolExecutor:
+        # spawn fresh processes, forking a process with a running event loop and
+        # threads is unsafe
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker,
+            initargs=(compiled_role_rules,),
+        )
+
+    def _iter_chunks(self, members: Iterable[tuple]) -> Iterator[list[tuple]]:
+        """
+        Packs the members into chunks, the role IDs of every member into an array.
+        """
+        chunk: list[tuple] = []
+        for member_id, member_role_ids, *member_status in members:
+            chunk.append((member_id, array("Q", member_role_ids), *member_status))
+
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    async def plan(
+        self,
+        snapshot: RoleConfigurationSnapshot,
+        live_role_ids: Iterable[int],
+        members: Iterable[tuple],
+    ) -> AsyncIterator[RoleChangePlan]:
+        """
+        Plans the role changes of many members in the worker processes.
+
+        Parameters
+        ----------
+        snapshot : RoleConfigurationSnapshot
+            The role configuration to plan against.
+        live_role_ids : Iterable of int
+            The configured roles that exist in the guild.
+        members : Iterable of tuple
+            The ID, the role IDs and the supporter status of every member, optionally
+            followed by the days the member is in the guild.
+
+        Yields
+        ------
+        RoleChangePlan
+            The plan of every member that needs changes, in the order the chunks finish.
+        """
+        start = perf_counter()
+        loop = asyncio.get_running_loop()
+
+        executor = self._create_executor(compile_role_rules(snapshot, live_role_ids))
+
+        member_count = 0
+        changed_count = 0
+        futures: list[asyncio.Future] = []
+
+        try:
+            for chunk in self._iter_chunks(members):
+                futures.append(loop.run_in_executor(executor, _plan_chunk, chunk))
+                member_count += len(chunk)
+
+                # let the loop handle events while the members are being packed
+                await asyncio.sleep(0)
+
+            for future in asyncio.as_completed(futures):
+                for role_change_plan in await future:
+                    changed_count += 1
+                    yield role_change_plan
+        finally:
+            # the workers are done, or the caller stopped listening and the rest
+            # is not needed
+            executor.shutdown(wait=False, cancel_futures=True)
+            _discard_futures(futures)
+
+            self.last_sweep_stats = {
+                "members": member_count,
+                "chunks": len(futures),
+                "changed": changed_count,
+                "seconds": perf_counter() - start,
+            }
+
+            logger.info(
+                "sweep_planner.finish",
+                workers=self.max_workers,
+                **self.last_sweep_stats,
+            )
@@ -2,9 +2,11 @@ from os import path, chdir, listdir, getcwd
 
 BUILT_IN_MARKER_FILE_NAMES: list[str] = ["setup.py", "readme.md", "requirements.txt"]
 
+
 def cut_off_string(input_string: str, cut_off_point: int) -> str:
     """
-    Cuts off the input string if it is too long. If it is too short, adds spaces to the end of the string.
+    Cuts off the input string if it is too long. If it is too short, adds spaces to the
+    end of the string.
     """
     return (
         input_string[:cut_off_point]
@@ -12,6 +14,7 @@ def cut_off_string(input_string: str, cut_off_point: int) -> str:
         else input_string + " " * (cut_off_point - len(input_string))
     )
 
+
 def get_project_root(marker_file_override: list = None) -> str:
     """
     Gets the project root regardless of relative or absolute path
@@ -45,15 +48,11 @@ def get_project_root(marker_file_override: list = None) -> str:
     # set the project root path
     project_root_path: str = None
 
-    # list of all marker file names
-    marker_file_names: list[str] = BUILT_IN_MARKER_FILE_NAMES
-
-    # check if there is a marker override
-    if marker_file_override:
-        # set the marker file names to the override
-        marker_file_names = marker_file_override
+    # list of all marker file names, the override is used instead when there is one
+    marker_file_names: list[str] = marker_file_override or BUILT_IN_MARKER_FILE_NAMES
 
-    # Try and get the project root by going up one directory from the current file path until we find the project root.
+    # Try and get the project root by going up one directory from the current file path
+    # until we find the project root.
     while not project_root_path:
         # get the parent directory of the current file path
         parent_directory: str = path.dirname(current_file_path)
@@ -68,10 +67,11 @@ def get_project_root(marker_file_override: list = None) -> str:
         parent_directory_files: list[str] = listdir(parent_directory)
 
         # check if any of the marker files are in the parent directory
-        for marker_file_name in marker_file_names:
-            if marker_file_name in parent_directory_files:
-                project_root_path = parent_directory
-                break
+        if any(
+            marker_file_name in parent_directory_files
+            for marker_file_name in marker_file_names
+        ):
+            project_root_path = parent_directory
 
         # If we reached drive root, we didn't find the project root.
         if not parent_directory_basename:
@@ -124,7 +124,8 @@ def fix_working_directory() -> None:
         print(f"Working directory is correct!\nCURRENT > {project_root}")
     else:
         print(
-            f"Working directory was changed!\nOLD | {old_working_directory}\nNEW | {project_root}"
+            f"Working directory was changed!\nOLD | {old_working_directory}"
+            f"\nNEW | {project_root}"
         )
 
     # return None
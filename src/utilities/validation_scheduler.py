@@ -0,0 +1,482 @@
+import asyncio
+
+from collections import deque
+from enum import IntEnum
+from time import monotonic
+from typing import Awaitable, Callable
+
+import discord
+
+from utilities.bulk_role_evaluation import RoleChangePlan
+from utilities.loop_watchdog import calculate_percentile
+from utilities.structured_logging import get_structured_logger
+
+# how many validation jobs run at the same time
+DEFAULT_WORKER_COUNT: int = 2
+# how many wait time samples are kept per priority for the percentiles
+DEFAULT_WAIT_SAMPLE_SIZE: int = 1024
+
+logger = get_structured_logger("role")
+
+
+class ValidationPriority(IntEnum):
+    """
+    The priority classes of validation jobs, a lower value is handled first.
+    """
+
+    # an admin asked for the validation and is waiting for the answer
+    INTERACTIVE = 0
+    # something happened to the member (a message, a role change, ...)
+    EVENT = 1
+    # a background sweep over the whole guild
+    SWEEP = 2
+
+
+# how many jobs can wait in each priority class before submitting blocks
+DEFAULT_QUEUE_SIZES: dict[ValidationPriority, int] = {
+    ValidationPriority.INTERACTIVE: 100,
+    ValidationPriority.EVENT: 1000,
+    ValidationPriority.SWEEP: 10000,
+}
+
+
+class ValidationJob:
+    """
+    A pending validation of a single member.
+
+    Attributes
+    ----------
+    key : tuple of int
+        The guild ID and member ID, there is at most one pending job per key.
+    member : discord.Member
+        The most recently submitted version of the member.
+    priority : ValidationPriority
+        The highest priority the job was submitted with.
+    submitted_at : float
+        When the job was first submitted, in monotonic seconds.
+    future : asyncio.Future
+        Resolved with the result of the validation, shared by every submitter.
+    plan : RoleChangePlan
+        The role changes that were already worked out for the member, applied instead
+        of planning again. None when the member has to be planned.
+    """
+
+    __slots__ = ("key", "member", "priority", "submitted_at", "future", "plan")
+
+    def __init__(
+        self,
+        member: discord.Member,
+        priority: ValidationPriority,
+        plan: RoleChangePlan = None,
+    ) -> None:
+        self.key: tuple[int, int] = (member.guild.id, member.id)
+        self.member: discord.Member = member
+        self.priority: ValidationPriority = priority
+        self.plan: RoleChangePlan = plan
+        self.submitted_at: float = monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ValidationScheduler:
+    """
+    Runs the role validations of every trigger through one set of workers.
+
+    Every priority class has its own bounded queue, workers always take the job with
+    the highest priority, so a large sweep never delays an admin request or an event
+    driven fix. Submitting to a full queue waits until there is room again, which
+    slows down whoever is producing the jobs instead of growing the queue forever.
+
+    A member has at most one pending job. Submitting the same member again updates the
+    member and raises the priority of the pending job instead of queueing it twice. A
+    member is never validated by two workers at the same time, a job submitted while
+    the member is being validated runs after the running validation finishes.
+
+    A job can carry a plan that was already worked out, like the plans of a sweep, so
+    the validation applies it instead of planning the member again. A plan only holds
+    for the member it was made for, so submitting the member again replaces it.
+
+    Attributes
+    ----------
+    worker_count : int
+        How many validation jobs run at the same time.
+    queue_sizes : dict of ValidationPriority to int
+        How many jobs can wait in each priority class.
+    submitted_count : int
+        How many jobs were submitted, including the deduplicated ones.
+    deduplicated_count : int
+        How many submissions were merged into an already pending job.
+    completed_count : int
+        How many jobs finished without an error.
+    failed_count : int
+        How many jobs raised an error.
+    """
+
+    def __init__(
+        self,
+        validate: Callable[[discord.Member, RoleChangePlan], Awaitable],
+        worker_count: int = DEFAULT_WORKER_COUNT,
+        queue_sizes: dict[ValidationPriority, int] = None,
+        wait_sample_size: int = DEFAULT_WAIT_SAMPLE_SIZE,
+    ) -> None:
+        """
+        Initializes the validation scheduler.
+
+        Parameters
+        ----------
+        validate : Callable
+            The coroutine function that validates a member, called with the member and
+            the plan of the job, None when the member has to be planned.
+        worker_count : int, optional
+            How many validation jobs run at the same time.
+        queue_sizes : dict of ValidationPriority to int, optional
+            How many jobs can wait in each priority class.
+        wait_sample_size : int, optional
+            How many wait time samples are kept per priority for the percentiles.
+        """
+        if worker_count < 1:
+            raise ValueError("worker_count must be at least 1.")
+
+        self.validate: Callable[[discord.Member, RoleChangePlan], Awaitable] = validate
+        self.worker_count: int = worker_count
+        self.queue_sizes: dict[ValidationPriority, int] = {
+            **DEFAULT_QUEUE_SIZES, **(queue_sizes or {})
+        }
+
+        # the keys of the pending jobs, per priority, in the order they were submitted
+        self._queues: dict[ValidationPriority, deque] = {
+            priority: deque() for priority in ValidationPriority
+        }
+        # the pending jobs, a key can sit in the queue of a lower priority after
+        # it was raised
+        self._pending: dict[tuple[int, int], ValidationJob] = {}
+        # the amount of pending jobs per priority, the queues can hold stale keys
+        self._depths: dict[ValidationPriority, int] = {
+            priority: 0 for priority in ValidationPriority
+        }
+
+        # the members that are being validated, and the jobs waiting for them to finish
+        self._running: set[tuple[int, int]] = set()
+        self._deferred: dict[tuple[int, int], ValidationJob] = {}
+
+        self._condition: asyncio.Condition = None
+        self._workers: list[asyncio.Task] = []
+
+        self._wait_samples: dict[ValidationPriority, deque] = {
+            priority: deque(maxlen=wait_sample_size) for priority in ValidationPriority
+        }
+
+        self.submitted_count: int = 0
+        self.deduplicated_count: int = 0
+        self.completed_count: int = 0
+        self.failed_count: int = 0
+
+    @property
+    def is_running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    async def start(self) -> None:
+        """
+        Starts the workers. Must be awaited from the event loop the jobs run on.
+        """
+        if self.is_running:
+            return None
+
+        self._condition = asyncio.Condition()
+        self._workers = [
+            asyncio.get_running_loop().create_task(
+                self._work(), name=f"validation-worker-{index}"
+            )
+            for index in range(self.worker_count)
+        ]
+
+        logger.info(
+            "validation_scheduler.started",
+            workers=self.worker_count,
+            queue_sizes=self.queue_sizes,
+        )
+
+        return None
+
+    def stop(self) -> None:
+        """
+        Stops the workers and cancels every pending job.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+        # nobody is going to run the pending jobs anymore
+        for job in [*self._pending.values(), *self._deferred.values()]:
+            if not job.future.done():
+                job.future.cancel()
+
+        self._pending.clear()
+        self._deferred.clear()
+        for priority in ValidationPriority:
+            self._queues[priority].clear()
+            self._depths[priority] = 0
+
+        return None
+
+    async def submit(
+        self,
+        member: discord.Member,
+        priority: ValidationPriority = ValidationPriority.EVENT,
+        plan: RoleChangePlan = None,
+    ) -> asyncio.Future:
+        """
+        Submits a validation of a member, waits while the queue of the priority is full.
+
+        Parameters
+        ----------
+        member : discord.Member
+            The member to validate.
+        priority : ValidationPriority, optional
+            The priority class of the validation.
+        plan : RoleChangePlan, optional
+            The role changes that were already worked out for the member.
+
+        Returns
+        -------
+        asyncio.Future
+            Resolved with the result of the validation, can be awaited by interactive
+            callers and ignored by everyone else.
+        """
+        if self._condition is None:
+            raise RuntimeError("The validation scheduler has not been started.")
+
+        async with self._condition:
+            job = self._merge_into_pending(member, priority, plan)
+            if job is not None:
+                return job.future
+
+            # backpressure, wait until there is room in the queue of this priority
+            await self._condition.wait_for(
+                lambda: self._depths[priority] < self.queue_sizes[priority]
+            )
+
+            # the member could have been submitted by someone else while we were waiting
+            job = self._merge_into_pending(member, priority, plan)
+            if job is not None:
+                return job.future
+
+            job = self._enqueue(ValidationJob(member, priority, plan))
+            self._condition.notify_all()
+
+            return job.future
+
+    def try_submit(
+        self,
+        member: discord.Member,
+        priority: ValidationPriority = ValidationPriority.EVENT,
+        plan: RoleChangePlan = None,
+    ) -> asyncio.Future:
+        """
+        Submits a validation of a member without waiting.
+
+        Parameters
+        ----------
+        member : discord.Member
+            The member to validate.
+        priority : ValidationPriority, optional
+            The priority class of the validation.
+        plan : RoleChangePlan, optional
+            The role changes that were already worked out for the member.
+
+        Returns
+        -------
+        asyncio.Future
+            Resolved with the result of the validation, None if the queue of the
+            priority is full.
+        """
+        if self._condition is None:
+            raise RuntimeError("The validation scheduler has not been started.")
+
+        job = self._merge_into_pending(member, priority, plan)
+        if job is not None:
+            return job.future
+
+        if self._depths[priority] >= self.queue_sizes[priority]:
+            logger.warning(
+                "validation_scheduler.queue_full", member=member, priority=priority.name
+            )
+            return None
+
+        job = self._enqueue(ValidationJob(member, priority, plan))
+
+        # wake up a worker, notifying requires holding the lock so it is done in a task
+        asyncio.get_running_loop().create_task(self._notify())
+
+        return job.future
+
+    def get_stats(self) -> dict:
+        """
+        Gets the queue depths, wait times and counters of the scheduler.
+
+        Returns
+        -------
+        dict
+            The depth and the p50/p90/p99/max wait time in seconds of every priority,
+            and the amount of running, submitted, deduplicated, completed
+            and failed jobs.
+        """
+        priorities = {}
+        for priority in ValidationPriority:
+            sorted_samples = sorted(self._wait_samples[priority])
+            priorities[priority.name.lower()] = {
+                "depth": self._depths[priority],
+                "wait_p50": calculate_percentile(sorted_samples, 50),
+                "wait_p90": calculate_percentile(sorted_samples, 90),
+                "wait_p99": calculate_percentile(sorted_samples, 99),
+                "wait_max": sorted_samples[-1] if sorted_samples else 0.0,
+            }
+
+        return {
+            "priorities": priorities,
+            "running": len(self._running),
+            "deferred": len(self._deferred),
+            "submitted": self.submitted_count,
+            "deduplicated": self.deduplicated_count,
+            "completed": self.completed_count,
+            "failed": self.failed_count,
+        }
+
+    def _merge_into_pending(
+        self,
+        member: discord.Member,
+        priority: ValidationPriority,
+        plan: RoleChangePlan,
+    ) -> ValidationJob:
+        """
+        Merges a submission into the pending job of the member, if there is one.
+
+        Returns
+        -------
+        ValidationJob
+            The pending job, None if the member has no pending job.
+        """
+        key = (member.guild.id, member.id)
+
+        job = self._pending.get(key) or self._deferred.get(key)
+        if job is None:
+            return None
+
+        self.submitted_count += 1
+        self.deduplicated_count += 1
+
+        # always validate the most recent version of the member, with the
+        # plan made for it
+        job.member = member
+        job.plan = plan
+
+        if priority < job.priority:
+            if key in self._pending:
+                # move the job to the higher priority, the old queue entry becomes stale
+                self._depths[job.priority] -= 1
+                self._depths[priority] += 1
+                self._queues[priority].append(key)
+            job.priority = priority
+
+        return job
+
+    def _enqueue(self, job: ValidationJob) -> ValidationJob:
+        self.submitted_count += 1
+
+        self._pending[job.key] = job
+        self._queues[job.priority].append(job.key)
+        self._depths[job.priority] += 1
+
+        return job
+
+    async def _notify(self) -> None:
+        async with self._condition:
+            self._condition.notify_all()
+
+    def _pop_next_job(self) -> ValidationJob:
+        """
+        Takes the pending job with the highest priority, None if there is none.
+        """
+        for priority in ValidationPriority:
+            queue = self._queues[priority]
+
+            while queue:
+                key = queue.popleft()
+                job = self._pending.get(key)
+
+                # skip keys of jobs that were moved to a higher priority
+                if job is None or job.priority != priority:
+                    continue
+
+                del self._pending[key]
+                self._depths[priority] -= 1
+
+                return job
+
+        return None
+
+    async def _work(self) -> None:
+        """
+        Runs validation jobs until the worker is cancelled.
+        """
+        while True:
+            async with self._condition:
+                job = self._pop_next_job()
+                while job is None:
+                    await self._condition.wait()
+                    job = self._pop_next_job()
+
+                # a job left the queue, so there is room for a waiting submitter
+                self._condition.notify_all()
+
+                # the member is already being validated, run the job once that is done
+                if job.key in self._running:
+                    self._deferred[job.key] = job
+                    continue
+
+                self._running.add(job.key)
+
+            await self._run(job)
+
+    async def _run(self, job: ValidationJob) -> None:
+        wait_time = monotonic() - job.submitted_at
+        self._wait_samples[job.priority].append(wait_time)
+
+        logger.debug(
+            "validation_scheduler.job_start",
+            member=job.member,
+            priority=job.priority.name,
+            wait_time=round(wait_time, 3),
+        )
+
+        try:
+            result = await self.validate(job.member, job.plan)
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as error:
+            self.failed_count += 1
+            logger.exception(
+                "validation_scheduler.job_failed", member=job.member, error=error
+            )
+            if not job.future.done():
+                job.future.set_exception(error)
+                # nobody has to await the future, so do not warn about an
+                # unretrieved error
+                job.future.exception()
+        else:
+            self.completed_count += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            async with self._condition:
+                self._running.discard(job.key)
+
+                # queue the job that was submitted while the member was being validated
+                deferred_job = self._deferred.pop(job.key, None)
+                if deferred_job is not None:
+                    self._pending[deferred_job.key] = deferred_job
+                    self._queues[deferred_job.priority].appendleft(deferred_job.key)
+                    self._depths[deferred_job.priority] += 1
+                    self._condition.notify_all()
+
+        return None
@@ -0,0 +1,174 @@
+import random
+
+import pytest
+
+from utilities import bulk_role_evaluation
+from utilities.bulk_role_evaluation import (
+    BulkRoleEvaluator,
+    RoleChangePlan,
+    plan_member_roles,
+)
+from utilities.role_configuration import (
+    RoleConfiguration,
+    RoleConfigurationSnapshot,
+)
+
+# the roles 1 to 30 are configured, 29 and 30 were deleted from the guild since
+CONFIGURED_ROLE_IDS = list(range(1, 31))
+LIVE_ROLE_IDS = set(range(1, 29))
+# roles of the guild that are not configured and not mentioned by any rule
+OTHER_ROLE_IDS = list(range(100, 106))
+
+# one role per kind of check, so every check is covered on its own
+CASE_RULES = {
+    1: {"requires_supporter_status": True},
+    2: {"cant_combine_with": ["3"]},
+    4: {"required_by": ["5", "6"]},
+    7: {"grants_role": ["8", "29"]},
+    9: {
+        "rule": "requires days_in_guild >= 30 and not <@&10>; "
+        "grants <@&11> if boosting",
+    },
+}
+# the checks of the plans, in the order of the RoleChangePlan fields
+PLAN_FIELDS = (
+    "supporter_roles_lost",
+    "singleton_roles_lost",
+    "required_roles_lost",
+    "granted_roles",
+    "rule_roles_lost",
+)
+
+
+def create_snapshot(rules: dict) -> RoleConfigurationSnapshot:
+    return RoleConfigurationSnapshot(1, {
+        role_id: RoleConfiguration(
+            role_id, {"role_name": f"role {role_id}", **rules.get(role_id, {})}
+        )
+        for role_id in CONFIGURED_ROLE_IDS
+    })
+
+
+def create_random_rule(generator: random.Random) -> dict:
+    def pick_roles() -> list[str]:
+        return [str(role_id) for role_id in generator.sample(CONFIGURED_ROLE_IDS, 2)]
+
+    def pick_condition() -> str:
+        first, second = generator.sample(CONFIGURED_ROLE_IDS, 2)
+        return generator.choice([
+            f"<@&{first}> or <@&{second}>",
+            f"not (<@&{first}> or <@&{second}>)",
+            f"<@&{first}> and not boosting",
+            f"days_in_guild > {generator.randrange(60)} or <@&{second}>",
+            f"(<@&{first}> or boosting) and days_in_guild != {generator.randrange(5)}",
+        ])
+
+    granted_role_id = generator.choice(CONFIGURED_ROLE_IDS)
+    rule = (
+        f"requires {pick_condition()}; "
+        f"grants <@&{granted_role_id}> if {pick_condition()}"
+    )
+
+    return generator.choice([
+        {"requires_supporter_status": True},
+        {"cant_combine_with": pick_roles()},
+        {"required_by": pick_roles()},
+        {"grants_role": pick_roles()},
+        {"rule": rule},
+    ])
+
+
+def create_random_members(generator: random.Random, amount: int) -> list[tuple]:
+    live_role_ids = sorted(LIVE_ROLE_IDS)
+    return [
+        (
+            member_id,
+            generator.sample(live_role_ids + OTHER_ROLE_IDS, generator.randrange(8)),
+            generator.random() < 0.3,
+            generator.randrange(90),
+        )
+        for member_id in range(amount)
+    ]
+
+
+def normalize(plans: list[RoleChangePlan]) -> list[tuple]:
+    # the bulk path lists roles in column order, the single path in member order
+    return [
+        (plan.member_id, *(sorted(getattr(plan, field)) for field in PLAN_FIELDS))
+        for plan in plans
+    ]
+
+
+def plan_one_by_one(snapshot: RoleConfigurationSnapshot, members: list[tuple]) -> list:
+    plans = (plan_member_roles(snapshot, LIVE_ROLE_IDS, *member) for member in members)
+    return [plan for plan in plans if plan.has_changes]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def numpy_mode(request, monkeypatch) -> str:
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(bulk_role_evaluation, "numpy", None)
+
+    return request.param
+
+
+def test_every_check_is_planned(numpy_mode):
+    snapshot = create_snapshot(CASE_RULES)
+    members = [
+        (1, [1], False, 0),
+        (2, [2, 3], True, 0),
+        (3, [4, 6], True, 0),
+        (4, [4], True, 0),
+        (5, [7], True, 0),
+        (6, [9], True, 10),
+        (7, [9, 10], True, 40),
+        (8, [9, 11], False, 40),
+        (9, [9], True, 40),
+    ]
+
+    evaluator = BulkRoleEvaluator(snapshot, LIVE_ROLE_IDS, chunk_size=4)
+    plans = evaluator.evaluate(members)
+
+    assert evaluator.uses_numpy == (numpy_mode == "numpy")
+    assert normalize(plans) == [
+        (1, [1], [], [], [], []),
+        (2, [], [2], [], [], []),
+        (4, [], [], [4], [], []),
+        # role 29 was deleted, so it is not granted
+        (5, [], [], [], [8], []),
+        (6, [], [], [], [], [9]),
+        (7, [], [], [], [], [9]),
+        (9, [], [], [], [11], []),
+    ]
+    assert normalize(plans) == normalize(plan_one_by_one(snapshot, members))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bulk_plans_match_single_plans(numpy_mode, seed):
+    generator = random.Random(seed)
+    rules = {
+        role_id: create_random_rule(generator)
+        for role_id in generator.sample(CONFIGURED_ROLE_IDS, 15)
+    }
+    snapshot = create_snapshot(rules)
+    members = create_random_members(generator, 500)
+
+    evaluator = BulkRoleEvaluator(snapshot, LIVE_ROLE_IDS, chunk_size=128)
+    plans = evaluator.evaluate(members)
+
+    assert plans
+    assert normalize(plans) == normalize(plan_one_by_one(snapshot, members))
+
+
+def test_members_without_days_are_planned_as_new_members(numpy_mode):
+    snapshot = create_snapshot(CASE_RULES)
+    members = [(1, [9], True), (2, [9], True, 0)]
+
+    plans = BulkRoleEvaluator(snapshot, LIVE_ROLE_IDS).evaluate(members)
+
+    assert normalize(plans) == [
+        (1, [], [], [], [], [9]),
+        (2, [], [], [], [], [9]),
+    ]
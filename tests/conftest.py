@@ -0,0 +1,38 @@
+from typing import Callable
+
+import pytest
+
+from utilities.data_handling import DataHandler
+from utilities.role_configuration import RoleConfigurationManager
+
+
+class StubBot:
+    """
+    A bot without any guild in its cache.
+    """
+
+    production_server_id = None
+
+    def get_guild(self, guild_id: int) -> None:
+        return None
+
+
+@pytest.fixture
+def stub_bot() -> StubBot:
+    return StubBot()
+
+
+@pytest.fixture
+def create_manager(tmp_path, stub_bot) -> Callable[[int], RoleConfigurationManager]:
+    """
+    Creates the loaded role configuration manager of a guild, with its files in the
+    data folder of the test.
+    """
+    data_handler = DataHandler(str(tmp_path / "data"))
+
+    def create(guild_id: int) -> RoleConfigurationManager:
+        manager = RoleConfigurationManager(stub_bot, data_handler, guild_id)
+        manager.load_role_configuration_file()
+        return manager
+
+    return create
@@ -0,0 +1,55 @@
+import logging
+
+import pytest
+
+from utilities import custom_logger
+from utilities.custom_logger import CustomLogger, LoggerRegistry
+from utilities.data_handling import DataHandler
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    data_handler = DataHandler(str(tmp_path / "data"))
+    monkeypatch.setattr(custom_logger, "get_data_handler", lambda: data_handler)
+
+    registry = LoggerRegistry()
+    monkeypatch.setattr(custom_logger, "main_logger_registry", registry)
+
+    yield registry
+
+    # the loggers live on in the logging module, so their files are closed here
+    for logger_name in list(registry._handlers):
+        logger = logging.getLogger(logger_name)
+        for handler in registry._handlers[logger_name]:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def test_repeated_request_changes_the_level(registry):
+    logger = CustomLogger("level test", logging_level=logging.INFO).logger
+    assert logger.level == logging.INFO
+
+    # a request without a level keeps the level
+    assert CustomLogger("level test").logger.level == logging.INFO
+
+    CustomLogger("level test", logging_level=logging.WARNING)
+    assert logger.level == logging.WARNING
+    assert len(logger.handlers) == 2
+
+
+def test_repeated_request_warns_about_another_format(registry, caplog):
+    CustomLogger("format test", structured=True)
+    caplog.clear()
+
+    with caplog.at_level(logging.WARNING, logger="format test"):
+        CustomLogger("format test")
+        CustomLogger("format test", structured=True)
+        assert caplog.records == []
+
+        CustomLogger("format test", structured=False)
+
+    assert registry.is_structured("format test")
+    assert [record.getMessage() for record in caplog.records] == [
+        "format test logger is already set up with json lines log files, "
+        "ignoring structured=False"
+    ]
@@ -0,0 +1,119 @@
+import asyncio
+import gzip
+import json
+
+from utilities.event_recorder import RECORDING_FORMAT_VERSION
+from utilities.data_handling import DataHandler
+from utilities.event_replay import (
+    EventReplayer,
+    ReplayBot,
+    read_recording,
+    replay_recording,
+)
+
+GUILD_ID = 1
+
+
+def create_rules(**changes) -> dict:
+    rules = {
+        str(role_id): {
+            "role_name": f"role {role_id}",
+            "requires_supporter_status": False,
+            "cant_combine_with": [],
+            "grants_role": [],
+            "required_by": [],
+        }
+        for role_id in range(1, 5)
+    }
+    for role_id, rule in changes.items():
+        rules[role_id.removeprefix("r")].update(rule)
+
+    return rules
+
+
+def write_recording(recording_path: str, records: list) -> None:
+    header = {
+        "format": RECORDING_FORMAT_VERSION,
+        "production_guild": GUILD_ID,
+        "development_guild": 2,
+    }
+    with gzip.open(recording_path, "wt", encoding="utf-8") as file:
+        for event_name, payload in [("recording", header), *records]:
+            file.write(json.dumps([0, event_name, payload]) + "\n")
+
+
+def write_member_updates(recording_path: str) -> None:
+    guild = {
+        "g": GUILD_ID,
+        "roles": [[role_id, f"role {role_id}", role_id] for role_id in range(1, 5)],
+        "members": [[10, [], 0, 0], [11, [], 0, 0], [12, [], 0, 1]],
+        "rules": create_rules(
+            r1={"cant_combine_with": ["2"]},
+            r3={"requires_supporter_status": True},
+            r4={"grants_role": ["1"]},
+        ),
+    }
+    write_recording(recording_path, [
+        ("guild", guild),
+        # loses role 2, it can not be combined with role 1
+        ("member_update", {"g": GUILD_ID, "m": 10, "r": [1, 2], "p": 0}),
+        # loses role 3, it needs supporter status
+        ("member_update", {"g": GUILD_ID, "m": 11, "r": [3], "p": 0}),
+        # a supporter keeps role 3 and gets role 1 from role 4
+        ("member_update", {"g": GUILD_ID, "m": 12, "r": [3, 4], "p": 1}),
+    ])
+
+
+def test_replayed_validations_change_roles(tmp_path):
+    recording_path = str(tmp_path / "recording.jsonl.gz")
+    write_member_updates(recording_path)
+
+    report = asyncio.run(replay_recording(
+        recording_path, speed=0, validate=True, live_validation=True
+    ))
+
+    assert report["validation"]["completed"] == 3
+    assert report["validation"]["failed"] == 0
+    assert report["requests"]["roles_removed"] == 2
+    assert report["requests"]["roles_added"] == 1
+
+
+def test_replayed_validations_change_nothing_by_default(tmp_path):
+    recording_path = str(tmp_path / "recording.jsonl.gz")
+    write_member_updates(recording_path)
+
+    report = asyncio.run(replay_recording(recording_path, speed=0, validate=True))
+
+    assert report["validation"]["completed"] == 3
+    assert report["validation"]["failed"] == 0
+    assert "roles_removed" not in report["requests"]
+    assert "roles_added" not in report["requests"]
+
+
+def test_member_events_are_submitted_for_validation(tmp_path):
+    recording_path = str(tmp_path / "recording.jsonl.gz")
+    write_member_updates(recording_path)
+
+    validated: list[tuple[int, list[int]]] = []
+
+    async def validate(member, plan) -> bool:
+        validated.append((member.id, sorted(role.id for role in member.roles)))
+        return False
+
+    async def run() -> None:
+        bot = ReplayBot(
+            {"production_guild": GUILD_ID, "development_guild": 2},
+            DataHandler(str(tmp_path / "data")),
+        )
+        bot.validation_scheduler.validate = validate
+        await bot.validation_scheduler.start()
+        try:
+            records = read_recording(recording_path)
+            next(records)
+            await EventReplayer(bot, speed=0, validate=True).replay(records)
+        finally:
+            bot.validation_scheduler.stop()
+
+    asyncio.run(run())
+
+    assert validated == [(10, [1, 2]), (11, [3]), (12, [3, 4])]
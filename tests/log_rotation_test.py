@@ -0,0 +1,42 @@
+import logging
+
+from utilities.log_rotation import LogArchiver
+
+
+def test_archiver_reports_failures_to_stderr(tmp_path, capsys):
+    archiver = LogArchiver()
+    missing_folder = str(tmp_path / "missing")
+
+    archiver.submit_folder_cleanup(missing_folder, 30, 1024)
+    archiver.wait_until_idle()
+
+    captured = capsys.readouterr()
+
+    assert captured.out == ""
+    assert f"Failed to archive logs in '{missing_folder}'" in captured.err
+    assert "FileNotFoundError" in captured.err
+
+
+def test_archiver_is_silent_without_raise_exceptions(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(logging, "raiseExceptions", False)
+    archiver = LogArchiver()
+
+    archiver.submit_folder_cleanup(str(tmp_path / "missing"), 30, 1024)
+    archiver.wait_until_idle()
+
+    captured = capsys.readouterr()
+
+    assert captured.out == ""
+    assert captured.err == ""
+
+
+def test_archiver_keeps_running_after_a_failure(tmp_path):
+    archiver = LogArchiver()
+    (tmp_path / "2024-01-01.log").write_text("line\n")
+
+    archiver.submit_folder_cleanup(str(tmp_path / "missing"), 30, 1024)
+    archiver.submit_folder_cleanup(str(tmp_path), 30, 1024 * 1024)
+    archiver.wait_until_idle()
+
+    assert (tmp_path / "2024-01-01.log.gz").exists()
+    assert not (tmp_path / "2024-01-01.log").exists()
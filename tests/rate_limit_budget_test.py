@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import urllib.error
+import urllib.request
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+
+from utilities.rate_limit_budget import (
+    RateLimitBudgetManager,
+    get_route_key,
+)
+
+BUCKET_LIMIT = 5
+BUCKET_WINDOW = 0.5
+
+
+class StubRateLimitHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request like discord does for a member role edit, with a single
+    bucket per guild that allows BUCKET_LIMIT requests per BUCKET_WINDOW seconds.
+    """
+
+    windows: dict = {}
+    lock = threading.Lock()
+
+    def do_PUT(self) -> None:
+        guild_id = self.path.split("/")[4]
+
+        with self.lock:
+            now = monotonic()
+            window_start, used = self.windows.get(guild_id, (now, 0))
+            if now - window_start >= BUCKET_WINDOW:
+                window_start, used = now, 0
+
+            used += 1
+            self.windows[guild_id] = (window_start, used)
+            reset_after = max(BUCKET_WINDOW - (now - window_start), 0.0)
+
+        self.send_response(429 if used > BUCKET_LIMIT else 204)
+        self.send_header("X-RateLimit-Bucket", "member-roles")
+        self.send_header("X-RateLimit-Limit", str(BUCKET_LIMIT))
+        self.send_header("X-RateLimit-Remaining", str(max(BUCKET_LIMIT - used, 0)))
+        self.send_header("X-RateLimit-Reset-After", f"{reset_after:.3f}")
+        if used > BUCKET_LIMIT:
+            self.send_header("Retry-After", f"{reset_after:.3f}")
+        self.end_headers()
+
+    def log_message(self, format, *args) -> None:
+        return None
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    StubRateLimitHandler.windows = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRateLimitHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def send_request(url: str) -> tuple[int, dict]:
+    request = urllib.request.Request(url, method="PUT")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, dict(response.headers)
+    except urllib.error.HTTPError as error:
+        return error.code, dict(error.headers)
+
+
+async def send_role_edits(
+    base_url: str, budget: RateLimitBudgetManager, amount: int, use_budget: bool
+) -> list[int]:
+    statuses = []
+
+    for member_id in range(amount):
+        url = f"{base_url}/api/v10/guilds/1/members/{member_id}/roles/2"
+
+        if use_budget:
+            await budget.acquire("PUT", url)
+
+        status, headers = await asyncio.to_thread(send_request, url)
+        budget.observe("PUT", url, status, headers)
+        statuses.append(status)
+
+    return statuses
+
+
+def test_get_route_key():
+    role_url = "https://discord.com/api/v10/guilds/1/members/2/roles/3"
+    assert get_route_key("put", role_url) == (
+        "PUT /guilds/{guild_id}/members/{id}/roles/{id}",
+        "1",
+    )
+    assert get_route_key("POST", "/channels/5/messages") == (
+        "POST /channels/{channel_id}/messages", "5"
+    )
+    assert get_route_key("POST", "/users/@me/channels") == (
+        "POST /users/@me/channels", ""
+    )
+
+
+def test_stub_server_rate_limits_without_budget():
+    server = start_stub_server()
+    try:
+        budget = RateLimitBudgetManager()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        statuses = asyncio.run(
+            send_role_edits(base_url, budget, BUCKET_LIMIT * 2, use_budget=False)
+        )
+    finally:
+        server.shutdown()
+
+    assert statuses.count(429) > 0
+    assert budget.rate_limited_count == statuses.count(429)
+
+
+def test_budget_avoids_429s():
+    server = start_stub_server()
+    try:
+        budget = RateLimitBudgetManager()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        statuses = asyncio.run(
+            send_role_edits(base_url, budget, BUCKET_LIMIT * 3, use_budget=True)
+        )
+    finally:
+        server.shutdown()
+
+    stats = budget.get_stats()
+
+    assert statuses.count(429) == 0
+    assert stats["observed_429s"] == 0
+    assert stats["avoided_429s"] >= 2
+    assert "member-roles:1" in stats["buckets"]
+    route = "PUT /guilds/{guild_id}/members/{id}/roles/{id}"
+    assert budget.route_buckets[route] == "member-roles"
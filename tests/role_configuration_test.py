@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import threading
+
+from os import path
+from types import SimpleNamespace
+
+from utilities import role_configuration
+from utilities.data_handling import DataHandler
+from utilities.role_configuration import (
+    RoleConfiguration,
+    RoleConfigurationManager,
+    RoleConfigurationStore,
+    get_guild_configuration_folder,
+)
+from utilities.role_handler import RoleHandler
+
+GUILD_ID = 1000
+
+
+def create_configuration(role_id: int, **configuration) -> RoleConfiguration:
+    return RoleConfiguration(role_id, {"role_name": f"role {role_id}", **configuration})
+
+
+def read_journal(manager: RoleConfigurationManager) -> list[dict]:
+    if not path.isfile(manager.journal_file_path):
+        return []
+
+    with open(manager.journal_file_path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def read_configuration_file(manager: RoleConfigurationManager) -> dict:
+    with open(manager.configuration_file_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def test_changes_are_journaled_and_replayed_on_load(create_manager):
+    manager = create_manager(GUILD_ID)
+    manager.add_configuration(create_configuration(1, requires_supporter_status=True))
+    manager.add_configuration(create_configuration(2, cant_combine_with=["1"]))
+    manager.update_configuration(2, grants_role=[3])
+    manager.remove_configuration(1)
+
+    assert [entry["op"] for entry in read_journal(manager)] == [
+        "set", "set", "set", "remove",
+    ]
+    # nothing was merged into the configuration file yet
+    assert read_configuration_file(manager) == {}
+
+    loaded_manager = create_manager(GUILD_ID)
+
+    assert set(loaded_manager.role_configurations) == {2}
+    configuration = loaded_manager.get_role_configuration(2)
+    assert list(configuration.cant_combine_with) == []
+    assert list(configuration.grants_role) == [3]
+
+    # the replayed journal is merged into the configuration file and cleared
+    assert set(read_configuration_file(loaded_manager)) == {"2"}
+    assert read_journal(loaded_manager) == []
+
+
+def test_journal_is_compacted_once_it_is_full(create_manager, monkeypatch):
+    monkeypatch.setattr(role_configuration, "MAX_JOURNAL_ENTRIES", 3)
+    manager = create_manager(GUILD_ID)
+
+    manager.add_configuration(create_configuration(1))
+    manager.add_configuration(create_configuration(2))
+    assert len(read_journal(manager)) == 2
+    assert read_configuration_file(manager) == {}
+
+    manager.add_configuration(create_configuration(3))
+
+    assert read_journal(manager) == []
+    assert set(read_configuration_file(manager)) == {"1", "2", "3"}
+
+    manager.add_configuration(create_configuration(4))
+
+    assert [entry["role_id"] for entry in read_journal(manager)] == ["4"]
+
+
+def test_journal_is_written_off_the_event_loop(create_manager, monkeypatch):
+    manager = create_manager(GUILD_ID)
+    loop_thread = threading.current_thread()
+    write_threads = []
+    flush_journal = manager.flush_journal
+
+    def record_flush() -> None:
+        write_threads.append(threading.current_thread())
+        flush_journal()
+
+    monkeypatch.setattr(manager, "flush_journal", record_flush)
+
+    async def run() -> list[dict]:
+        manager.add_configurations([create_configuration(1), create_configuration(2)])
+        manager.remove_configuration(1)
+
+        # nothing is written on the event loop
+        assert read_journal(manager) == []
+        await manager.flush_journal_async()
+        return read_journal(manager)
+
+    journal = asyncio.run(run())
+
+    assert [entry["op"] for entry in journal] == ["set", "set", "remove"]
+    # the three entries were written together, in the file I/O thread pool
+    assert len(write_threads) == 1
+    assert loop_thread not in write_threads
+
+
+def test_journal_merge_keeps_the_changes_made_during_it(create_manager, monkeypatch):
+    monkeypatch.setattr(role_configuration, "MAX_JOURNAL_ENTRIES", 2)
+    manager = create_manager(GUILD_ID)
+    writing = threading.Event()
+    changed = threading.Event()
+    write_snapshot_to_file = manager._write_snapshot_to_file
+
+    def write_after_a_change(snapshot) -> None:
+        writing.set()
+        changed.wait(5)
+        write_snapshot_to_file(snapshot)
+
+    monkeypatch.setattr(manager, "_write_snapshot_to_file", write_after_a_change)
+
+    async def run() -> None:
+        manager.add_configurations([create_configuration(1), create_configuration(2)])
+
+        while not writing.is_set():
+            await asyncio.sleep(0.01)
+        manager.add_configuration(create_configuration(3))
+        changed.set()
+
+        await manager._journal_merge
+        await manager.flush_journal_async()
+
+    asyncio.run(run())
+
+    # the merged file misses the last change, so the journal has to keep it
+    assert set(read_configuration_file(manager)) == {"1", "2"}
+    assert [entry["role_id"] for entry in read_journal(manager)] == ["1", "2", "3"]
+
+    loaded_manager = create_manager(GUILD_ID)
+    assert set(loaded_manager.role_configurations) == {1, 2, 3}
+
+
+def test_snapshots_are_isolated_from_later_changes(create_manager):
+    manager = create_manager(GUILD_ID)
+    manager.add_configuration(create_configuration(1, cant_combine_with=["2"]))
+    manager.add_configuration(create_configuration(2))
+
+    snapshot = manager.get_snapshot()
+    configuration = snapshot.get(1)
+
+    manager.update_configuration(1, requires_supporter_status=True)
+    manager.remove_configuration(2)
+    manager.add_configuration(create_configuration(3))
+
+    assert manager.get_snapshot().version > snapshot.version
+    assert set(snapshot.configurations) == {1, 2}
+    assert snapshot.get(1) is configuration
+    assert not configuration.requires_supporter_status
+    assert list(configuration.cant_combine_with) == [2]
+
+    assert set(manager.role_configurations) == {1, 3}
+    assert manager.get_role_configuration(1).requires_supporter_status
+    assert list(manager.get_role_configuration(1).cant_combine_with) == []
+
+
+def test_guild_roles_are_added_as_one_snapshot(create_manager):
+    manager = create_manager(GUILD_ID)
+    published = []
+    manager.add_snapshot_listener(published.append)
+
+    roles = [SimpleNamespace(id=0, name="@everyone")] + [
+        SimpleNamespace(id=role_id, name=f"role {role_id}") for role_id in range(1, 51)
+    ]
+    guild = SimpleNamespace(id=GUILD_ID, roles=roles)
+    handler = SimpleNamespace(logger=logging.getLogger("role"))
+
+    RoleHandler._add_guild_role_configurations(handler, guild, manager)
+
+    assert len(published) == 1
+    assert set(published[0].configurations) == set(range(1, 51))
+    assert read_journal(manager) == []
+
+
+def create_store(tmp_path, discord_bot, **options) -> RoleConfigurationStore:
+    data_handler = DataHandler(str(tmp_path / "data"))
+    return RoleConfigurationStore(discord_bot, data_handler, **options)
+
+
+def test_store_evicts_the_least_recently_used_guild(tmp_path, stub_bot):
+    store = create_store(tmp_path, stub_bot, max_loaded_guilds=2)
+    evicted = []
+    store.add_eviction_listener(evicted.append)
+
+    first_manager = store.get_manager(1)
+    store.get_manager(2)
+    assert store.get_manager(1) is first_manager
+
+    store.get_manager(3)
+
+    assert store.get_loaded_guild_ids() == [1, 3]
+    assert evicted == [2]
+    assert store.get_stats()["loads"] == 3
+
+    # an evicted guild is loaded again, with the changes from its journal
+    store.get_manager(3).add_configuration(create_configuration(30))
+    store.evict(3)
+    assert store.get_manager(3).get_role_configuration(30) is not None
+    assert store.get_stats()["loads"] == 4
+
+
+def test_store_evicts_idle_guilds(tmp_path, stub_bot, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(role_configuration, "monotonic", lambda: now[0])
+    store = create_store(tmp_path, stub_bot, idle_eviction_seconds=10)
+
+    store.get_manager(1)
+    now[0] = 5.0
+    store.get_manager(2)
+    now[0] = 12.0
+    store.get_manager(2)
+
+    assert store.get_loaded_guild_ids() == [2]
+
+    now[0] = 30.0
+    store.get_manager(3)
+
+    assert store.get_loaded_guild_ids() == [3]
+    assert store.get_stats()["evictions"] == 2
+
+
+def test_store_shares_a_background_load(tmp_path, stub_bot, monkeypatch):
+    store = create_store(tmp_path, stub_bot)
+    loop_thread = threading.current_thread()
+    folder_threads = []
+
+    def get_folder(data_handler, guild_id):
+        folder_threads.append(threading.current_thread())
+        return get_guild_configuration_folder(data_handler, guild_id)
+
+    monkeypatch.setattr(
+        role_configuration, "get_guild_configuration_folder", get_folder
+    )
+
+    async def run() -> list[RoleConfigurationManager]:
+        loads = [store.get_manager_async(GUILD_ID) for _ in range(3)]
+        return await asyncio.gather(*loads)
+
+    managers = asyncio.run(run())
+
+    assert managers[0] is managers[1] is managers[2]
+    assert store.get_stats()["loads"] == 1
+    assert store._loading == {}
+
+    # the shared folder tree is only changed on the event loop
+    assert folder_threads == [loop_thread]
+    assert store.data_handler.search_for_folder(str(GUILD_ID), "guilds") is not None
+    assert path.isfile(managers[0].configuration_file_path)
+
+
+def test_production_guild_copies_the_global_configuration(tmp_path, stub_bot):
+    store = create_store(tmp_path, stub_bot)
+    store.discord_bot.production_server_id = GUILD_ID
+
+    configuration_folder = store.data_handler.search_for_folder("configuration")
+    file_path = path.join(configuration_folder.path, "role_configuration.json")
+    with open(file_path, "w") as file:
+        json.dump({"7": {"role_name": "global role"}}, file)
+
+    manager = asyncio.run(store.get_manager_async(GUILD_ID))
+
+    assert manager.get_role_configuration(7).role_name == "global role"
+    assert read_configuration_file(manager) == {"7": {"role_name": "global role"}}
+
+
+def test_deleted_roles_are_removed_from_the_rules(create_manager):
+    manager = create_manager(GUILD_ID)
+    manager.add_configuration(create_configuration(1))
+    manager.add_configuration(create_configuration(
+        2, rule="requires <@&1> or boosting; grants <@&3> if not <@&1>"
+    ))
+    manager.add_configuration(create_configuration(3, rule="grants <@&1>"))
+
+    assert manager.remove_configuration(1) == [2, 3]
+
+    configuration = manager.get_role_configuration(2)
+    assert configuration.rule == "requires boosting; grants <@&3>"
+    assert configuration.compiled_rule.referenced_role_ids == {3}
+    assert manager.get_role_configuration(3).rule == ""
+    assert manager.get_role_configuration(3).compiled_rule is None
+
+    # the reverse index follows the rewritten rules, so deleting role 3 finds role 2
+    assert manager.remove_configuration(3) == [2]
+    assert manager.get_role_configuration(2).rule == "requires boosting"
+
+    # the journal replays the same rewrite
+    loaded_manager = create_manager(GUILD_ID)
+
+    assert set(loaded_manager.role_configurations) == {2}
+    assert loaded_manager.get_role_configuration(2).rule == "requires boosting"
@@ -0,0 +1,88 @@
+import asyncio
+
+from utilities.bulk_role_evaluation import RoleChangePlan
+from utilities.data_handling import DataHandler
+from utilities.event_replay import EventReplayer, ReplayBot
+from utilities.role_handler import format_role_names
+from utilities.validation_scheduler import ValidationPriority
+
+GUILD_ID = 1
+MEMBER_ID = 10
+
+
+def create_bot(tmp_path) -> ReplayBot:
+    bot = ReplayBot(
+        {"production_guild": GUILD_ID, "development_guild": 2},
+        DataHandler(str(tmp_path / "data")),
+        live_validation=True,
+    )
+    EventReplayer(bot).load_guild({
+        "g": GUILD_ID,
+        "roles": [[role_id, f"role {role_id}", role_id] for role_id in range(1, 6)],
+        # a supporter, none of the rules below take a role away from the member
+        "members": [[MEMBER_ID, [1, 2, 3], 0, 1]],
+        "rules": {
+            str(role_id): {"role_name": f"role {role_id}"} for role_id in range(1, 6)
+        },
+    })
+    return bot
+
+
+def get_role_ids(bot: ReplayBot) -> list[int]:
+    member = bot.get_guild(GUILD_ID).get_member(MEMBER_ID)
+    return sorted(role.id for role in member.roles)
+
+
+def test_submitted_plans_are_applied_without_planning_again(tmp_path, monkeypatch):
+    bot = create_bot(tmp_path)
+
+    def plan_member_roles(member) -> None:
+        raise AssertionError("the member was planned again")
+
+    monkeypatch.setattr(bot.role_handler, "plan_member_roles", plan_member_roles)
+
+    role_change_plan = RoleChangePlan(
+        MEMBER_ID,
+        # role 4 is not held anymore, so only role 2 is removed
+        singleton_roles_lost=[2, 4],
+        # role 1 is already held, so only role 5 is added
+        granted_roles=[1, 5],
+    )
+
+    async def run() -> bool:
+        await bot.validation_scheduler.start()
+        try:
+            member = bot.get_guild(GUILD_ID).get_member(MEMBER_ID)
+            future = await bot.validation_scheduler.submit(
+                member, ValidationPriority.SWEEP, role_change_plan
+            )
+            return await future
+        finally:
+            bot.validation_scheduler.stop()
+
+    assert asyncio.run(run())
+    assert get_role_ids(bot) == [1, 3, 5]
+    assert bot.io.counts["messages_sent"] == 1
+
+
+def test_plans_that_no_longer_change_anything_send_no_notice(tmp_path):
+    bot = create_bot(tmp_path)
+    member = bot.get_guild(GUILD_ID).get_member(MEMBER_ID)
+    role_change_plan = RoleChangePlan(
+        MEMBER_ID, rule_roles_lost=[4], granted_roles=[3]
+    )
+
+    changed = asyncio.run(bot.role_handler.validate_roles(member, role_change_plan))
+
+    assert not changed
+    assert get_role_ids(bot) == [1, 2, 3]
+    assert bot.io.counts["messages_sent"] == 0
+
+
+def test_role_names_are_listed_for_the_notice(tmp_path):
+    guild = create_bot(tmp_path).get_guild(GUILD_ID)
+    divider = guild.get_or_create_role(6, "ㅤㅤcolorsㅤㅤ", 6)
+
+    assert format_role_names([guild.get_role(1), divider]) == (
+        "@role 1,\n@colors (Role Visual Divider)"
+    )
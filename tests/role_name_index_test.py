@@ -0,0 +1,39 @@
+from utilities.role_name_index import RoleNameIndex, normalize_role_name
+
+
+def create_index() -> RoleNameIndex:
+    index = RoleNameIndex(1)
+    for role_id, role_name in enumerate(["✨ VIP ✨", "🔑", "ㅤㅤModeratorㅤㅤ"], 1):
+        index.add_role(role_id, role_name)
+    return index
+
+
+def test_names_are_normalized():
+    assert normalize_role_name("✨ VIP ✨") == "vip"
+    assert normalize_role_name("ㅤㅤModeratorㅤㅤ") == "moderator"
+    assert normalize_role_name("ＢＯＯＳＴＥＲ") == "booster"
+
+
+def test_emoji_names_keep_their_emoji():
+    assert normalize_role_name("🔑") == "🔑"
+    assert normalize_role_name("🔑 🔒") == "🔑 🔒"
+    assert normalize_role_name("🔑 Keys") == "keys"
+
+
+def test_emoji_names_are_found():
+    index = create_index()
+
+    assert index.search("🔑") == [(2, "🔑")]
+    assert (2, "🔑") in index.search("")
+
+
+def test_names_are_found_by_prefix_and_substring():
+    index = create_index()
+
+    assert index.search("vi") == [(1, "✨ VIP ✨")]
+    assert index.search("erat") == [(3, "ㅤㅤModeratorㅤㅤ")]
+
+    index.remove_role(2)
+
+    assert index.search("🔑") == []
+    assert len(index) == 2
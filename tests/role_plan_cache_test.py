@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from utilities.data_handling import DataHandler
+from utilities.event_replay import EventReplayer, ReplayBot
+from utilities.role_configuration import (
+    RoleConfiguration,
+    RoleConfigurationManager,
+)
+from utilities.role_plan_cache import RolePlanCache
+
+GUILD_ID = 1
+LIVE_ROLE_IDS = {1, 2, 3}
+
+
+@pytest.fixture
+def manager(create_manager) -> RoleConfigurationManager:
+    manager = create_manager(GUILD_ID)
+    manager.add_configurations([
+        RoleConfiguration(1, {"role_name": "role 1", "cant_combine_with": ["2"]}),
+        RoleConfiguration(2, {"role_name": "role 2"}),
+        RoleConfiguration(3, {
+            "role_name": "role 3", "rule": "requires days_in_guild >= 30",
+        }),
+    ])
+    return manager
+
+
+def test_members_with_the_same_roles_share_a_plan(manager):
+    snapshot = manager.get_snapshot()
+    cache = RolePlanCache()
+
+    first_plan = cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [1, 2], False)
+    second_plan = cache.get_plan(snapshot, LIVE_ROLE_IDS, 11, [2, 1], False)
+
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert first_plan.member_id == 10
+    assert second_plan.member_id == 11
+    assert first_plan.singleton_roles_lost == second_plan.singleton_roles_lost == (1,)
+
+    # boosting is part of the role combination
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 12, [1, 2], True)
+    assert (cache.misses, cache.hits) == (2, 1)
+
+
+def test_members_between_the_same_day_thresholds_share_a_plan(manager):
+    snapshot = manager.get_snapshot()
+    cache = RolePlanCache()
+
+    young_plan = cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [3], False, 5)
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 11, [3], False, 29)
+    old_plan = cache.get_plan(snapshot, LIVE_ROLE_IDS, 12, [3], False, 30)
+
+    assert cache.day_thresholds == [30]
+    assert (cache.misses, cache.hits) == (2, 1)
+    assert young_plan.rule_roles_lost == (3,)
+    assert not old_plan.has_changes
+
+
+def test_new_snapshots_and_reloads_drop_every_plan(manager):
+    cache = RolePlanCache()
+
+    cache.get_plan(manager.get_snapshot(), LIVE_ROLE_IDS, 10, [1, 2], False)
+
+    # a changed configuration is a new snapshot
+    manager.update_configuration(1, cant_combine_with=[])
+    plan = cache.get_plan(manager.get_snapshot(), LIVE_ROLE_IDS, 11, [1, 2], False)
+
+    assert not plan.has_changes
+    assert (cache.misses, cache.hits, cache.invalidations) == (2, 0, 1)
+
+    # a reloaded configuration is a new snapshot too
+    manager.load_role_configuration_file()
+    cache.get_plan(manager.get_snapshot(), LIVE_ROLE_IDS, 12, [1, 2], False)
+
+    assert (cache.misses, cache.hits, cache.invalidations) == (3, 0, 2)
+
+    # and so is a deleted role
+    cache.get_plan(manager.get_snapshot(), {1, 2}, 13, [1, 2], False)
+
+    assert (cache.misses, cache.hits, cache.invalidations) == (4, 0, 3)
+    assert len(cache) == 1
+
+
+def test_cache_drops_the_least_recently_used_plan(manager):
+    snapshot = manager.get_snapshot()
+    cache = RolePlanCache(max_size=2)
+
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [1], False)
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [2], False)
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [1], False)
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [1, 2], False)
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [1], False)
+    cache.get_plan(snapshot, LIVE_ROLE_IDS, 10, [2], False)
+
+    assert len(cache) == 2
+    assert cache.get_stats()["hits"] == 2
+    assert cache.get_stats()["misses"] == 4
+
+
+def test_validations_go_through_the_plan_cache(tmp_path):
+    bot = ReplayBot(
+        {"production_guild": GUILD_ID, "development_guild": 2},
+        DataHandler(str(tmp_path / "data")),
+        live_validation=True,
+    )
+    guild = EventReplayer(bot).load_guild({
+        "g": GUILD_ID,
+        "roles": [[role_id, f"role {role_id}", role_id] for role_id in (1, 2)],
+        "members": [[10, [1], 0, 0], [11, [1], 0, 0]],
+        "rules": {
+            "1": {"role_name": "role 1", "grants_role": ["2"]},
+            "2": {"role_name": "role 2"},
+        },
+    })
+
+    async def validate(member_id: int) -> bool:
+        return await bot.role_handler.validate_roles(guild.get_member(member_id))
+
+    assert asyncio.run(validate(10))
+    assert asyncio.run(validate(11))
+
+    stats = bot.role_handler.get_role_plan_cache_stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+    # changed rules are planned again
+    bot.role_handler.update_role_rules(guild, 1, grants_role=[])
+    guild.update_member(12, [1], False, False)
+
+    assert not asyncio.run(validate(12))
+
+    stats = bot.role_handler.get_role_plan_cache_stats()
+    assert (stats["misses"], stats["hits"]) == (2, 1)
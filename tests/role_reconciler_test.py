@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+
+from os import path
+
+import pytest
+
+from utilities.data_handling import DataHandler
+from utilities.event_replay import EventReplayer, ReplayBot
+from utilities.role_reconciler import RoleReconciler
+
+GUILD_ID = 1
+SUPPORTER_ROLE_ID = 3
+MEMBER_IDS = list(range(10, 20))
+
+
+def create_bot(data_path: str) -> ReplayBot:
+    bot = ReplayBot(
+        {"production_guild": GUILD_ID, "development_guild": 2},
+        DataHandler(data_path),
+        live_validation=True,
+    )
+    rule = {
+        "role_name": "supporters only",
+        "requires_supporter_status": True,
+        "cant_combine_with": [],
+        "grants_role": [],
+        "required_by": [],
+    }
+    EventReplayer(bot).load_guild({
+        "g": GUILD_ID,
+        "roles": [[SUPPORTER_ROLE_ID, "supporters only", 1]],
+        # none of the members is a supporter, so every one of them loses the role
+        "members": [[member_id, [SUPPORTER_ROLE_ID], 0, 0] for member_id in MEMBER_IDS],
+        "rules": {str(SUPPORTER_ROLE_ID): rule},
+    })
+    return bot
+
+
+def create_reconciler(bot: ReplayBot, slice_interval: float = 3.0) -> RoleReconciler:
+    # a slice covers three of the ten members by default
+    return RoleReconciler(
+        bot,
+        bot.validation_scheduler,
+        bot.role_handler,
+        bot.data_handler,
+        period=10.0,
+        slice_interval=slice_interval,
+        slice_time_budget=10.0,
+    )
+
+
+def get_fixed_member_ids(bot: ReplayBot) -> list[int]:
+    guild = bot.get_guild(GUILD_ID)
+    return [
+        member_id for member_id in MEMBER_IDS
+        if not guild.get_member(member_id).roles
+    ]
+
+
+def test_cursor_is_written_to_the_data_folder_and_resumed(tmp_path):
+    data_path = str(tmp_path / "data")
+
+    async def run_slice(bot: ReplayBot, reconciler: RoleReconciler) -> int:
+        await bot.validation_scheduler.start()
+        try:
+            queued_count = await reconciler.run_slice()
+            await bot.wait_until_idle()
+        finally:
+            bot.validation_scheduler.stop()
+
+        return queued_count
+
+    bot = create_bot(data_path)
+    reconciler = create_reconciler(bot)
+
+    assert asyncio.run(run_slice(bot, reconciler)) == 3
+    assert get_fixed_member_ids(bot) == [10, 11, 12]
+
+    cursor_file_path = path.join(data_path, "reconciliation", "cursor.json")
+    assert reconciler.cursor_file_path == cursor_file_path
+    with open(cursor_file_path) as file:
+        assert json.load(file) == {str(GUILD_ID): 12}
+
+    # a restarted bot continues after the last member that was checked
+    restarted_bot = create_bot(data_path)
+    restarted_reconciler = create_reconciler(restarted_bot)
+
+    assert restarted_reconciler.cursors == {GUILD_ID: 12}
+    assert asyncio.run(run_slice(restarted_bot, restarted_reconciler)) == 3
+    assert get_fixed_member_ids(restarted_bot) == [13, 14, 15]
+    assert restarted_reconciler.cursors == {GUILD_ID: 15}
+
+
+def test_walk_starts_over_after_the_last_member(tmp_path):
+    bot = create_bot(str(tmp_path / "data"))
+    reconciler = create_reconciler(bot)
+
+    async def run() -> None:
+        await bot.validation_scheduler.start()
+        try:
+            for _ in range(4):
+                await reconciler.run_slice()
+                await bot.wait_until_idle()
+        finally:
+            bot.validation_scheduler.stop()
+
+    asyncio.run(run())
+
+    assert get_fixed_member_ids(bot) == MEMBER_IDS
+    assert reconciler.cycles_completed == 1
+    assert reconciler.members_queued == len(MEMBER_IDS)
+    assert reconciler.cursors == {GUILD_ID: 0}
+
+
+def test_cursor_is_only_written_when_it_moved(tmp_path, monkeypatch):
+    bot = create_bot(str(tmp_path / "data"))
+    # a slice covers the whole guild, so the cursor is back at 0 after every slice
+    reconciler = create_reconciler(bot, slice_interval=10.0)
+    loop_thread = threading.current_thread()
+    write_threads = []
+    write_cursor_file = reconciler._write_cursor_file
+
+    def record_write(cursors: dict[int, int]) -> None:
+        write_threads.append(threading.current_thread())
+        write_cursor_file(cursors)
+
+    monkeypatch.setattr(reconciler, "_write_cursor_file", record_write)
+
+    async def run() -> None:
+        await bot.validation_scheduler.start()
+        try:
+            for _ in range(3):
+                await reconciler.run_slice()
+                await bot.wait_until_idle()
+        finally:
+            bot.validation_scheduler.stop()
+
+    asyncio.run(run())
+
+    assert reconciler.cycles_completed == 3
+    assert reconciler.cursors == {GUILD_ID: 0}
+    # only the first slice moved the cursor, and it was written off the event loop
+    assert len(write_threads) == 1
+    assert loop_thread not in write_threads
+
+
+def test_period_and_interval_must_be_positive(tmp_path):
+    bot = create_bot(str(tmp_path / "data"))
+
+    with pytest.raises(ValueError):
+        RoleReconciler(
+            bot,
+            bot.validation_scheduler,
+            bot.role_handler,
+            bot.data_handler,
+            period=0,
+        )
@@ -0,0 +1,229 @@
+import itertools
+
+import pytest
+
+from utilities.bulk_role_evaluation import plan_member_roles
+from utilities.role_configuration import (
+    RoleConfiguration,
+    RoleConfigurationSnapshot,
+)
+from utilities.role_rule_language import (
+    compile_rule,
+    express_legacy_rules,
+    parse_rule,
+    remove_rule_role,
+    tokenize_rule,
+)
+
+
+def test_rules_are_tokenized():
+    assert tokenize_rule("requires <@&12> AND days_in_guild>=3;") == [
+        ("word", "requires", 0),
+        ("number", "12", 12),
+        ("word", "and", 16),
+        ("word", "days_in_guild", 20),
+        ("operator", ">=", 33),
+        ("number", "3", 35),
+        ("punctuation", ";", 36),
+    ]
+
+
+@pytest.mark.parametrize("rule_text, message", [
+    ("requires <@&1> & <@&2>", "Unexpected character '&' at position 16."),
+    ("requires   @", "Unexpected character '@' at position 12."),
+    ("requires <@&1> nand <@&2>", "Unknown word 'nand' at position 16."),
+])
+def test_tokenizer_errors_say_where(rule_text, message):
+    with pytest.raises(ValueError) as error:
+        tokenize_rule(rule_text)
+
+    assert str(error.value) == message
+
+
+@pytest.mark.parametrize("rule_text, message", [
+    ("boosting", "Expected 'requires' or 'grants' at position 1, found 'boosting'."),
+    ("requires", "Expected a condition at the end of the rule."),
+    ("requires (<@&1> or <@&2>", "Expected ')' at the end of the rule."),
+    ("requires <@&1> <@&2>", "Unexpected '2' at position 19."),
+    ("grants if boosting", "Expected a role at position 8, found 'if'."),
+    (
+        "requires days_in_guild 3",
+        "Expected a comparison like '>=' at position 24, found '3'.",
+    ),
+    (
+        "requires days_in_guild > boosting",
+        "Expected a number of days at position 26, found 'boosting'.",
+    ),
+    ("requires and", "Expected a condition at position 10, found 'and'."),
+])
+def test_parser_errors_say_where(rule_text, message):
+    with pytest.raises(ValueError) as error:
+        parse_rule(rule_text)
+
+    assert str(error.value) == message
+
+
+def test_deeply_nested_rules_are_rejected():
+    assert compile_rule("requires " + "(" * 32 + "boosting" + ")" * 32)
+
+    with pytest.raises(ValueError) as error:
+        compile_rule("requires " + "(" * 250 + "boosting" + ")" * 250)
+
+    assert str(error.value) == (
+        "Condition nested too deep at position 42, at most 32 levels are allowed."
+    )
+
+    with pytest.raises(ValueError) as error:
+        compile_rule("requires " + "not " * 1000 + "boosting")
+
+    assert str(error.value) == (
+        "Condition nested too deep at position 138, at most 32 levels are allowed."
+    )
+
+
+def test_rules_are_parsed_by_precedence():
+    rule_text = "requires not <@&1> and 2 or boosting; grants 3, 4, 3 if true;"
+    assert parse_rule(rule_text) == [
+        ("requires", ("or", (
+            ("and", (("not", ("role", 1)), ("role", 2))),
+            ("boosting",),
+        ))),
+        ("grants", (3, 4), ("constant", True)),
+    ]
+
+
+def test_empty_rules_are_not_compiled():
+    assert compile_rule("") is None
+    assert compile_rule("   ") is None
+
+
+def test_compiled_rules_check_the_member():
+    compiled_rule = compile_rule(
+        "requires (<@&1> or <@&2>) and not (<@&3> or <@&4>); "
+        "requires days_in_guild >= 7 or boosting; "
+        "grants <@&5>; "
+        "grants <@&6>, <@&7> if <@&1> and <@&2> and not boosting"
+    )
+
+    assert compiled_rule.referenced_role_ids == {1, 2, 3, 4, 5, 6, 7}
+    assert compiled_rule.granted_role_ids == {5, 6, 7}
+
+    assert compiled_rule.allows({1}, False, 7)
+    assert compiled_rule.allows({2}, True, 0)
+    assert not compiled_rule.allows({2}, False, 6)
+    assert not compiled_rule.allows({1, 4}, True, 30)
+    assert not compiled_rule.allows(set(), True, 30)
+
+    assert list(compiled_rule.iter_granted_role_ids({1}, False, 7)) == [5]
+    assert list(compiled_rule.iter_granted_role_ids({1, 2}, False, 7)) == [5, 6, 7]
+    assert list(compiled_rule.iter_granted_role_ids({1, 2}, True, 7)) == [5]
+
+
+def test_constants_are_folded():
+    assert compile_rule("requires true or <@&1>").allows(set(), False, 0)
+    assert not compile_rule("requires false and <@&1>").allows({1}, False, 0)
+    assert not compile_rule("requires not (true and boosting)").allows(set(), True, 0)
+    assert compile_rule("requires not false").allows(set(), False, 0)
+
+
+@pytest.mark.parametrize("rule_text, day_thresholds", [
+    ("requires days_in_guild >= 30", (30,)),
+    ("requires days_in_guild < 30", (30,)),
+    ("requires days_in_guild > 30", (31,)),
+    ("requires days_in_guild <= 30", (31,)),
+    ("requires days_in_guild == 30", (30, 31)),
+    ("requires not days_in_guild != 30", (30, 31)),
+    (
+        "requires <@&1> and days_in_guild > 7; grants <@&2> if days_in_guild >= 90",
+        (8, 90),
+    ),
+    ("requires boosting; grants <@&2>", ()),
+])
+def test_day_thresholds(rule_text, day_thresholds):
+    assert compile_rule(rule_text).day_thresholds == day_thresholds
+
+
+def test_day_thresholds_split_members_by_outcome():
+    compiled_rule = compile_rule("requires days_in_guild > 7 and days_in_guild != 20")
+
+    for days_in_guild in range(40):
+        # every member in the same bucket gets the same outcome as the first day of it
+        bucket_start = max(
+            [0, *(day for day in compiled_rule.day_thresholds if day <= days_in_guild)]
+        )
+        is_allowed = compiled_rule.allows(set(), False, days_in_guild)
+        assert is_allowed == compiled_rule.allows(set(), False, bucket_start)
+
+
+@pytest.mark.parametrize("rule_text, role_id, rewritten_rule_text", [
+    ("requires <@&1> or <@&2>", 1, "requires <@&2>"),
+    ("requires <@&1> and boosting", 1, "requires false"),
+    ("requires not <@&1> and boosting", 1, "requires boosting"),
+    ("requires not <@&1>", 1, ""),
+    ("requires boosting and (<@&1> or <@&2>)", 2, "requires boosting and <@&1>"),
+    ("grants <@&1>, <@&2> if <@&3>", 1, "grants <@&2> if <@&3>"),
+    ("grants <@&1> if boosting; requires <@&2>", 1, "requires <@&2>"),
+    ("grants <@&2> if <@&1>; requires boosting", 1, "requires boosting"),
+    ("grants <@&2> if not <@&1>", 1, "grants <@&2>"),
+])
+def test_deleted_roles_are_removed_from_rules(rule_text, role_id, rewritten_rule_text):
+    assert remove_rule_role(rule_text, role_id) == rewritten_rule_text
+
+
+LEGACY_FIELD_CASES = [
+    (True, [], [], []),
+    (False, [2], [], []),
+    (False, [2, 3], [], []),
+    (False, [], [4], []),
+    (False, [], [4, 5], []),
+    (False, [], [], [6, 7]),
+    (True, [2, 3], [4, 5], [6]),
+]
+
+
+@pytest.mark.parametrize("fields", LEGACY_FIELD_CASES)
+def test_legacy_rules_keep_and_grant_the_same_roles(fields):
+    requires_supporter_status, cant_combine_with, required_by, grants_role = fields
+    legacy_configuration = RoleConfiguration(1, {
+        "requires_supporter_status": requires_supporter_status,
+        "cant_combine_with": cant_combine_with,
+        "required_by": required_by,
+        "grants_role": grants_role,
+    })
+    rule_configuration = RoleConfiguration(1, {
+        "rule": express_legacy_rules(*fields),
+    })
+    live_role_ids = set(range(1, 8))
+
+    def plan(configuration: RoleConfiguration, role_ids: list[int], is_supporter: bool):
+        snapshot = RoleConfigurationSnapshot(1, {1: configuration})
+        role_change_plan = plan_member_roles(
+            snapshot, live_role_ids, 10, role_ids, is_supporter
+        )
+        lost_role_ids = {
+            role_id
+            for field in (
+                "supporter_roles_lost",
+                "singleton_roles_lost",
+                "required_roles_lost",
+                "rule_roles_lost",
+            )
+            for role_id in getattr(role_change_plan, field)
+        }
+        return lost_role_ids, set(role_change_plan.granted_roles)
+
+    for other_role_ids in itertools.chain.from_iterable(
+        itertools.combinations(range(2, 8), count) for count in range(3)
+    ):
+        for is_supporter in (False, True):
+            role_ids = [1, *other_role_ids]
+            assert plan(legacy_configuration, role_ids, is_supporter) == plan(
+                rule_configuration, role_ids, is_supporter
+            )
+
+
+def test_legacy_rules_without_fields_are_empty():
+    assert express_legacy_rules(False, [], [], []) == ""
+    assert express_legacy_rules(True, [2, 3], [4], [6, 7]) == (
+        "requires boosting and not (<@&2> or <@&3>) and <@&4>; grants <@&6>, <@&7>"
+    )
@@ -0,0 +1,52 @@
+import json
+import logging
+
+from utilities.log_search import LogSearch
+from utilities.structured_logging import JsonLinesFormatter, StructuredLogger
+
+
+def format_event(event: str, **fields) -> dict:
+    records = []
+    logger = logging.getLogger("structured logging test")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        StructuredLogger(logger).info(event, **fields)
+    finally:
+        logger.removeHandler(handler)
+
+    return json.loads(JsonLinesFormatter().format(records[0]))
+
+
+def test_fields_can_not_overwrite_the_record():
+    json_record = format_event(
+        "role.granted", time="never", level="ERROR", logger="other", member=10
+    )
+
+    assert json_record["event"] == "role.granted"
+    assert json_record["time"] != "never"
+    assert json_record["level"] == "INFO"
+    assert json_record["logger"] == "structured logging test"
+    assert json_record["fields"] == {
+        "time": "never", "level": "ERROR", "logger": "other", "member": 10
+    }
+
+
+def test_events_without_fields_have_no_fields():
+    assert "fields" not in format_event("reconciler.started")
+
+
+def test_nested_fields_are_found_by_the_log_search(tmp_path):
+    log_file_path = tmp_path / "2024-01-01.log"
+    log_file_path.write_text(
+        json.dumps(format_event("role.granted", member=123456789012345678)) + "\n"
+    )
+
+    matches = list(LogSearch("123456789012345678").search_file(str(log_file_path)))
+
+    assert len(matches) == 1
+    assert json.loads(matches[0])["fields"]["member"] == 123456789012345678
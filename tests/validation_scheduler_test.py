@@ -0,0 +1,194 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from utilities.validation_scheduler import (
+    ValidationPriority,
+    ValidationScheduler,
+)
+
+SWEEP = ValidationPriority.SWEEP
+EVENT = ValidationPriority.EVENT
+INTERACTIVE = ValidationPriority.INTERACTIVE
+
+GUILD = SimpleNamespace(id=1)
+
+
+def create_member(member_id: int, version: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(id=member_id, guild=GUILD, version=version)
+
+
+class BlockingValidator:
+    """
+    Records the validated members, the first validation waits until it is released so
+    jobs can pile up behind it.
+    """
+
+    def __init__(self) -> None:
+        self.validated: list = []
+        self.started: asyncio.Event = asyncio.Event()
+        self.released: asyncio.Event = asyncio.Event()
+
+    async def __call__(self, member, plan) -> int:
+        self.validated.append(member)
+        self.started.set()
+        await self.released.wait()
+        return member.id
+
+
+async def start_blocked_scheduler(**options) -> tuple:
+    validator = BlockingValidator()
+    scheduler = ValidationScheduler(validator, worker_count=1, **options)
+    await scheduler.start()
+
+    # occupy the only worker
+    first_future = await scheduler.submit(create_member(1), SWEEP)
+    await validator.started.wait()
+
+    return scheduler, validator, first_future
+
+
+def test_jobs_run_by_priority():
+    async def run() -> list[int]:
+        scheduler, validator, first_future = await start_blocked_scheduler()
+
+        futures = [
+            await scheduler.submit(create_member(2), SWEEP),
+            await scheduler.submit(create_member(3), EVENT),
+            await scheduler.submit(create_member(4), INTERACTIVE),
+            await scheduler.submit(create_member(5), EVENT),
+        ]
+
+        validator.released.set()
+        results = await asyncio.gather(first_future, *futures)
+        scheduler.stop()
+
+        assert results == [1, 2, 3, 4, 5]
+        return [member.id for member in validator.validated]
+
+    assert asyncio.run(run()) == [1, 4, 3, 5, 2]
+
+
+def test_pending_jobs_of_a_member_are_merged():
+    async def run() -> None:
+        scheduler, validator, first_future = await start_blocked_scheduler()
+
+        sweep_future = await scheduler.submit(create_member(2, 0), SWEEP)
+        event_future = await scheduler.submit(create_member(2, 1), EVENT)
+        interactive_future = scheduler.try_submit(create_member(2, 2), INTERACTIVE)
+        other_future = await scheduler.submit(create_member(3), EVENT)
+
+        assert sweep_future is event_future is interactive_future
+
+        stats = scheduler.get_stats()
+        assert stats["submitted"] == 5
+        assert stats["deduplicated"] == 2
+        assert stats["priorities"]["interactive"]["depth"] == 1
+        assert stats["priorities"]["event"]["depth"] == 1
+        assert stats["priorities"]["sweep"]["depth"] == 0
+
+        validator.released.set()
+        await asyncio.gather(first_future, sweep_future, other_future)
+        scheduler.stop()
+
+        # one validation of the latest version, before the other event
+        assert [(member.id, member.version) for member in validator.validated] == [
+            (1, 0), (2, 2), (3, 0),
+        ]
+        assert scheduler.completed_count == 3
+
+    asyncio.run(run())
+
+
+def test_member_submitted_while_running_runs_afterwards():
+    async def run() -> None:
+        scheduler, validator, first_future = await start_blocked_scheduler()
+
+        again_future = await scheduler.submit(create_member(1, 1), EVENT)
+
+        assert again_future is not first_future
+        assert scheduler.get_stats()["running"] == 1
+
+        validator.released.set()
+        await asyncio.gather(first_future, again_future)
+        scheduler.stop()
+
+        assert [(member.id, member.version) for member in validator.validated] == [
+            (1, 0), (1, 1),
+        ]
+
+    asyncio.run(run())
+
+
+def test_submit_blocks_while_the_queue_is_full():
+    async def run() -> None:
+        scheduler, validator, first_future = await start_blocked_scheduler(
+            queue_sizes={SWEEP: 1}
+        )
+
+        queued_future = await scheduler.submit(create_member(2), SWEEP)
+
+        blocked_submit = asyncio.ensure_future(
+            scheduler.submit(create_member(3), SWEEP)
+        )
+        await asyncio.sleep(0.05)
+
+        assert not blocked_submit.done()
+        assert scheduler.try_submit(create_member(4), SWEEP) is None
+
+        # other priorities are not held up by a full sweep queue
+        event_future = scheduler.try_submit(create_member(5), EVENT)
+        assert event_future is not None
+
+        validator.released.set()
+        blocked_future = await asyncio.wait_for(blocked_submit, 1)
+        await asyncio.gather(first_future, queued_future, event_future, blocked_future)
+        scheduler.stop()
+
+        assert [member.id for member in validator.validated] == [1, 5, 2, 3]
+
+    asyncio.run(run())
+
+
+def test_failed_jobs_are_counted():
+    async def fail(member, plan) -> None:
+        raise ValueError("broken")
+
+    async def run() -> None:
+        scheduler = ValidationScheduler(fail, worker_count=1)
+        await scheduler.start()
+
+        future = await scheduler.submit(create_member(1))
+        await asyncio.wait([future])
+        scheduler.stop()
+
+        assert isinstance(future.exception(), ValueError)
+        assert scheduler.failed_count == 1
+
+    asyncio.run(run())
+
+
+def test_plans_are_replaced_by_later_submissions():
+    async def run() -> None:
+        plans = []
+
+        async def validate(member, plan) -> None:
+            plans.append((member.id, plan))
+
+        scheduler, validator, first_future = await start_blocked_scheduler()
+        scheduler.validate = validate
+
+        await scheduler.submit(create_member(2), SWEEP, "sweep plan")
+        await scheduler.submit(create_member(3), SWEEP, "stale plan")
+        # the member changed since it was planned, so the plan no longer holds
+        await scheduler.submit(create_member(3, 1), EVENT)
+
+        validator.released.set()
+        await first_future
+        while scheduler.completed_count < 3:
+            await asyncio.sleep(0.01)
+        scheduler.stop()
+
+        assert plans == [(3, None), (2, "sweep plan")]
+
+    asyncio.run(run())